@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import AuditEntry, AuditJournal, OrderAuditEntry
+from .models import AuditEntry, AuditJournal, OrderAuditArchive, OrderAuditEntry
 
 
 @admin.register(AuditJournal)
@@ -32,3 +32,20 @@ class OrderAuditEntryAdmin(admin.ModelAdmin):
     list_filter = ("action", "order_type", "agency")
     search_fields = ("order_id", "description", "agency__agn_name")
     ordering = ("-created_at",)
+
+
+@admin.register(OrderAuditArchive)
+class OrderAuditArchiveAdmin(admin.ModelAdmin):
+    list_display = (
+        "archived_at",
+        "order_type",
+        "order_id",
+        "agency",
+        "entries_count",
+        "first_created_at",
+        "last_created_at",
+    )
+    list_filter = ("order_type",)
+    search_fields = ("order_id", "agency__agn_name")
+    ordering = ("-archived_at",)
+    exclude = ("data",)
@@ -0,0 +1,242 @@
+import json
+import zlib
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from sku.models import Agency
+
+from .models import OrderAuditArchive, OrderAuditEntry, promoted_payload_fields
+
+
+ARCHIVABLE_ORDER_TYPES = ("receiving", "processing")
+DONE_STATUSES = {"done", "completed", "closed", "finished"}
+
+# Записи с пользовательским содержимым (создание, комментарии, файлы) всегда остаются в журнале.
+_ALWAYS_HOT_ACTIONS = {"create", "comment", "upload"}
+_STATUS_KEYS = ("status", "status_label", "submit_action")
+_SERVICE_PAYLOAD_KEYS = {
+    "comment",
+    "message",
+    "status",
+    "status_label",
+    "submit_action",
+    "flow_state",
+    "flow_boxes",
+    "flow_pallets",
+    "flow_active_box",
+    "flow_active_pallet",
+}
+
+
+def _pack(rows: list[dict]) -> bytes:
+    return zlib.compress(json.dumps(rows, ensure_ascii=False, cls=DjangoJSONEncoder).encode("utf-8"), 6)
+
+
+def _unpack(data) -> list[dict]:
+    return json.loads(zlib.decompress(bytes(data)).decode("utf-8"))
+
+
+def _entry_row(entry: OrderAuditEntry) -> dict:
+    return {
+        "id": entry.pk,
+        "action": entry.action,
+        "user_id": entry.user_id,
+        "agency_id": entry.agency_id,
+        "description": entry.description,
+        "payload": entry.payload,
+        "created_at": entry.created_at,
+    }
+
+
+def _entry_from_row(order_type: str, order_id: str, row: dict) -> OrderAuditEntry:
+    payload = row.get("payload")
+    return OrderAuditEntry(
+        id=row["id"],
+        order_id=order_id,
+        order_type=order_type,
+        action=row.get("action") or "update",
+        user_id=row.get("user_id"),
+        agency_id=row.get("agency_id"),
+        description=row.get("description") or "",
+        payload=payload,
+        created_at=parse_datetime(row["created_at"]),
+        **promoted_payload_fields(payload),
+    )
+
+
+def _is_status_entry(entry: OrderAuditEntry) -> bool:
+    payload = entry.payload or {}
+    return entry.action == "status" or any(payload.get(key) for key in _STATUS_KEYS)
+
+
+def _is_closed(entries: list[OrderAuditEntry]) -> bool:
+    for entry in reversed(entries):
+        if _is_status_entry(entry):
+            status_value = str((entry.payload or {}).get("status") or "").strip().lower()
+            return status_value in DONE_STATUSES
+    return False
+
+
+def state_defining_ids(entries: list[OrderAuditEntry]) -> set:
+    """
+    Записи, по которым восстанавливается состояние заявки (entries — по возрастанию времени):
+    первая и последняя, последняя статусная, последняя по каждому акту, последняя отправка акта,
+    последняя запись с содержательным payload, а также все создания, комментарии и файлы.
+    """
+    if not entries:
+        return set()
+    keep = {entries[0].pk, entries[-1].pk}
+    latest = {}
+    for entry in entries:
+        payload = entry.payload or {}
+        if entry.action in _ALWAYS_HOT_ACTIONS:
+            keep.add(entry.pk)
+        if _is_status_entry(entry):
+            latest["status"] = entry.pk
+        if entry.act:
+            latest[f"act:{entry.act}"] = entry.pk
+        if entry.act_sent:
+            latest["act_sent"] = entry.pk
+        if set(payload) - _SERVICE_PAYLOAD_KEYS:
+            latest["payload"] = entry.pk
+    keep.update(latest.values())
+    return keep
+
+
+def archive_order(order_type: str, order_id: str) -> int:
+    """Переносит вытесненные записи закрытой заявки в архив; возвращает число перенесенных записей."""
+    with transaction.atomic():
+        entries = list(
+            OrderAuditEntry.objects.filter(order_type=order_type, order_id=order_id).order_by("created_at", "pk")
+        )
+        if not entries or not _is_closed(entries):
+            return 0
+        keep = state_defining_ids(entries)
+        moved = [entry for entry in entries if entry.pk not in keep]
+        if not moved:
+            return 0
+        OrderAuditArchive.objects.create(
+            order_id=order_id,
+            order_type=order_type,
+            agency_id=entries[-1].agency_id,
+            entries_count=len(moved),
+            first_created_at=moved[0].created_at,
+            last_created_at=moved[-1].created_at,
+            data=_pack([_entry_row(entry) for entry in moved]),
+        )
+        OrderAuditEntry.objects.filter(pk__in=[entry.pk for entry in moved]).delete()
+    return len(moved)
+
+
+def archive_candidates(days: int, order_types=ARCHIVABLE_ORDER_TYPES) -> list[tuple[str, str]]:
+    """Заявки с финальным статусом, в которых ничего не происходило больше days дней."""
+    cutoff = timezone.now() - timedelta(days=days)
+    done_orders = OrderAuditEntry.objects.filter(order_type__in=order_types, status__in=DONE_STATUSES).values(
+        "order_id"
+    )
+    rows = (
+        OrderAuditEntry.objects.filter(order_type__in=order_types, order_id__in=done_orders)
+        .values("order_type", "order_id")
+        .annotate(last_at=Max("created_at"))
+        .filter(last_at__lt=cutoff)
+        .order_by("last_at")
+    )
+    return [(row["order_type"], row["order_id"]) for row in rows]
+
+
+def archive_closed_orders(days: int | None = None, order_types=ARCHIVABLE_ORDER_TYPES, limit: int | None = None) -> dict:
+    """Архивирует историю закрытых заявок старше days дней: {"orders": N, "entries": M}."""
+    if days is None:
+        days = getattr(settings, "ORDER_ARCHIVE_AFTER_DAYS", 180)
+    candidates = archive_candidates(days, order_types)
+    if limit:
+        candidates = candidates[:limit]
+    summary = {"orders": 0, "entries": 0}
+    for order_type, order_id in candidates:
+        moved = archive_order(order_type, order_id)
+        if moved:
+            summary["orders"] += 1
+            summary["entries"] += moved
+    return summary
+
+
+def restore_order(order_type: str, order_id: str) -> int:
+    """Возвращает архивную историю заявки в журнал; возвращает число восстановленных записей."""
+    with transaction.atomic():
+        archives = list(
+            OrderAuditArchive.objects.select_for_update().filter(order_type=order_type, order_id=order_id)
+        )
+        if not archives:
+            return 0
+        restored = [
+            _entry_from_row(order_type, order_id, row) for archive in archives for row in _unpack(archive.data)
+        ]
+        OrderAuditEntry.objects.bulk_create(restored, batch_size=500)
+        OrderAuditArchive.objects.filter(pk__in=[archive.pk for archive in archives]).delete()
+    return len(restored)
+
+
+def archived_entries(order_type: str, order_id: str) -> list[OrderAuditEntry]:
+    """Архивные записи заявки как несохраняемые OrderAuditEntry с подставленными user и agency."""
+    rows = [
+        row
+        for data in OrderAuditArchive.objects.filter(order_type=order_type, order_id=order_id).values_list(
+            "data", flat=True
+        )
+        for row in _unpack(data)
+    ]
+    if not rows:
+        return []
+    entries = [_entry_from_row(order_type, order_id, row) for row in rows]
+    users = get_user_model().objects.in_bulk({entry.user_id for entry in entries if entry.user_id})
+    agencies = Agency.objects.in_bulk({entry.agency_id for entry in entries if entry.agency_id})
+    for entry in entries:
+        entry.user = users.get(entry.user_id)
+        entry.agency = agencies.get(entry.agency_id)
+        entry.archived = True
+    return entries
+
+
+def archived_entries_between(
+    order_type: str, start, end, act: str | None = None, agency_ids=None
+) -> list[OrderAuditEntry]:
+    """
+    Архивные записи заявок order_type с created_at в [start, end) (start=None — с начала журнала)
+    для пересчетов по журналу за прошлые даты; по возрастанию времени, без user и agency.
+    """
+    archives = OrderAuditArchive.objects.filter(order_type=order_type, first_created_at__lt=end)
+    if start is not None:
+        archives = archives.filter(last_created_at__gte=start)
+    if agency_ids is not None:
+        archives = archives.filter(agency_id__in=agency_ids)
+    entries = []
+    for order_id, data in archives.order_by().values_list("order_id", "data").iterator():
+        for row in _unpack(data):
+            entry = _entry_from_row(order_type, order_id, row)
+            if entry.created_at >= end or (start is not None and entry.created_at < start):
+                continue
+            if act and entry.act != act:
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda entry: (entry.created_at, entry.pk))
+    return entries
+
+
+def order_entries(order_id: str, order_type: str = "receiving") -> list[OrderAuditEntry]:
+    """Полная история заявки по возрастанию времени: журнал плюс холодный архив."""
+    entries = list(
+        OrderAuditEntry.objects.filter(order_id=order_id, order_type=order_type)
+        .select_related("user", "agency")
+        .order_by("created_at")
+    )
+    archived = archived_entries(order_type, order_id)
+    if not archived:
+        return entries
+    return sorted(entries + archived, key=lambda entry: (entry.created_at, entry.pk))
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from audit.archive import ARCHIVABLE_ORDER_TYPES, archive_candidates, archive_closed_orders, restore_order
+
+
+class Command(BaseCommand):
+    help = "Move superseded journal entries of long-closed orders into the compressed archive, or restore an order."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, help="Archive orders idle for this many days (ORDER_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument(
+            "--type",
+            action="append",
+            dest="order_types",
+            choices=ARCHIVABLE_ORDER_TYPES,
+            help="Order type to archive; repeat for several (default: all).",
+        )
+        parser.add_argument("--limit", type=int, help="Archive at most this many orders.")
+        parser.add_argument("--dry-run", action="store_true", help="Only count candidate orders.")
+        parser.add_argument("--restore", metavar="TYPE:ORDER_ID", help="Return an order's archived history to the journal.")
+
+    def handle(self, *args, **options):
+        if options["restore"]:
+            order_type, _, order_id = options["restore"].partition(":")
+            if not order_type or not order_id:
+                raise CommandError("Use --restore <order_type>:<order_id>.")
+            restored = restore_order(order_type, order_id)
+            self.stdout.write(self.style.SUCCESS(f"Restored {restored} entries for {order_type} {order_id}."))
+            return
+        if options["days"] is not None and options["days"] < 0:
+            raise CommandError("Days must not be negative.")
+        order_types = tuple(options["order_types"] or ARCHIVABLE_ORDER_TYPES)
+        if options["dry_run"]:
+            days = options["days"] if options["days"] is not None else settings.ORDER_ARCHIVE_AFTER_DAYS
+            self.stdout.write(f"Candidate orders: {len(archive_candidates(days, order_types))}")
+            return
+        summary = archive_closed_orders(days=options["days"], order_types=order_types, limit=options["limit"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. Archived {summary['entries']} entries from {summary['orders']} orders.")
+        )
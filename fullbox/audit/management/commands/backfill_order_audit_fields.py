@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry, backfill_promoted_fields
+
+
+class Command(BaseCommand):
+    help = "Recompute order journal columns promoted from payload (act, act_state, status, act_sent, org, fio, email)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=JOURNAL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if options["batch_size"] <= 0:
+            raise CommandError("Batch size must be positive.")
+        total = OrderAuditEntry.objects.count()
+        self.stdout.write(f"Checking {total} order journal entries...")
+        updated = backfill_promoted_fields(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Done. Updated {updated} entries."))
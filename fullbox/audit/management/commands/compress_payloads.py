@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import TextField
+from django.db.models.functions import Cast, Length
+
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
+from audit.payload import PACKED_KEY, canonical_json, pack_payload
+
+
+class Command(BaseCommand):
+    help = "Measure order journal payload size and optionally compress (or decompress) stored payloads."
+
+    def add_arguments(self, parser):
+        mode = parser.add_mutually_exclusive_group()
+        mode.add_argument("--convert", action="store_true", help="Rewrite rows in compressed form.")
+        mode.add_argument("--decompress", action="store_true", help="Rewrite compressed rows as plain JSON.")
+        parser.add_argument("--batch-size", type=int, default=JOURNAL_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("Batch size must be positive.")
+        if options["decompress"] and settings.ORDER_PAYLOAD_COMPRESSION:
+            raise CommandError(
+                "Disable ORDER_PAYLOAD_COMPRESSION before decompressing, otherwise rows are packed again."
+            )
+        entries = OrderAuditEntry.objects.all()
+        if options["convert"]:
+            entries = entries.exclude(payload__has_key=PACKED_KEY)
+        elif options["decompress"]:
+            entries = entries.filter(payload__has_key=PACKED_KEY)
+        stats = {"rows": 0, "stored_bytes": 0, "plain_bytes": 0, "packed_bytes": 0, "rewritten": 0}
+        last_pk = 0
+        while True:
+            batch = list(
+                entries.filter(pk__gt=last_pk)
+                .annotate(stored_bytes=Length(Cast("payload", output_field=TextField())))
+                .order_by("pk")
+                .only("pk", "payload")[:batch_size]
+            )
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            changed = []
+            for entry in batch:
+                plain = entry.payload
+                packed = pack_payload(plain)
+                stats["rows"] += 1
+                stats["stored_bytes"] += entry.stored_bytes or 0
+                stats["plain_bytes"] += len(canonical_json(plain).encode("utf-8")) if plain is not None else 0
+                stats["packed_bytes"] += len(canonical_json(packed).encode("utf-8")) if packed is not None else 0
+                if options["convert"] and packed is not plain:
+                    entry.payload = packed
+                    changed.append(entry)
+                elif options["decompress"]:
+                    changed.append(entry)
+            if changed:
+                OrderAuditEntry.objects.bulk_update(changed, ["payload"], batch_size=500)
+                stats["rewritten"] += len(changed)
+        ratio = stats["packed_bytes"] / stats["plain_bytes"] if stats["plain_bytes"] else 1
+        self.stdout.write(
+            f"Rows: {stats['rows']}, stored: {stats['stored_bytes']} bytes, "
+            f"plain JSON: {stats['plain_bytes']} bytes, compressed: {stats['packed_bytes']} bytes ({ratio:.0%})."
+        )
+        if options["convert"] or options["decompress"]:
+            self.stdout.write(self.style.SUCCESS(f"Done. Rewrote {stats['rewritten']} rows."))
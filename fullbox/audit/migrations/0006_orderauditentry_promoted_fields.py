@@ -0,0 +1,58 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0005_orderauditentry_order_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='act',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Акт'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='act_sent',
+            field=models.BooleanField(default=False, verbose_name='Акт отправлен'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='act_state',
+            field=models.CharField(blank=True, default='', max_length=16, verbose_name='Состояние акта'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='email',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=254, verbose_name='Email'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='fio',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='ФИО'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='org',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Организация'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='status',
+            field=models.CharField(blank=True, default='', max_length=64, verbose_name='Статус'),
+        ),
+        migrations.AddIndex(
+            model_name='orderauditentry',
+            index=models.Index(fields=['agency', 'order_type', 'created_at'], name='audit_order_agency__9abaeb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderauditentry',
+            index=models.Index(fields=['order_type', 'act', 'created_at'], name='audit_order_order_t_10732d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderauditentry',
+            index=models.Index(fields=['order_type', 'status'], name='audit_order_order_t_282d3b_idx'),
+        ),
+    ]
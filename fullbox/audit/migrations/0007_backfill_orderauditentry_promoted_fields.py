@@ -0,0 +1,56 @@
+from django.db import migrations
+
+# Логика заморожена на момент миграции: audit.models меняется вместе с моделью.
+FIELDS = ("act", "act_state", "status", "act_sent", "org", "fio", "email")
+
+
+def _payload_text(payload, key, limit):
+    value = payload.get(key)
+    if value is None or isinstance(value, (dict, list)):
+        return ""
+    return str(value).strip()[:limit]
+
+
+def _promoted_fields(payload):
+    payload = payload if isinstance(payload, dict) else {}
+    return {
+        "act": _payload_text(payload, "act", 32),
+        "act_state": _payload_text(payload, "act_state", 16).lower(),
+        "status": _payload_text(payload, "status", 64),
+        "act_sent": bool(payload.get("act_sent")),
+        "org": _payload_text(payload, "org", 255),
+        "fio": _payload_text(payload, "fio", 255),
+        "email": _payload_text(payload, "email", 254).lower(),
+    }
+
+
+def backfill(apps, schema_editor):
+    OrderAuditEntry = apps.get_model("audit", "OrderAuditEntry")
+    last_pk = 0
+    while True:
+        batch = list(
+            OrderAuditEntry.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "payload", *FIELDS)[:2000]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        changed = []
+        for entry in batch:
+            values = _promoted_fields(entry.payload)
+            if any(getattr(entry, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(entry, name, value)
+                changed.append(entry)
+        if changed:
+            OrderAuditEntry.objects.bulk_update(changed, FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("audit", "0006_orderauditentry_promoted_fields"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0007_backfill_orderauditentry_promoted_fields'),
+        ('sku', '0008_agency_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderAuditArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=128, verbose_name='ID заявки')),
+                ('order_type', models.CharField(max_length=64, verbose_name='Тип заявки')),
+                ('entries_count', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('first_created_at', models.DateTimeField(verbose_name='Первая запись')),
+                ('last_created_at', models.DateTimeField(verbose_name='Последняя запись')),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Архивировано')),
+                ('data', models.BinaryField(verbose_name='Сжатые записи')),
+                ('agency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sku.agency', verbose_name='Клиент')),
+            ],
+            options={
+                'verbose_name': 'Архив истории заявки',
+                'verbose_name_plural': 'Архив истории заявок',
+                'ordering': ['-archived_at'],
+                'indexes': [models.Index(fields=['order_type', 'order_id'], name='audit_order_order_t_0147a4_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+import audit.payload
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0008_orderauditarchive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderauditentry',
+            name='payload',
+            field=audit.payload.PackedJSONField(blank=True, null=True, verbose_name='Данные'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+from django.db import migrations, models
+
+# Логика заморожена на момент миграции: audit.models меняется вместе с моделью.
+FIELDS = ("status_label", "submit_action")
+
+
+def _payload_text(payload, key, limit):
+    value = payload.get(key)
+    if value is None or isinstance(value, (dict, list)):
+        return ""
+    return str(value).strip()[:limit]
+
+
+def backfill(apps, schema_editor):
+    OrderAuditEntry = apps.get_model("audit", "OrderAuditEntry")
+    last_pk = 0
+    while True:
+        batch = list(
+            OrderAuditEntry.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "payload", *FIELDS)[:2000]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        changed = []
+        for entry in batch:
+            payload = entry.payload if isinstance(entry.payload, dict) else {}
+            values = {
+                "status_label": _payload_text(payload, "status_label", 255),
+                "submit_action": _payload_text(payload, "submit_action", 32),
+            }
+            if any(getattr(entry, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(entry, name, value)
+                changed.append(entry)
+        if changed:
+            OrderAuditEntry.objects.bulk_update(changed, FIELDS, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('audit', '0009_orderauditentry_packed_payload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='status_label',
+            field=models.CharField(blank=True, default='', max_length=255, verbose_name='Подпись статуса'),
+        ),
+        migrations.AddField(
+            model_name='orderauditentry',
+            name='submit_action',
+            field=models.CharField(blank=True, default='', max_length=32, verbose_name='Действие отправки'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
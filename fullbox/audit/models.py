@@ -2,6 +2,8 @@ from django.conf import settings
 from django.db import models
 from django.utils import timezone
 
+from .payload import PackedJSONField
+
 
 class AuditJournal(models.Model):
     code = models.CharField("Код", max_length=64, unique=True)
@@ -216,18 +218,117 @@ class OrderAuditEntry(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Пользователь"
     )
     description = models.TextField("Описание", blank=True)
-    payload = models.JSONField("Данные", null=True, blank=True)
+    payload = PackedJSONField("Данные", null=True, blank=True)
     created_at = models.DateTimeField("Когда", default=timezone.now)
+    # Часто фильтруемые ключи payload, вынесенные в колонки (см. promoted_payload_fields).
+    act = models.CharField("Акт", max_length=32, blank=True, default="")
+    act_state = models.CharField("Состояние акта", max_length=16, blank=True, default="")
+    status = models.CharField("Статус", max_length=64, blank=True, default="")
+    status_label = models.CharField("Подпись статуса", max_length=255, blank=True, default="")
+    submit_action = models.CharField("Действие отправки", max_length=32, blank=True, default="")
+    act_sent = models.BooleanField("Акт отправлен", default=False)
+    org = models.CharField("Организация", max_length=255, blank=True, default="")
+    fio = models.CharField("ФИО", max_length=255, blank=True, default="")
+    email = models.CharField("Email", max_length=254, blank=True, default="", db_index=True)
 
     class Meta:
         verbose_name = "Аудит заявки"
         verbose_name_plural = "Аудит заявок"
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["order_type", "order_id", "created_at"]),
+            models.Index(fields=["agency", "order_type", "created_at"]),
+            models.Index(fields=["order_type", "act", "created_at"]),
+            models.Index(fields=["order_type", "status"]),
+        ]
 
     def __str__(self):
         return f"{self.order_type} {self.order_id} [{self.get_action_display()}]"
 
 
+class OrderAuditArchive(models.Model):
+    """
+    Холодный архив истории закрытой заявки: вытесненные записи журнала одним
+    сжатым пакетом (zlib + JSON). Читается прозрачно через audit.archive.order_entries.
+    """
+
+    order_id = models.CharField("ID заявки", max_length=128)
+    order_type = models.CharField("Тип заявки", max_length=64)
+    agency = models.ForeignKey(
+        "sku.Agency", on_delete=models.SET_NULL, null=True, blank=True, verbose_name="Клиент"
+    )
+    entries_count = models.PositiveIntegerField("Записей", default=0)
+    first_created_at = models.DateTimeField("Первая запись")
+    last_created_at = models.DateTimeField("Последняя запись")
+    archived_at = models.DateTimeField("Архивировано", default=timezone.now)
+    data = models.BinaryField("Сжатые записи")
+
+    class Meta:
+        verbose_name = "Архив истории заявки"
+        verbose_name_plural = "Архив истории заявок"
+        ordering = ["-archived_at"]
+        indexes = [
+            models.Index(fields=["order_type", "order_id"]),
+        ]
+
+    def __str__(self):
+        return f"{self.order_type} {self.order_id} ({self.entries_count})"
+
+
+# Размер порции при потоковом чтении журнала (серверный курсор на PostgreSQL).
+JOURNAL_CHUNK_SIZE = 2000
+
+
+def _payload_text(payload: dict, key: str, limit: int) -> str:
+    value = payload.get(key)
+    if value is None or isinstance(value, (dict, list)):
+        return ""
+    return str(value).strip()[:limit]
+
+
+def promoted_payload_fields(payload: dict | None) -> dict:
+    """Значения колонок OrderAuditEntry, продублированных из ключей payload."""
+    payload = payload if isinstance(payload, dict) else {}
+    return {
+        "act": _payload_text(payload, "act", 32),
+        "act_state": _payload_text(payload, "act_state", 16).lower(),
+        "status": _payload_text(payload, "status", 64),
+        "status_label": _payload_text(payload, "status_label", 255),
+        "submit_action": _payload_text(payload, "submit_action", 32),
+        "act_sent": bool(payload.get("act_sent")),
+        "org": _payload_text(payload, "org", 255),
+        "fio": _payload_text(payload, "fio", 255),
+        "email": _payload_text(payload, "email", 254).lower(),
+    }
+
+
+def backfill_promoted_fields(batch_size: int = JOURNAL_CHUNK_SIZE) -> int:
+    """
+    Пересчитывает колонки из payload для уже записанных строк журнала.
+    Идет порциями по первичному ключу и обновляет только расходящиеся строки; возвращает их число.
+    """
+    names = list(promoted_payload_fields({}))
+    updated = 0
+    last_pk = 0
+    while True:
+        batch = list(
+            OrderAuditEntry.objects.filter(pk__gt=last_pk).order_by("pk").only("pk", "payload", *names)[:batch_size]
+        )
+        if not batch:
+            return updated
+        last_pk = batch[-1].pk
+        changed = []
+        for entry in batch:
+            values = promoted_payload_fields(entry.payload)
+            if any(getattr(entry, name) != value for name, value in values.items()):
+                for name, value in values.items():
+                    setattr(entry, name, value)
+                changed.append(entry)
+        if changed:
+            OrderAuditEntry.objects.bulk_update(changed, names, batch_size=500)
+            updated += len(changed)
+
+
 def log_order_action(
     action: str,
     order_id: str,
@@ -236,8 +337,8 @@ def log_order_action(
     agency=None,
     description: str = "",
     payload: dict | None = None,
-):
-    OrderAuditEntry.objects.create(
+) -> OrderAuditEntry:
+    return OrderAuditEntry.objects.create(
         order_id=order_id,
         order_type=order_type,
         action=action,
@@ -245,6 +346,7 @@ def log_order_action(
         agency=agency,
         description=description,
         payload=payload or {},
+        **promoted_payload_fields(payload),
     )
 
 # Create your models here.
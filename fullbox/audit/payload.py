@@ -0,0 +1,65 @@
+import base64
+import json
+import zlib
+
+from django.conf import settings
+from django.db import models
+
+from fullbox.instrumentation import count_payload_bytes
+
+
+# Служебный ключ payload со сжатыми вложенными значениями.
+PACKED_KEY = "__packed__"
+
+
+def canonical_json(value) -> str:
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+
+
+def pack_payload(payload, min_bytes: int | None = None):
+    """
+    Сжимает вложенные значения payload (act_boxes, act_pallets, flow_state и т. п.) в один ключ PACKED_KEY.
+    Скалярные ключи (status, act, org ...) остаются как есть, чтобы по ним работали JSON-фильтры.
+    Небольшие payload и уже сжатые не меняются.
+    """
+    if not isinstance(payload, dict) or PACKED_KEY in payload:
+        return payload
+    nested = {key: value for key, value in payload.items() if isinstance(value, (dict, list))}
+    if not nested:
+        return payload
+    if min_bytes is None:
+        min_bytes = getattr(settings, "ORDER_PAYLOAD_COMPRESSION_MIN_BYTES", 512)
+    raw = canonical_json(nested).encode("utf-8")
+    if len(raw) < min_bytes:
+        return payload
+    packed = base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+    if len(packed) >= len(raw):
+        return payload
+    result = {key: value for key, value in payload.items() if key not in nested}
+    result[PACKED_KEY] = packed
+    return result
+
+
+def unpack_payload(payload):
+    if not isinstance(payload, dict) or PACKED_KEY not in payload:
+        return payload
+    result = {key: value for key, value in payload.items() if key != PACKED_KEY}
+    result.update(json.loads(zlib.decompress(base64.b64decode(payload[PACKED_KEY])).decode("utf-8")))
+    return result
+
+
+class PackedJSONField(models.JSONField):
+    """
+    JSONField журнала заявок: при ORDER_PAYLOAD_COMPRESSION=True крупные вложенные
+    значения пишутся сжатыми, а при чтении всегда разворачиваются обратно —
+    код видит обычный dict независимо от того, как хранится строка.
+    """
+
+    def from_db_value(self, value, expression, connection):
+        count_payload_bytes(value)
+        return unpack_payload(super().from_db_value(value, expression, connection))
+
+    def get_db_prep_save(self, value, connection):
+        if isinstance(value, dict) and getattr(settings, "ORDER_PAYLOAD_COMPRESSION", False):
+            value = pack_payload(value)
+        return super().get_db_prep_save(value, connection)
@@ -1,3 +1,168 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.conf import settings
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
+
+from fullbox.db_routing import PRIMARY_COOKIE, ReplicaRouter, replica_reads
+
+from .archive import archive_closed_orders, order_entries, restore_order
+from .models import OrderAuditArchive, OrderAuditEntry, log_order_action
+from .payload import PACKED_KEY
+
+
+_WITH_REPLICA = {
+    **settings.DATABASES,
+    "replica": {"ENGINE": "django.db.backends.sqlite3", "NAME": ":memory:"},
+}
+
+
+def _read_alias_view(write=False):
+    router = ReplicaRouter()
+
+    def view(request):
+        if write:
+            router.db_for_write(None)
+        return HttpResponse(router.db_for_read(None) or "default")
+
+    return replica_reads(view)
+
+
+@override_settings(DATABASES=_WITH_REPLICA, DB_REPLICA_STICKY_SECONDS=5)
+class ReplicaRoutingTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def test_reporting_get_reads_from_replica(self):
+        response = _read_alias_view()(self.factory.get("/orders/"))
+        self.assertEqual(response.content, b"replica")
+        self.assertNotIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_reads_outside_reporting_views_use_primary(self):
+        self.assertIsNone(ReplicaRouter().db_for_read(None))
+
+    def test_write_pins_request_to_primary_and_sets_sticky_cookie(self):
+        response = _read_alias_view(write=True)(self.factory.get("/orders/"))
+        self.assertEqual(response.content, b"default")
+        self.assertIn(PRIMARY_COOKIE, response.cookies)
+
+    def test_recent_write_keeps_reads_on_primary(self):
+        request = self.factory.get("/orders/")
+        request.COOKIES[PRIMARY_COOKIE] = "9999999999"
+        self.assertEqual(_read_alias_view()(request).content, b"default")
+
+    def test_post_is_never_routed_to_replica(self):
+        self.assertEqual(_read_alias_view()(self.factory.post("/orders/")).content, b"default")
+
+    @override_settings(DATABASES={"default": settings.DATABASES["default"]})
+    def test_without_replica_decorator_is_transparent(self):
+        self.assertEqual(_read_alias_view()(self.factory.get("/orders/")).content, b"default")
+
+
+class PromotedPayloadFieldsTests(TestCase):
+    def test_log_order_action_fills_columns(self):
+        log_order_action(
+            "update",
+            order_id="1",
+            payload={
+                "act": "placement",
+                "act_state": "Closed",
+                "status": "warehouse",
+                "act_sent": "Акт приемки",
+                "org": "ООО Ромашка",
+                "email": " Client@Example.com ",
+            },
+        )
+        entry = OrderAuditEntry.objects.get(order_id="1")
+        self.assertEqual((entry.act, entry.act_state, entry.status), ("placement", "closed", "warehouse"))
+        self.assertTrue(entry.act_sent)
+        self.assertEqual((entry.org, entry.fio, entry.email), ("ООО Ромашка", "", "client@example.com"))
+
+    def test_backfill_command_repairs_stale_rows(self):
+        log_order_action("status", order_id="2", payload={"status": "done", "act": "receiving"})
+        log_order_action("comment", order_id="3", payload={"comment": "ok"})
+        OrderAuditEntry.objects.filter(order_id="2").update(status="", act="")
+        out = StringIO()
+        call_command("backfill_order_audit_fields", batch_size=1, stdout=out)
+        self.assertIn("Updated 1 entries", out.getvalue())
+        entry = OrderAuditEntry.objects.get(order_id="2")
+        self.assertEqual((entry.status, entry.act), ("done", "receiving"))
+
+
+class OrderArchiveTests(TestCase):
+    def _order(self, order_id, final_status, age_days=200):
+        log_order_action("create", order_id=order_id, payload={"items": [{"sku": "A-1", "qty": 1}]})
+        for step in range(5):
+            log_order_action("update", order_id=order_id, payload={"flow_state": {"step": step}})
+        log_order_action("status", order_id=order_id, payload={"status": "warehouse"})
+        log_order_action("update", order_id=order_id, payload={"act": "placement", "act_state": "closed"})
+        log_order_action("comment", order_id=order_id, payload={"comment": "ok"})
+        log_order_action("status", order_id=order_id, payload={"status": final_status})
+        entries = OrderAuditEntry.objects.filter(order_id=order_id).order_by("pk")
+        started = timezone.now() - timedelta(days=age_days)
+        for offset, entry in enumerate(entries):
+            OrderAuditEntry.objects.filter(pk=entry.pk).update(created_at=started + timedelta(minutes=offset))
+        return [entry.pk for entry in order_entries(order_id)]
+
+    def test_closed_order_keeps_state_and_full_history(self):
+        history = self._order("1", "done")
+        summary = archive_closed_orders(days=30)
+        self.assertEqual(summary, {"orders": 1, "entries": 6})
+        hot = OrderAuditEntry.objects.filter(order_id="1")
+        self.assertEqual(hot.count(), 4)
+        self.assertTrue(hot.filter(act="placement").exists())
+        self.assertEqual(hot.order_by("-created_at").first().status, "done")
+        self.assertEqual([entry.pk for entry in order_entries("1")], history)
+
+    def test_open_and_recent_orders_stay_hot(self):
+        self._order("2", "warehouse")
+        self._order("3", "done", age_days=5)
+        self.assertEqual(archive_closed_orders(days=30), {"orders": 0, "entries": 0})
+
+    def test_restore_returns_entries_to_journal(self):
+        history = self._order("4", "done")
+        archive_closed_orders(days=30)
+        self.assertEqual(restore_order("receiving", "4"), 6)
+        self.assertFalse(OrderAuditArchive.objects.exists())
+        restored = OrderAuditEntry.objects.filter(order_id="4").order_by("created_at")
+        self.assertEqual([entry.pk for entry in restored], history)
+
+
+def _act_payload(pallets=40):
+    return {
+        "act": "placement",
+        "status": "warehouse",
+        "act_pallets": [
+            {"code": f"P{idx:04d}", "location": {"zone": "OS", "row": idx % 5 + 1}, "items": [{"sku": "A-1", "qty": 10}]}
+            for idx in range(pallets)
+        ],
+    }
+
+
+class PackedPayloadTests(TestCase):
+    def _stored(self, order_id):
+        return OrderAuditEntry.objects.filter(order_id=order_id, payload__has_key=PACKED_KEY).exists()
+
+    @override_settings(ORDER_PAYLOAD_COMPRESSION=True)
+    def test_large_payload_is_stored_packed_and_read_back(self):
+        log_order_action("update", order_id="1", payload=_act_payload())
+        log_order_action("status", order_id="2", payload={"status": "done"})
+        self.assertTrue(self._stored("1"))
+        self.assertFalse(self._stored("2"))
+        entry = OrderAuditEntry.objects.get(order_id="1")
+        self.assertEqual(entry.payload, _act_payload())
+        self.assertTrue(OrderAuditEntry.objects.filter(order_id="1", payload__status="warehouse").exists())
+
+    def test_command_converts_and_restores_rows(self):
+        log_order_action("update", order_id="1", payload=_act_payload())
+        self.assertFalse(self._stored("1"))
+        out = StringIO()
+        call_command("compress_payloads", convert=True, stdout=out)
+        self.assertIn("Rewrote 1 rows", out.getvalue())
+        self.assertTrue(self._stored("1"))
+        self.assertEqual(OrderAuditEntry.objects.get(order_id="1").payload, _act_payload())
+        call_command("compress_payloads", decompress=True, stdout=StringIO())
+        self.assertFalse(self._stored("1"))
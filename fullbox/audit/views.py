@@ -1,7 +1,9 @@
 from django.db import models
+from django.utils.decorators import method_decorator
 from django.views.generic import ListView
 
 from employees.access import RoleRequiredMixin
+from fullbox.db_routing import replica_reads
 from .models import (
     AuditEntry,
     get_agency_journal,
@@ -12,6 +14,7 @@ from .models import (
 )
 
 
+@method_decorator(replica_reads, name="dispatch")
 class AuditListView(ListView):
     template_name = "audit/list.html"
     model = AuditEntry
@@ -45,6 +48,7 @@ class AuditListView(ListView):
         return ctx
 
 
+@method_decorator(replica_reads, name="dispatch")
 class OrderAuditListView(ListView):
     template_name = "audit/orders_list.html"
     model = OrderAuditEntry
@@ -59,6 +63,7 @@ class OrderAuditListView(ListView):
         return qs
 
 
+@method_decorator(replica_reads, name="dispatch")
 class ClientAuditListView(ListView):
     template_name = "audit/clients_list.html"
     model = AuditEntry
@@ -94,6 +99,7 @@ class ClientAuditListView(ListView):
         return ctx
 
 
+@method_decorator(replica_reads, name="dispatch")
 class StaffOveractionsListView(RoleRequiredMixin, ListView):
     template_name = "audit/staff_overactions_list.html"
     model = AuditEntry
@@ -128,6 +134,7 @@ class StaffOveractionsListView(RoleRequiredMixin, ListView):
         return ctx
 
 
+@method_decorator(replica_reads, name="dispatch")
 class StockMoveAuditListView(ListView):
     template_name = "audit/stock_moves_list.html"
     model = AuditEntry
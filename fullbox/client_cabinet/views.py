@@ -11,8 +11,8 @@ from django.views.generic import ListView, CreateView, UpdateView, TemplateView,
 import uuid
 from urllib.parse import urlencode
 
-from employees.models import Employee
-from employees.access import get_request_role, is_staff_role, resolve_cabinet_url
+from employees.directory import first_active_entry
+from employees.access import get_request_client_agency, get_request_role, is_staff_role, resolve_cabinet_url
 from sku.models import Agency, SKU, SKUBarcode
 from sku.views import SKUCreateView, SKUUpdateView, SKUDuplicateView
 from todo.models import Task
@@ -31,7 +31,7 @@ def _staff_allowed(request) -> bool:
 def _get_client_for_request(request):
     if not request.user.is_authenticated:
         return None, False, False
-    direct_client = Agency.objects.filter(portal_user=request.user).first()
+    direct_client = get_request_client_agency(request)
     if direct_client:
         return direct_client, True, True
     staff_allowed = _staff_allowed(request)
@@ -46,7 +46,7 @@ def _get_client_for_request(request):
 def _check_agency_access(request, agency) -> bool:
     if not request.user.is_authenticated or not agency:
         return False
-    direct_client = Agency.objects.filter(portal_user=request.user).first()
+    direct_client = get_request_client_agency(request)
     if direct_client:
         return direct_client.id == agency.id
     return _staff_allowed(request)
@@ -99,11 +99,7 @@ def _describe_agency_changes(old_snapshot: dict, new_snapshot: dict) -> str:
 def _create_manager_task(order_id, agency, request, submitted_at):
     if not agency:
         return
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    manager = first_active_entry("manager")
     if not manager:
         return
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}"
@@ -111,7 +107,7 @@ def _create_manager_task(order_id, agency, request, submitted_at):
         title=f"Подтвердите заявку на приемку товара №{order_id}",
         description=description,
         route=f"/orders/receiving/{order_id}/",
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         created_by=request.user if request.user.is_authenticated else None,
         due_date=_manager_due_date(submitted_at),
     )
@@ -610,7 +606,7 @@ def archive_toggle(request, pk: int):
 def fetch_by_inn(request):
     if not request.user.is_authenticated:
         return JsonResponse({"ok": False, "error": "Доступ запрещен"}, status=403)
-    direct_client = Agency.objects.filter(portal_user=request.user).first()
+    direct_client = get_request_client_agency(request)
     if not _staff_allowed(request) and not direct_client:
         return JsonResponse({"ok": False, "error": "Доступ запрещен"}, status=403)
     inn = (request.GET.get("inn") or "").strip()
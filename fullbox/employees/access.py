@@ -1,10 +1,20 @@
+import time
+
 from django.conf import settings
 from django.contrib.auth.mixins import AccessMixin
+from django.core.cache import cache
 from django.http import HttpResponseForbidden
+from django.utils.functional import cached_property
+
+from sku.models import Agency
 
 from .models import Employee
 
 
+_ACCESS_SESSION_KEY = "_request_access"
+_ACCESS_VERSION_KEY = "employees:access:version"
+
+
 STAFF_ROLES = {
     "admin",
     "director",
@@ -27,10 +37,114 @@ def get_employee_for_user(user):
     return Employee.objects.filter(user=user, is_active=True).first()
 
 
+def access_version() -> int:
+    version = cache.get(_ACCESS_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(_ACCESS_VERSION_KEY, version, None)
+        version = cache.get(_ACCESS_VERSION_KEY, version)
+    return version
+
+
+def touch_access() -> None:
+    """Сбрасывает закэшированные в сессиях роли (после изменения сотрудников или клиентов)."""
+    try:
+        cache.incr(_ACCESS_VERSION_KEY)
+    except ValueError:
+        cache.set(_ACCESS_VERSION_KEY, time.time_ns(), None)
+
+
+class RequestAccess:
+    """
+    Сотрудник, роль и клиентский кабинет текущего пользователя.
+    Считаются один раз за запрос; ид и роль дополнительно хранятся в сессии до смены версии доступа,
+    но не дольше ACCESS_SNAPSHOT_SECONDS.
+    """
+
+    def __init__(self, request):
+        self._request = request
+
+    @property
+    def _user(self):
+        return getattr(self._request, "user", None)
+
+    @cached_property
+    def snapshot(self) -> dict:
+        user = self._user
+        if not user or not getattr(user, "is_authenticated", False):
+            return {}
+        session = getattr(self._request, "session", None)
+        version = access_version()
+        stored = session.get(_ACCESS_SESSION_KEY) if session is not None else None
+        now = time.time()
+        if (
+            stored
+            and stored.get("user_id") == user.pk
+            and stored.get("version") == version
+            and now - stored.get("checked_at", 0) < settings.ACCESS_SNAPSHOT_SECONDS
+        ):
+            return stored
+        employee = get_employee_for_user(user)
+        agency_id = (
+            Agency.objects.filter(portal_user=user).values_list("pk", flat=True).first()
+        )
+        snapshot = {
+            "user_id": user.pk,
+            "version": version,
+            "checked_at": now,
+            "employee_id": employee.pk if employee else None,
+            "role": employee.role if employee else None,
+            "agency_id": agency_id,
+        }
+        if employee:
+            self.__dict__["employee"] = employee
+        if session is not None:
+            session[_ACCESS_SESSION_KEY] = snapshot
+        return snapshot
+
+    @cached_property
+    def employee(self):
+        employee_id = self.snapshot.get("employee_id")
+        if not employee_id:
+            return None
+        return Employee.objects.filter(pk=employee_id, is_active=True).first()
+
+    @cached_property
+    def employee_role(self) -> str | None:
+        return self.snapshot.get("role")
+
+    @cached_property
+    def client_agency(self):
+        agency_id = self.snapshot.get("agency_id")
+        if not agency_id:
+            return None
+        return Agency.objects.filter(pk=agency_id, portal_user=self._user).first()
+
+
+def get_request_access(request) -> RequestAccess:
+    access = getattr(request, "access", None)
+    if access is None:
+        access = RequestAccess(request)
+        request.access = access
+    return access
+
+
+def get_request_employee(request):
+    return get_request_access(request).employee
+
+
+def get_request_client_agency(request, client_id=None):
+    """Клиент, привязанный к пользователю; если передан client_id, он должен совпасть."""
+    agency = get_request_access(request).client_agency
+    if agency and client_id and str(agency.pk) != str(client_id).strip():
+        return None
+    return agency
+
+
 def get_request_role(request):
-    employee = get_employee_for_user(request.user)
-    if employee:
-        return employee.role
+    role = get_request_access(request).employee_role
+    if role:
+        return role
     if settings.DEBUG:
         role = request.session.get("employee_role")
         if role:
@@ -0,0 +1,115 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Employee
+
+
+_DIRECTORY_VERSION_KEY = "employees:directory:version"
+
+_directory_lock = threading.Lock()
+_directory = {"version": None, "loaded_at": 0.0, "by_role": {}, "by_id": {}}
+
+
+def short_name(full_name: str) -> str:
+    if not full_name:
+        return "-"
+    parts = [part for part in full_name.split() if part]
+    if not parts:
+        return "-"
+    surname = parts[0]
+    initials = "".join(f"{part[0].upper()}." for part in parts[1:3] if part)
+    return f"{surname} {initials}".strip()
+
+
+def facsimile_url(employee: Employee | None) -> str:
+    if not employee or not getattr(employee, "facsimile", None):
+        return ""
+    url = employee.facsimile.url
+    if url and not url.startswith(("http://", "https://", "/")):
+        return f"/{url}"
+    return url
+
+
+def directory_version() -> int:
+    version = cache.get(_DIRECTORY_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(_DIRECTORY_VERSION_KEY, version, None)
+        version = cache.get(_DIRECTORY_VERSION_KEY, version)
+    return version
+
+
+def touch_employee_directory() -> None:
+    """
+    Помечает справочник сотрудников устаревшим. Другие процессы видят новую версию только
+    через общий кэш (REDIS_URL); без него их копии живут до EMPLOYEE_DIRECTORY_SECONDS.
+    """
+    try:
+        cache.incr(_DIRECTORY_VERSION_KEY)
+    except ValueError:
+        cache.set(_DIRECTORY_VERSION_KEY, time.time_ns(), None)
+    with _directory_lock:
+        _directory["version"] = None
+
+
+def _directory_entry(employee: Employee) -> dict:
+    # Только значения: экземпляр модели, общий для всех потоков, нельзя отдавать на изменение.
+    full_name = (employee.full_name or "").strip()
+    return {
+        "id": employee.id,
+        "role": employee.role,
+        "full_name": full_name,
+        "short_name": short_name(full_name),
+        "facsimile_url": facsimile_url(employee),
+    }
+
+
+def employee_directory() -> dict:
+    """
+    Активные сотрудники процесса: {"by_role": {роль: [записи по ФИО]}, "by_id": {ид: запись}}.
+    Перечитывается одним запросом, когда меняется версия в кэше или копия старше
+    EMPLOYEE_DIRECTORY_SECONDS.
+    """
+    version = directory_version()
+    now = time.monotonic()
+    with _directory_lock:
+        if _directory["version"] == version and now - _directory["loaded_at"] < settings.EMPLOYEE_DIRECTORY_SECONDS:
+            return _directory
+    by_role = {}
+    by_id = {}
+    for employee in Employee.objects.filter(is_active=True).order_by("full_name", "id"):
+        entry = _directory_entry(employee)
+        by_role.setdefault(employee.role, []).append(entry)
+        by_id[employee.id] = entry
+    with _directory_lock:
+        _directory.update({"version": version, "loaded_at": now, "by_role": by_role, "by_id": by_id})
+        return _directory
+
+
+def first_active_entry(*roles: str) -> dict | None:
+    by_role = employee_directory()["by_role"]
+    for role in [role for role in roles if role]:
+        entries = by_role.get(role)
+        if entries:
+            return dict(entries[0])
+    return None
+
+
+def first_active_employee(*roles: str) -> Employee | None:
+    """Свежий экземпляр первого активного сотрудника по ролям — для вызовов, которым нужна модель."""
+    entry = first_active_entry(*roles)
+    if not entry:
+        return None
+    return Employee.objects.filter(pk=entry["id"], is_active=True).first()
+
+
+def active_employee_entry(employee_id) -> dict | None:
+    try:
+        employee_id = int(employee_id)
+    except (TypeError, ValueError):
+        return None
+    entry = employee_directory()["by_id"].get(employee_id)
+    return dict(entry) if entry else None
@@ -0,0 +1,12 @@
+from .access import get_request_access
+
+
+class RequestAccessMiddleware:
+    """Вешает на request.access сотрудника, роль и клиента, вычисляемые один раз за запрос."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        get_request_access(request)
+        return self.get_response(request)
@@ -0,0 +1,22 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from sku.models import Agency
+
+from .access import touch_access
+from .directory import touch_employee_directory
+from .models import Employee
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+@receiver(post_save, sender=Agency)
+@receiver(post_delete, sender=Agency)
+def drop_request_access_snapshots(sender, instance, **kwargs):
+    touch_access()
+
+
+@receiver(post_save, sender=Employee)
+@receiver(post_delete, sender=Employee)
+def drop_employee_directory(sender, instance, **kwargs):
+    touch_employee_directory()
@@ -1,3 +1,106 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
 
-# Create your tests here.
+from sku.models import Agency
+
+from .access import _ACCESS_SESSION_KEY, get_request_access, get_request_client_agency, get_request_role
+from .directory import active_employee_entry, first_active_employee, first_active_entry
+from .models import Employee
+
+
+class RequestAccessTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user_model = get_user_model()
+        self.manager_user = user_model.objects.create_user("manager1", password="x")
+        self.employee = Employee.objects.create(full_name="Петров Петр", role="manager", user=self.manager_user)
+        self.client_user = user_model.objects.create_user("client1", password="x")
+        self.agency = Agency.objects.create(agn_name="ООО Клиент", portal_user=self.client_user)
+        self.session = SessionStore()
+
+    def _request(self, user, **params):
+        request = RequestFactory().get("/", params)
+        request.user = user
+        request.session = self.session
+        return request
+
+    def test_role_is_resolved_once_per_request(self):
+        request = self._request(self.manager_user)
+        with self.assertNumQueries(2):
+            for _ in range(5):
+                self.assertEqual(get_request_role(request), "manager")
+        self.assertEqual(request.access.employee, self.employee)
+
+    def test_session_snapshot_skips_lookups_on_next_request(self):
+        get_request_role(self._request(self.manager_user))
+        with self.assertNumQueries(0):
+            self.assertEqual(get_request_role(self._request(self.manager_user)), "manager")
+
+    def test_employee_save_invalidates_session_snapshot(self):
+        get_request_role(self._request(self.manager_user))
+        self.employee.role = "head_manager"
+        self.employee.save()
+        self.assertEqual(get_request_role(self._request(self.manager_user)), "head_manager")
+
+    def test_session_snapshot_expires_without_version_bump(self):
+        get_request_role(self._request(self.manager_user))
+        # Смена роли в другом воркере, чей сброс версии сюда не дошел.
+        Employee.objects.filter(pk=self.employee.pk).update(role="head_manager")
+        self.assertEqual(get_request_role(self._request(self.manager_user)), "manager")
+        self.session[_ACCESS_SESSION_KEY]["checked_at"] -= settings.ACCESS_SNAPSHOT_SECONDS
+        self.assertEqual(get_request_role(self._request(self.manager_user)), "head_manager")
+
+    def test_client_agency_must_match_requested_id(self):
+        request = self._request(self.client_user)
+        self.assertEqual(get_request_client_agency(request), self.agency)
+        self.assertEqual(get_request_client_agency(request, str(self.agency.pk)), self.agency)
+        self.assertIsNone(get_request_client_agency(request, str(self.agency.pk + 1)))
+        self.assertIsNone(get_request_access(request).employee)
+
+
+class EmployeeDirectoryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.head = Employee.objects.create(full_name="Сидоров Сидор Сидорович", role="head_manager")
+        self.storekeeper = Employee.objects.create(full_name="Борисов Борис", role="storekeeper")
+
+    def test_lookups_are_served_from_directory(self):
+        first_active_entry("manager")
+        with self.assertNumQueries(0):
+            self.assertEqual(first_active_entry("manager", "head_manager")["id"], self.head.pk)
+            self.assertEqual(first_active_entry("head_manager")["short_name"], "Сидоров С.С.")
+            self.assertEqual(active_employee_entry(str(self.storekeeper.pk))["full_name"], "Борисов Борис")
+            self.assertIsNone(active_employee_entry("abc"))
+
+    def test_employee_changes_refresh_directory(self):
+        first_active_entry("manager")
+        manager = Employee.objects.create(full_name="Алексеев Алексей", role="manager")
+        self.assertEqual(first_active_employee("manager", "head_manager"), manager)
+        self.storekeeper.is_active = False
+        self.storekeeper.save()
+        self.assertIsNone(first_active_employee("storekeeper"))
+        manager.delete()
+        self.assertEqual(first_active_employee("manager", "head_manager"), self.head)
+
+    def test_directory_hands_out_copies(self):
+        entry = first_active_entry("head_manager")
+        self.assertNotIn("employee", entry)
+        entry["full_name"] = "Чужое имя"
+        active_employee_entry(self.storekeeper.pk)["role"] = "manager"
+        self.assertEqual(first_active_entry("head_manager")["full_name"], "Сидоров Сидор Сидорович")
+        self.assertEqual(active_employee_entry(self.storekeeper.pk)["role"], "storekeeper")
+        first = first_active_employee("head_manager")
+        self.assertIsNot(first, first_active_employee("head_manager"))
+        first.full_name = "Чужое имя"
+        self.assertEqual(first_active_employee("head_manager").full_name, "Сидоров Сидор Сидорович")
+
+    def test_process_copy_expires_without_version_bump(self):
+        first_active_entry("manager")
+        Employee.objects.filter(pk=self.head.pk).update(full_name="Андреев Андрей")
+        with self.assertNumQueries(0):
+            self.assertEqual(first_active_entry("head_manager")["full_name"], "Сидоров Сидор Сидорович")
+        with override_settings(EMPLOYEE_DIRECTORY_SECONDS=0):
+            self.assertEqual(first_active_entry("head_manager")["full_name"], "Андреев Андрей")
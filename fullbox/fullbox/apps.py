@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class FullboxConfig(AppConfig):
+    name = "fullbox"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .db_concurrency import configure_sqlite_connection
+
+        connection_created.connect(configure_sqlite_connection, dispatch_uid="fullbox.sqlite_pragmas")
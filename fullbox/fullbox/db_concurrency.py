@@ -0,0 +1,87 @@
+import random
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+
+
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+
+def configure_sqlite_connection(sender, connection, **kwargs):
+    """
+    Настройка каждого нового соединения с SQLite: журнал WAL (читатели не мешают
+    писателю), ожидание освобождения блокировки вместо мгновенной ошибки
+    и synchronous=NORMAL, которого в режиме WAL достаточно для сохранности данных.
+    """
+    if connection.vendor != "sqlite":
+        return
+    busy_timeout = int(getattr(settings, "SQLITE_BUSY_TIMEOUT_MS", 5000))
+    synchronous = str(getattr(settings, "SQLITE_SYNCHRONOUS", "NORMAL")).upper()
+    if synchronous not in _SYNCHRONOUS_MODES:
+        synchronous = "NORMAL"
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+        cursor.execute(f"PRAGMA synchronous={synchronous}")
+
+
+@contextmanager
+def immediate_atomic(using=None):
+    """
+    transaction.atomic() для пишущих транзакций: на SQLite внешний блок начинается
+    с BEGIN IMMEDIATE, то есть сразу берет блокировку на запись и ждет ее по busy_timeout,
+    а не падает с «database is locked» при повышении блокировки посреди транзакции.
+    Читающие транзакции остаются отложенными и не ждут писателей.
+    Вложенный блок и другие СУБД — обычный atomic().
+    """
+    connection = transaction.get_connection(using)
+    if connection.vendor != "sqlite" or connection.in_atomic_block:
+        with transaction.atomic(using=using):
+            yield
+        return
+    # transaction_mode перечитывается из настроек при подключении — сначала подключаемся.
+    connection.ensure_connection()
+    previous = connection.transaction_mode
+    connection.transaction_mode = "IMMEDIATE"
+    try:
+        with transaction.atomic(using=using):
+            connection.transaction_mode = previous
+            yield
+    finally:
+        connection.transaction_mode = previous
+
+
+def is_lock_error(exc: Exception) -> bool:
+    message = str(exc).lower()
+    return isinstance(exc, OperationalError) and ("locked" in message or "busy" in message)
+
+
+def retry_on_lock(func=None, *, attempts: int | None = None, base_delay_ms: int | None = None):
+    """
+    Повторяет короткую пишущую транзакцию, если база занята другим писателем:
+    пауза растет вдвое с каждой попыткой, плюс случайная добавка, чтобы
+    параллельные запросы не просыпались одновременно.
+    Внутри чужой транзакции не повторяет — ошибка уходит наружу.
+    """
+
+    def decorator(inner):
+        @wraps(inner)
+        def wrapped(*args, **kwargs):
+            total = attempts or int(getattr(settings, "DB_WRITE_RETRIES", 5))
+            delay = (base_delay_ms or int(getattr(settings, "DB_WRITE_RETRY_DELAY_MS", 50))) / 1000
+            for attempt in range(1, total + 1):
+                try:
+                    return inner(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt >= total or connections[DEFAULT_DB_ALIAS].in_atomic_block or not is_lock_error(exc):
+                        raise
+                time.sleep(delay * 2 ** (attempt - 1) * (1 + random.random()))
+
+        return wrapped
+
+    if func is not None:
+        return decorator(func)
+    return decorator
@@ -0,0 +1,113 @@
+import time
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+
+REPLICA_ALIAS = "replica"
+PRIMARY_COOKIE = "db_primary_until"
+
+# Сессии и пользователи всегда читаются с основной БД: они загружаются лениво уже внутри представления.
+_PRIMARY_ONLY_APPS = {"auth", "sessions"}
+
+_read_state: ContextVar[dict | None] = ContextVar("db_read_state", default=None)
+
+
+def replica_configured() -> bool:
+    return REPLICA_ALIAS in settings.DATABASES
+
+
+class ReplicaRouter:
+    """
+    Чтение отчетных страниц с реплики (внутри replica_reads), все записи и прочие чтения — с основной БД.
+    Первая запись в запросе закрепляет его за основной БД до конца.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _read_state.get()
+        if not state or state.get("pinned"):
+            return None
+        if model is not None and model._meta.app_label in _PRIMARY_ONLY_APPS:
+            return None
+        if connections["default"].in_atomic_block:
+            return None
+        return REPLICA_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _read_state.get()
+        if state is not None:
+            state["pinned"] = True
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == "default"
+
+
+def _sticky_to_primary(request) -> bool:
+    raw = request.COOKIES.get(PRIMARY_COOKIE)
+    try:
+        return float(raw) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+def mark_primary_sticky(response) -> None:
+    """После записи следующие чтения клиента идут в основную БД, пока реплика догоняет."""
+    seconds = getattr(settings, "DB_REPLICA_STICKY_SECONDS", 5)
+    response.set_cookie(
+        PRIMARY_COOKIE,
+        f"{time.time() + seconds:.3f}",
+        max_age=max(int(seconds), 1),
+        httponly=True,
+        samesite="Lax",
+    )
+
+
+def replica_reads(view):
+    """
+    Декоратор отчетных представлений: GET-запросы читают с реплики, если она настроена
+    и клиент недавно ничего не записывал. Ленивые TemplateResponse рендерятся здесь же.
+    """
+
+    @wraps(view)
+    def wrapped(request, *args, **kwargs):
+        if (
+            not replica_configured()
+            or request.method not in {"GET", "HEAD"}
+            or _sticky_to_primary(request)
+        ):
+            return view(request, *args, **kwargs)
+        state = {"pinned": False}
+        token = _read_state.set(state)
+        try:
+            response = view(request, *args, **kwargs)
+            if hasattr(response, "render") and not getattr(response, "is_rendered", True):
+                response = response.render()
+        finally:
+            _read_state.reset(token)
+        if state["pinned"]:
+            mark_primary_sticky(response)
+        return response
+
+    return wrapped
+
+
+class ReplicaStickinessMiddleware:
+    """Ставит метку «читать с основной БД» после любых изменяющих запросов."""
+
+    def __init__(self, get_response):
+        if not replica_configured():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in {"GET", "HEAD", "OPTIONS", "TRACE"}:
+            mark_primary_sticky(response)
+        return response
@@ -0,0 +1,214 @@
+"""
+Живые обновления панелей (доска задач, очередь ричтрака, статус печати) через server-sent events.
+
+Изменения публикуются из сигналов после коммита транзакции, поток /events/ отдает их клиентам,
+и страницы правят только затронутые карточки вместо полной перезагрузки.
+EVENT_BROKER=memory держит события в памяти процесса (один процесс ASGI);
+EVENT_BROKER=cache хранит их в общем кэше Redis (REDIS_URL), чтобы события доходили
+между несколькими процессами: номер события выдает cache.incr, и он должен быть атомарным.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+
+
+logger = logging.getLogger(__name__)
+
+EVENT_CHANNELS = ("tasks", "moves", "print")
+_CACHE_LAST_ID_KEY = "events:last_id"
+_CACHE_EVENT_KEY = "events:{}"
+# Бэкенды, у которых incr атомарен. Файловый и табличный кэш читают и пишут значение
+# отдельно: два процесса получат один номер и перезапишут события друг друга.
+# LocMemCache атомарен, но виден одному процессу — годится для разработки и тестов.
+ATOMIC_CACHE_BACKENDS = (
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+)
+
+
+def _buffer_size() -> int:
+    return getattr(settings, "EVENT_BUFFER_SIZE", 500)
+
+
+class MemoryBroker:
+    """События одного процесса: кольцевой буфер и пробуждение ожидающих потоков SSE."""
+
+    def __init__(self, size: int | None = None):
+        self._size = size or _buffer_size()
+        self._events = []
+        self._last_id = 0
+        self._lock = threading.Lock()
+        self._waiters = set()
+
+    def publish(self, event: dict) -> dict:
+        with self._lock:
+            self._last_id += 1
+            event = dict(event, id=self._last_id)
+            self._events.append(event)
+            del self._events[: -self._size]
+            waiters = list(self._waiters)
+        for loop, flag in waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:
+                # Цикл событий уже закрыт (клиент отключился).
+                pass
+        return event
+
+    async def last_id(self) -> int:
+        return self._last_id
+
+    async def since(self, last_id: int) -> list[dict]:
+        with self._lock:
+            return [event for event in self._events if event["id"] > last_id]
+
+    async def wait(self, last_id: int, timeout: float) -> bool:
+        """Ждет событие новее last_id не дольше timeout секунд; True, если оно появилось."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            if self._last_id > last_id:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(waiter[1].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+
+class CacheBroker:
+    """События в общем кэше: счетчик events:last_id и ключ на каждое событие; ожидание — опросом."""
+
+    def __init__(self, size: int | None = None, poll_seconds: float | None = None):
+        backend = settings.CACHES["default"]["BACKEND"]
+        if backend not in ATOMIC_CACHE_BACKENDS:
+            raise ImproperlyConfigured(
+                f"EVENT_BROKER=cache needs a cache with atomic incr (Redis, see REDIS_URL), got {backend}"
+            )
+        self._size = size or _buffer_size()
+        self._poll_seconds = poll_seconds or getattr(settings, "EVENT_POLL_SECONDS", 1.0)
+        self._ttl = getattr(settings, "EVENT_TTL_SECONDS", 600)
+
+    def _next_id(self) -> int:
+        try:
+            return cache.incr(_CACHE_LAST_ID_KEY)
+        except ValueError:
+            cache.add(_CACHE_LAST_ID_KEY, 0, None)
+            return cache.incr(_CACHE_LAST_ID_KEY)
+
+    def publish(self, event: dict) -> dict:
+        event_id = self._next_id()
+        event = dict(event, id=event_id)
+        cache.set(_CACHE_EVENT_KEY.format(event_id), event, self._ttl)
+        return event
+
+    async def last_id(self) -> int:
+        return await cache.aget(_CACHE_LAST_ID_KEY) or 0
+
+    async def since(self, last_id: int) -> list[dict]:
+        current = await self.last_id()
+        if current <= last_id:
+            return []
+        first = max(last_id + 1, current - self._size + 1)
+        keys = [_CACHE_EVENT_KEY.format(event_id) for event_id in range(first, current + 1)]
+        found = await cache.aget_many(keys)
+        return [found[key] for key in keys if key in found]
+
+    async def wait(self, last_id: int, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        while True:
+            if await self.last_id() > last_id:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self._poll_seconds, remaining))
+
+
+_BROKERS = {"memory": MemoryBroker, "cache": CacheBroker}
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                name = getattr(settings, "EVENT_BROKER", "memory")
+                if name not in _BROKERS:
+                    raise ValueError(f"EVENT_BROKER must be one of {sorted(_BROKERS)}, got {name!r}")
+                _broker = _BROKERS[name]()
+    return _broker
+
+
+def reset_broker() -> None:
+    """Сбрасывает брокер (после смены настроек, в тестах)."""
+    global _broker
+    with _broker_lock:
+        _broker = None
+
+
+def publish_event(channel: str, event_type: str, data: dict) -> None:
+    """Отправляет событие подписчикам канала после коммита текущей транзакции."""
+    event = {"channel": channel, "type": event_type, "data": data, "ts": time.time()}
+
+    def send():
+        try:
+            get_broker().publish(event)
+        except Exception:
+            # Живые обновления не должны ломать запись данных.
+            logger.exception("Failed to publish %s event", event_type)
+
+    transaction.on_commit(send)
+
+
+def format_event(event: dict) -> str:
+    data = json.dumps(
+        {"type": event["type"], "channel": event["channel"], **event["data"]},
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return f"id: {event['id']}\nevent: {event['channel']}\ndata: {data}\n\n"
+
+
+async def event_stream(channels, last_id: int | None = None, broker=None, keepalive: float | None = None):
+    """
+    Асинхронный поток SSE: события каналов channels новее last_id, а в паузах — комментарий keepalive,
+    чтобы прокси не закрывали соединение.
+    """
+    broker = broker or get_broker()
+    if keepalive is None:
+        keepalive = getattr(settings, "EVENT_KEEPALIVE_SECONDS", 15)
+    if last_id is None:
+        last_id = await broker.last_id()
+    yield f"retry: {int(getattr(settings, 'EVENT_RETRY_MS', 3000))}\n\n"
+    while True:
+        current = await broker.last_id()
+        events = await broker.since(last_id)
+        for event in events:
+            last_id = event["id"]
+            if event["channel"] in channels:
+                yield format_event(event)
+        if events:
+            continue
+        # Событий новее last_id нет, хотя счетчик ушел вперед (их ключи истекли в кэше) или начался
+        # заново (перезапуск процесса, очистка кэша) — переходим на счетчик, прочитанный до since(),
+        # иначе wait() возвращается сразу и поток крутится без пауз.
+        last_id = current
+        if not await broker.wait(last_id, keepalive):
+            yield ": keepalive\n\n"
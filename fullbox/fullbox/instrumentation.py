@@ -0,0 +1,207 @@
+import json
+import logging
+import threading
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.models.signals import post_init
+from django.template.base import Template
+
+
+slow_request_logger = logging.getLogger("fullbox.slow_requests")
+
+# Медленные запросы хранятся по одному в кольце ключей кэша; номер ячейки выдает
+# атомарный cache.incr, поэтому параллельные запросы не затирают записи друг друга.
+_SLOW_SEQ_KEY = "instrumentation:slow:seq"
+_SLOW_RECORD_KEY = "instrumentation:slow:{}"
+_SLOW_RECORDS_KEPT = 500
+
+_state = threading.local()
+_install_lock = threading.Lock()
+_installed = False
+
+
+def _current_metrics() -> dict | None:
+    return getattr(_state, "metrics", None)
+
+
+def _count_loaded_rows(sender, instance, **kwargs):
+    metrics = _current_metrics()
+    if metrics is not None:
+        metrics["rows"] += 1
+
+
+def count_payload_bytes(raw) -> None:
+    """Учитывает сырой JSON колонки payload журнала заявок (из PackedJSONField.from_db_value)."""
+    metrics = _current_metrics()
+    if metrics is None or not raw:
+        return
+    if isinstance(raw, str):
+        metrics["payload_bytes"] += len(raw.encode("utf-8"))
+    elif isinstance(raw, (bytes, bytearray, memoryview)):
+        metrics["payload_bytes"] += len(raw)
+
+
+def _timed_template_render(original):
+    def render(self, context):
+        metrics = _current_metrics()
+        if metrics is None or metrics["template_depth"]:
+            return original(self, context)
+        metrics["template_depth"] += 1
+        started = time.perf_counter()
+        try:
+            return original(self, context)
+        finally:
+            metrics["template_ms"] += (time.perf_counter() - started) * 1000
+            metrics["template_depth"] -= 1
+
+    return render
+
+
+def _install_hooks() -> None:
+    global _installed
+    with _install_lock:
+        if _installed:
+            return
+        post_init.connect(_count_loaded_rows, dispatch_uid="fullbox.instrumentation.rows")
+        Template._render = _timed_template_render(Template._render)
+        _installed = True
+
+
+def _query_timer(metrics: dict):
+    def wrapper(execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics["queries"] += 1
+            metrics["query_ms"] += (time.perf_counter() - started) * 1000
+
+    return wrapper
+
+
+def _response_size(response) -> int:
+    if getattr(response, "streaming", False):
+        try:
+            return int(response.get("Content-Length") or 0)
+        except ValueError:
+            return 0
+    return len(getattr(response, "content", b"") or b"")
+
+
+def _route_label(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match and match.route:
+        return f"{request.method} /{match.route}"
+    return f"{request.method} {request.path}"
+
+
+def _slow_record_keys(seq: int) -> list[str]:
+    first = max(seq - _SLOW_RECORDS_KEPT + 1, 1)
+    return [_SLOW_RECORD_KEY.format(number % _SLOW_RECORDS_KEPT) for number in range(first, seq + 1)]
+
+
+def _record_offender(record: dict) -> None:
+    try:
+        seq = cache.incr(_SLOW_SEQ_KEY)
+    except ValueError:
+        cache.add(_SLOW_SEQ_KEY, 0, None)
+        seq = cache.incr(_SLOW_SEQ_KEY)
+    cache.set(_SLOW_RECORD_KEY.format(seq % _SLOW_RECORDS_KEPT), record, None)
+
+
+def top_slow_requests(limit: int = 10) -> list[dict]:
+    """
+    Маршруты с самыми медленными запросами (по максимальному времени) для кабинета разработчика.
+    Считается по последним _SLOW_RECORDS_KEPT медленным запросам.
+    """
+    keys = _slow_record_keys(cache.get(_SLOW_SEQ_KEY) or 0)
+    records = cache.get_many(keys)
+    offenders = {}
+    for key in keys:
+        record = records.get(key)
+        if not record:
+            continue
+        stats = offenders.setdefault(
+            record["route"],
+            {"route": record["route"], "count": 0, "total_ms": 0.0, "max_ms": 0.0, "max_queries": 0},
+        )
+        stats["count"] += 1
+        stats["total_ms"] += record["wall_ms"]
+        stats["max_ms"] = max(stats["max_ms"], record["wall_ms"])
+        stats["max_queries"] = max(stats["max_queries"], record["queries"])
+        stats["last_path"] = record["path"]
+        stats["last_at"] = record["at"]
+    rows = [{**stats, "avg_ms": round(stats["total_ms"] / stats["count"], 1)} for stats in offenders.values()]
+    rows.sort(key=lambda item: (item["max_ms"], item["count"]), reverse=True)
+    return rows[:limit]
+
+
+def reset_slow_requests() -> None:
+    seq = cache.get(_SLOW_SEQ_KEY) or 0
+    cache.delete_many([_SLOW_SEQ_KEY, *_slow_record_keys(seq)])
+
+
+class RequestMetricsMiddleware:
+    """
+    Замеры запроса: общее время, число и время SQL-запросов, загруженные строки,
+    объем JSON из журнала заявок, время рендера шаблонов и размер ответа.
+    Медленные запросы пишутся в журнал fullbox.slow_requests и в сводку для /dev/.
+    При REQUEST_METRICS_ENABLED=False middleware отключается целиком.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, "REQUEST_METRICS_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = getattr(settings, "REQUEST_METRICS_SLOW_MS", 500)
+        _install_hooks()
+
+    def __call__(self, request):
+        metrics = {
+            "queries": 0,
+            "query_ms": 0.0,
+            "rows": 0,
+            "payload_bytes": 0,
+            "template_ms": 0.0,
+            "template_depth": 0,
+        }
+        previous = _current_metrics()
+        _state.metrics = metrics
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(_query_timer(metrics)))
+                response = self.get_response(request)
+        finally:
+            _state.metrics = previous
+        wall_ms = (time.perf_counter() - started) * 1000
+        request.metrics = metrics
+        if wall_ms >= self.slow_ms:
+            self._log_slow(request, response, metrics, wall_ms)
+        return response
+
+    def _log_slow(self, request, response, metrics, wall_ms):
+        user = getattr(request, "user", None)
+        record = {
+            "at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "method": request.method,
+            "path": request.path,
+            "route": _route_label(request),
+            "status": response.status_code,
+            "user": user.get_username() if user is not None and user.is_authenticated else "",
+            "wall_ms": round(wall_ms, 1),
+            "queries": metrics["queries"],
+            "query_ms": round(metrics["query_ms"], 1),
+            "rows": metrics["rows"],
+            "payload_bytes": metrics["payload_bytes"],
+            "template_ms": round(metrics["template_ms"], 1),
+            "response_bytes": _response_size(response),
+        }
+        slow_request_logger.warning(json.dumps(record, ensure_ascii=False))
+        _record_offender(record)
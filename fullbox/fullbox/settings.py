@@ -47,6 +47,7 @@ INSTALLED_APPS = [
     "django.contrib.messages",
     "django.contrib.staticfiles",
     "widget_tweaks",
+    "fullbox",
     "client_cabinet",
     "audit",
     "sku",
@@ -66,11 +67,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'fullbox.instrumentation.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'employees.middleware.RequestAccessMiddleware',
+    'fullbox.db_routing.ReplicaStickinessMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -103,8 +107,18 @@ db_user = os.environ.get("DB_USER")
 db_password = os.environ.get("DB_PASSWORD")
 db_host = os.environ.get("DB_HOST", "127.0.0.1")
 db_port = os.environ.get("DB_PORT", "5432")
+db_pool = os.environ.get("DB_POOL", "False").lower() == "true"
 
 if db_name and db_user and db_password:
+    # Продакшн-профиль: постоянные соединения с проверкой перед использованием
+    # или пул psycopg (DB_POOL=True, тогда CONN_MAX_AGE должен быть 0).
+    postgres_options = {}
+    if db_pool:
+        postgres_options["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN_SIZE", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX_SIZE", "10")),
+            "timeout": int(os.environ.get("DB_POOL_TIMEOUT", "10")),
+        }
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -113,15 +127,150 @@ if db_name and db_user and db_password:
             'PASSWORD': db_password,
             'HOST': db_host,
             'PORT': db_port,
+            'CONN_MAX_AGE': 0 if db_pool else int(os.environ.get("DB_CONN_MAX_AGE", "60")),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.environ.get("DB_DISABLE_SERVER_SIDE_CURSORS", "False").lower() == "true"
+            ),
+            'OPTIONS': postgres_options,
         }
     }
+    replica_host = os.environ.get("DB_REPLICA_HOST", "").strip()
+    if replica_host:
+        DATABASES['replica'] = {
+            **DATABASES['default'],
+            'NAME': os.environ.get("DB_REPLICA_NAME", db_name),
+            'USER': os.environ.get("DB_REPLICA_USER", db_user),
+            'PASSWORD': os.environ.get("DB_REPLICA_PASSWORD", db_password),
+            'HOST': replica_host,
+            'PORT': os.environ.get("DB_REPLICA_PORT", db_port),
+            'TEST': {'MIRROR': 'default'},
+        }
 else:
+    # WAL и busy_timeout включаются при подключении, пишущие транзакции
+    # открываются через immediate_atomic() (fullbox.db_concurrency).
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    # Локальная проверка маршрутизации: копия базы как «реплика».
+    sqlite_replica = os.environ.get("SQLITE_REPLICA_PATH", "").strip()
+    if sqlite_replica:
+        DATABASES['replica'] = {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': sqlite_replica,
+            'TEST': {'MIRROR': 'default'},
+        }
+
+if 'replica' in DATABASES:
+    DATABASE_ROUTERS = ['fullbox.db_routing.ReplicaRouter']
+DB_REPLICA_STICKY_SECONDS = int(os.environ.get("DB_REPLICA_STICKY_SECONDS", "5"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL").upper()
+DB_WRITE_RETRIES = int(os.environ.get("DB_WRITE_RETRIES", "5"))
+DB_WRITE_RETRY_DELAY_MS = int(os.environ.get("DB_WRITE_RETRY_DELAY_MS", "50"))
+# История закрытых заявок старше этого срока уходит в архив (manage.py archive_orders).
+ORDER_ARCHIVE_AFTER_DAYS = int(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", "180"))
+
+# Тарифы хранения, руб. за паллету в сутки по зонам (sklad/billing.py).
+STORAGE_PALLET_DAY_RATES = {
+    "OS": os.environ.get("STORAGE_RATE_OS", "45"),
+    "MR": os.environ.get("STORAGE_RATE_MR", "35"),
+    "PR": os.environ.get("STORAGE_RATE_PR", "60"),
+    "OTG": os.environ.get("STORAGE_RATE_OTG", "60"),
+}
+# Сжатие вложенных данных журнала заявок при записи (чтение сжатых строк работает всегда).
+ORDER_PAYLOAD_COMPRESSION = os.environ.get("ORDER_PAYLOAD_COMPRESSION", "False").lower() == "true"
+ORDER_PAYLOAD_COMPRESSION_MIN_BYTES = int(os.environ.get("ORDER_PAYLOAD_COMPRESSION_MIN_BYTES", "512"))
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# Несколько воркеров: REDIS_URL — общий кэш с атомарным incr (версии справочников,
+# события EVENT_BROKER=cache). Файловый кэш DJANGO_CACHE_DIR общий, но incr в нем не атомарен.
+redis_url = os.environ.get("REDIS_URL", "").strip()
+cache_dir = os.environ.get("DJANGO_CACHE_DIR", "").strip()
+
+if redis_url:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': redis_url,
+        }
+    }
+elif cache_dir:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': cache_dir,
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'fullbox',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+STOCK_CACHE_SECONDS = int(os.environ.get("STOCK_CACHE_SECONDS", "600"))
+TASK_BOARD_CACHE_SECONDS = int(os.environ.get("TASK_BOARD_CACHE_SECONDS", "300"))
+# Панель главного менеджера дообновляет выработку кладовщиков не чаще этого срока;
+# по расписанию итоги собирает команда aggregate_throughput.
+THROUGHPUT_REFRESH_SECONDS = int(os.environ.get("THROUGHPUT_REFRESH_SECONDS", "60"))
+# Роль и клиент в сессии перепроверяются по базе не реже этого срока: без общего кэша
+# (LocMem) сброс версии доступа в одном воркере до остальных не доходит.
+ACCESS_SNAPSHOT_SECONDS = int(os.environ.get("ACCESS_SNAPSHOT_SECONDS", "60"))
+# Справочник сотрудников в памяти процесса перечитывается не реже этого срока.
+EMPLOYEE_DIRECTORY_SECONDS = int(os.environ.get("EMPLOYEE_DIRECTORY_SECONDS", "60"))
+# Индекс штрихкодов клиента в памяти процесса (sku.barcodes) перечитывается не реже этого срока.
+BARCODE_INDEX_SECONDS = int(os.environ.get("BARCODE_INDEX_SECONDS", "60"))
+
+# Живые обновления панелей (/events/, server-sent events; нужен ASGI-сервер, fullbox.asgi).
+# memory — события в памяти одного процесса; cache — через общий кэш Redis (REDIS_URL)
+# для нескольких процессов.
+EVENT_BROKER = os.environ.get("EVENT_BROKER", "memory").strip().lower()
+EVENT_BUFFER_SIZE = int(os.environ.get("EVENT_BUFFER_SIZE", "500"))
+EVENT_KEEPALIVE_SECONDS = int(os.environ.get("EVENT_KEEPALIVE_SECONDS", "15"))
+EVENT_POLL_SECONDS = float(os.environ.get("EVENT_POLL_SECONDS", "1"))
+
+
+# Request metrics
+# Замеры запросов и журнал медленных запросов (fullbox/instrumentation.py)
+
+REQUEST_METRICS_ENABLED = os.environ.get("REQUEST_METRICS_ENABLED", "False").lower() == "true"
+REQUEST_METRICS_SLOW_MS = int(os.environ.get("REQUEST_METRICS_SLOW_MS", "500"))
+slow_request_log = os.environ.get("SLOW_REQUEST_LOG", "").strip()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': (
+            {
+                'class': 'logging.handlers.RotatingFileHandler',
+                'filename': slow_request_log,
+                'maxBytes': int(os.environ.get("SLOW_REQUEST_LOG_MAX_BYTES", str(5 * 1024 * 1024))),
+                'backupCount': int(os.environ.get("SLOW_REQUEST_LOG_BACKUPS", "5")),
+                'encoding': 'utf-8',
+            }
+            if slow_request_log
+            else {'class': 'logging.StreamHandler'}
+        ),
+    },
+    'loggers': {
+        'fullbox.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
 
 
 # Password validation
@@ -0,0 +1,91 @@
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import RequestFactory, TestCase, override_settings
+
+from audit.models import OrderAuditEntry, log_order_action
+from employees.models import Employee
+
+from .instrumentation import RequestMetricsMiddleware, _record_offender, reset_slow_requests, top_slow_requests
+
+
+def _journal_view(request):
+    entries = list(OrderAuditEntry.objects.all())
+    html = Template("{% for entry in entries %}{{ entry.order_id }}{% endfor %}").render(Context({"entries": entries}))
+    return HttpResponse(html)
+
+
+class RequestMetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_slow_requests()
+        log_order_action("create", order_id="1", order_type="receiving", payload={"items": [{"sku_code": "A-1"}]})
+
+    @override_settings(REQUEST_METRICS_ENABLED=False)
+    def test_disabled_middleware_is_not_used(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RequestMetricsMiddleware(_journal_view)
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=0)
+    def test_rows_templates_and_slow_requests_are_recorded(self):
+        middleware = RequestMetricsMiddleware(_journal_view)
+        request = RequestFactory().get("/orders/")
+        request.user = get_user_model()(username="anon")
+        with self.assertLogs("fullbox.slow_requests", "WARNING"):
+            response = middleware(request)
+        self.assertEqual(response.content, b"1")
+        metrics = request.metrics
+        self.assertEqual(metrics["rows"], 1)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT payload FROM audit_orderauditentry")
+            raw = cursor.fetchone()[0]
+        self.assertEqual(metrics["payload_bytes"], len(raw.encode("utf-8")))
+        self.assertEqual(metrics["queries"], 1)
+        self.assertGreater(metrics["template_ms"], 0)
+        self.assertEqual(metrics["template_depth"], 0)
+        offenders = top_slow_requests()
+        self.assertEqual([row["route"] for row in offenders], ["GET /orders/"])
+        self.assertEqual(offenders[0]["count"], 1)
+
+    def test_offenders_are_aggregated_from_recent_slow_requests(self):
+        with patch("fullbox.instrumentation._SLOW_RECORDS_KEPT", 3):
+            for route, wall_ms in (("GET /old/", 5000), ("GET /a/", 700), ("GET /a/", 900), ("GET /b/", 600)):
+                _record_offender({"route": route, "path": route[4:], "at": "", "wall_ms": wall_ms, "queries": 3})
+            rows = top_slow_requests()
+            self.assertEqual(
+                [(row["route"], row["count"], row["avg_ms"], row["max_ms"]) for row in rows],
+                [("GET /a/", 2, 800.0, 900), ("GET /b/", 1, 600.0, 600)],
+            )
+            reset_slow_requests()
+            self.assertEqual(top_slow_requests(), [])
+
+    @override_settings(REQUEST_METRICS_ENABLED=True, REQUEST_METRICS_SLOW_MS=60_000)
+    def test_fast_requests_are_not_recorded(self):
+        request = RequestFactory().get("/orders/")
+        request.user = get_user_model()(username="anon")
+        RequestMetricsMiddleware(_journal_view)(request)
+        self.assertEqual(request.metrics["rows"], 1)
+        self.assertEqual(top_slow_requests(), [])
+
+
+class DeveloperHomeTests(TestCase):
+    def test_slow_requests_are_hidden_from_other_roles(self):
+        self.assertEqual(self.client.get("/dev/").status_code, 403)
+        user = get_user_model().objects.create_user("dev_storekeeper")
+        Employee.objects.create(full_name="Иванов Иван", role="storekeeper", user=user)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/dev/").status_code, 403)
+
+    def test_developer_and_staff_see_the_page(self):
+        user = get_user_model().objects.create_user("dev_user")
+        Employee.objects.create(full_name="Петров Петр", role="developer", user=user)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/dev/").status_code, 200)
+        staff = get_user_model().objects.create_user("dev_staff", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get("/dev/").status_code, 200)
@@ -24,8 +24,9 @@ from fullbox import views
 
 urlpatterns = [
     path('favicon.ico', views.favicon, name='favicon'),
+    path('events/', views.live_events, name='live-events'),
     path('', TemplateView.as_view(template_name='landing.html'), name='home'),
-    path('dev/', TemplateView.as_view(template_name='developer.html'), name='dev-home'),
+    path('dev/', views.developer_home, name='dev-home'),
     path('login-menu/', views.login_menu, name='login-menu'),
     path('dev-login/<str:username>/', views.dev_login, name='dev-login'),
     path('login/', views.sign_in, name='login'),
@@ -2,22 +2,34 @@ from pathlib import Path
 import time
 
 import requests
+from asgiref.sync import sync_to_async
 from django.contrib.auth import authenticate, get_user_model, login, logout
+from django.core.handlers.asgi import ASGIRequest
 from django.http import (
     FileResponse,
     HttpResponse,
     HttpResponseForbidden,
     HttpResponseNotFound,
     HttpResponseRedirect,
+    StreamingHttpResponse,
 )
 from django.shortcuts import redirect, render
 from django.utils.html import escape
+from employees.directory import first_active_entry
 from employees.models import Employee
 
 from django.conf import settings
-from employees.access import get_employee_for_user, get_request_role, resolve_cabinet_url
+from employees.access import (
+    get_employee_for_user,
+    get_request_client_agency,
+    get_request_role,
+    resolve_cabinet_url,
+)
 from sku.models import Agency
 
+from .events import EVENT_CHANNELS, event_stream
+from .instrumentation import top_slow_requests
+
 
 DEV_USERS = [
     ("admin", "Администратор"),
@@ -87,15 +99,11 @@ def dev_login(request, username):
         employee_role = "reachtruck_driver"
 
     if employee_role:
-        employee = (
-            Employee.objects.filter(role=employee_role, is_active=True)
-            .order_by("full_name")
-            .first()
-        )
+        employee = first_active_entry(employee_role)
         if employee:
-            request.session["employee_id"] = employee.id
-            request.session["employee_name"] = employee.full_name
-            request.session["employee_role"] = employee.role
+            request.session["employee_id"] = employee["id"]
+            request.session["employee_name"] = employee["full_name"]
+            request.session["employee_role"] = employee["role"]
         else:
             request.session.pop("employee_id", None)
             request.session.pop("employee_name", None)
@@ -114,6 +122,24 @@ def dev_login(request, username):
     return redirect(target)
 
 
+def developer_home(request):
+    """Кабинет разработчика: сводка медленных запросов видна только разработчику и администраторам."""
+    user = request.user
+    if not user.is_authenticated:
+        return HttpResponseForbidden("Доступ запрещен")
+    if not (user.is_staff or get_request_role(request) in {"developer", "admin"}):
+        return HttpResponseForbidden("Доступ запрещен")
+    return render(
+        request,
+        "developer.html",
+        {
+            "metrics_enabled": getattr(settings, "REQUEST_METRICS_ENABLED", False),
+            "slow_threshold_ms": getattr(settings, "REQUEST_METRICS_SLOW_MS", 500),
+            "slow_requests": top_slow_requests(10),
+        },
+    )
+
+
 def role_cabinet(request, role):
     """Простой кабинет для каждой роли (временно)."""
     if not request.user.is_authenticated:
@@ -130,7 +156,7 @@ def sign_in(request):
         role = get_request_role(request)
         if role:
             return redirect(resolve_cabinet_url(role))
-        agency = Agency.objects.filter(portal_user=request.user).first()
+        agency = get_request_client_agency(request)
         if agency:
             return redirect(f"/client/dashboard/?client={agency.id}")
     error = None
@@ -181,6 +207,30 @@ def favicon(request):
     return response
 
 
+def _can_receive_live_events(request) -> bool:
+    if not request.user.is_authenticated:
+        return False
+    return bool(get_request_role(request)) and not get_request_client_agency(request)
+
+
+async def live_events(request):
+    """Поток server-sent events для живых панелей: ?channels=tasks,moves,print."""
+    if not await sync_to_async(_can_receive_live_events)(request):
+        return HttpResponseForbidden("Доступ запрещен")
+    if not isinstance(request, ASGIRequest):
+        # Под WSGI бесконечный поток занял бы воркер целиком; 204 останавливает переподключения EventSource.
+        return HttpResponse(status=204)
+    requested = {channel.strip() for channel in request.GET.get("channels", "").split(",") if channel.strip()}
+    channels = requested & set(EVENT_CHANNELS) or set(EVENT_CHANNELS)
+    last_id = request.headers.get("Last-Event-ID") or request.GET.get("last_id") or ""
+    last_id = int(last_id) if last_id.isdigit() else None
+    response = StreamingHttpResponse(event_stream(channels, last_id), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # nginx не должен буферизовать поток.
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def project_description(request):
     """Описание проекта для кабинета директора."""
     sections = _load_sections(settings.BASE_DIR.parent / "README.md")
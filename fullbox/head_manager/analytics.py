@@ -0,0 +1,356 @@
+"""
+Выработка кладовщиков по событиям приемки потоком.
+
+Источники: запись акта приемки с flow_closed (в ней flow_state — короба и паллеты потока),
+запись «Заявка взята в работу кладовщиком» — начало приемки, и журнал избыточных действий
+(правка и удаление короба, повторное открытие приемки) — переделки. refresh_throughput
+дочитывает записи после курсоров и прибавляет их к почасовым итогам кладовщиков и итогам
+заявок; панель главного менеджера читает готовые итоги. Ид выдаются до фиксации транзакции,
+поэтому запись с меньшим ид может появиться уже после курсора: последние LATE_COMMIT_WINDOW
+перечитываются, а учтенные в окне ид хранятся в курсоре. Коробы, паллеты и единицы
+относятся к часу закрытия приемки: времени отдельных коробов в журнале нет.
+"""
+
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, Min, Q, Sum
+from django.utils import timezone
+
+from audit.models import JOURNAL_CHUNK_SIZE, AuditEntry, OrderAuditEntry
+from employees.models import Employee
+
+from .models import AnalyticsCursor, ReceivingOrderStats, StorekeeperHourlyStats
+
+TAKEN_DESCRIPTION = "Заявка взята в работу кладовщиком"
+ACTS_CURSOR = "receiving_flow_acts"
+REWORKS_CURSOR = "staff_overactions"
+THROUGHPUT_PERIODS = (1, 7, 30)
+LATE_COMMIT_WINDOW = timedelta(minutes=5)
+_COUNTERS = ("orders", "boxes", "pallets", "units", "reworks")
+_REFRESH_GATE_KEY = "head_manager:throughput:refreshed"
+
+
+def _hour(moment: datetime) -> datetime:
+    return timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+
+
+def _parse_id(raw) -> int | None:
+    try:
+        return int(str(raw).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _closed_at(entry: OrderAuditEntry) -> datetime:
+    raw = (entry.payload or {}).get("flow_closed_at")
+    try:
+        value = datetime.fromisoformat(str(raw))
+    except (TypeError, ValueError):
+        return entry.created_at
+    return timezone.make_aware(value) if timezone.is_naive(value) else value
+
+
+def flow_counts(payload: dict) -> tuple[int, int, int]:
+    """Коробы, паллеты и единицы товара закрытой приемки потоком."""
+    flow_state = payload.get("flow_state") or {}
+    boxes = [box for box in flow_state.get("boxes") or [] if isinstance(box, dict)]
+    pallets = [pallet for pallet in flow_state.get("pallets") or [] if isinstance(pallet, dict)]
+    units = 0
+    for holder in boxes + pallets:
+        for item in holder.get("items") or []:
+            if isinstance(item, dict):
+                units += max(_parse_id(item.get("qty")) or 0, 0)
+    return len(boxes), len(pallets), units
+
+
+class _Buckets:
+    """Приращения почасовых итогов, записываемые одним проходом."""
+
+    def __init__(self):
+        self.deltas = {}
+
+    def add(self, employee_id, moment, sign=1, **counters):
+        if not employee_id or moment is None:
+            return
+        delta = self.deltas.setdefault((employee_id, _hour(moment)), dict.fromkeys(_COUNTERS, 0))
+        for name, value in counters.items():
+            delta[name] += sign * value
+
+    def save(self):
+        if not self.deltas:
+            return
+        known = set(Employee.objects.filter(pk__in={key[0] for key in self.deltas}).values_list("pk", flat=True))
+        existing = {
+            (row.employee_id, row.hour): row
+            for row in StorekeeperHourlyStats.objects.filter(
+                employee_id__in=known, hour__in={key[1] for key in self.deltas}
+            )
+        }
+        created = []
+        for (employee_id, hour), delta in self.deltas.items():
+            if employee_id not in known:
+                continue
+            row = existing.get((employee_id, hour))
+            if row is None:
+                row = StorekeeperHourlyStats(employee_id=employee_id, hour=hour)
+                created.append(row)
+            for name, value in delta.items():
+                setattr(row, name, getattr(row, name) + value)
+        StorekeeperHourlyStats.objects.bulk_create(created)
+        StorekeeperHourlyStats.objects.bulk_update(existing.values(), _COUNTERS)
+
+
+def _cursor(name: str) -> AnalyticsCursor:
+    cursor = AnalyticsCursor.objects.select_for_update().filter(name=name).first()
+    return cursor or AnalyticsCursor.objects.select_for_update().get_or_create(name=name)[0]
+
+
+def _employees_by_user(user_ids) -> dict:
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return {}
+    return dict(Employee.objects.filter(user_id__in=user_ids).values_list("user_id", "pk"))
+
+
+def _order_stats(order_ids, orders: dict) -> None:
+    missing = set(order_ids) - set(orders)
+    if missing:
+        orders.update(ReceivingOrderStats.objects.in_bulk(list(missing), field_name="order_id"))
+
+
+def _read_journal(cursor: AnalyticsCursor, queryset, fields, apply) -> int:
+    """
+    Передает в apply новые записи после курсора и записи хвостового окна, которых
+    курсор еще не видел; возвращает сумму учтенного.
+    """
+    horizon = timezone.now() - LATE_COMMIT_WINDOW
+    window = set(queryset.filter(pk__lte=cursor.last_id, created_at__gte=horizon).order_by().values_list("pk", flat=True))
+    counted = 0
+    if cursor.recent_ids is not None:
+        late = window - set(cursor.recent_ids)
+        if late:
+            counted += apply(list(queryset.filter(pk__in=late).order_by("pk").only(*fields)))
+    while True:
+        batch = list(queryset.filter(pk__gt=cursor.last_id).order_by("pk").only(*fields)[:JOURNAL_CHUNK_SIZE])
+        if not batch:
+            break
+        cursor.last_id = batch[-1].pk
+        window.update(entry.pk for entry in batch if entry.created_at >= horizon)
+        counted += apply(batch)
+    cursor.recent_ids = sorted(window)
+    return counted
+
+
+def _apply_acts(cursor: AnalyticsCursor, buckets: _Buckets, orders: dict) -> int:
+    def apply(batch) -> int:
+        closed = [entry for entry in batch if (entry.payload or {}).get("flow_closed")]
+        if not closed:
+            return 0
+        counted = 0
+        order_ids = {entry.order_id for entry in closed}
+        _order_stats(order_ids, orders)
+        started = dict(
+            OrderAuditEntry.objects.filter(
+                order_type="receiving", order_id__in=order_ids, description=TAKEN_DESCRIPTION
+            )
+            .values("order_id")
+            .annotate(first=Min("created_at"))
+            .values_list("order_id", "first")
+        )
+        by_user = _employees_by_user(entry.user_id for entry in closed)
+        for entry in closed:
+            payload = entry.payload or {}
+            closed_at = _closed_at(entry)
+            stats = orders.get(entry.order_id)
+            if stats and stats.closed_at and closed_at <= stats.closed_at:
+                # Подписи и отправка акта копируют payload закрытия — это та же приемка;
+                # более раннее закрытие, ставшее видимым позже, уже перекрыто новым.
+                continue
+            if stats and stats.closed_at:
+                buckets.add(
+                    stats.employee_id,
+                    stats.closed_at,
+                    sign=-1,
+                    orders=1,
+                    boxes=stats.boxes,
+                    pallets=stats.pallets,
+                    units=stats.units,
+                )
+            if stats is None:
+                stats = orders[entry.order_id] = ReceivingOrderStats(order_id=entry.order_id)
+            employee_id = (
+                _parse_id(payload.get("storekeeper_employee_id"))
+                or _parse_id(payload.get("act_storekeeper_employee_id"))
+                or by_user.get(entry.user_id)
+            )
+            boxes, pallets, units = flow_counts(payload)
+            stats.agency_id = entry.agency_id
+            stats.employee_id = employee_id
+            stats.started_at = started.get(entry.order_id)
+            stats.closed_at = closed_at
+            stats.duration_seconds = (
+                max(int((closed_at - stats.started_at).total_seconds()), 0) if stats.started_at else None
+            )
+            stats.boxes, stats.pallets, stats.units = boxes, pallets, units
+            buckets.add(employee_id, closed_at, orders=1, boxes=boxes, pallets=pallets, units=units)
+            counted += 1
+        return counted
+
+    return _read_journal(
+        cursor,
+        OrderAuditEntry.objects.filter(order_type="receiving", act="receiving"),
+        ("pk", "order_id", "agency_id", "user_id", "created_at", "payload"),
+        apply,
+    )
+
+
+def _apply_reworks(cursor: AnalyticsCursor, buckets: _Buckets, orders: dict) -> int:
+    def apply(batch) -> int:
+        by_user = _employees_by_user(entry.user_id for entry in batch)
+        order_ids = {str((entry.snapshot or {}).get("order_id") or "") for entry in batch} - {""}
+        _order_stats(order_ids, orders)
+        for entry in batch:
+            employee_id = by_user.get(entry.user_id)
+            buckets.add(employee_id, entry.created_at, reworks=1)
+            order_id = str((entry.snapshot or {}).get("order_id") or "")
+            if order_id:
+                stats = orders.get(order_id)
+                if stats is None:
+                    stats = orders[order_id] = ReceivingOrderStats(order_id=order_id, employee_id=employee_id)
+                stats.reworks += 1
+        return len(batch)
+
+    return _read_journal(
+        cursor,
+        AuditEntry.objects.filter(journal__code=REWORKS_CURSOR),
+        ("pk", "user_id", "created_at", "snapshot"),
+        apply,
+    )
+
+
+def refresh_throughput() -> dict:
+    """Дописывает в итоги события после курсоров; возвращает число учтенных приемок и переделок."""
+    with transaction.atomic():
+        acts_cursor = _cursor(ACTS_CURSOR)
+        reworks_cursor = _cursor(REWORKS_CURSOR)
+        acts_start = (acts_cursor.last_id, acts_cursor.recent_ids)
+        reworks_start = (reworks_cursor.last_id, reworks_cursor.recent_ids)
+        buckets = _Buckets()
+        orders = {}
+        acts = _apply_acts(acts_cursor, buckets, orders)
+        reworks = _apply_reworks(reworks_cursor, buckets, orders)
+        buckets.save()
+        if orders:
+            known = set(
+                Employee.objects.filter(
+                    pk__in={stats.employee_id for stats in orders.values() if stats.employee_id}
+                ).values_list("pk", flat=True)
+            )
+            for stats in orders.values():
+                if stats.employee_id not in known:
+                    stats.employee_id = None
+            ReceivingOrderStats.objects.bulk_create([stats for stats in orders.values() if stats.pk is None])
+            ReceivingOrderStats.objects.bulk_update(
+                [stats for stats in orders.values() if stats.pk is not None],
+                [
+                    "agency",
+                    "employee",
+                    "started_at",
+                    "closed_at",
+                    "duration_seconds",
+                    "boxes",
+                    "pallets",
+                    "units",
+                    "reworks",
+                ],
+            )
+        for cursor, start in ((acts_cursor, acts_start), (reworks_cursor, reworks_start)):
+            if (cursor.last_id, cursor.recent_ids) != start:
+                cursor.save(update_fields=["last_id", "recent_ids", "updated_at"])
+    return {"acts": acts, "reworks": reworks}
+
+
+def refresh_throughput_throttled() -> bool:
+    """
+    Обновление итогов для панели: не чаще раза в THROUGHPUT_REFRESH_SECONDS, чтобы просмотры
+    не выстраивались в очередь за блокировкой курсоров. Основной путь — команда
+    aggregate_throughput по расписанию. Возвращает True, если обновление выполнялось.
+    """
+    if not cache.add(_REFRESH_GATE_KEY, True, settings.THROUGHPUT_REFRESH_SECONDS):
+        return False
+    refresh_throughput()
+    return True
+
+
+def reset_throughput() -> None:
+    """Удаляет итоги и курсоры: следующий refresh_throughput пересчитает все с начала журнала."""
+    with transaction.atomic():
+        StorekeeperHourlyStats.objects.all().delete()
+        ReceivingOrderStats.objects.all().delete()
+        AnalyticsCursor.objects.filter(name__in=[ACTS_CURSOR, REWORKS_CURSOR]).delete()
+
+
+def throughput_summary(days: int = 7) -> dict:
+    """Выработка кладовщиков за последние days суток и приемка по часам за сегодня."""
+    now = timezone.localtime()
+    since = _hour(now) - timedelta(days=days) + timedelta(hours=1)
+    storekeepers = (
+        StorekeeperHourlyStats.objects.filter(hour__gte=since)
+        .values("employee_id", "employee__full_name")
+        .annotate(
+            total_orders=Sum("orders"),
+            total_boxes=Sum("boxes"),
+            total_pallets=Sum("pallets"),
+            total_units=Sum("units"),
+            total_reworks=Sum("reworks"),
+            active_hours=Count("id", filter=Q(units__gt=0)),
+        )
+        .order_by("-total_units", "employee__full_name")
+    )
+    durations = dict(
+        ReceivingOrderStats.objects.filter(closed_at__gte=since, duration_seconds__isnull=False)
+        .values("employee_id")
+        .annotate(avg=Avg("duration_seconds"))
+        .values_list("employee_id", "avg")
+    )
+    rows = []
+    for row in storekeepers:
+        duration = durations.get(row["employee_id"])
+        rows.append(
+            {
+                "employee_id": row["employee_id"],
+                "name": row["employee__full_name"],
+                "orders": row["total_orders"],
+                "boxes": row["total_boxes"],
+                "pallets": row["total_pallets"],
+                "units": row["total_units"],
+                "active_hours": row["active_hours"],
+                "units_per_hour": round(row["total_units"] / row["active_hours"]) if row["active_hours"] else 0,
+                "avg_duration_minutes": round(duration / 60) if duration is not None else None,
+                "reworks": row["total_reworks"],
+                "rework_rate": (
+                    round(100 * row["total_reworks"] / row["total_boxes"], 1) if row["total_boxes"] else None
+                ),
+            }
+        )
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    hourly = {
+        timezone.localtime(row["hour"]).hour: row
+        for row in StorekeeperHourlyStats.objects.filter(hour__gte=today)
+        .values("hour")
+        .annotate(total_boxes=Sum("boxes"), total_units=Sum("units"))
+    }
+    peak = max((row["total_units"] for row in hourly.values()), default=0)
+    hours = [
+        {
+            "hour": hour,
+            "boxes": hourly[hour]["total_boxes"] if hour in hourly else 0,
+            "units": hourly[hour]["total_units"] if hour in hourly else 0,
+            "height": round(100 * hourly[hour]["total_units"] / peak) if hour in hourly and peak else 0,
+        }
+        for hour in range(now.hour + 1)
+    ]
+    return {"days": days, "rows": rows, "hours": hours}
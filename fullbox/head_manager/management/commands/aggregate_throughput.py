@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from head_manager.analytics import refresh_throughput, reset_throughput
+
+
+class Command(BaseCommand):
+    help = "Fold new receiving flow closes and rework events into the storekeeper throughput tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Drop the aggregated tables and cursors and rebuild them from the whole journal.",
+        )
+
+    def handle(self, *args, **options):
+        if options["rebuild"]:
+            reset_throughput()
+            self.stdout.write("Throughput tables cleared.")
+        counts = refresh_throughput()
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. Counted {counts['acts']} flow closes and {counts['reworks']} reworks.")
+        )
@@ -0,0 +1,60 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('employees', '0005_alter_employee_role'),
+        ('sku', '0008_agency_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCursor',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=64, unique=True)),
+                ('last_id', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReceivingOrderStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=128, unique=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('closed_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.PositiveIntegerField(blank=True, null=True)),
+                ('boxes', models.PositiveIntegerField(default=0)),
+                ('pallets', models.PositiveIntegerField(default=0)),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('reworks', models.PositiveIntegerField(default=0)),
+                ('agency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='sku.agency')),
+                ('employee', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='receiving_stats', to='employees.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['closed_at'], name='head_manage_closed__58082b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StorekeeperHourlyStats',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('orders', models.IntegerField(default=0)),
+                ('boxes', models.IntegerField(default=0)),
+                ('pallets', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('reworks', models.IntegerField(default=0)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hourly_stats', to='employees.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['hour'], name='head_manage_hour_7788a3_idx')],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'hour'), name='uniq_storekeeper_hour')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('head_manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analyticscursor',
+            name='recent_ids',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,67 @@
 from django.db import models
 
-# Create your models here.
+from employees.models import Employee
+from sku.models import Agency
+
+
+class StorekeeperHourlyStats(models.Model):
+    """Выработка кладовщика за час: закрытые приемки потоком и переделки (head_manager.analytics)."""
+
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name="hourly_stats")
+    hour = models.DateTimeField()
+    orders = models.IntegerField(default=0)
+    boxes = models.IntegerField(default=0)
+    pallets = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    reworks = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["employee", "hour"], name="uniq_storekeeper_hour"),
+        ]
+        indexes = [
+            models.Index(fields=["hour"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.employee_id} · {self.hour:%Y-%m-%d %H:00} · {self.units}"
+
+
+class ReceivingOrderStats(models.Model):
+    """Итоги приемки потоком по заявке: кто, сколько и как долго принимал."""
+
+    order_id = models.CharField(max_length=128, unique=True)
+    agency = models.ForeignKey(Agency, on_delete=models.SET_NULL, null=True, blank=True)
+    employee = models.ForeignKey(
+        Employee, on_delete=models.SET_NULL, null=True, blank=True, related_name="receiving_stats"
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+    duration_seconds = models.PositiveIntegerField(null=True, blank=True)
+    boxes = models.PositiveIntegerField(default=0)
+    pallets = models.PositiveIntegerField(default=0)
+    units = models.PositiveIntegerField(default=0)
+    reworks = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["closed_at"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.order_id} · {self.boxes} коробов"
+
+
+class AnalyticsCursor(models.Model):
+    """
+    Последняя учтенная запись источника (журнал заявок, журнал переделок) и ид записей,
+    уже учтенных в хвостовом окне: запись с меньшим ид может стать видна позже курсора.
+    """
+
+    name = models.CharField(max_length=64, unique=True)
+    last_id = models.BigIntegerField(default=0)
+    recent_ids = models.JSONField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.name}: {self.last_id}"
@@ -1,3 +1,143 @@
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
+from django.utils import timezone
+
+from audit.models import OrderAuditEntry, log_order_action, log_staff_overaction
+from employees.models import Employee
+from sku.models import Agency
+
+from .analytics import TAKEN_DESCRIPTION, refresh_throughput, refresh_throughput_throttled, throughput_summary
+from .models import ReceivingOrderStats, StorekeeperHourlyStats
+
+
+def _flow_state(*box_qtys):
+    return {
+        "boxes": [
+            {"code": f"B-{idx}", "items": [{"sku_code": "SKU-1", "name": "Футболка", "size": "M", "qty": qty}]}
+            for idx, qty in enumerate(box_qtys, start=1)
+        ],
+        "pallets": [{"code": "P-1", "boxes": [f"B-{idx}" for idx in range(1, len(box_qtys) + 1)], "items": []}],
+    }
+
+
+class StorekeeperThroughputTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        self.user = get_user_model().objects.create_user("throughput_storekeeper")
+        self.storekeeper = Employee.objects.create(full_name="Иванов Иван", role="storekeeper", user=self.user)
+        self.now = timezone.localtime().replace(minute=30, second=0, microsecond=0)
+
+    def _log(self, order_id, payload, description="", moment=None):
+        entry = log_order_action(
+            "status",
+            order_id=order_id,
+            order_type="receiving",
+            user=self.user,
+            agency=self.agency,
+            description=description,
+            payload=payload,
+        )
+        if moment is not None:
+            type(entry).objects.filter(pk=entry.pk).update(created_at=moment)
+        return entry
+
+    def _close(self, order_id, *box_qtys, closed_at=None):
+        closed_at = closed_at or self.now
+        return self._log(
+            order_id,
+            {
+                "act": "receiving",
+                "flow_state": _flow_state(*box_qtys),
+                "flow_closed": True,
+                "flow_closed_at": closed_at.isoformat(),
+                "storekeeper_employee_id": self.storekeeper.id,
+            },
+            description="Приемка потоком закрыта",
+            moment=closed_at,
+        )
+
+    def test_flow_close_is_counted_once(self):
+        self._log(
+            "1",
+            {"storekeeper_employee_id": self.storekeeper.id},
+            description=TAKEN_DESCRIPTION,
+            moment=self.now - timedelta(minutes=45),
+        )
+        close = self._close("1", 10, 15)
+        # Подпись акта копирует payload закрытия — это не новая приемка.
+        self._log("1", {**close.payload, "act_storekeeper_signed": True}, description="Подписан акт приемки")
+        self.assertEqual(refresh_throughput(), {"acts": 1, "reworks": 0})
+
+        hour = StorekeeperHourlyStats.objects.get()
+        self.assertEqual((hour.orders, hour.boxes, hour.pallets, hour.units), (1, 2, 1, 25))
+        stats = ReceivingOrderStats.objects.get(order_id="1")
+        self.assertEqual(stats.employee, self.storekeeper)
+        self.assertEqual(stats.duration_seconds, 45 * 60)
+
+        summary = throughput_summary(1)
+        self.assertEqual(len(summary["rows"]), 1)
+        self.assertEqual(summary["rows"][0]["units"], 25)
+        self.assertEqual(summary["rows"][0]["avg_duration_minutes"], 45)
+
+    def test_reclose_replaces_previous_contribution(self):
+        self._close("1", 10, 15)
+        refresh_throughput()
+        self._close("1", 10, closed_at=self.now + timedelta(minutes=10))
+        refresh_throughput()
+        hour = StorekeeperHourlyStats.objects.get()
+        self.assertEqual((hour.orders, hour.boxes, hour.units), (1, 1, 10))
+        self.assertEqual(ReceivingOrderStats.objects.get(order_id="1").boxes, 1)
+
+    def test_reworks_come_from_staff_overactions(self):
+        self._close("1", 10, 15, 5, 20)
+        log_staff_overaction("delete", user=self.user, agency=self.agency, snapshot={"order_id": "1"})
+        self.assertEqual(refresh_throughput(), {"acts": 1, "reworks": 1})
+        self.assertEqual(ReceivingOrderStats.objects.get(order_id="1").reworks, 1)
+        row = throughput_summary(1)["rows"][0]
+        self.assertEqual(row["reworks"], 1)
+        self.assertEqual(row["rework_rate"], 25.0)
+
+    def test_refresh_reads_only_new_entries(self):
+        self._close("1", 10)
+        refresh_throughput()
+        with self.assertNumQueries(8):
+            # Точка сохранения транзакции, блокировка двух курсоров, ид хвостовых окон
+            # и два пустых чтения журналов.
+            self.assertEqual(refresh_throughput(), {"acts": 0, "reworks": 0})
+        self._close("2", 5)
+        self.assertEqual(refresh_throughput()["acts"], 1)
+        self.assertEqual(StorekeeperHourlyStats.objects.get().orders, 2)
+
+    def test_late_committed_entry_below_cursor_is_counted_once(self):
+        placeholder = self._close("1", 10)
+        self._close("2", 5)
+        # Запись заявки 1 еще не зафиксирована, когда курсор уходит дальше.
+        placeholder_pk = placeholder.pk
+        placeholder.delete()
+        self.assertEqual(refresh_throughput()["acts"], 1)
+        # Поздняя запись свежая: она должна попасть в хвостовое окно при любом текущем времени.
+        late = self._close("1", 10, closed_at=timezone.localtime())
+        OrderAuditEntry.objects.filter(pk=late.pk).update(id=placeholder_pk)
+        self.assertEqual(refresh_throughput()["acts"], 1)
+        self.assertEqual(refresh_throughput()["acts"], 0)
+        self.assertEqual(StorekeeperHourlyStats.objects.get().orders, 2)
+
+    def test_dashboard_refresh_is_throttled(self):
+        self.assertTrue(refresh_throughput_throttled())
+        self._close("1", 10)
+        self.assertFalse(refresh_throughput_throttled())
+        self.assertFalse(ReceivingOrderStats.objects.exists())
 
-# Create your tests here.
+    def test_dashboard_renders_throughput(self):
+        self._close("1", 10, 15)
+        user = get_user_model().objects.create_user("throughput_head")
+        Employee.objects.create(full_name="Сидоров Сидор", role="head_manager", user=user)
+        self.client.force_login(user)
+        response = self.client.get("/head-manager/?days=30")
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Иванов Иван")
+        self.assertEqual(response.context["throughput"]["days"], 30)
@@ -15,11 +15,26 @@ from django.views.generic import TemplateView
 from employees.access import RoleRequiredMixin
 from sku.models import Agency, Market, MarketCredential
 
+from .analytics import THROUGHPUT_PERIODS, refresh_throughput_throttled, throughput_summary
+
 
 class HeadManagerDashboard(RoleRequiredMixin, TemplateView):
     template_name = 'head_manager/dashboard.html'
     allowed_roles = ("head_manager",)
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        try:
+            days = int(self.request.GET.get("days") or 7)
+        except (TypeError, ValueError):
+            days = 7
+        if days not in THROUGHPUT_PERIODS:
+            days = 7
+        refresh_throughput_throttled()
+        ctx["throughput"] = throughput_summary(days)
+        ctx["throughput_periods"] = THROUGHPUT_PERIODS
+        return ctx
+
 
 def _marketplace_warehouses_path() -> Path:
     return settings.BASE_DIR.parent / "marketplace_warehouses.json"
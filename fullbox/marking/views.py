@@ -9,6 +9,7 @@ from openpyxl import load_workbook
 
 from audit.models import OrderAuditEntry
 from employees.access import get_request_role
+from fullbox.db_concurrency import retry_on_lock
 from sku.models import SKU, SKUBarcode
 from .models import MarkingCode
 from .utils import extract_processing_items
@@ -92,6 +93,11 @@ def processing_marking_summary(request, order_id: str):
     return JsonResponse({"ok": True, "items": items, "total_count": total_count})
 
 
+@retry_on_lock
+def _record_scanned_code(**fields) -> MarkingCode:
+    return MarkingCode.objects.create(**fields)
+
+
 @login_required
 @require_POST
 def processing_marking_scan(request, order_id: str):
@@ -130,7 +136,7 @@ def processing_marking_scan(request, order_id: str):
         return JsonResponse({"ok": False, "error": "Код уже учтен."}, status=409)
     sku = _resolve_sku(agency, sku_code)
     try:
-        MarkingCode.objects.create(
+        _record_scanned_code(
             order_type="processing",
             order_id=order_id,
             agency=agency,
@@ -0,0 +1,231 @@
+from functools import cached_property
+
+from audit.archive import order_entries
+
+
+_LATEST_PAYLOAD_IGNORED_KEYS = {
+    "comment",
+    "message",
+    "status",
+    "status_label",
+    "submit_action",
+    "flow_state",
+    "flow_boxes",
+    "flow_pallets",
+    "flow_active_box",
+    "flow_active_pallet",
+}
+_FALLBACK_PAYLOAD_IGNORED_KEYS = {
+    "comment",
+    "message",
+    "flow_state",
+    "flow_boxes",
+    "flow_pallets",
+    "flow_active_box",
+    "flow_active_pallet",
+}
+
+
+def is_status_entry(entry) -> bool:
+    payload = entry.payload or {}
+    if entry.action == "status":
+        return True
+    return bool(
+        payload.get("status")
+        or payload.get("status_label")
+        or payload.get("submit_action")
+    )
+
+
+def current_status_entry(entries):
+    for entry in reversed(entries):
+        if is_status_entry(entry):
+            return entry
+    return entries[-1] if entries else None
+
+
+def act_entry_from_entries(entries, act_type: str = "receiving"):
+    for entry in reversed(entries or []):
+        if (entry.payload or {}).get("act") == act_type:
+            return entry
+    return None
+
+
+def find_act_entry(entries, act_type: str, label_hint: str):
+    entry = act_entry_from_entries(entries, act_type)
+    if entry:
+        return entry
+    for candidate in reversed(entries or []):
+        label = ((candidate.payload or {}).get("act_label") or "").lower()
+        if label_hint in label:
+            return candidate
+    return None
+
+
+def act_storekeeper_signed_from_payload(payload: dict) -> bool:
+    return bool((payload or {}).get("act_storekeeper_signed"))
+
+
+def act_manager_signed_from_payload(payload: dict) -> bool:
+    return bool((payload or {}).get("act_manager_signed"))
+
+
+def act_storekeeper_signed(entries) -> bool:
+    act_entry = find_act_entry(entries, "receiving", "акт приемки")
+    if not act_entry:
+        return False
+    return act_storekeeper_signed_from_payload(act_entry.payload or {})
+
+
+def latest_payload_from_entries(entries):
+    fallback_payload = {}
+    for entry in reversed(entries):
+        payload = entry.payload or {}
+        if not payload:
+            continue
+        if not fallback_payload:
+            fallback_keys = set(payload.keys()) - _FALLBACK_PAYLOAD_IGNORED_KEYS
+            if fallback_keys:
+                fallback_payload = payload
+        significant_keys = set(payload.keys()) - _LATEST_PAYLOAD_IGNORED_KEYS
+        if significant_keys:
+            return payload
+    return fallback_payload or (entries[-1].payload or {} if entries else {})
+
+
+def _flow_state_from_entries(entries):
+    for entry in reversed(entries or []):
+        payload = entry.payload or {}
+        flow_state = payload.get("flow_state")
+        if isinstance(flow_state, dict):
+            return flow_state
+        boxes = payload.get("flow_boxes")
+        pallets = payload.get("flow_pallets")
+        if boxes or pallets:
+            return {
+                "boxes": boxes or [],
+                "pallets": pallets or [],
+                "activeBox": payload.get("flow_active_box") or "",
+                "activePallet": payload.get("flow_active_pallet") or "",
+            }
+    return {}
+
+
+def flow_closed_from_entries(entries):
+    for entry in reversed(entries or []):
+        payload = entry.payload or {}
+        if payload.get("flow_reopened"):
+            return False
+        if payload.get("flow_closed"):
+            return True
+    return False
+
+
+class OrderAggregate:
+    """
+    Журнал одной заявки, загруженный один раз за запрос (вместе с архивом).
+    Производные значения считаются по первому обращению и запоминаются;
+    после записи в журнал заявки вызывается record(), чтобы они пересчитались.
+    """
+
+    _derived = (
+        "latest",
+        "status_entry",
+        "receiving_act",
+        "placement_act",
+        "payload",
+        "flow_state",
+        "flow_closed",
+        "placement_closed",
+        "storekeeper_signed",
+        "manager_signed",
+        "agency_ids",
+    )
+
+    def __init__(self, order_type: str, order_id: str):
+        self.order_type = order_type
+        self.order_id = order_id
+        self._act_entries = {}
+
+    @cached_property
+    def entries(self) -> list:
+        return order_entries(self.order_id, self.order_type)
+
+    def record(self, entry) -> None:
+        """Добавляет только что записанную запись журнала и сбрасывает вычисленные значения."""
+        if "entries" in self.__dict__ and entry is not None:
+            self.entries.append(entry)
+        self._forget()
+
+    def reload(self) -> None:
+        self.__dict__.pop("entries", None)
+        self._forget()
+
+    def _forget(self) -> None:
+        for name in self._derived:
+            self.__dict__.pop(name, None)
+        self._act_entries = {}
+
+    def act_entry(self, act_type: str):
+        """Последняя запись акта данного типа (без поиска по названию акта)."""
+        if act_type not in self._act_entries:
+            self._act_entries[act_type] = act_entry_from_entries(self.entries, act_type)
+        return self._act_entries[act_type]
+
+    @cached_property
+    def latest(self):
+        return self.entries[-1] if self.entries else None
+
+    @cached_property
+    def status_entry(self):
+        return current_status_entry(self.entries)
+
+    @cached_property
+    def receiving_act(self):
+        return find_act_entry(self.entries, "receiving", "акт приемки")
+
+    @cached_property
+    def placement_act(self):
+        return find_act_entry(self.entries, "placement", "акт размещения")
+
+    @cached_property
+    def payload(self) -> dict:
+        return latest_payload_from_entries(self.entries)
+
+    @cached_property
+    def flow_state(self) -> dict:
+        return _flow_state_from_entries(self.entries)
+
+    @cached_property
+    def flow_closed(self) -> bool:
+        return flow_closed_from_entries(self.entries)
+
+    @cached_property
+    def placement_closed(self) -> bool:
+        if not self.placement_act:
+            return False
+        return ((self.placement_act.payload or {}).get("act_state") or "closed").lower() == "closed"
+
+    @cached_property
+    def storekeeper_signed(self) -> bool:
+        return bool(self.receiving_act) and act_storekeeper_signed_from_payload(self.receiving_act.payload or {})
+
+    @cached_property
+    def manager_signed(self) -> bool:
+        return bool(self.receiving_act) and act_manager_signed_from_payload(self.receiving_act.payload or {})
+
+    @cached_property
+    def agency_ids(self) -> set:
+        return {entry.agency_id for entry in self.entries if entry.agency_id}
+
+
+def order_aggregate(request, order_type: str, order_id: str) -> OrderAggregate:
+    """Одна OrderAggregate на (тип, номер) заявки в пределах запроса."""
+    aggregates = getattr(request, "_order_aggregates", None)
+    if aggregates is None:
+        aggregates = {}
+        request._order_aggregates = aggregates
+    key = (order_type, str(order_id))
+    if key not in aggregates:
+        aggregates[key] = OrderAggregate(order_type, str(order_id))
+    return aggregates[key]
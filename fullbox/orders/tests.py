@@ -1,3 +1,55 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase
 
-# Create your tests here.
+from audit.models import log_order_action
+
+from .aggregate import order_aggregate
+from .views import _send_act_to_client
+
+
+class OrderAggregateTests(TestCase):
+    def setUp(self):
+        log_order_action("create", order_id="10", payload={"items": [{"sku": "A-1", "qty": 3}]})
+        log_order_action("status", order_id="10", payload={"status": "warehouse"})
+        log_order_action("update", order_id="10", payload={"act": "receiving", "act_storekeeper_signed": True})
+
+    def test_journal_is_loaded_once_per_request(self):
+        request = RequestFactory().get("/orders/receiving/10/")
+        # Журнал (1) и проверка архива (1); повторные обращения идут из памяти.
+        with self.assertNumQueries(2):
+            aggregate = order_aggregate(request, "receiving", "10")
+            self.assertEqual(len(aggregate.entries), 3)
+            self.assertIs(order_aggregate(request, "receiving", 10), aggregate)
+            self.assertEqual(aggregate.status_entry.payload["status"], "warehouse")
+            self.assertEqual(aggregate.payload["act"], "receiving")
+            self.assertTrue(aggregate.storekeeper_signed)
+            self.assertIsNone(aggregate.placement_act)
+        other_request = RequestFactory().get("/orders/receiving/10/")
+        self.assertIsNot(order_aggregate(other_request, "receiving", "10"), aggregate)
+
+    def test_record_refreshes_derived_state(self):
+        request = RequestFactory().get("/orders/receiving/10/")
+        aggregate = order_aggregate(request, "receiving", "10")
+        self.assertFalse(aggregate.placement_closed)
+        entry = log_order_action("update", order_id="10", payload={"act": "placement", "act_state": "closed"})
+        with self.assertNumQueries(0):
+            aggregate.record(entry)
+            self.assertIs(aggregate.latest, entry)
+            self.assertIs(aggregate.placement_act, entry)
+            self.assertTrue(aggregate.placement_closed)
+
+    def test_send_act_to_client_reads_aggregate(self):
+        request = RequestFactory().post("/orders/receiving/10/")
+        aggregate = order_aggregate(request, "receiving", "10")
+        self.assertFalse(_send_act_to_client(aggregate, None))
+        aggregate.record(log_order_action("update", order_id="10", payload={"act": "placement", "act_state": "closed"}))
+        aggregate.record(
+            log_order_action(
+                "update",
+                order_id="10",
+                payload={"act": "receiving", "act_storekeeper_signed": True, "act_manager_signed": True},
+            )
+        )
+        self.assertTrue(_send_act_to_client(aggregate, None))
+        # Отправка записана в тот же агрегат: статус уже «done», повторной отправки нет.
+        self.assertEqual(aggregate.status_entry.payload["status"], "done")
+        self.assertFalse(_send_act_to_client(aggregate, None))
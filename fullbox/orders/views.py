@@ -9,18 +9,50 @@ from django.db import transaction
 from django.http import FileResponse, Http404, HttpResponseForbidden, JsonResponse
 from django.shortcuts import redirect, render
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.generic import TemplateView
 from openpyxl import load_workbook
 from openpyxl.cell.cell import MergedCell
 
+from audit.archive import order_entries
 from audit.models import OrderAuditEntry, log_order_action, log_staff_overaction
+from employees.directory import (
+    active_employee_entry,
+    first_active_employee,
+    first_active_entry,
+    short_name as _short_name,
+)
 from employees.models import Employee
-from employees.access import RoleRequiredMixin, get_request_role, resolve_cabinet_url, is_staff_role
+from employees.access import (
+    RoleRequiredMixin,
+    get_request_client_agency,
+    get_request_employee,
+    get_request_role,
+    is_staff_role,
+    resolve_cabinet_url,
+)
+from fullbox.db_routing import replica_reads
+from sku.barcodes import barcode_index
 from sku.models import Agency, SKU, SKUBarcode
 from todo.models import Task
+from reachtruck.services import reserved_os_cells
+from stockmap.slotting import placement_suggestions
 from stockmap.views import _OS_CELLS_PER_TIER, _OS_ROW_SECTIONS, _OS_TIERS
 
+from .aggregate import (
+    act_entry_from_entries,
+    act_manager_signed_from_payload,
+    act_storekeeper_signed,
+    act_storekeeper_signed_from_payload,
+    current_status_entry,
+    find_act_entry,
+    flow_closed_from_entries,
+    is_status_entry,
+    latest_payload_from_entries,
+    order_aggregate,
+)
+
 
 _IP_PREFIX_RE = re.compile(r"\bиндивидуальный предприниматель\b", re.IGNORECASE)
 _TEMPLATE_DOCS_DIR = settings.BASE_DIR / "static" / "docs"
@@ -58,17 +90,6 @@ def _shorten_ip_name(name: str) -> str:
     return " ".join(normalized.split())
 
 
-def _short_name(full_name: str) -> str:
-    if not full_name:
-        return "-"
-    parts = [part for part in full_name.split() if part]
-    if not parts:
-        return "-"
-    surname = parts[0]
-    initials = "".join(f"{part[0].upper()}." for part in parts[1:3] if part)
-    return f"{surname} {initials}".strip()
-
-
 def _order_type_label(order_type: str) -> str:
     if not order_type:
         return "-"
@@ -77,24 +98,7 @@ def _order_type_label(order_type: str) -> str:
 
 
 def _first_active_employee_by_roles(*roles: str) -> Employee | None:
-    for role in [role for role in roles if role]:
-        employee = (
-            Employee.objects.filter(role=role, is_active=True)
-            .order_by("full_name")
-            .first()
-        )
-        if employee:
-            return employee
-    return None
-
-
-def _facsimile_url(employee: Employee | None) -> str:
-    if not employee or not getattr(employee, "facsimile", None):
-        return ""
-    url = employee.facsimile.url
-    if url and not url.startswith(("http://", "https://", "/")):
-        return f"/{url}"
-    return url
+    return first_active_employee(*roles)
 
 
 def _barcode_value_for_sku(sku, size: str | None) -> str:
@@ -164,64 +168,33 @@ def _can_client_edit_draft(entries, client_agency) -> bool:
         return False
     if not any(entry.agency_id == client_agency.id for entry in entries if entry.agency_id):
         return False
-    status_entry = _current_status_entry(entries)
+    status_entry = current_status_entry(entries)
     return _is_draft_entry(status_entry or entries[-1])
 
 
-def _is_status_entry(entry) -> bool:
-    payload = entry.payload or {}
-    if entry.action == "status":
-        return True
-    return bool(
-        payload.get("status")
-        or payload.get("status_label")
-        or payload.get("submit_action")
-    )
-
-
 def _manager_label() -> str:
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
-    return _short_name(manager.full_name) if manager else "-"
+    entry = first_active_entry("manager")
+    return entry["short_name"] if entry else "-"
 
 
 def _storekeeper_label() -> str:
-    storekeeper = (
-        Employee.objects.filter(role="storekeeper", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
-    return _short_name(storekeeper.full_name) if storekeeper else "-"
+    entry = first_active_entry("storekeeper")
+    return entry["short_name"] if entry else "-"
 
 
 def _storekeeper_full_name() -> str:
-    storekeeper = (
-        Employee.objects.filter(role="storekeeper", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
-    return storekeeper.full_name.strip() if storekeeper and storekeeper.full_name else ""
+    entry = first_active_entry("storekeeper")
+    return entry["full_name"] if entry else ""
 
 
 def _processing_head_full_name() -> str:
-    head = (
-        Employee.objects.filter(role="processing_head", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
-    return head.full_name.strip() if head and head.full_name else ""
+    entry = first_active_entry("processing_head")
+    return entry["full_name"] if entry else ""
 
 
 def _manager_full_name() -> str:
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
-    return manager.full_name.strip() if manager and manager.full_name else ""
+    entry = first_active_entry("manager")
+    return entry["full_name"] if entry else ""
 
 
 def _journal_action_label(entry, manager_label: str, storekeeper_label: str) -> str:
@@ -266,13 +239,6 @@ def _status_label_from_entry(entry):
     return payload.get("status_label") or payload.get("status") or "-"
 
 
-def _current_status_entry(entries):
-    for entry in reversed(entries):
-        if _is_status_entry(entry):
-            return entry
-    return entries[-1] if entries else None
-
-
 def _current_responsible_label(entry):
     if not entry:
         return "-"
@@ -310,8 +276,8 @@ def _current_responsible_label(entry):
             _signed_employee_from_payload(payload, "storekeeper_employee_id")
             or _signed_employee_from_payload(payload, "act_storekeeper_employee_id")
         )
-        if storekeeper and storekeeper.full_name:
-            return f"Кладовщик {storekeeper.full_name.strip()}"
+        if storekeeper and storekeeper["full_name"]:
+            return f"Кладовщик {storekeeper['full_name']}"
         if stored_name:
             return f"Кладовщик {stored_name}"
         storekeeper_full = _storekeeper_full_name()
@@ -488,24 +454,6 @@ def _warehouse_status_from_entry(entry) -> bool:
     return status_value in {"warehouse", "on_warehouse"} or "склад" in status_label or "ожидании поставки" in status_label
 
 
-def _act_entry_from_entries(entries, act_type: str = "receiving"):
-    for entry in reversed(entries or []):
-        if (entry.payload or {}).get("act") == act_type:
-            return entry
-    return None
-
-
-def _find_act_entry(entries, act_type: str, label_hint: str):
-    entry = _act_entry_from_entries(entries, act_type)
-    if entry:
-        return entry
-    for candidate in reversed(entries or []):
-        label = ((candidate.payload or {}).get("act_label") or "").lower()
-        if label_hint in label:
-            return candidate
-    return None
-
-
 def _is_done_status(entry) -> bool:
     if not entry:
         return False
@@ -517,54 +465,26 @@ def _is_done_status(entry) -> bool:
     return "выполн" in status_label
 
 
-def _act_storekeeper_signed_from_payload(payload: dict) -> bool:
-    return bool((payload or {}).get("act_storekeeper_signed"))
-
-
-def _act_manager_signed_from_payload(payload: dict) -> bool:
-    return bool((payload or {}).get("act_manager_signed"))
-
-
-def _act_storekeeper_signed(entries) -> bool:
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
-    if not act_entry:
-        return False
-    return _act_storekeeper_signed_from_payload(act_entry.payload or {})
-
-
-def _act_manager_signed(entries) -> bool:
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
-    if not act_entry:
-        return False
-    return _act_manager_signed_from_payload(act_entry.payload or {})
-
-
-def _signed_employee_from_payload(payload: dict, employee_key: str) -> Employee | None:
+def _signed_employee_from_payload(payload: dict, employee_key: str) -> dict | None:
     raw_id = (payload or {}).get(employee_key)
     if raw_id in (None, ""):
         return None
-    try:
-        employee_id = int(raw_id)
-    except (TypeError, ValueError):
-        return None
-    return Employee.objects.filter(id=employee_id, is_active=True).first()
+    return active_employee_entry(raw_id)
 
 
-def _send_act_to_client(order_id, entries, user) -> bool:
+def _send_act_to_client(order, user) -> bool:
+    entries = order.entries
     if not entries:
         return False
-    receiving_entry = _find_act_entry(entries, "receiving", "акт приемки")
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
-    if not receiving_entry or not placement_entry:
+    order_id = order.order_id
+    receiving_entry = order.receiving_act
+    if not receiving_entry or not order.placement_act:
         return False
-    if not _placement_closed(entries):
+    if not order.placement_closed:
         return False
-    receiving_payload = receiving_entry.payload or {}
-    if not _act_storekeeper_signed_from_payload(receiving_payload):
+    if not order.storekeeper_signed or not order.manager_signed:
         return False
-    if not _act_manager_signed_from_payload(receiving_payload):
-        return False
-    status_entry = _current_status_entry(entries)
+    status_entry = order.status_entry
     if _is_done_status(status_entry):
         return False
     latest = entries[-1]
@@ -579,7 +499,7 @@ def _send_act_to_client(order_id, entries, user) -> bool:
     payload["act_sent_at"] = timezone.localtime().isoformat()
     if "act_viewed" not in payload:
         payload["act_viewed"] = False
-    log_order_action(
+    entry = log_order_action(
         "status",
         order_id=order_id,
         order_type="receiving",
@@ -588,7 +508,8 @@ def _send_act_to_client(order_id, entries, user) -> bool:
         description="Акт отправлен клиенту",
         payload=payload,
     )
-    log_order_action(
+    order.record(entry)
+    entry = log_order_action(
         "update",
         order_id=order_id,
         order_type="receiving",
@@ -597,6 +518,7 @@ def _send_act_to_client(order_id, entries, user) -> bool:
         description=f"{act_label} отправлен клиенту",
         payload={"message": act_label},
     )
+    order.record(entry)
     Task.objects.filter(
         route=f"/orders/receiving/{order_id}/",
         assigned_to__role="manager",
@@ -615,11 +537,7 @@ def _manager_due_date(submitted_at):
 def _create_manager_task(order_id, agency, request, submitted_at):
     if not agency:
         return
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    manager = first_active_entry("manager")
     if not manager:
         return
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}"
@@ -627,7 +545,7 @@ def _create_manager_task(order_id, agency, request, submitted_at):
         title=f"Подтвердите заявку на приемку товара №{order_id}",
         description=description,
         route=f"/orders/receiving/{order_id}/",
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         created_by=request.user if request.user.is_authenticated else None,
         due_date=_manager_due_date(submitted_at),
     )
@@ -636,11 +554,7 @@ def _create_manager_task(order_id, agency, request, submitted_at):
 def _create_storekeeper_task(order_id, agency, request, submitted_at, observer=None):
     if not agency:
         return
-    storekeeper = (
-        Employee.objects.filter(role="storekeeper", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    storekeeper = first_active_entry("storekeeper")
     if not storekeeper:
         return
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}"
@@ -648,7 +562,7 @@ def _create_storekeeper_task(order_id, agency, request, submitted_at, observer=N
         title=f"Принять заявку на приемку товара №{order_id}",
         description=description,
         route=f"/orders/receiving/{order_id}/",
-        assigned_to=storekeeper,
+        assigned_to_id=storekeeper["id"],
         observer=observer,
         created_by=request.user if request.user.is_authenticated else None,
         due_date=submitted_at + timedelta(days=1),
@@ -658,17 +572,13 @@ def _create_storekeeper_task(order_id, agency, request, submitted_at, observer=N
 def _create_manager_followup_task(order_id, agency, request, submitted_at, observer=None):
     if not agency:
         return
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    manager = first_active_entry("manager")
     if not manager:
         return
     title = f"Проверьте размещение по заявке на приемку товара №{order_id}"
     existing = Task.objects.filter(
         route=f"/orders/receiving/{order_id}/",
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         title=title,
     ).exclude(status="done")
     if existing.exists():
@@ -678,28 +588,28 @@ def _create_manager_followup_task(order_id, agency, request, submitted_at, obser
         title=title,
         description=description,
         route=f"/orders/receiving/{order_id}/",
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         observer=observer,
         created_by=request.user if request.user.is_authenticated else None,
         due_date=_manager_due_date(submitted_at),
     )
 
 
-def _create_manager_sign_task(order_id, agency, request, observer=None):
-    manager = _first_active_employee_by_roles("manager", "head_manager")
+def _create_manager_sign_task(order_id, agency, request, observer_id=None):
+    manager = first_active_entry("manager", "head_manager")
     if not manager:
         return
     route = f"/orders/receiving/{order_id}/act/print/"
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}" if agency else "Клиент: -"
     due_date = timezone.localtime()
     existing = (
-        Task.objects.filter(route=route, assigned_to=manager)
+        Task.objects.filter(route=route, assigned_to_id=manager["id"])
         .exclude(status="done")
         .first()
     )
     if existing:
         existing.description = description
-        existing.observer = observer
+        existing.observer_id = observer_id
         existing.due_date = due_date
         if existing.status == "done":
             existing.status = "in_progress"
@@ -709,8 +619,8 @@ def _create_manager_sign_task(order_id, agency, request, observer=None):
         title=f"Подписать акт приемки по заявке №{order_id}",
         description=description,
         route=route,
-        assigned_to=manager,
-        observer=observer,
+        assigned_to_id=manager["id"],
+        observer_id=observer_id,
         created_by=request.user if request.user.is_authenticated else None,
         due_date=due_date,
         status="in_progress",
@@ -718,7 +628,7 @@ def _create_manager_sign_task(order_id, agency, request, observer=None):
 
 
 def _create_manager_client_response_task(order_id, agency, request, response: str):
-    manager = _first_active_employee_by_roles("manager", "head_manager")
+    manager = first_active_entry("manager", "head_manager")
     if not manager:
         return
     response_label = "подтвердил акт приемки" if response == "confirmed" else "заявил разногласия по акту приемки"
@@ -726,7 +636,7 @@ def _create_manager_client_response_task(order_id, agency, request, response: st
     route = f"/orders/receiving/{order_id}/act/print/"
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}" if agency else "Клиент: -"
     existing = (
-        Task.objects.filter(route=route, assigned_to=manager, title=title)
+        Task.objects.filter(route=route, assigned_to_id=manager["id"], title=title)
         .exclude(status="done")
         .first()
     )
@@ -741,76 +651,11 @@ def _create_manager_client_response_task(order_id, agency, request, response: st
         title=title,
         description=description,
         route=route,
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         created_by=request.user if request.user.is_authenticated else None,
         due_date=timezone.localtime(),
         status="in_progress",
     )
-def _latest_payload_from_entries(entries):
-    fallback_payload = {}
-    ignored_keys = {
-        "comment",
-        "message",
-        "status",
-        "status_label",
-        "submit_action",
-        "flow_state",
-        "flow_boxes",
-        "flow_pallets",
-        "flow_active_box",
-        "flow_active_pallet",
-    }
-    fallback_ignored = {
-        "comment",
-        "message",
-        "flow_state",
-        "flow_boxes",
-        "flow_pallets",
-        "flow_active_box",
-        "flow_active_pallet",
-    }
-    for entry in reversed(entries):
-        payload = entry.payload or {}
-        if not payload:
-            continue
-        if not fallback_payload:
-            fallback_keys = set(payload.keys()) - fallback_ignored
-            if fallback_keys:
-                fallback_payload = payload
-        significant_keys = set(payload.keys()) - ignored_keys
-        if significant_keys:
-            return payload
-    return fallback_payload or (entries[-1].payload or {} if entries else {})
-
-
-
-
-def _flow_state_from_entries(entries):
-    for entry in reversed(entries or []):
-        payload = entry.payload or {}
-        flow_state = payload.get("flow_state")
-        if isinstance(flow_state, dict):
-            return flow_state
-        boxes = payload.get("flow_boxes")
-        pallets = payload.get("flow_pallets")
-        if boxes or pallets:
-            return {
-                "boxes": boxes or [],
-                "pallets": pallets or [],
-                "activeBox": payload.get("flow_active_box") or "",
-                "activePallet": payload.get("flow_active_pallet") or "",
-            }
-    return {}
-
-
-def _flow_closed_from_entries(entries):
-    for entry in reversed(entries or []):
-        payload = entry.payload or {}
-        if payload.get("flow_reopened"):
-            return False
-        if payload.get("flow_closed"):
-            return True
-    return False
 def _client_agency_from_request(request):
     if not request.user.is_authenticated:
         return None
@@ -818,9 +663,7 @@ def _client_agency_from_request(request):
     if is_staff_role(role):
         return None
     client_id = request.GET.get("client") or request.GET.get("agency")
-    if client_id:
-        return Agency.objects.filter(pk=client_id, portal_user=request.user).first()
-    return Agency.objects.filter(portal_user=request.user).first()
+    return get_request_client_agency(request, client_id)
 
 
 _PHONE_DIGITS_RE = re.compile(r"\D+")
@@ -1564,9 +1407,7 @@ def _ensure_act_documents(
 
 
 def _load_order_entries(order_id: str, order_type: str = "receiving"):
-    return list(
-        OrderAuditEntry.objects.filter(order_id=order_id, order_type=order_type).order_by("created_at")
-    )
+    return order_entries(order_id, order_type)
 
 
 def _act_access_allowed(request, entries):
@@ -1579,26 +1420,19 @@ def _act_access_allowed(request, entries):
     return request.user.is_staff or role in {"storekeeper", "manager", "head_manager", "director", "admin"}
 
 
-def _placement_closed(entries) -> bool:
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
-    if not placement_entry:
-        return False
-    state = ((placement_entry.payload or {}).get("act_state") or "closed").lower()
-    return state == "closed"
-
-
 def download_receiving_act_doc(request, order_id: str):
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
         return HttpResponseForbidden("Доступ запрещен")
-    if not _placement_closed(entries):
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/?error=placement_required")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
+    placement_entry = order.placement_act
     act_path, _ = _ensure_act_documents(
         order_id,
         act_entry.agency,
@@ -1609,17 +1443,18 @@ def download_receiving_act_doc(request, order_id: str):
 
 
 def download_receiving_act_mx1(request, order_id: str):
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
         return HttpResponseForbidden("Доступ запрещен")
-    if not _placement_closed(entries):
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/?error=placement_required")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
+    placement_entry = order.placement_act
     _, mx1_path = _ensure_act_documents(
         order_id,
         act_entry.agency,
@@ -1630,16 +1465,17 @@ def download_receiving_act_mx1(request, order_id: str):
 
 
 def print_receiving_act(request, order_id: str):
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
         return HttpResponseForbidden("Доступ запрещен")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
-    if not _placement_closed(entries):
+    placement_entry = order.placement_act
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/?error=placement_required")
     act_payload = act_entry.payload or {}
     placement_payload = placement_entry.payload if placement_entry else None
@@ -1706,8 +1542,8 @@ def print_receiving_act(request, order_id: str):
     total_pallets_label = total_pallets if total_pallets else "-"
     total_mismatch = total_actual - total_planned
 
-    storekeeper_signed = _act_storekeeper_signed_from_payload(act_payload)
-    manager_signed = _act_manager_signed_from_payload(act_payload)
+    storekeeper_signed = act_storekeeper_signed_from_payload(act_payload)
+    manager_signed = act_manager_signed_from_payload(act_payload)
     storekeeper_employee = (
         _signed_employee_from_payload(act_payload, "act_storekeeper_employee_id")
         if storekeeper_signed
@@ -1722,7 +1558,12 @@ def print_receiving_act(request, order_id: str):
     client_agency = _client_agency_from_request(request)
     client_view = bool(client_agency)
     if storekeeper_signed and not manager_signed:
-        _create_manager_sign_task(order_id, agency, request, observer=storekeeper_employee)
+        _create_manager_sign_task(
+            order_id,
+            agency,
+            request,
+            observer_id=storekeeper_employee["id"] if storekeeper_employee else None,
+        )
     can_storekeeper_sign = role == "storekeeper" and not storekeeper_signed and not client_view
     can_manager_sign = (
         role in {"manager", "head_manager", "director", "admin"}
@@ -1738,7 +1579,7 @@ def print_receiving_act(request, order_id: str):
         default_return_url = f"/client/dashboard/?client={client_agency.id}"
     raw_return_url = request.GET.get("return") or request.META.get("HTTP_REFERER")
     return_url = _safe_return_url(request, raw_return_url, request.path) or default_return_url
-    status_entry = _current_status_entry(entries)
+    status_entry = current_status_entry(entries)
     status_payload = status_entry.payload or {} if status_entry else {}
     client_response = (
         status_payload.get("act_client_response")
@@ -1794,8 +1635,8 @@ def print_receiving_act(request, order_id: str):
         "total_mismatch": "" if total_mismatch == 0 else total_mismatch,
         "print_date": timezone.localtime().strftime("%d.%m.%Y %H:%M"),
         "executor_label": _EXECUTOR_LABEL,
-        "manager_facsimile_url": _facsimile_url(manager_employee),
-        "storekeeper_facsimile_url": _facsimile_url(storekeeper_employee),
+        "manager_facsimile_url": manager_employee["facsimile_url"] if manager_employee else "",
+        "storekeeper_facsimile_url": storekeeper_employee["facsimile_url"] if storekeeper_employee else "",
         "storekeeper_signed": storekeeper_signed,
         "manager_signed": manager_signed,
         "can_storekeeper_sign": can_storekeeper_sign,
@@ -1815,7 +1656,8 @@ def print_receiving_act(request, order_id: str):
 def sign_receiving_act_storekeeper(request, order_id: str):
     if request.method != "POST":
         return HttpResponseForbidden("Доступ запрещен")
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
@@ -1823,16 +1665,16 @@ def sign_receiving_act_storekeeper(request, order_id: str):
     role = get_request_role(request)
     if role != "storekeeper":
         return HttpResponseForbidden("Доступ запрещен")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    if not _placement_closed(entries):
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/print/?error=placement_required")
     act_payload = dict(act_entry.payload or {})
-    if _act_storekeeper_signed_from_payload(act_payload):
+    if order.storekeeper_signed:
         return redirect(f"/orders/receiving/{order_id}/act/print/")
-    employee = Employee.objects.filter(user=request.user, role="storekeeper", is_active=True).first()
-    if not employee:
+    employee = get_request_employee(request)
+    if not employee or employee.role != "storekeeper":
         employee = _first_active_employee_by_roles("storekeeper")
     if not employee or not getattr(employee, "facsimile", None):
         return redirect(f"/orders/receiving/{order_id}/act/print/?error=storekeeper_facsimile")
@@ -1857,7 +1699,7 @@ def sign_receiving_act_storekeeper(request, order_id: str):
         order_id,
         act_entry.agency or (entries[-1].agency if entries else None),
         request,
-        observer=employee,
+        observer_id=employee.id,
     )
     return redirect(f"/orders/receiving/{order_id}/act/print/?signed=storekeeper")
 
@@ -1865,7 +1707,8 @@ def sign_receiving_act_storekeeper(request, order_id: str):
 def sign_receiving_act_manager(request, order_id: str):
     if request.method != "POST":
         return HttpResponseForbidden("Доступ запрещен")
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
@@ -1873,17 +1716,17 @@ def sign_receiving_act_manager(request, order_id: str):
     role = get_request_role(request)
     if role not in {"manager", "head_manager", "director", "admin"}:
         return HttpResponseForbidden("Доступ запрещен")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    if not _placement_closed(entries):
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/print/?error=placement_required")
     act_payload = dict(act_entry.payload or {})
-    if not _act_storekeeper_signed_from_payload(act_payload):
+    if not order.storekeeper_signed:
         return redirect(f"/orders/receiving/{order_id}/act/print/?error=storekeeper_required")
-    if _act_manager_signed_from_payload(act_payload):
+    if order.manager_signed:
         return redirect(f"/orders/receiving/{order_id}/act/print/?signed=manager")
-    employee = Employee.objects.filter(user=request.user, is_active=True).first()
+    employee = get_request_employee(request)
     if not employee:
         employee = _first_active_employee_by_roles("manager", "head_manager")
     if not employee or not getattr(employee, "facsimile", None):
@@ -1893,7 +1736,7 @@ def sign_receiving_act_manager(request, order_id: str):
     act_payload["act_manager_employee_id"] = employee.id
     if request.user.is_authenticated:
         act_payload["act_manager_user_id"] = request.user.id
-    log_order_action(
+    entry = log_order_action(
         "status",
         order_id=order_id,
         order_type="receiving",
@@ -1902,8 +1745,8 @@ def sign_receiving_act_manager(request, order_id: str):
         description="Акт приемки подписан менеджером",
         payload=act_payload,
     )
-    entries = _load_order_entries(order_id)
-    sent = _send_act_to_client(order_id, entries, request.user)
+    order.record(entry)
+    sent = _send_act_to_client(order, request.user)
     if not sent:
         return redirect(f"/orders/receiving/{order_id}/act/print/?signed=manager&error=send")
     Task.objects.filter(
@@ -1952,7 +1795,7 @@ def _client_act_access_allowed(request, entries):
         return False
     if not any(entry.agency_id == client_agency.id for entry in entries if entry.agency_id):
         return False
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = find_act_entry(entries, "receiving", "акт приемки")
     return bool(act_entry)
 
 
@@ -1967,7 +1810,7 @@ def confirm_receiving_act_client(request, order_id: str):
     client_agency = _client_agency_from_request(request)
     raw_return_url = request.POST.get("return") or request.GET.get("return")
     return_url = _safe_return_url(request, raw_return_url, request.path)
-    status_entry = _current_status_entry(entries)
+    status_entry = current_status_entry(entries)
     payload = dict(status_entry.payload or {}) if status_entry else {}
     existing_response = (payload.get("act_client_response") or "").lower()
     if existing_response in {"confirmed", "dispute"}:
@@ -2003,7 +1846,7 @@ def dispute_receiving_act_client(request, order_id: str):
     client_agency = _client_agency_from_request(request)
     raw_return_url = request.POST.get("return") or request.GET.get("return")
     return_url = _safe_return_url(request, raw_return_url, request.path)
-    status_entry = _current_status_entry(entries)
+    status_entry = current_status_entry(entries)
     payload = dict(status_entry.payload or {}) if status_entry else {}
     existing_response = (payload.get("act_client_response") or "").lower()
     if existing_response in {"confirmed", "dispute"}:
@@ -2029,16 +1872,17 @@ def dispute_receiving_act_client(request, order_id: str):
 
 
 def print_receiving_act_mx1(request, order_id: str):
-    entries = _load_order_entries(order_id)
+    order = order_aggregate(request, "receiving", order_id)
+    entries = order.entries
     if not entries:
         raise Http404("Заявка не найдена")
     if not _act_access_allowed(request, entries):
         return HttpResponseForbidden("Доступ запрещен")
-    act_entry = _find_act_entry(entries, "receiving", "акт приемки")
+    act_entry = order.receiving_act
     if not act_entry:
         raise Http404("Акт приемки не найден")
-    placement_entry = _find_act_entry(entries, "placement", "акт размещения")
-    if not _placement_closed(entries):
+    placement_entry = order.placement_act
+    if not order.placement_closed:
         return redirect(f"/orders/receiving/{order_id}/act/?error=placement_required")
     act_payload = act_entry.payload or {}
     placement_payload = placement_entry.payload if placement_entry else None
@@ -2097,8 +1941,8 @@ def print_receiving_act_mx1(request, order_id: str):
         total_boxes = len([box for box in boxes_payload if isinstance(box, dict)])
     total_pallets = len([pallet for pallet in pallets_payload if isinstance(pallet, dict)])
 
-    manager_employee = _first_active_employee_by_roles("manager", "head_manager")
-    storekeeper_employee = _first_active_employee_by_roles("storekeeper")
+    manager_entry = first_active_entry("manager", "head_manager")
+    storekeeper_entry = first_active_entry("storekeeper")
 
     items_per_page = 18
     pages = []
@@ -2122,12 +1966,13 @@ def print_receiving_act_mx1(request, order_id: str):
         "total_actual": total_actual,
         "total_boxes": total_boxes if total_boxes else "-",
         "total_pallets": total_pallets if total_pallets else "-",
-        "manager_facsimile_url": _facsimile_url(manager_employee),
-        "storekeeper_facsimile_url": _facsimile_url(storekeeper_employee),
+        "manager_facsimile_url": manager_entry["facsimile_url"] if manager_entry else "",
+        "storekeeper_facsimile_url": storekeeper_entry["facsimile_url"] if storekeeper_entry else "",
     }
     return render(request, "orders/mx1_print.html", ctx)
 
 
+@method_decorator(replica_reads, name="dispatch")
 class OrdersHomeView(RoleRequiredMixin, TemplateView):
     template_name = 'orders/index.html'
     allowed_roles = ("manager", "storekeeper", "head_manager", "director", "admin", "processing_head")
@@ -2304,7 +2149,7 @@ class OrdersHomeView(RoleRequiredMixin, TemplateView):
                 return self.get(request, error="Недостаточно прав для исправления заявки")
         old_payload = {}
         if edit_order_id:
-            old_payload = _latest_payload_from_entries(previous_entries)
+            old_payload = latest_payload_from_entries(previous_entries)
         status_value = "draft" if submit_action == "draft" else "sent_unconfirmed"
         status_label = "Черновик" if status_value == "draft" else "Ждет подтверждения"
         if edit_order_id and old_payload and submit_action != "send":
@@ -2497,7 +2342,7 @@ class OrdersHomeView(RoleRequiredMixin, TemplateView):
             for entry in raw_entries:
                 if entry.order_id not in latest_by_order:
                     latest_by_order[entry.order_id] = entry
-                if entry.order_id not in status_by_order and _is_status_entry(entry):
+                if entry.order_id not in status_by_order and is_status_entry(entry):
                     status_by_order[entry.order_id] = entry
             latest_entries = [
                 status_by_order.get(order_id, latest_entry)
@@ -2558,12 +2403,12 @@ class OrdersHomeView(RoleRequiredMixin, TemplateView):
                     .order_by("created_at")
                 )
                 can_client_edit = client_view and _can_client_edit_draft(entries, client_agency)
-                if _act_storekeeper_signed(entries):
+                if act_storekeeper_signed(entries):
                     ctx["error"] = "Заявка подписана кладовщиком, редактирование запрещено"
                 elif role != "manager" and not can_client_edit:
                     ctx["error"] = "Недостаточно прав для исправления заявки"
                 elif entries:
-                    edit_payload = _latest_payload_from_entries(entries)
+                    edit_payload = latest_payload_from_entries(entries)
                     if not agency:
                         agency = entries[-1].agency
                         ctx["agency"] = agency
@@ -2574,31 +2419,6 @@ class OrdersHomeView(RoleRequiredMixin, TemplateView):
                     ctx["status_label"] = "Черновик" if can_client_edit else "Исправление заявки"
                     ctx["order_number"] = edit_order_id
 
-            sku_options = []
-            if agency:
-                skus = (
-                    SKU.objects.filter(agency=agency, deleted=False)
-                    .prefetch_related("barcodes")
-                    .order_by("sku_code")
-                )
-                for sku in skus:
-                    barcodes = [barcode.value for barcode in sku.barcodes.all()]
-                    size_map = {}
-                    for barcode in sku.barcodes.all():
-                        size_value = (barcode.size or "").strip()
-                        if not size_value:
-                            continue
-                        size_map.setdefault(size_value, []).append(barcode.value)
-                    sku_options.append(
-                        {
-                            "id": sku.id,
-                            "code": sku.sku_code,
-                            "name": sku.name,
-                            "barcodes_joined": "|".join(barcodes),
-                            "sizes_json": json.dumps(size_map, ensure_ascii=True),
-                        }
-                    )
-            ctx["sku_options"] = sku_options
         if active_tab == "packing":
             status = self.request.GET.get("status")
             status_label = "Подготовка заявки"
@@ -2677,9 +2497,7 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
                 route=f"/orders/receiving/{order_id}/",
                 assigned_to__role="manager",
             ).exclude(status="done").update(status="done")
-            observer = Employee.objects.filter(
-                user=request.user, is_active=True
-            ).first()
+            observer = get_request_employee(request)
             _create_storekeeper_task(
                 order_id,
                 latest.agency,
@@ -2691,17 +2509,13 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
             suffix = f"?client={client_param}" if client_param else ""
             return redirect(f"/orders/{self.order_type}/{order_id}/{suffix}")
         if action == "send_act_to_client":
-            entries = list(
-                OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-                .select_related("agency")
-                .order_by("created_at")
-            )
-            if not entries:
+            order = order_aggregate(request, self.order_type, order_id)
+            if not order.entries:
                 return redirect("/orders/")
             role = get_request_role(request)
             if role not in {"manager", "head_manager", "director", "admin"}:
                 return redirect("/orders/")
-            _send_act_to_client(order_id, entries, request.user)
+            _send_act_to_client(order, request.user)
             client_param = request.GET.get("client")
             suffix = f"?client={client_param}" if client_param else ""
             return redirect(f"/orders/{self.order_type}/{order_id}/{suffix}")
@@ -2722,7 +2536,7 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
                     .select_related("agency")
                     .order_by("created_at")
                 )
-                status_entry = _current_status_entry(entries)
+                status_entry = current_status_entry(entries)
                 payload = dict(status_entry.payload or {}) if status_entry else {}
                 existing_type = (payload.get("goods_type") or "").strip().lower()
                 if not existing_type:
@@ -2765,14 +2579,10 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
         order_id = kwargs.get("order_id")
         client_agency = getattr(self.request, "_client_agency", None) or _client_agency_from_request(self.request)
         client_view = bool(client_agency)
-        entries = (
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
-        entries_list = list(entries)
-        latest = entries_list[-1] if entries_list else None
-        status_entry = _current_status_entry(entries_list)
+        aggregate = order_aggregate(self.request, self.order_type, order_id)
+        entries_list = aggregate.entries
+        latest = aggregate.latest
+        status_entry = aggregate.status_entry
         payload = self._payload_from_entries(entries_list)
         ctx["order_id"] = order_id
         ctx["order_type"] = self.order_type
@@ -2812,8 +2622,8 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
         ctx["goods_type_label"] = goods_type_labels.get(goods_type, "")
         can_send_to_warehouse = False
         role = get_request_role(self.request)
-        signed_by_storekeeper = _act_storekeeper_signed(entries_list)
-        signed_by_manager = _act_manager_signed(entries_list)
+        signed_by_storekeeper = aggregate.storekeeper_signed
+        signed_by_manager = aggregate.manager_signed
         can_edit_order = bool(role == "manager" and not client_view)
         if "товар принят" in (status_text or "").lower():
             can_edit_order = False
@@ -2845,8 +2655,8 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
                 can_create_receiving_act = True
         ctx["can_send_to_warehouse"] = can_send_to_warehouse
         ctx["can_create_receiving_act"] = can_create_receiving_act
-        flow_state = _flow_state_from_entries(entries_list)
-        flow_closed = _flow_closed_from_entries(entries_list)
+        flow_state = aggregate.flow_state
+        flow_closed = aggregate.flow_closed
         flow_has_data = bool(flow_state and (flow_state.get("boxes") or flow_state.get("pallets")))
         ctx["can_continue_flow"] = bool(role == "storekeeper" and flow_has_data and not flow_closed)
         ctx["can_open_flow"] = bool(role == "storekeeper" and not client_view)
@@ -2867,7 +2677,7 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
             "driver_phone": payload.get("driver_phone"),
             "comment": payload.get("comment"),
         }
-        act_entry_for_items = _find_act_entry(entries_list, "receiving", "акт приемки")
+        act_entry_for_items = aggregate.receiving_act
         act_items = (act_entry_for_items.payload or {}).get("act_items") if act_entry_for_items else []
         items = payload.get("items") or []
         display_items = []
@@ -2969,8 +2779,8 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
             for entry in reversed(entries_list)
             if entry.action != "comment"
         ]
-        act_entry = _find_act_entry(entries_list, "receiving", "акт приемки")
-        placement_entry = _find_act_entry(entries_list, "placement", "акт размещения")
+        act_entry = aggregate.receiving_act
+        placement_entry = aggregate.placement_act
         ctx["act_entry"] = act_entry
         ctx["placement_act_entry"] = placement_entry
         ctx["has_receiving_act"] = bool(act_entry)
@@ -2993,7 +2803,7 @@ class OrdersDetailView(RoleRequiredMixin, TemplateView):
             and act_entry
             and placement_entry
             and not _is_done_status(status_entry)
-            and _act_manager_signed_from_payload(act_entry.payload or {})
+            and act_manager_signed_from_payload(act_entry.payload or {})
             and not client_view
         )
         return ctx
@@ -3005,11 +2815,7 @@ class PackingDetailView(OrdersDetailView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         order_id = kwargs.get("order_id")
-        entries_list = list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        entries_list = order_aggregate(self.request, self.order_type, order_id).entries
         payload = self._payload_from_entries(entries_list)
         marketplaces = payload.get("marketplaces") or []
         if isinstance(marketplaces, str):
@@ -3086,7 +2892,7 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
                 return HttpResponseForbidden("Доступ запрещен")
             if request.method != "GET":
                 return HttpResponseForbidden("Доступ запрещен")
-            status_entry = _current_status_entry(entries)
+            status_entry = current_status_entry(entries)
             if status_entry:
                 payload = dict(status_entry.payload or {})
                 if payload.get("act_sent") and not payload.get("act_viewed"):
@@ -3109,22 +2915,21 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
             return redirect(_client_print_url(order_id, client_agency, response, return_url))
         return super().dispatch(request, *args, **kwargs)
 
+    def _aggregate(self, order_id):
+        return order_aggregate(self.request, self.order_type, order_id)
+
     def _load_entries(self, order_id):
-        return list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        return self._aggregate(order_id).entries
 
     def _act_entry(self, entries):
-        return _act_entry_from_entries(entries, "receiving")
+        return act_entry_from_entries(entries, "receiving")
 
     def _can_create(self, entries):
         if not entries:
             return False
         if self._act_entry(entries):
             return False
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         status_payload = status_entry.payload or {} if status_entry else {}
         return _warehouse_status_from_entry(status_entry)
 
@@ -3134,7 +2939,7 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
         entries = self._load_entries(order_id)
         if not entries or self._act_entry(entries):
             return
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         if not _warehouse_status_from_entry(status_entry):
             return
         payload = dict(status_entry.payload or {}) if status_entry else {}
@@ -3142,16 +2947,14 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
             return
         payload["status"] = payload.get("status") or "warehouse"
         payload["status_label"] = "Взята в работу"
-        employee = Employee.objects.filter(
-            user=request.user, role="storekeeper", is_active=True
-        ).first()
-        if not employee:
+        employee = get_request_employee(request)
+        if not employee or employee.role != "storekeeper":
             employee = _first_active_employee_by_roles("storekeeper")
         if employee:
             payload["storekeeper_employee_id"] = employee.id
             payload["storekeeper_name"] = employee.full_name or ""
         latest = entries[-1]
-        log_order_action(
+        entry = log_order_action(
             "status",
             order_id=order_id,
             order_type=self.order_type,
@@ -3160,6 +2963,7 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
             description="Заявка взята в работу кладовщиком",
             payload=payload,
         )
+        self._aggregate(order_id).record(entry)
 
     def get(self, request, *args, **kwargs):
         if get_request_role(request) == "storekeeper":
@@ -3179,7 +2983,7 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
             return HttpResponseForbidden("Доступ запрещен")
         if not self._can_create(entries):
             return redirect(f"/orders/receiving/{order_id}/act/?error=1")
-        payload = _latest_payload_from_entries(entries)
+        payload = latest_payload_from_entries(entries)
         items = payload.get("items") or []
         has_planned_items = bool(items)
         actual_raw = request.POST.getlist("actual_qty[]")
@@ -3263,7 +3067,7 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
             )
         if not act_items:
             return redirect(f"/orders/receiving/{order_id}/act/?error=1")
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         latest = entries[-1]
         act_payload = dict((status_entry.payload or {}) if status_entry else {})
         if not act_payload.get("status"):
@@ -3295,25 +3099,24 @@ class ReceivingActView(RoleRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         order_id = kwargs.get("order_id")
-        entries = self._load_entries(order_id)
-        latest = entries[-1] if entries else None
+        aggregate = self._aggregate(order_id)
+        entries = aggregate.entries
+        latest = aggregate.latest
         client_agency = getattr(self.request, "_client_agency", None)
         client_view = bool(client_agency)
-        status_entry = _current_status_entry(entries)
-        payload = _latest_payload_from_entries(entries)
+        status_entry = aggregate.status_entry
+        payload = aggregate.payload
         order_title = _order_title_label(self.order_type, payload)
         items = payload.get("items") or []
-        act_entry = self._act_entry(entries)
+        act_entry = aggregate.act_entry("receiving")
         act_items = (act_entry.payload or {}).get("act_items") if act_entry else []
-        placement_entry = _find_act_entry(entries, "placement", "акт размещения")
-        placement_closed = _placement_closed(entries)
         role = get_request_role(self.request)
         if act_entry:
             act_label = (act_entry.payload or {}).get("act_label") or "Акт приемки"
         else:
             act_label = "Акт приемки"
         act_documents = []
-        flow_closed = _flow_closed_from_entries(entries)
+        flow_closed = aggregate.flow_closed
         if act_entry and flow_closed:
             act_documents = [
                 {
@@ -3505,34 +3308,33 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
     order_type = "receiving"
     allowed_roles = ("storekeeper", "manager", "head_manager", "director", "admin")
 
+    def _aggregate(self, order_id):
+        return order_aggregate(self.request, self.order_type, order_id)
+
     def _load_entries(self, order_id):
-        return list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        return self._aggregate(order_id).entries
 
     def _receiving_act_entry(self, entries):
-        return _act_entry_from_entries(entries, "receiving")
+        return act_entry_from_entries(entries, "receiving")
 
     def _placement_act_entry(self, entries):
-        return _act_entry_from_entries(entries, "placement")
+        return act_entry_from_entries(entries, "placement")
 
     def _can_start(self, entries):
         if not entries:
             return False
-        if _flow_closed_from_entries(entries):
+        if flow_closed_from_entries(entries):
             return False
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         return _warehouse_status_from_entry(status_entry)
 
     def _mark_in_progress(self, request, order_id: str | None):
         if not order_id:
             return
         entries = self._load_entries(order_id)
-        if not entries or _flow_closed_from_entries(entries):
+        if not entries or flow_closed_from_entries(entries):
             return
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         if not _warehouse_status_from_entry(status_entry):
             return
         payload = dict(status_entry.payload or {}) if status_entry else {}
@@ -3540,16 +3342,14 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
             return
         payload["status"] = payload.get("status") or "warehouse"
         payload["status_label"] = "Взята в работу"
-        employee = Employee.objects.filter(
-            user=request.user, role="storekeeper", is_active=True
-        ).first()
-        if not employee:
+        employee = get_request_employee(request)
+        if not employee or employee.role != "storekeeper":
             employee = _first_active_employee_by_roles("storekeeper")
         if employee:
             payload["storekeeper_employee_id"] = employee.id
             payload["storekeeper_name"] = employee.full_name or ""
         latest = entries[-1]
-        log_order_action(
+        entry = log_order_action(
             "status",
             order_id=order_id,
             order_type=self.order_type,
@@ -3558,25 +3358,9 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
             description="Заявка взята в работу кладовщиком",
             payload=payload,
         )
+        self._aggregate(order_id).record(entry)
 
 
-    def _find_flow_state(self, entries):
-        for entry in reversed(entries):
-            payload = entry.payload or {}
-            flow_state = payload.get("flow_state")
-            if isinstance(flow_state, dict):
-                return flow_state
-            boxes = payload.get("flow_boxes")
-            pallets = payload.get("flow_pallets")
-            if boxes or pallets:
-                return {
-                    "boxes": boxes or [],
-                    "pallets": pallets or [],
-                    "activeBox": payload.get("flow_active_box") or "",
-                    "activePallet": payload.get("flow_active_pallet") or "",
-                }
-        return {}
-
     def _normalize_flow_state(self, boxes_data, pallets_data, active_box, active_pallet):
         def normalize_items(raw_items):
             items = []
@@ -3691,7 +3475,7 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
         role = get_request_role(request)
         if role != "storekeeper":
             return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
-        if _flow_closed_from_entries(entries):
+        if flow_closed_from_entries(entries):
             return JsonResponse({"ok": False, "error": "closed"}, status=400)
         if not self._can_start(entries):
             return JsonResponse({"ok": False, "error": "not_allowed"}, status=400)
@@ -3738,7 +3522,7 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
         role = get_request_role(request)
         if role != "storekeeper":
             return HttpResponseForbidden("Доступ запрещен")
-        if not _flow_closed_from_entries(entries):
+        if not flow_closed_from_entries(entries):
             return redirect(f"/orders/receiving/{order_id}/flow/")
         latest = entries[-1] if entries else None
         closed_entry = next(
@@ -3795,12 +3579,12 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
         role = get_request_role(request)
         if role != "storekeeper":
             return HttpResponseForbidden("Доступ запрещен")
-        if _flow_closed_from_entries(entries):
+        if flow_closed_from_entries(entries):
             return redirect(f"/orders/receiving/{order_id}/flow/")
         if not self._can_start(entries):
             return redirect(f"/orders/receiving/{order_id}/flow/?error=1")
 
-        payload = _latest_payload_from_entries(entries)
+        payload = latest_payload_from_entries(entries)
         planned_items = payload.get("items") or []
         plan_map = {}
         for item in planned_items:
@@ -3982,7 +3766,7 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
         if not act_items:
             return redirect(f"/orders/receiving/{order_id}/flow/?error=1")
 
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         latest = entries[-1]
         act_payload = dict((status_entry.payload or {}) if status_entry else {})
         if not act_payload.get("status"):
@@ -4065,7 +3849,7 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
                 route=f"/orders/receiving/{order_id}/",
                 assigned_to__role="storekeeper",
             ).exclude(status="done").update(status="done")
-        observer = Employee.objects.filter(user=request.user, is_active=True).first()
+        observer = get_request_employee(request)
         _create_manager_followup_task(
             order_id,
             latest.agency,
@@ -4078,10 +3862,10 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         order_id = kwargs.get("order_id")
-        entries = self._load_entries(order_id)
-        latest = entries[-1] if entries else None
-        status_entry = _current_status_entry(entries)
-        payload = _latest_payload_from_entries(entries)
+        aggregate = self._aggregate(order_id)
+        latest = aggregate.latest
+        status_entry = aggregate.status_entry
+        payload = aggregate.payload
         items = payload.get("items") or []
         display_items = []
         for item in items:
@@ -4112,36 +3896,18 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
             "no": "Не обработанный",
         }
         barcode_map = {}
-        catalog_items = []
         if latest and latest.agency_id:
-            for sku in SKU.objects.filter(agency_id=latest.agency_id, deleted=False).only(
-                "sku_code",
-                "name",
-                "size",
-            ):
-                catalog_items.append(
-                    {
-                        "sku_code": sku.sku_code,
-                        "name": sku.name,
-                        "size": sku.size,
-                    }
-                )
-            for barcode in (
-                SKUBarcode.objects.select_related("sku")
-                .filter(sku__agency_id=latest.agency_id, sku__deleted=False)
-            ):
-                value = (barcode.value or "").strip()
-                if not value:
-                    continue
-                sku = barcode.sku
-                barcode_map[value] = {
-                    "sku_code": sku.sku_code,
-                    "name": sku.name,
-                    "size": (barcode.size or sku.size or "").strip(),
-                }
-        flow_state = self._find_flow_state(entries)
+            # Остальная номенклатура клиента не встраивается в страницу: сканы и подсказки
+            # разрешаются на сервере (/sku/barcodes/lookup/, /sku/catalog/).
+            planned_codes = {item["sku_code"] for item in display_items if item["sku_code"]}
+            barcode_map = {
+                value: entry
+                for value, entry in barcode_index(latest.agency_id)["barcodes"].items()
+                if entry["sku_code"] in planned_codes
+            }
+        flow_state = aggregate.flow_state
         if not flow_state or not (flow_state.get("boxes") or flow_state.get("pallets")):
-            placement_entry = self._placement_act_entry(entries)
+            placement_entry = aggregate.act_entry("placement")
             if placement_entry:
                 placement_payload = placement_entry.payload or {}
                 placement_boxes = placement_payload.get("act_boxes") or []
@@ -4157,8 +3923,8 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
                         "activeBox": active_box or "",
                         "activePallet": active_pallet or "",
                     }
-        flow_locked = _flow_closed_from_entries(entries)
-        act_entry = self._receiving_act_entry(entries)
+        flow_locked = aggregate.flow_closed
+        act_entry = aggregate.act_entry("receiving")
         act_print_url = ""
         if act_entry and flow_locked:
             act_print_url = (
@@ -4176,7 +3942,7 @@ class ReceivingFlowView(RoleRequiredMixin, TemplateView):
                 "goods_type_label": goods_type_labels.get(goods_type, ""),
                 "items": display_items,
                 "barcode_map": barcode_map,
-                "catalog_items": catalog_items,
+                "agency_id": latest.agency_id if latest else "",
                 "flow_state": flow_state,
                 "flow_locked": flow_locked,
                 "act_print_url": act_print_url,
@@ -4243,18 +4009,17 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
     order_type = "receiving"
     allowed_roles = ("storekeeper", "head_manager", "director", "admin", "manager")
 
+    def _aggregate(self, order_id):
+        return order_aggregate(self.request, self.order_type, order_id)
+
     def _load_entries(self, order_id):
-        return list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        return self._aggregate(order_id).entries
 
     def _receiving_act_entry(self, entries):
-        return _act_entry_from_entries(entries, "receiving")
+        return act_entry_from_entries(entries, "receiving")
 
     def _placement_act_entry(self, entries):
-        return _act_entry_from_entries(entries, "placement")
+        return act_entry_from_entries(entries, "placement")
 
     def _can_create(self, entries):
         if not entries:
@@ -4269,6 +4034,25 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
         ctx = self.get_context_data(ok=ok, error=error, **kwargs)
         return self.render_to_response(ctx)
 
+    def _suggest_locations(self, request, order_id, entries, role):
+        if role != "storekeeper":
+            return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
+        try:
+            boxes_data = json.loads(request.POST.get("boxes_json") or "[]")
+            pallets_data = json.loads(request.POST.get("pallets_json") or "[]")
+        except json.JSONDecodeError:
+            return JsonResponse({"ok": False, "error": "invalid_json"}, status=400)
+        targets = [code for code in request.POST.getlist("targets") if code]
+        suggestions = placement_suggestions(
+            entries[-1].agency,
+            pallets_data if isinstance(pallets_data, list) else [],
+            boxes_data if isinstance(boxes_data, list) else [],
+            targets,
+            exclude_order_id=order_id,
+            reserved=reserved_os_cells(),
+        )
+        return JsonResponse({"ok": True, "suggestions": suggestions})
+
     def post(self, request, *args, **kwargs):
         order_id = kwargs.get("order_id")
         entries = self._load_entries(order_id)
@@ -4278,9 +4062,11 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
             return self._save_flow_draft(request, order_id, entries)
         action = (request.POST.get("action") or "close").lower()
         role = get_request_role(request)
+        if action == "suggest":
+            return self._suggest_locations(request, order_id, entries, role)
         if role != "storekeeper":
             return redirect(f"/orders/receiving/{order_id}/placement/")
-        if action == "open" and _act_storekeeper_signed(entries):
+        if action == "open" and act_storekeeper_signed(entries):
             return redirect(f"/orders/receiving/{order_id}/placement/?error=signed")
         if not self._can_create(entries):
             return redirect(f"/orders/receiving/{order_id}/placement/?error=1")
@@ -4394,18 +4180,15 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
         occupied_cells = set()
         seen_orders = set()
         for entry in (
-            OrderAuditEntry.objects.filter(order_type=self.order_type)
+            OrderAuditEntry.objects.filter(order_type=self.order_type, act="placement")
             .exclude(order_id=order_id)
             .order_by("-created_at")
         ):
             if entry.order_id in seen_orders:
                 continue
-            payload = entry.payload or {}
-            if payload.get("act") != "placement":
-                continue
-            state = (payload.get("act_state") or "closed").lower()
-            if state != "closed":
+            if (entry.act_state or "closed") != "closed":
                 continue
+            payload = entry.payload or {}
             seen_orders.add(entry.order_id)
             for pallet in payload.get("act_pallets") or []:
                 parts = _location_parts((pallet or {}).get("location"), pallet)
@@ -4449,7 +4232,7 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
                 "tier": tier if zone == "OS" else "",
                 "cell": cell if zone == "OS" else "",
             }
-        status_entry = _current_status_entry(entries)
+        status_entry = current_status_entry(entries)
         latest = entries[-1]
         act_payload = dict((status_entry.payload or {}) if status_entry else {})
         if not act_payload.get("status"):
@@ -4480,7 +4263,7 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
                 route=f"/orders/receiving/{order_id}/",
                 assigned_to__role="storekeeper",
             ).exclude(status="done").update(status="done")
-        observer = Employee.objects.filter(user=request.user, is_active=True).first()
+        observer = get_request_employee(request)
         _create_manager_followup_task(
             order_id,
             latest.agency,
@@ -4493,11 +4276,11 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         order_id = kwargs.get("order_id")
-        entries = self._load_entries(order_id)
-        latest = entries[-1] if entries else None
-        status_entry = _current_status_entry(entries)
-        receiving_act = self._receiving_act_entry(entries)
-        placement_act = self._placement_act_entry(entries)
+        aggregate = self._aggregate(order_id)
+        latest = aggregate.latest
+        status_entry = aggregate.status_entry
+        receiving_act = aggregate.act_entry("receiving")
+        placement_act = aggregate.act_entry("placement")
         status_payload = status_entry.payload or {} if status_entry else {}
         receiving_items = (receiving_act.payload or {}).get("act_items") if receiving_act else []
         placement_items = (placement_act.payload or {}).get("act_items") if placement_act else []
@@ -4579,7 +4362,7 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
         act_state = "open"
         if placement_act:
             act_state = (placement_act.payload or {}).get("act_state") or "closed"
-        signed_by_storekeeper = _act_storekeeper_signed(entries)
+        signed_by_storekeeper = aggregate.storekeeper_signed
         can_open_act = can_submit and act_state == "closed" and not signed_by_storekeeper
         boxes_data = (placement_act.payload or {}).get("act_boxes") if placement_act else []
         pallets_data = (placement_act.payload or {}).get("act_pallets") if placement_act else []
@@ -4587,18 +4370,15 @@ class PlacementActView(RoleRequiredMixin, TemplateView):
         occupied_keys = set()
         seen_orders = set()
         for entry in (
-            OrderAuditEntry.objects.filter(order_type=self.order_type)
+            OrderAuditEntry.objects.filter(order_type=self.order_type, act="placement")
             .exclude(order_id=order_id)
             .order_by("-created_at")
         ):
             if entry.order_id in seen_orders:
                 continue
-            payload = entry.payload or {}
-            if payload.get("act") != "placement":
-                continue
-            state = (payload.get("act_state") or "closed").lower()
-            if state != "closed":
+            if (entry.act_state or "closed") != "closed":
                 continue
+            payload = entry.payload or {}
             seen_orders.add(entry.order_id)
             for pallet in payload.get("act_pallets") or []:
                 parts = _location_parts((pallet or {}).get("location"), pallet)
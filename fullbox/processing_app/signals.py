@@ -0,0 +1,24 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from fullbox.events import publish_event
+
+from .models import ProcessingPrintJob
+
+
+@receiver(post_save, sender=ProcessingPrintJob)
+def publish_print_job(sender, instance, **kwargs):
+    publish_event(
+        "print",
+        "print_job",
+        {
+            "id": instance.pk,
+            "status": instance.status,
+            "order_id": instance.order_id,
+            "card_id": instance.card_id,
+            "barcode": instance.barcode,
+            "printer_name": instance.printer_name,
+            "agent": instance.agent,
+            "error": instance.error,
+        },
+    )
@@ -1,3 +1,121 @@
-from django.test import TestCase
+import threading
 
-# Create your tests here.
+from django.db import OperationalError, connection, transaction
+from django.test import SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from fullbox.db_concurrency import configure_sqlite_connection, immediate_atomic, retry_on_lock
+from marking.models import MarkingCode
+from marking.views import _record_scanned_code
+
+from .models import ProcessingPrintJob
+from .views import _claim_next_print_job
+
+
+def _run_parallel(workers: int, target) -> list[Exception]:
+    """Запускает target(index) в нескольких потоках одновременно, возвращает пойманные ошибки."""
+    barrier = threading.Barrier(workers)
+    errors = []
+    lock = threading.Lock()
+
+    def worker(index):
+        try:
+            barrier.wait()
+            target(index)
+        except Exception as exc:
+            with lock:
+                errors.append(exc)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+class RetryOnLockTests(SimpleTestCase):
+    def test_lock_errors_are_retried(self):
+        calls = []
+
+        @retry_on_lock(attempts=3, base_delay_ms=1)
+        def write():
+            calls.append(1)
+            if len(calls) < 3:
+                raise OperationalError("database is locked")
+            return "ok"
+
+        self.assertEqual(write(), "ok")
+        self.assertEqual(len(calls), 3)
+
+    def test_other_errors_are_not_retried(self):
+        calls = []
+
+        @retry_on_lock(attempts=3, base_delay_ms=1)
+        def write():
+            calls.append(1)
+            raise OperationalError("no such table: missing")
+
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+@override_settings(DB_WRITE_RETRIES=20, DB_WRITE_RETRY_DELAY_MS=5)
+class ParallelWritersTests(TransactionTestCase):
+    workers = 8
+
+    def test_new_connections_wait_for_locks(self):
+        with override_settings(SQLITE_BUSY_TIMEOUT_MS=1234):
+            configure_sqlite_connection(sender=None, connection=connection)
+        self.addCleanup(configure_sqlite_connection, sender=None, connection=connection)
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 1234)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_only_write_transactions_begin_immediate(self):
+        with CaptureQueriesContext(connection) as queries:
+            with transaction.atomic():
+                ProcessingPrintJob.objects.count()
+            with immediate_atomic():
+                with immediate_atomic():
+                    ProcessingPrintJob.objects.count()
+        begins = [query["sql"] for query in queries if query["sql"].startswith("BEGIN")]
+        self.assertEqual(begins, ["BEGIN", "BEGIN IMMEDIATE"])
+        self.assertIsNone(connection.transaction_mode)
+
+    def test_each_print_job_is_claimed_once(self):
+        jobs = [ProcessingPrintJob.objects.create(barcode=f"2000{idx}") for idx in range(12)]
+        claimed = []
+        lock = threading.Lock()
+
+        def claim(index):
+            while True:
+                job = _claim_next_print_job(f"agent-{index}")
+                if job is None:
+                    return
+                with lock:
+                    claimed.append(job.pk)
+
+        self.assertEqual(_run_parallel(self.workers, claim), [])
+        self.assertEqual(sorted(claimed), sorted(job.pk for job in jobs))
+        self.assertFalse(ProcessingPrintJob.objects.filter(status=ProcessingPrintJob.STATUS_PENDING).exists())
+
+    def test_parallel_scans_are_all_recorded(self):
+        per_worker = 5
+
+        def scan(index):
+            for number in range(per_worker):
+                _record_scanned_code(
+                    order_id="100",
+                    sku_code="A-1",
+                    code=f"010460{index:02d}{number:04d}",
+                    source="scan",
+                )
+
+        self.assertEqual(_run_parallel(self.workers, scan), [])
+        self.assertEqual(MarkingCode.objects.filter(order_id="100").count(), self.workers * per_worker)
@@ -7,7 +7,6 @@ from urllib.parse import urlparse
 
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db import transaction
 from django.db.models import Count
 from django.shortcuts import redirect
 from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse
@@ -17,25 +16,30 @@ from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import TemplateView
 
 from audit.models import OrderAuditEntry, log_order_action
-from employees.access import RoleRequiredMixin, get_request_role, resolve_cabinet_url, is_staff_role
-from employees.models import Employee
+from employees.access import (
+    RoleRequiredMixin,
+    get_request_client_agency,
+    get_request_role,
+    is_staff_role,
+    resolve_cabinet_url,
+)
+from employees.directory import first_active_entry
+from fullbox.db_concurrency import immediate_atomic, retry_on_lock
 from labels.utils import load_available_printers_data, load_label_settings, save_print_agent_status
 from marking.models import MarkingCode
 from marking.utils import extract_processing_items
+from orders.aggregate import order_aggregate
 from orders.views import OrdersDetailView
-from sku.models import Agency, SKU
-from sklad.models import InventoryState
+from sku.models import Agency
+from sklad.services import (
+    GOODS_TYPE_LABELS,
+    available_stock_items,
+    format_shortfall,
+    reserve_processing_stock,
+)
 from todo.models import Task
 from .models import ProcessingPrintJob
 
-GOODS_TYPE_LABELS = {
-    "op": "Оптовый",
-    "gv": "Готовый",
-    "br": "Брак",
-    "vz": "Возврат",
-    "rh": "Расходный",
-    "no": "Не обработанный",
-}
 
 
 def _format_payload_value(value):
@@ -345,60 +349,6 @@ def _is_draft_payload(payload: dict | None) -> bool:
     return status_value == "draft" or "черновик" in status_label
 
 
-def _normalize_goods_type(value):
-    text = str(value or "").strip()
-    if not text or text == "-":
-        return ""
-    lowered = text.lower()
-    if lowered in GOODS_TYPE_LABELS:
-        return GOODS_TYPE_LABELS[lowered].lower()
-    return lowered
-
-
-def _processing_reserve_maps(
-    agency: Agency | None,
-    exclude_order_id: str | None = None,
-) -> tuple[dict[tuple[str, str, str], int], dict[tuple[str, str], int]]:
-    if not agency:
-        return {}, {}
-    reserves = InventoryState.objects.filter(agency=agency, state="processing")
-    if exclude_order_id:
-        reserves = reserves.exclude(order_type="processing", order_id=str(exclude_order_id))
-    reserve_map: dict[tuple[str, str, str], int] = {}
-    reserve_any: dict[tuple[str, str], int] = {}
-    for entry in reserves:
-        sku = (entry.sku or "").strip()
-        if not sku:
-            continue
-        size = (entry.size or "").strip()
-        goods_key = _normalize_goods_type(entry.goods_type)
-        key = (sku.lower(), size.lower(), goods_key)
-        reserve_map[key] = reserve_map.get(key, 0) + (entry.qty or 0)
-        any_key = (sku.lower(), size.lower())
-        reserve_any[any_key] = reserve_any.get(any_key, 0) + (entry.qty or 0)
-    return reserve_map, reserve_any
-
-
-def _reserved_qty(
-    reserve_map: dict[tuple[str, str, str], int],
-    reserve_any: dict[tuple[str, str], int],
-    sku: str,
-    size: str,
-    goods_type: str | None = None,
-) -> int:
-    sku_key = (sku or "").strip().lower()
-    if not sku_key:
-        return 0
-    size_key = (size or "").strip().lower()
-    goods_key = _normalize_goods_type(goods_type)
-    if not goods_key:
-        return reserve_any.get((sku_key, size_key), 0)
-    return reserve_map.get((sku_key, size_key, goods_key), 0) + reserve_map.get(
-        (sku_key, size_key, ""),
-        0,
-    )
-
-
 def _next_order_number(order_type: str = "receiving") -> str:
     order_ids = (
         OrderAuditEntry.objects.filter(order_type=order_type)
@@ -435,15 +385,11 @@ def _manager_due_date(submitted_at):
 def _create_processing_manager_task(order_id, agency, request, submitted_at):
     if not agency:
         return
-    manager = (
-        Employee.objects.filter(role="manager", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    manager = first_active_entry("manager")
     if not manager:
         return
     route = f"/orders/processing/{order_id}/"
-    existing = Task.objects.filter(route=route, assigned_to=manager).exclude(status="done")
+    existing = Task.objects.filter(route=route, assigned_to_id=manager["id"]).exclude(status="done")
     if existing.exists():
         return
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}"
@@ -451,7 +397,7 @@ def _create_processing_manager_task(order_id, agency, request, submitted_at):
         title=f"Подтвердите заявку на обработку №{order_id}",
         description=description,
         route=route,
-        assigned_to=manager,
+        assigned_to_id=manager["id"],
         created_by=request.user if request.user.is_authenticated else None,
         due_date=_manager_due_date(submitted_at),
     )
@@ -460,15 +406,11 @@ def _create_processing_manager_task(order_id, agency, request, submitted_at):
 def _create_processing_head_task(order_id, agency, request, submitted_at):
     if not agency:
         return
-    head = (
-        Employee.objects.filter(role="processing_head", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    head = first_active_entry("processing_head")
     if not head:
         return
     route = f"/orders/processing/{order_id}/"
-    existing = Task.objects.filter(route=route, assigned_to=head).exclude(status="done")
+    existing = Task.objects.filter(route=route, assigned_to_id=head["id"]).exclude(status="done")
     if existing.exists():
         return
     description = f"Клиент: {agency.agn_name or agency.inn or agency.id}"
@@ -476,7 +418,7 @@ def _create_processing_head_task(order_id, agency, request, submitted_at):
         title=f"Заявка на обработку №{order_id}",
         description=description,
         route=route,
-        assigned_to=head,
+        assigned_to_id=head["id"],
         created_by=request.user if request.user.is_authenticated else None,
         due_date=submitted_at or timezone.localtime(),
     )
@@ -489,212 +431,14 @@ def _client_agency_from_request(request):
     if is_staff_role(role):
         return None
     client_id = request.GET.get("client") or request.GET.get("agency")
-    if client_id:
-        return Agency.objects.filter(pk=client_id, portal_user=request.user).first()
-    return Agency.objects.filter(portal_user=request.user).first()
-
-
-def _barcode_value_for_sku(sku, size: str | None) -> str:
-    if not sku:
-        return "-"
-    barcodes = list(getattr(sku, "barcodes", []).all())
-    if not barcodes:
-        return "-"
-    size_value = (size or "").strip()
-    if size_value:
-        for barcode in barcodes:
-            if (barcode.size or "").strip() == size_value:
-                return barcode.value
-    primary = next((barcode for barcode in barcodes if barcode.is_primary), None)
-    return primary.value if primary else barcodes[0].value
+    return get_request_client_agency(request, client_id)
 
 
 def _inventory_items_for_agency(
     agency: Agency | None,
     exclude_order_id: str | None = None,
 ) -> list[dict]:
-    if not agency:
-        return []
-    order_ids = list(
-        OrderAuditEntry.objects.filter(order_type="receiving", agency=agency)
-        .values_list("order_id", flat=True)
-        .distinct()
-    )
-    if not order_ids:
-        return []
-    entries = list(
-        OrderAuditEntry.objects.filter(order_type="receiving", order_id__in=order_ids)
-        .select_related("agency")
-        .order_by("-created_at")
-    )
-    goods_type_labels = GOODS_TYPE_LABELS
-    goods_type_by_order = {}
-    for entry in entries:
-        if entry.order_id in goods_type_by_order:
-            continue
-        payload = entry.payload or {}
-        goods_type = (payload.get("goods_type") or "").strip().lower()
-        goods_label = (payload.get("goods_type_label") or "").strip()
-        if not goods_label and goods_type in goods_type_labels:
-            goods_label = goods_type_labels[goods_type]
-        if goods_label or goods_type:
-            goods_type_by_order[entry.order_id] = goods_label or goods_type
-    latest_by_order = {}
-    blocked_orders = set()
-    for entry in entries:
-        if entry.order_id in latest_by_order or entry.order_id in blocked_orders:
-            continue
-        payload = entry.payload or {}
-        if payload.get("act") != "placement":
-            continue
-        state = (payload.get("act_state") or "closed").lower()
-        if state != "closed":
-            blocked_orders.add(entry.order_id)
-            continue
-        latest_by_order[entry.order_id] = entry
-
-    totals = {}
-
-    def add_item(item, goods_label: str):
-        sku = (item.get("sku") or item.get("sku_code") or "").strip()
-        name = (item.get("name") or "").strip()
-        size = (item.get("size") or "").strip()
-        qty = _parse_qty_value(item.get("qty"))
-        if qty is None:
-            qty = _parse_qty_value(item.get("actual_qty")) or 0
-        if not any((sku, name, size)):
-            return
-        goods_label = goods_label or "-"
-        key = (sku, name, size, goods_label)
-        entry = totals.setdefault(
-            key,
-            {"sku": sku, "name": name, "size": size, "qty": 0, "goods_type": goods_label},
-        )
-        entry["qty"] += qty
-
-    for entry in latest_by_order.values():
-        payload = entry.payload or {}
-        goods_label = goods_type_by_order.get(entry.order_id, "-")
-        boxes = payload.get("act_boxes") or []
-        pallets = payload.get("act_pallets") or []
-        for box in boxes:
-            for item in (box or {}).get("items") or []:
-                add_item(item, goods_label)
-        for pallet in pallets:
-            for item in (pallet or {}).get("items") or []:
-                add_item(item, goods_label)
-        if not boxes and not pallets:
-            for item in payload.get("act_items") or []:
-                add_item(item, goods_label)
-
-    sku_codes = {item["sku"] for item in totals.values() if item.get("sku")}
-    sku_map = {}
-    if sku_codes:
-        for sku in (
-            SKU.objects.filter(agency=agency, deleted=False, sku_code__in=sku_codes)
-            .prefetch_related("barcodes", "photos")
-        ):
-            sku_map[sku.sku_code] = sku
-
-    def normalize_photo_url(url: str) -> str:
-        if not url:
-            return ""
-        if url.startswith(("http://", "https://", "/")):
-            return url
-        return f"/{url}"
-
-    def sku_photo_url(sku_obj: SKU | None) -> str:
-        if not sku_obj:
-            return ""
-        url = (sku_obj.img or "").strip()
-        if url:
-            return normalize_photo_url(url)
-        photos = list(getattr(sku_obj, "photos", []).all())
-        if photos:
-            url = (photos[0].url or "").strip()
-            return normalize_photo_url(url)
-        return ""
-
-    reserve_map, reserve_any = _processing_reserve_maps(agency, exclude_order_id=exclude_order_id)
-    items = []
-    for item in totals.values():
-        sku_obj = sku_map.get(item.get("sku"))
-        barcode = _barcode_value_for_sku(sku_obj, item.get("size")) if sku_obj else "-"
-        photo_url = sku_photo_url(sku_obj)
-        reserved_qty = _reserved_qty(
-            reserve_map,
-            reserve_any,
-            item.get("sku") or "",
-            item.get("size") or "",
-            item.get("goods_type") or "",
-        )
-        available_qty = max((item.get("qty") or 0) - reserved_qty, 0)
-        if available_qty <= 0:
-            continue
-        items.append(
-            {
-                "sku": item.get("sku") or "",
-                "name": item.get("name") or "",
-                "size": item.get("size") or "",
-                "barcode": barcode or "-",
-                "qty": available_qty,
-                "goods_type": item.get("goods_type") or "-",
-                "photo": photo_url,
-            }
-        )
-    items.sort(
-        key=lambda row: (
-            row.get("name") or "",
-            row.get("goods_type") or "",
-            row.get("size") or "",
-            row.get("sku") or "",
-        )
-    )
-    return items
-
-
-def _replace_processing_reserves(order_id: str, agency: Agency, stock_rows: list[dict]):
-    if not order_id or not agency:
-        return
-    InventoryState.objects.filter(
-        agency=agency,
-        order_type="processing",
-        order_id=str(order_id),
-        state="processing",
-    ).delete()
-    reserves: dict[tuple[str, str, str, str], int] = {}
-    for row in stock_rows or []:
-        if not isinstance(row, dict):
-            continue
-        sku = (row.get("article") or row.get("sku") or "").strip()
-        if not sku:
-            continue
-        qty_value = _parse_qty_value(row.get("qty"))
-        if qty_value is None or qty_value <= 0:
-            continue
-        size = (row.get("size") or "").strip()
-        barcode = (row.get("barcode") or "").strip()
-        goods_type = (row.get("goods_type") or "").strip()
-        key = (sku, size, barcode, goods_type)
-        reserves[key] = reserves.get(key, 0) + qty_value
-    if not reserves:
-        return
-    InventoryState.objects.bulk_create(
-        [
-            InventoryState(
-                agency=agency,
-                order_type="processing",
-                order_id=str(order_id),
-                sku=sku,
-                size=size,
-                barcode=barcode,
-                goods_type=goods_type,
-                qty=qty,
-                state="processing",
-            )
-            for (sku, size, barcode, goods_type), qty in reserves.items()
-        ]
-    )
+    return available_stock_items(agency, exclude_order_id=exclude_order_id)
 
 
 def _submit_processing(request):
@@ -891,43 +635,6 @@ def _submit_processing(request):
             "storage_zone": request.POST.getlist("unboxing_storage_zone[]"),
         }
     )
-    if not is_draft and stock_rows:
-        available_map = {}
-        barcode_map = {}
-        for item in _inventory_items_for_agency(agency, exclude_order_id=edit_order_id or None):
-            sku_key = (item.get("sku") or "").strip().lower()
-            size_key = (item.get("size") or "").strip().lower()
-            qty_value = _parse_qty_value(item.get("qty")) or 0
-            if sku_key:
-                key = (sku_key, size_key)
-                available_map[key] = available_map.get(key, 0) + qty_value
-            barcode_value = (item.get("barcode") or "").strip()
-            if barcode_value:
-                barcode_map[barcode_value] = barcode_map.get(barcode_value, 0) + qty_value
-        for row in stock_rows:
-            qty_value = _parse_qty_value(row.get("qty"))
-            if qty_value is None:
-                continue
-            sku_key = (row.get("article") or "").strip().lower()
-            size_key = (row.get("size") or "").strip().lower()
-            barcode_value = (row.get("barcode") or "").strip()
-            max_qty = None
-            if sku_key:
-                max_qty = available_map.get((sku_key, size_key))
-            if max_qty is None and barcode_value:
-                max_qty = barcode_map.get(barcode_value)
-            if max_qty is None:
-                max_qty = 0
-            if qty_value > max_qty:
-                sku_label = row.get("article") or "-"
-                size_label = row.get("size") or "-"
-                return ProcessingHomeView().get(
-                    request,
-                    error=(
-                        f"Количество для {sku_label} ({size_label}) превышает остаток: {max_qty}."
-                    ),
-                )
-
     primary_article = (request.POST.get("article") or "").strip()
     primary_photo_url = (request.POST.get("product_photo_url") or "").strip()
     if cards_payload:
@@ -1067,17 +774,34 @@ def _submit_processing(request):
         order_id = _next_order_number(order_type="processing")
         action = "create"
         description = f"Заявка на обработку №{order_id}"
-    log_order_action(
-        action,
-        order_id=order_id,
-        order_type="processing",
-        user=request.user if request.user.is_authenticated else None,
-        agency=agency,
-        description=description,
-        payload=payload,
-    )
-    if not is_draft:
-        _replace_processing_reserves(order_id, agency, stock_rows)
+
+    @retry_on_lock
+    def save_order() -> list[dict]:
+        with immediate_atomic():
+            if not is_draft:
+                shortfall = reserve_processing_stock(order_id, agency, stock_rows)
+                if shortfall:
+                    return shortfall
+            log_order_action(
+                action,
+                order_id=order_id,
+                order_type="processing",
+                user=request.user if request.user.is_authenticated else None,
+                agency=agency,
+                description=description,
+                payload=payload,
+            )
+        return []
+
+    shortfall = save_order()
+    if shortfall:
+        message = format_shortfall(shortfall)
+        if autosave:
+            return JsonResponse(
+                {"ok": False, "error": message, "shortfall": shortfall},
+                status=409,
+            )
+        return ProcessingHomeView().get(request, error=message)
     if not is_draft and draft_order_id and not edit_order_id:
         OrderAuditEntry.objects.filter(
             order_id=draft_order_id,
@@ -1851,11 +1575,7 @@ class ProcessingDetailView(OrdersDetailView):
         if client_agency:
             request._client_agency = client_agency
         if order_id and not client_agency:
-            latest_entry = (
-                OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-                .order_by("-created_at")
-                .first()
-            )
+            latest_entry = order_aggregate(request, self.order_type, order_id).latest
             if latest_entry and _is_draft_payload(latest_entry.payload or {}):
                 return HttpResponseForbidden("Доступ запрещен")
         return super().dispatch(request, *args, **kwargs)
@@ -1863,11 +1583,7 @@ class ProcessingDetailView(OrdersDetailView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         order_id = kwargs.get("order_id")
-        entries_list = list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type=self.order_type)
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        entries_list = order_aggregate(self.request, self.order_type, order_id).entries
         payload = self._payload_from_entries(entries_list)
         stock_rows_raw = payload.get("stock_rows") or []
         size_rows_raw = payload.get("size_rows") or []
@@ -2209,14 +1925,10 @@ def enqueue_processing_print_job(request):
     return JsonResponse({"ok": True, "job_id": job.id})
 
 
-@require_GET
-def processing_print_jobs_next(request):
-    ok, response = _check_print_agent_token(request)
-    if not ok:
-        return response
-    agent_name = (request.GET.get("agent") or request.headers.get("X-Print-Agent") or "").strip()
-    save_print_agent_status(agent_name)
-    with transaction.atomic():
+@retry_on_lock
+def _claim_next_print_job(agent_name: str) -> ProcessingPrintJob | None:
+    """Забирает самое старое задание печати; каждое задание достается ровно одному агенту."""
+    with immediate_atomic():
         job = (
             ProcessingPrintJob.objects.select_for_update()
             .filter(status=ProcessingPrintJob.STATUS_PENDING)
@@ -2224,11 +1936,24 @@ def processing_print_jobs_next(request):
             .first()
         )
         if not job:
-            return JsonResponse({"ok": True, "has_job": False})
+            return None
         job.status = ProcessingPrintJob.STATUS_PRINTING
         if agent_name:
             job.agent = agent_name
         job.save(update_fields=["status", "agent", "updated_at"])
+    return job
+
+
+@require_GET
+def processing_print_jobs_next(request):
+    ok, response = _check_print_agent_token(request)
+    if not ok:
+        return response
+    agent_name = (request.GET.get("agent") or request.headers.get("X-Print-Agent") or "").strip()
+    save_print_agent_status(agent_name)
+    job = _claim_next_print_job(agent_name)
+    if not job:
+        return JsonResponse({"ok": True, "has_job": False})
     return JsonResponse({"ok": True, "has_job": True, "job": _serialize_print_job(job)})
 
 
@@ -0,0 +1,51 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from reachtruck.routing import fifo_routes, plan_routes, routes_summary
+from sklad.dataset import _random_location
+
+
+class Command(BaseCommand):
+    help = "Compare reach truck travel for synthetic move queues: created order vs. planned routes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--moves", type=int, default=200, help="Moves per queue.")
+        parser.add_argument("--drivers", type=int, default=3)
+        parser.add_argument("--queues", type=int, default=5, help="Number of random queues to average over.")
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options["moves"] <= 0 or options["drivers"] <= 0 or options["queues"] <= 0:
+            raise CommandError("Moves, drivers and queues must be positive.")
+        rng = random.Random(options["seed"])
+        header = f"{'queue':<7}{'fifo m':>10}{'fifo m/pal':>12}{'plan m':>10}{'plan m/pal':>12}{'saved':>8}{'plan ms':>9}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        totals = {"fifo": 0.0, "plan": 0.0, "pallets": 0}
+        for number in range(1, options["queues"] + 1):
+            moves = [
+                {"order_id": str(idx), "from_location": _random_location(rng), "to_location": _random_location(rng)}
+                for idx in range(options["moves"])
+            ]
+            drivers = {driver: {"start": {"zone": "PR"}, "claimed": []} for driver in range(options["drivers"])}
+            fifo = routes_summary(fifo_routes(moves, drivers), drivers)
+            started = time.perf_counter()
+            planned_routes = plan_routes(moves, drivers)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            planned = routes_summary(planned_routes, drivers)
+            totals["fifo"] += fifo["total_m"]
+            totals["plan"] += planned["total_m"]
+            totals["pallets"] += planned["pallets"]
+            saved = 1 - planned["total_m"] / fifo["total_m"] if fifo["total_m"] else 0
+            self.stdout.write(
+                f"{number:<7}{fifo['total_m']:>10.0f}{fifo['meters_per_pallet']:>12.1f}"
+                f"{planned['total_m']:>10.0f}{planned['meters_per_pallet']:>12.1f}{saved:>8.1%}{elapsed_ms:>9.1f}"
+            )
+        fifo_per_pallet = totals["fifo"] / totals["pallets"]
+        plan_per_pallet = totals["plan"] / totals["pallets"]
+        self.stdout.write(
+            f"Average: {fifo_per_pallet:.1f} -> {plan_per_pallet:.1f} m per pallet "
+            f"({1 - plan_per_pallet / fifo_per_pallet:.1%} less travel)"
+        )
@@ -0,0 +1,39 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('employees', '0005_alter_employee_role'),
+        ('sku', '0008_agency_user'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMove',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=64, unique=True)),
+                ('status', models.CharField(choices=[('created', 'Ожидает перевозки'), ('in_progress', 'В работе'), ('done', 'Перемещено')], default='created', max_length=20)),
+                ('status_label', models.CharField(blank=True, max_length=128)),
+                ('pallet_code', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('receiving_order_id', models.CharField(blank=True, max_length=64)),
+                ('from_location', models.JSONField(blank=True, default=dict)),
+                ('to_location', models.JSONField(blank=True, default=dict)),
+                ('assigned_to_name', models.CharField(blank=True, max_length=255)),
+                ('requested_by_name', models.CharField(blank=True, max_length=255)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('taken_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('agency', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_moves', to='sku.agency')),
+                ('assigned_to', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='stock_moves', to='employees.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'assigned_to'], name='reachtruck__status_8a8e0e_idx'), models.Index(fields=['status', '-updated_at'], name='reachtruck__status_48fccf_idx')],
+            },
+        ),
+    ]
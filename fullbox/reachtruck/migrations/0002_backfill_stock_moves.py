@@ -0,0 +1,79 @@
+from django.db import migrations
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+# Логика заморожена на момент миграции: reachtruck.services меняется вместе с моделью.
+STATUSES = ("created", "in_progress", "done")
+
+
+def _parse_id(value):
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_moment(value):
+    if not value:
+        return None
+    moment = parse_datetime(str(value))
+    if moment and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def backfill(apps, schema_editor):
+    OrderAuditEntry = apps.get_model("audit", "OrderAuditEntry")
+    StockMove = apps.get_model("reachtruck", "StockMove")
+    Employee = apps.get_model("employees", "Employee")
+    employee_ids = set(Employee.objects.values_list("pk", flat=True))
+    first_seen = {}
+    latest = {}
+    entries = (
+        OrderAuditEntry.objects.filter(order_type="stock_move")
+        .only("order_id", "agency_id", "payload", "created_at")
+        .order_by("order_id", "created_at", "pk")
+    )
+    for entry in entries.iterator(chunk_size=2000):
+        first_seen.setdefault(entry.order_id, entry.created_at)
+        latest[entry.order_id] = entry
+    StockMove.objects.all().delete()
+    moves = []
+    for order_id, entry in latest.items():
+        payload = entry.payload or {}
+        status = (payload.get("status") or payload.get("submit_action") or "").strip().lower()
+        if status not in STATUSES:
+            status = "created"
+        assigned_to_id = _parse_id(payload.get("assigned_to_id"))
+        moves.append(
+            StockMove(
+                order_id=order_id,
+                agency_id=entry.agency_id,
+                status=status,
+                status_label=(payload.get("status_label") or "").strip(),
+                pallet_code=(payload.get("pallet_code") or "").strip(),
+                receiving_order_id=str(payload.get("receiving_order_id") or ""),
+                from_location=payload.get("from_location") or {},
+                to_location=payload.get("to_location") or {},
+                assigned_to_id=assigned_to_id if assigned_to_id in employee_ids else None,
+                assigned_to_name=payload.get("assigned_to_name") or "",
+                requested_by_name=payload.get("requested_by_name") or "",
+                created_at=first_seen[order_id],
+                updated_at=entry.created_at,
+                taken_at=_parse_moment(payload.get("taken_at")),
+                completed_at=_parse_moment(payload.get("completed_at")),
+            )
+        )
+    StockMove.objects.bulk_create(moves, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reachtruck", "0001_initial"),
+        ("audit", "0009_orderauditentry_packed_payload"),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
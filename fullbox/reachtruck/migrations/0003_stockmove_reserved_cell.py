@@ -0,0 +1,49 @@
+from django.db import migrations, models
+
+
+# Логика заморожена на момент миграции: reachtruck.services меняется вместе с моделью.
+ACTIVE_STATUSES = ("created", "in_progress")
+
+
+def _reserved_cell_key(location):
+    location = location or {}
+    if str(location.get("zone") or "").strip().upper() != "OS":
+        return ""
+    parts = []
+    for key in ("row", "section", "tier", "cell"):
+        try:
+            parts.append(int(location.get(key)) if location.get(key) else None)
+        except (TypeError, ValueError):
+            parts.append(None)
+    return "-".join(str(part) for part in parts) if all(parts) else ""
+
+
+def fill_reserved_cells(apps, schema_editor):
+    StockMove = apps.get_model("reachtruck", "StockMove")
+    reserved = set()
+    for move in StockMove.objects.filter(status__in=ACTIVE_STATUSES).order_by("created_at", "pk"):
+        key = _reserved_cell_key(move.to_location)
+        if key and key not in reserved:
+            reserved.add(key)
+            move.reserved_cell = key
+            move.save(update_fields=["reserved_cell"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reachtruck', '0002_backfill_stock_moves'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockmove',
+            name='reserved_cell',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+        migrations.RunPython(fill_reserved_cells, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='stockmove',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['created', 'in_progress']), models.Q(('reserved_cell', ''), _negated=True)), fields=('reserved_cell',), name='reachtruck_stockmove_unique_reserved_cell'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import models
+
+from employees.models import Employee
+from sku.models import Agency
+
+
+class StockMove(models.Model):
+    """
+    Текущее состояние задания на перемещение паллеты. История остается в журнале заявок
+    (order_type="stock_move"); строка обновляется в той же транзакции, что и запись журнала.
+    """
+
+    STATUS_CREATED = "created"
+    STATUS_IN_PROGRESS = "in_progress"
+    STATUS_DONE = "done"
+    STATUS_CHOICES = [
+        (STATUS_CREATED, "Ожидает перевозки"),
+        (STATUS_IN_PROGRESS, "В работе"),
+        (STATUS_DONE, "Перемещено"),
+    ]
+
+    order_id = models.CharField(max_length=64, unique=True)
+    agency = models.ForeignKey(Agency, on_delete=models.SET_NULL, null=True, blank=True, related_name="stock_moves")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_CREATED)
+    status_label = models.CharField(max_length=128, blank=True)
+    pallet_code = models.CharField(max_length=64, blank=True, db_index=True)
+    receiving_order_id = models.CharField(max_length=64, blank=True)
+    from_location = models.JSONField(default=dict, blank=True)
+    to_location = models.JSONField(default=dict, blank=True)
+    # Ячейка OS, зарезервированная под паллету до завершения задания ("ряд-секция-ярус-ячейка").
+    reserved_cell = models.CharField(max_length=32, blank=True)
+    assigned_to = models.ForeignKey(
+        Employee,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="stock_moves",
+    )
+    assigned_to_name = models.CharField(max_length=255, blank=True)
+    requested_by_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    taken_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "assigned_to"]),
+            models.Index(fields=["status", "-updated_at"]),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["reserved_cell"],
+                condition=models.Q(status__in=["created", "in_progress"]) & ~models.Q(reserved_cell=""),
+                name="reachtruck_stockmove_unique_reserved_cell",
+            ),
+        ]
+
+    def __str__(self) -> str:
+        return f"Перемещение №{self.order_id} ({self.pallet_code})"
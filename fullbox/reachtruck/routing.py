@@ -0,0 +1,229 @@
+"""
+Планирование маршрутов ричтраков.
+
+Модель склада: ряды OS стоят параллельно, между ними узкие проходы, у торцов рядов —
+общий поперечный проезд (y = 0). Секции идут вдоль прохода вглубь склада. PR и OTG —
+площадки перед поперечным проездом, MR — напольное хранение в начале междурядий.
+Переезд между разными проходами идет через поперечный проезд, внутри одного прохода — по прямой.
+Подъем на ярус от порядка заданий не зависит, поэтому в расстояние не входит.
+"""
+
+import heapq
+
+from stockmap.views import _OS_CELLS_PER_TIER, _OS_ROW_SECTIONS
+
+SECTION_LENGTH_M = 2.8
+ROW_PITCH_M = 4.5
+FRONT_ZONE_DEPTH_M = 6.0
+TWO_OPT_MAX_PASSES = 50
+
+_LAST_ROW = max(_OS_ROW_SECTIONS)
+_ZONE_POINTS = {
+    "PR": (0.0, -FRONT_ZONE_DEPTH_M, None),
+    "OTG": ((_LAST_ROW + 1) * ROW_PITCH_M, -FRONT_ZONE_DEPTH_M, None),
+}
+
+
+def _int_value(raw) -> int:
+    try:
+        return int(str(raw).strip())
+    except (TypeError, ValueError):
+        return 0
+
+
+def location_point(location: dict | None) -> tuple[float, float, int | None]:
+    """Координаты места хранения (x, y, номер прохода или None вне проходов)."""
+    location = location or {}
+    zone = str(location.get("zone") or "").strip().upper()
+    row = _int_value(location.get("row"))
+    if zone == "OS" and row in _OS_ROW_SECTIONS:
+        section = min(max(_int_value(location.get("section")), 1), _OS_ROW_SECTIONS[row])
+        cell = min(max(_int_value(location.get("cell")), 1), _OS_CELLS_PER_TIER)
+        y = (section - 1 + (cell - 0.5) / _OS_CELLS_PER_TIER) * SECTION_LENGTH_M
+        return row * ROW_PITCH_M, y, row
+    if zone == "MR" and row:
+        # Ряд MR n — напольная площадка между рядами OS 2n и 2n+1.
+        return (2 * row + 0.5) * ROW_PITCH_M, 0.0, None
+    return _ZONE_POINTS.get(zone, _ZONE_POINTS["PR"])
+
+
+def travel_distance(start, end) -> float:
+    """Метры между двумя точками location_point."""
+    x1, y1, aisle1 = start
+    x2, y2, aisle2 = end
+    if aisle1 is not None and aisle1 == aisle2:
+        return abs(y1 - y2)
+    return abs(y1) + abs(x1 - x2) + abs(y2)
+
+
+def _prepare(moves: list[dict]) -> tuple[list, list, list[float]]:
+    pickups = [location_point(move.get("from_location")) for move in moves]
+    drops = [location_point(move.get("to_location")) for move in moves]
+    loaded = [travel_distance(pickup, drop) for pickup, drop in zip(pickups, drops)]
+    return pickups, drops, loaded
+
+
+def route_legs(moves: list[dict], start: dict | None = None) -> list[dict]:
+    """Метры по шагам маршрута: подъезд к паллете и переезд с грузом."""
+    pickups, drops, loaded = _prepare(moves)
+    position = location_point(start)
+    legs = []
+    for pickup, drop, loaded_m in zip(pickups, drops, loaded):
+        legs.append({"empty_m": travel_distance(position, pickup), "loaded_m": loaded_m})
+        position = drop
+    return legs
+
+
+def route_length(moves: list[dict], start: dict | None = None) -> dict:
+    """Пробег по маршруту: порожний (подъезд к паллетам) и с грузом."""
+    legs = route_legs(moves, start)
+    empty = sum(leg["empty_m"] for leg in legs)
+    loaded = sum(leg["loaded_m"] for leg in legs)
+    return {"empty_m": empty, "loaded_m": loaded, "total_m": empty + loaded}
+
+
+def _two_opt(order: list[int], start, pickups, drops, pinned: int = 0) -> list[int]:
+    """
+    2-opt для направленных заданий: разворот отрезка меняет порядок заданий, но не их
+    направление, поэтому стоимость отрезка считается по префиксным суммам прямых и обратных переездов.
+    Первые pinned заданий (уже взятые водителем) остаются на месте.
+    """
+    size = len(order)
+    if size - pinned < 2:
+        return order
+
+    def prefix_sums():
+        forward = [0.0]
+        backward = [0.0]
+        for k in range(size - 1):
+            forward.append(forward[-1] + travel_distance(drops[order[k]], pickups[order[k + 1]]))
+            backward.append(backward[-1] + travel_distance(drops[order[k + 1]], pickups[order[k]]))
+        return forward, backward
+
+    for _ in range(TWO_OPT_MAX_PASSES):
+        forward, backward = prefix_sums()
+        improved = False
+        for i in range(pinned, size - 1):
+            before = start if i == 0 else drops[order[i - 1]]
+            for j in range(i + 1, size):
+                old = travel_distance(before, pickups[order[i]]) + forward[j] - forward[i]
+                new = travel_distance(before, pickups[order[j]]) + backward[j] - backward[i]
+                if j + 1 < size:
+                    following = pickups[order[j + 1]]
+                    old += travel_distance(drops[order[j]], following)
+                    new += travel_distance(drops[order[i]], following)
+                if new < old - 1e-9:
+                    order[i : j + 1] = order[i : j + 1][::-1]
+                    forward, backward = prefix_sums()
+                    improved = True
+        if not improved:
+            break
+    return order
+
+
+def _nearest_order(indexes: list[int], start, pickups, drops) -> list[int]:
+    remaining = set(indexes)
+    position = start
+    order = []
+    while remaining:
+        index = min(remaining, key=lambda candidate: (travel_distance(position, pickups[candidate]), candidate))
+        remaining.discard(index)
+        order.append(index)
+        position = drops[index]
+    return order
+
+
+def plan_routes(moves: list[dict], drivers: dict) -> dict:
+    """
+    Распределяет свободные задания между водителями и упорядочивает маршрут каждого.
+    drivers: {ид водителя: {"start": место, "claimed": [взятые задания]}}.
+    Сначала водитель довозит взятые задания, затем свободные раздаются ближайшим соседом:
+    очередное задание получает водитель с наименьшим пробегом. Затем маршрут каждого
+    улучшается 2-opt. Возвращает {ид водителя: список заданий по порядку}.
+    """
+    if not drivers:
+        return {}
+    claimed_moves = [move for info in drivers.values() for move in info.get("claimed") or []]
+    all_moves = claimed_moves + list(moves)
+    pickups, drops, loaded = _prepare(all_moves)
+    starts = {driver_id: location_point(info.get("start")) for driver_id, info in drivers.items()}
+    routes = {}
+    positions = {}
+    distance = {}
+    offset = 0
+    for driver_id, info in drivers.items():
+        count = len(info.get("claimed") or [])
+        route = list(range(offset, offset + count))
+        offset += count
+        route = _nearest_order(route, starts[driver_id], pickups, drops)
+        routes[driver_id] = route
+        position = starts[driver_id]
+        total = 0.0
+        for index in route:
+            total += travel_distance(position, pickups[index]) + loaded[index]
+            position = drops[index]
+        positions[driver_id] = position
+        distance[driver_id] = total
+
+    free = set(range(offset, len(all_moves)))
+    queue = [(distance[driver_id], turn, driver_id) for turn, driver_id in enumerate(drivers)]
+    heapq.heapify(queue)
+    while free:
+        total, turn, driver_id = heapq.heappop(queue)
+        position = positions[driver_id]
+        index = min(free, key=lambda candidate: (travel_distance(position, pickups[candidate]), candidate))
+        free.discard(index)
+        routes[driver_id].append(index)
+        total += travel_distance(position, pickups[index]) + loaded[index]
+        positions[driver_id] = drops[index]
+        heapq.heappush(queue, (total, turn, driver_id))
+
+    return {
+        driver_id: [
+            all_moves[index]
+            for index in _two_opt(
+                route, starts[driver_id], pickups, drops, pinned=len(drivers[driver_id].get("claimed") or [])
+            )
+        ]
+        for driver_id, route in routes.items()
+    }
+
+
+def fifo_routes(moves: list[dict], drivers: dict) -> dict:
+    """Текущая практика для сравнения: освободившийся водитель берет следующее задание по времени создания."""
+    if not drivers:
+        return {}
+    pickups, drops, loaded = _prepare(moves)
+    routes = {driver_id: list(info.get("claimed") or []) for driver_id, info in drivers.items()}
+    queue = []
+    for turn, (driver_id, info) in enumerate(drivers.items()):
+        route = routes[driver_id]
+        position = location_point(route[-1].get("to_location") if route else info.get("start"))
+        queue.append((route_length(route, info.get("start"))["total_m"], turn, driver_id, position))
+    heapq.heapify(queue)
+    for index, move in enumerate(moves):
+        total, turn, driver_id, position = heapq.heappop(queue)
+        routes[driver_id].append(move)
+        total += travel_distance(position, pickups[index]) + loaded[index]
+        heapq.heappush(queue, (total, turn, driver_id, drops[index]))
+    return routes
+
+
+def routes_summary(routes: dict, drivers: dict) -> dict:
+    """Суммарный пробег и метры на паллету по всем водителям."""
+    pallets = 0
+    empty = 0.0
+    loaded = 0.0
+    for driver_id, route in routes.items():
+        length = route_length(route, drivers[driver_id].get("start"))
+        pallets += len(route)
+        empty += length["empty_m"]
+        loaded += length["loaded_m"]
+    total = empty + loaded
+    return {
+        "pallets": pallets,
+        "empty_m": round(empty, 1),
+        "loaded_m": round(loaded, 1),
+        "total_m": round(total, 1),
+        "meters_per_pallet": round(total / pallets, 2) if pallets else 0.0,
+    }
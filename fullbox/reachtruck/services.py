@@ -0,0 +1,271 @@
+from django.db import transaction
+from django.db.models import BigIntegerField, JSONField, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Cast
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry, log_order_action
+from employees.models import Employee
+from fullbox.db_concurrency import immediate_atomic, retry_on_lock
+
+from .models import StockMove
+from .routing import plan_routes, route_legs
+
+
+ACTIVE_STATUSES = (StockMove.STATUS_CREATED, StockMove.STATUS_IN_PROGRESS)
+DONE_HISTORY_LIMIT = 10
+ROUTE_BATCH_SIZE = 10
+
+
+def _parse_id(value) -> int | None:
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_moment(value):
+    if not value:
+        return None
+    moment = parse_datetime(str(value))
+    if moment and timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+def reserved_cell_key(location: dict | None) -> str:
+    """Ключ ячейки OS для резерва; пусто, если место не является конкретной ячейкой."""
+    location = location or {}
+    if str(location.get("zone") or "").strip().upper() != "OS":
+        return ""
+    parts = [_parse_id(location.get(key)) for key in ("row", "section", "tier", "cell")]
+    return "-".join(str(part) for part in parts) if all(parts) else ""
+
+
+def reserved_os_cells() -> set[tuple[int, int, int, int]]:
+    """Ячейки OS, зарезервированные невыполненными заданиями."""
+    keys = StockMove.objects.filter(status__in=ACTIVE_STATUSES).exclude(reserved_cell="")
+    return {tuple(int(part) for part in key.split("-")) for key in keys.values_list("reserved_cell", flat=True)}
+
+
+def move_fields_from_entry(entry, employee_ids=None) -> dict:
+    """
+    Состояние задания по записи журнала. employee_ids — известные ид сотрудников
+    (при пересборке), чтобы не ссылаться на удаленных.
+    """
+    payload = entry.payload or {}
+    status = (payload.get("status") or payload.get("submit_action") or "").strip().lower()
+    if status not in ACTIVE_STATUSES and status != StockMove.STATUS_DONE:
+        status = StockMove.STATUS_CREATED
+    assigned_to_id = _parse_id(payload.get("assigned_to_id"))
+    if employee_ids is not None and assigned_to_id not in employee_ids:
+        assigned_to_id = None
+    return {
+        "agency_id": entry.agency_id,
+        "status": status,
+        "status_label": (payload.get("status_label") or "").strip(),
+        "pallet_code": (payload.get("pallet_code") or "").strip(),
+        "receiving_order_id": str(payload.get("receiving_order_id") or ""),
+        "from_location": payload.get("from_location") or {},
+        "to_location": payload.get("to_location") or {},
+        "reserved_cell": reserved_cell_key(payload.get("to_location")),
+        "assigned_to_id": assigned_to_id,
+        "assigned_to_name": payload.get("assigned_to_name") or "",
+        "requested_by_name": payload.get("requested_by_name") or "",
+        "updated_at": entry.created_at,
+        "taken_at": _parse_moment(payload.get("taken_at")),
+        "completed_at": _parse_moment(payload.get("completed_at")),
+    }
+
+
+class MoveNumberTaken(Exception):
+    """Номер задания успели занять параллельным созданием; создание можно повторить."""
+
+
+def next_move_numbers(count: int = 1) -> list[str]:
+    """
+    Следующие номера заданий на перемещение после наибольшего числового номера в StockMove.
+    Вызывается внутри пишущей транзакции создания: уникальный order_id не даст выдать номер дважды.
+    """
+    top = (
+        StockMove.objects.filter(order_id__regex=r"^[0-9]+$")
+        .aggregate(top=Max(Cast("order_id", BigIntegerField())))["top"]
+        or 0
+    )
+    return [str(top + offset) for offset in range(1, count + 1)]
+
+
+def record_move_entry(entry) -> StockMove:
+    """
+    Переносит состояние из только что записанной записи журнала в StockMove.
+    Создание задания только вставляет строку: занятый номер дает IntegrityError, а не перезапись чужого задания.
+    """
+    fields = move_fields_from_entry(entry)
+    if entry.action == "create":
+        return StockMove.objects.create(order_id=entry.order_id, created_at=entry.created_at, **fields)
+    move, _ = StockMove.objects.update_or_create(
+        order_id=entry.order_id,
+        defaults=fields,
+        create_defaults={**fields, "created_at": entry.created_at},
+    )
+    return move
+
+
+def log_move_action(action: str, order_id: str, user=None, agency=None, description: str = "", payload=None):
+    """Запись журнала по заданию и обновление StockMove в одной транзакции."""
+    with transaction.atomic():
+        entry = log_order_action(
+            action,
+            order_id=order_id,
+            order_type="stock_move",
+            user=user,
+            agency=agency,
+            description=description,
+            payload=payload,
+        )
+        return entry, record_move_entry(entry)
+
+
+def latest_move_payload(order_id: str) -> dict:
+    entry = (
+        OrderAuditEntry.objects.filter(order_type="stock_move", order_id=str(order_id))
+        .only("payload")
+        .order_by("-created_at")
+        .first()
+    )
+    return dict(entry.payload or {}) if entry else {}
+
+
+@retry_on_lock
+def claim_move(order_id: str, employee, employee_name: str, user=None) -> tuple[StockMove | None, str | None]:
+    """
+    Берет задание в работу. Условный UPDATE срабатывает только для свободного задания
+    (или уже взятого этим же водителем), поэтому два водителя не могут забрать одно задание.
+    Возвращает (задание, None) или (None, текст ошибки).
+    """
+    with immediate_atomic():
+        now = timezone.now()
+        claimed = (
+            StockMove.objects.filter(order_id=order_id)
+            .filter(
+                Q(status=StockMove.STATUS_CREATED, assigned_to__isnull=True)
+                | Q(status=StockMove.STATUS_IN_PROGRESS, assigned_to=employee)
+            )
+            .update(
+                status=StockMove.STATUS_IN_PROGRESS,
+                status_label="В работе",
+                assigned_to=employee,
+                assigned_to_name=employee_name,
+                taken_at=now,
+                updated_at=now,
+            )
+        )
+        if not claimed:
+            move = StockMove.objects.filter(order_id=order_id).first()
+            if move is None:
+                return None, "Задание не найдено."
+            if move.status == StockMove.STATUS_DONE:
+                return None, "Задание уже выполнено."
+            return None, "Задание уже взято другим водителем."
+        move = StockMove.objects.select_related("agency").get(order_id=order_id)
+        payload = latest_move_payload(order_id)
+        payload.update(
+            {
+                "status": StockMove.STATUS_IN_PROGRESS,
+                "status_label": "В работе",
+                "assigned_to_id": employee.id,
+                "assigned_to_name": employee_name,
+                "taken_at": timezone.localtime(now).isoformat(),
+            }
+        )
+        log_order_action(
+            "status",
+            order_id=order_id,
+            order_type="stock_move",
+            user=user,
+            agency=move.agency,
+            description=f"Задание {order_id} взято в работу",
+            payload=payload,
+        )
+    return move, None
+
+
+def active_moves(employee_id: int | None = None, driver_view: bool = False):
+    """Невыполненные задания; водителю — свободные и свои."""
+    moves = StockMove.objects.filter(status__in=ACTIVE_STATUSES)
+    if driver_view and employee_id:
+        moves = moves.filter(Q(assigned_to__isnull=True) | Q(assigned_to_id=employee_id))
+    return moves.order_by("-updated_at")
+
+
+def recent_done_moves(limit: int = DONE_HISTORY_LIMIT):
+    return StockMove.objects.filter(status=StockMove.STATUS_DONE).order_by("-updated_at")[:limit]
+
+
+def driver_route(employee_id: int, limit: int = ROUTE_BATCH_SIZE) -> list[dict]:
+    """
+    Маршрут водителя на ближайшие limit заданий. Свободные задания планируются на всех
+    активных водителей сразу, чтобы маршруты не пересекались; старт водителя — место,
+    куда он отвез последнюю паллету.
+    """
+    last_drop = (
+        StockMove.objects.filter(assigned_to=OuterRef("pk"), status=StockMove.STATUS_DONE)
+        .order_by("-updated_at")
+        .values("to_location")[:1]
+    )
+    drivers = {
+        driver_id: {"start": start or {}, "claimed": []}
+        for driver_id, start in Employee.objects.filter(
+            Q(role="reachtruck_driver", is_active=True) | Q(pk=employee_id)
+        )
+        .annotate(last_drop=Subquery(last_drop, output_field=JSONField()))
+        .order_by("pk")
+        .values_list("pk", "last_drop")
+    }
+    free = []
+    for move in active_moves().order_by("created_at", "order_id"):
+        item = {"move": move, "from_location": move.from_location, "to_location": move.to_location}
+        if move.status == StockMove.STATUS_IN_PROGRESS and move.assigned_to_id in drivers:
+            drivers[move.assigned_to_id]["claimed"].append(item)
+        elif move.status == StockMove.STATUS_CREATED and not move.assigned_to_id:
+            free.append(item)
+    if employee_id not in drivers:
+        return []
+    route = plan_routes(free, drivers)[employee_id][:limit]
+    legs = route_legs(route, drivers[employee_id]["start"])
+    return [{"move": item["move"], **leg} for item, leg in zip(route, legs)]
+
+
+def rebuild_stock_moves(order_id_prefix: str = "", batch_size: int = JOURNAL_CHUNK_SIZE) -> int:
+    """
+    Пересобирает StockMove по журналу (синтетические данные) для заданий с номером
+    на order_id_prefix: состояние берется из последней записи задания, время создания — из первой.
+    Возвращает число заданий.
+    """
+    employee_ids = set(Employee.objects.values_list("pk", flat=True))
+    entries = OrderAuditEntry.objects.filter(order_type="stock_move", order_id__startswith=order_id_prefix)
+    first_seen = {}
+    latest = {}
+    for entry in entries.only("order_id", "agency_id", "payload", "created_at").order_by(
+        "order_id", "created_at", "pk"
+    ).iterator(chunk_size=batch_size):
+        first_seen.setdefault(entry.order_id, entry.created_at)
+        latest[entry.order_id] = entry
+    StockMove.objects.filter(order_id__startswith=order_id_prefix).delete()
+    # Старые задания могли указывать на одну ячейку: резерв остается за первым из них.
+    reserved = set(
+        StockMove.objects.filter(status__in=ACTIVE_STATUSES)
+        .exclude(reserved_cell="")
+        .values_list("reserved_cell", flat=True)
+    )
+    moves = []
+    for order_id, entry in latest.items():
+        fields = move_fields_from_entry(entry, employee_ids)
+        if fields["status"] in ACTIVE_STATUSES and fields["reserved_cell"]:
+            if fields["reserved_cell"] in reserved:
+                fields["reserved_cell"] = ""
+            else:
+                reserved.add(fields["reserved_cell"])
+        moves.append(StockMove(order_id=order_id, created_at=first_seen[order_id], **fields))
+    StockMove.objects.bulk_create(moves, batch_size=500)
+    return len(latest)
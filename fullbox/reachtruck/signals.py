@@ -0,0 +1,27 @@
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from audit.models import OrderAuditEntry
+from fullbox.events import publish_event
+
+
+@receiver(post_save, sender=OrderAuditEntry)
+def publish_stock_move(sender, instance, created, **kwargs):
+    if not created or instance.order_type != "stock_move":
+        return
+    payload = instance.payload or {}
+    status = (payload.get("status") or payload.get("submit_action") or "").strip().lower()
+    publish_event(
+        "moves",
+        "move.created" if instance.action == "create" else "move.updated",
+        {
+            "order_id": instance.order_id,
+            "status": status or "-",
+            "status_label": (payload.get("status_label") or "").strip() or status or "-",
+            "pallet_code": (payload.get("pallet_code") or "").strip() or "-",
+            "from_label": payload.get("from_label") or "",
+            "to_label": payload.get("to_label") or "",
+            "assigned_to_id": payload.get("assigned_to_id"),
+            "assigned_to_name": payload.get("assigned_to_name") or "-",
+        },
+    )
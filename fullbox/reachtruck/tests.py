@@ -0,0 +1,227 @@
+import random
+import threading
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from audit.models import OrderAuditEntry, log_order_action
+from employees.models import Employee
+from processing_app.tests import _run_parallel
+from sku.models import Agency
+
+from .models import StockMove
+from .routing import fifo_routes, location_point, plan_routes, routes_summary, travel_distance
+from .services import claim_move, driver_route, log_move_action, rebuild_stock_moves
+from .views import MOVE_NUMBER_TAKEN_ERROR, _collect_moves
+
+
+def _create_move(order_id: str, pallet_code: str = "P-1", from_location=None, to_location=None):
+    return log_move_action(
+        "create",
+        order_id=order_id,
+        payload={
+            "status": "created",
+            "status_label": "Ожидает перевозки",
+            "pallet_code": pallet_code,
+            "from_location": from_location or {"zone": "PR"},
+            "to_location": to_location or {"zone": "MR", "row": 2},
+        },
+    )[1]
+
+
+def _os(row: int, section: int) -> dict:
+    return {"zone": "OS", "row": row, "section": section, "tier": 1, "cell": 2}
+
+
+class StockMoveQueueTests(TestCase):
+    def setUp(self):
+        self.driver = Employee.objects.create(full_name="Водитель Один", role="reachtruck_driver")
+        self.other = Employee.objects.create(full_name="Водитель Два", role="reachtruck_driver")
+
+    def test_journal_write_updates_current_state(self):
+        move = _create_move("1")
+        self.assertEqual((move.status, move.pallet_code), ("created", "P-1"))
+        self.assertEqual(move.created_at, OrderAuditEntry.objects.get(order_id="1").created_at)
+
+    def test_move_can_be_claimed_only_once(self):
+        _create_move("1")
+        move, error = claim_move("1", self.driver, "Водитель Один")
+        self.assertIsNone(error)
+        self.assertEqual((move.status, move.assigned_to_id), ("in_progress", self.driver.id))
+        self.assertEqual(claim_move("1", self.other, "Водитель Два"), (None, "Задание уже взято другим водителем."))
+        self.assertEqual(claim_move("2", self.other, "Водитель Два"), (None, "Задание не найдено."))
+        latest = OrderAuditEntry.objects.filter(order_id="1").order_by("-created_at").first()
+        self.assertEqual(latest.payload["assigned_to_id"], self.driver.id)
+        self.assertEqual(latest.payload["pallet_code"], "P-1")
+
+    def test_driver_sees_free_and_own_active_moves_and_last_done(self):
+        for number in range(1, 4):
+            _create_move(str(number), pallet_code=f"P-{number}")
+        claim_move("2", self.other, "Водитель Два")
+        for number in range(10, 22):
+            _create_move(str(number))
+            log_move_action("status", order_id=str(number), payload={"status": "done", "status_label": "Перемещено"})
+        with self.assertNumQueries(2):
+            active, done = _collect_moves(self.driver.id, driver_view=True)
+        self.assertEqual([move["order_id"] for move in active], ["3", "1"])
+        self.assertTrue(all(move["can_take"] for move in active))
+        self.assertEqual(len(done), 10)
+        self.assertEqual(done[0]["order_id"], "21")
+
+    def test_rebuild_from_journal(self):
+        _create_move("1")
+        claim_move("1", self.driver, "Водитель Один")
+        StockMove.objects.all().delete()
+        self.assertEqual(rebuild_stock_moves(), 1)
+        move = StockMove.objects.get(order_id="1")
+        self.assertEqual((move.status, move.assigned_to_id), ("in_progress", self.driver.id))
+        self.assertIsNotNone(move.taken_at)
+
+
+class RoutePlanningTests(TestCase):
+    def test_distance_uses_aisles(self):
+        same_aisle = travel_distance(location_point(_os(3, 1)), location_point(_os(3, 5)))
+        next_aisle = travel_distance(location_point(_os(3, 5)), location_point(_os(4, 5)))
+        self.assertAlmostEqual(same_aisle, 4 * 2.8)
+        self.assertGreater(next_aisle, 2 * location_point(_os(3, 5))[1])
+        self.assertEqual(location_point({}), location_point({"zone": "PR"}))
+
+    def test_planned_routes_cover_queue_and_beat_created_order(self):
+        rng = random.Random(3)
+        zones = [{"zone": "PR"}, {"zone": "OTG"}, {"zone": "MR", "row": 1}]
+        locations = zones + [_os(row, section) for row in range(1, 10) for section in range(1, 6)]
+        moves = [
+            {"order_id": str(idx), "from_location": rng.choice(locations), "to_location": rng.choice(locations)}
+            for idx in range(200)
+        ]
+        drivers = {driver: {"start": {"zone": "PR"}, "claimed": []} for driver in range(3)}
+        routes = plan_routes(moves, drivers)
+        planned_ids = sorted(move["order_id"] for route in routes.values() for move in route)
+        self.assertEqual(planned_ids, sorted(move["order_id"] for move in moves))
+        planned = routes_summary(routes, drivers)
+        fifo = routes_summary(fifo_routes(moves, drivers), drivers)
+        self.assertEqual(planned["loaded_m"], fifo["loaded_m"])
+        self.assertLess(planned["meters_per_pallet"], fifo["meters_per_pallet"] * 0.8)
+
+    def test_claimed_moves_stay_first(self):
+        claimed = {"order_id": "c", "from_location": _os(9, 5), "to_location": _os(9, 6)}
+        moves = [{"order_id": str(idx), "from_location": {"zone": "PR"}, "to_location": _os(1, idx)} for idx in range(1, 5)]
+        routes = plan_routes(moves, {1: {"start": {"zone": "PR"}, "claimed": [claimed]}})
+        self.assertEqual(routes[1][0]["order_id"], "c")
+        self.assertEqual(len(routes[1]), 5)
+
+    def test_dashboard_route_splits_free_moves_between_drivers(self):
+        first = Employee.objects.create(full_name="Водитель Один", role="reachtruck_driver")
+        second = Employee.objects.create(full_name="Водитель Два", role="reachtruck_driver")
+        for number in range(1, 7):
+            _create_move(str(number), from_location=_os(number, 1), to_location=_os(number, 2))
+        claim_move("6", second, "Водитель Два")
+        first_route = [step["move"].order_id for step in driver_route(first.id)]
+        second_route = [step["move"].order_id for step in driver_route(second.id)]
+        self.assertEqual(second_route[0], "6")
+        self.assertFalse(set(first_route) & set(second_route))
+        self.assertEqual(sorted(first_route + second_route), [str(number) for number in range(1, 7)])
+
+
+class BulkRelocationTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user("bulk_manager")
+        Employee.objects.create(full_name="Петров Петр", role="manager", user=user)
+        self.client.force_login(user)
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        self.other = Agency.objects.create(agn_name="Другой клиент")
+        self._place("1", self.agency, [("A-1", _os(2, 1)), ("A-2", _os(2, 2)), ("A-3", {"zone": "PR"})])
+        self._place("2", self.other, [("B-1", _os(2, 3))])
+        occupied = {"zone": "OS", "row": 5, "section": 1, "tier": 1, "cell": 1}
+        self._place("3", self.other, [("B-2", occupied)])
+
+    def _place(self, order_id, agency, pallets):
+        log_order_action(
+            "status",
+            order_id=order_id,
+            agency=agency,
+            payload={
+                "act": "placement",
+                "act_state": "closed",
+                "act_pallets": [{"code": code, "location": location} for code, location in pallets],
+            },
+        )
+
+    def _bulk(self, **data):
+        return self.client.post("/reachtruck/", {"action": "bulk_move", **data})
+
+    def test_client_row_is_moved_into_free_cells(self):
+        response = self._bulk(source_agency=self.agency.id, source_row=2, to_zone="OS", to_row=5)
+        self.assertRedirects(response, "/reachtruck/?ok=1&bulk=2&skipped=0", fetch_redirect_response=False)
+        moves = StockMove.objects.order_by("order_id")
+        self.assertEqual([move.pallet_code for move in moves], ["A-1", "A-2"])
+        self.assertEqual([move.reserved_cell for move in moves], ["5-1-1-2", "5-1-1-3"])
+        self.assertEqual(OrderAuditEntry.objects.filter(order_type="stock_move").count(), 2)
+
+    def test_reserved_cells_and_busy_pallets_are_skipped(self):
+        self._bulk(pallet_codes="A-1", to_zone="OS", to_row=5)
+        response = self._bulk(pallet_codes="A-1, A-2\nB-1", to_zone="OS", to_row=5)
+        self.assertRedirects(response, "/reachtruck/?ok=1&bulk=2&skipped=1", fetch_redirect_response=False)
+        self.assertEqual(
+            sorted(StockMove.objects.values_list("reserved_cell", flat=True)),
+            ["5-1-1-2", "5-1-1-3", "5-1-2-1"],
+        )
+
+    def test_unknown_codes_create_nothing(self):
+        response = self._bulk(pallet_codes="A-1 X-9", to_zone="MR", to_row=1)
+        self.assertContains(response, "Паллеты не найдены в размещении: X-9")
+        self.assertFalse(StockMove.objects.exists())
+
+    def test_not_enough_free_cells(self):
+        codes = " ".join(f"C-{idx}" for idx in range(61))
+        self._place("4", self.agency, [(f"C-{idx}", {"zone": "PR"}) for idx in range(61)])
+        response = self._bulk(pallet_codes=codes, to_zone="OS", to_row=9)
+        self.assertContains(response, "свободно ячеек: 60, а паллет к перемещению: 61")
+        self.assertFalse(StockMove.objects.exists())
+
+    def test_move_numbers_continue_after_existing_moves(self):
+        _create_move("41", pallet_code="X-1")
+        self._bulk(source_agency=self.agency.id, source_row=2, to_zone="OS", to_row=5)
+        self.assertEqual(
+            list(StockMove.objects.order_by("order_id").values_list("order_id", "pallet_code")),
+            [("41", "X-1"), ("42", "A-1"), ("43", "A-2")],
+        )
+
+    def test_taken_move_number_is_reported_and_not_overwritten(self):
+        _create_move("41", pallet_code="X-1")
+        with patch("reachtruck.views.next_move_numbers", return_value=["41"]) as numbers:
+            response = self._bulk(pallet_codes="A-1", to_zone="MR", to_row=1)
+        self.assertContains(response, MOVE_NUMBER_TAKEN_ERROR)
+        self.assertEqual(numbers.call_count, 3)
+        self.assertEqual(list(StockMove.objects.values_list("order_id", "pallet_code")), [("41", "X-1")])
+
+    def test_database_rejects_double_reservation(self):
+        _create_move("1", to_location=_os(4, 4))
+        with self.assertRaises(IntegrityError):
+            _create_move("2", to_location=_os(4, 4))
+
+
+@override_settings(DB_WRITE_RETRIES=20, DB_WRITE_RETRY_DELAY_MS=5)
+class ParallelClaimTests(TransactionTestCase):
+    workers = 8
+
+    def test_each_move_goes_to_one_driver(self):
+        drivers = [
+            Employee.objects.create(full_name=f"Водитель {idx}", role="reachtruck_driver") for idx in range(self.workers)
+        ]
+        _create_move("1")
+        winners = []
+        lock = threading.Lock()
+
+        def take(index):
+            move, error = claim_move("1", drivers[index], drivers[index].full_name)
+            if move:
+                with lock:
+                    winners.append(index)
+
+        self.assertEqual(_run_parallel(self.workers, take), [])
+        self.assertEqual(len(winners), 1)
+        self.assertEqual(StockMove.objects.get(order_id="1").assigned_to_id, drivers[winners[0]].id)
+        self.assertEqual(OrderAuditEntry.objects.filter(order_id="1", action="status").count(), 1)
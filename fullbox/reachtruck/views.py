@@ -1,15 +1,35 @@
 import copy
 import re
 
+from django.db import IntegrityError, transaction
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect
 from django.utils import timezone
 from django.views.generic import TemplateView
 
-from audit.models import OrderAuditEntry, log_order_action, log_stock_move
-from employees.access import RoleRequiredMixin, get_employee_for_user, get_request_role, resolve_cabinet_url
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry, log_order_action, log_stock_move
+from employees.access import RoleRequiredMixin, get_request_employee, get_request_role, resolve_cabinet_url
+from fullbox.db_concurrency import immediate_atomic
+from sku.models import Agency
+from stockmap.views import _OS_CELLS_PER_TIER, _OS_ROW_SECTIONS, _OS_TIERS
+
+from .models import StockMove
+from .services import (
+    ACTIVE_STATUSES,
+    MoveNumberTaken,
+    active_moves,
+    claim_move,
+    driver_route,
+    latest_move_payload,
+    log_move_action,
+    next_move_numbers,
+    recent_done_moves,
+    reserved_os_cells,
+)
 
 ALLOWED_ZONES = {"PR", "OTG", "MR", "OS"}
+MOVE_NUMBER_ATTEMPTS = 3
+MOVE_NUMBER_TAKEN_ERROR = "Номер задания только что выдан другому перемещению, повторите создание."
 ALLOWED_ROLES = (
     "reachtruck_driver",
     "manager",
@@ -126,150 +146,177 @@ def _location_label(location: dict | None) -> str:
 
 
 def _latest_closed_placement_entries():
-    entries = OrderAuditEntry.objects.filter(order_type="receiving").order_by("-created_at")
+    entries = OrderAuditEntry.objects.filter(order_type="receiving", act="placement").order_by("-created_at")
     latest_by_order = {}
     blocked_orders = set()
-    for entry in entries:
+    for entry in entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
         if entry.order_id in latest_by_order or entry.order_id in blocked_orders:
             continue
-        payload = entry.payload or {}
-        if payload.get("act") != "placement":
-            continue
-        state = (payload.get("act_state") or "closed").lower()
-        if state != "closed":
+        if (entry.act_state or "closed") != "closed":
             blocked_orders.add(entry.order_id)
             continue
         latest_by_order[entry.order_id] = entry
     return list(latest_by_order.values())
 
 
-def _find_pallet_by_code(code: str):
-    target = (code or "").strip()
-    if not target:
-        return None
+def _placement_snapshot() -> dict:
+    """
+    Один проход по закрытым актам размещения: паллеты по коду
+    {код: (запись, индекс, паллета, место)} и занятые ячейки OS {ячейка: {коды}}.
+    """
+    pallets = {}
+    occupied = {}
     for entry in _latest_closed_placement_entries():
         payload = entry.payload or {}
-        pallets = payload.get("act_pallets") or []
-        for idx, pallet in enumerate(pallets):
+        for idx, pallet in enumerate(payload.get("act_pallets") or []):
             if not isinstance(pallet, dict):
                 continue
             pallet_code = (pallet.get("code") or "").strip()
-            if pallet_code and pallet_code == target:
-                location = _location_parts(pallet.get("location"), pallet)
-                return entry, idx, pallet, location
-    return None
+            parts = _location_parts(pallet.get("location"), pallet)
+            if pallet_code and pallet_code not in pallets:
+                pallets[pallet_code] = (entry, idx, pallet, parts)
+            if parts.get("zone") == "OS" and all(parts.get(key) for key in ("row", "section", "tier", "cell")):
+                cell = (parts["row"], parts["section"], parts["tier"], parts["cell"])
+                occupied.setdefault(cell, set()).add(pallet_code)
+    return {"pallets": pallets, "occupied": occupied}
 
 
-def _occupied_os_cells(exclude_code: str | None = None) -> set[tuple[int, int, int, int]]:
-    occupied = set()
-    exclude_code = (exclude_code or "").strip()
-    for entry in _latest_closed_placement_entries():
-        payload = entry.payload or {}
-        pallets = payload.get("act_pallets") or []
-        for pallet in pallets:
-            if not isinstance(pallet, dict):
-                continue
-            pallet_code = (pallet.get("code") or "").strip()
-            if exclude_code and pallet_code == exclude_code:
-                continue
-            parts = _location_parts(pallet.get("location"), pallet)
-            if parts.get("zone") != "OS":
-                continue
-            if all(parts.get(key) for key in ("row", "section", "tier", "cell")):
-                occupied.add(
-                    (parts["row"], parts["section"], parts["tier"], parts["cell"])
-                )
-    return occupied
+def _find_pallet_by_code(code: str, snapshot: dict | None = None):
+    target = (code or "").strip()
+    if not target:
+        return None
+    snapshot = snapshot or _placement_snapshot()
+    return snapshot["pallets"].get(target)
 
 
-def _next_move_number() -> str:
-    order_ids = (
-        OrderAuditEntry.objects.filter(order_type="stock_move")
-        .values_list("order_id", flat=True)
-        .distinct()
-    )
-    max_number = 0
-    for order_id in order_ids:
-        candidate = str(order_id).strip()
-        if not candidate.isdigit():
-            continue
-        number = int(candidate)
-        if number > max_number:
-            max_number = number
-    next_number = max_number + 1
-    while OrderAuditEntry.objects.filter(order_type="stock_move", order_id=str(next_number)).exists():
-        next_number += 1
-    return str(next_number)
+def _occupied_os_cells(exclude_code: str | None = None, snapshot: dict | None = None) -> set[tuple[int, int, int, int]]:
+    exclude = {(exclude_code or "").strip()} - {""}
+    snapshot = snapshot or _placement_snapshot()
+    return {cell for cell, codes in snapshot["occupied"].items() if codes - exclude}
 
 
-def _latest_move_entry(order_id: str):
-    if not order_id:
-        return None
-    return (
-        OrderAuditEntry.objects.filter(order_type="stock_move", order_id=str(order_id))
-        .order_by("-created_at")
-        .first()
-    )
+def _parse_pallet_codes(raw: str) -> list[str]:
+    codes = []
+    for code in re.split(r"[\s,;]+", raw or ""):
+        if code and code not in codes:
+            codes.append(code)
+    return codes
 
 
-def _collect_moves(employee_id: int | None, driver_view: bool) -> tuple[list[dict], list[dict]]:
-    entries = (
-        OrderAuditEntry.objects.filter(order_type="stock_move")
-        .select_related("user", "agency")
-        .order_by("order_id", "created_at")
+def _free_target_locations(zone: str, row: int, count: int, blocked: set) -> list[dict]:
+    """Места назначения для count паллет: свободные ячейки ряда OS по порядку или сама зона."""
+    if zone != "OS":
+        return [_build_location(zone, row, 0, 0, 0) for _ in range(count)]
+    targets = []
+    for section in range(1, _OS_ROW_SECTIONS.get(row, 0) + 1):
+        for tier in range(1, _OS_TIERS + 1):
+            for cell in range(1, _OS_CELLS_PER_TIER + 1):
+                if len(targets) == count:
+                    return targets
+                if (row, section, tier, cell) not in blocked:
+                    targets.append(_build_location(zone, row, section, tier, cell))
+    return targets
+
+
+def _move_row(move) -> dict:
+    return {
+        "order_id": move.order_id,
+        "created_at": move.created_at,
+        "updated_at": move.updated_at,
+        "status": move.status,
+        "status_label": move.status_label or move.get_status_display(),
+        "pallet_code": move.pallet_code or "-",
+        "from_location": move.from_location,
+        "to_location": move.to_location,
+        "from_label": _location_label(move.from_location),
+        "to_label": _location_label(move.to_location),
+        "assigned_to_id": move.assigned_to_id,
+        "assigned_to_name": move.assigned_to_name or "-",
+        "requested_by_name": move.requested_by_name or "-",
+        "receiving_order_id": move.receiving_order_id or "-",
+    }
+
+
+def _create_move_records(
+    move_id: str, pallet_code: str, found, to_location: dict, user=None, employee_name: str = "", role: str = ""
+):
+    """Запись задания в журнал заявок, StockMove и журнал перемещений одной транзакцией."""
+    placement_entry, _, _, from_parts = found
+    from_location = _build_location(
+        from_parts.get("zone"),
+        from_parts.get("row"),
+        from_parts.get("section"),
+        from_parts.get("tier"),
+        from_parts.get("cell"),
     )
-    latest_by_order = {}
-    created_at_by_order = {}
-    for entry in entries:
-        created_at_by_order.setdefault(entry.order_id, entry.created_at)
-        latest_by_order[entry.order_id] = entry
+    payload = {
+        "status": "created",
+        "status_label": "Ожидает перевозки",
+        "pallet_code": pallet_code,
+        "from_location": from_location,
+        "to_location": to_location,
+        "from_label": _location_label(from_location),
+        "to_label": _location_label(to_location),
+        "receiving_order_id": placement_entry.order_id,
+        "requested_by_name": employee_name,
+        "requested_by_role": role,
+    }
+    with transaction.atomic():
+        log_move_action(
+            "create",
+            order_id=move_id,
+            user=user,
+            agency=placement_entry.agency,
+            description=f"Задание на перемещение паллеты {pallet_code}",
+            payload=payload,
+        )
+        log_stock_move(
+            "create",
+            user=user,
+            agency=placement_entry.agency,
+            description=f"Создано задание на перемещение паллеты {pallet_code}",
+            snapshot={
+                "move_id": move_id,
+                "pallet_code": pallet_code,
+                "from_location": from_location,
+                "to_location": to_location,
+                "from_label": _location_label(from_location),
+                "to_label": _location_label(to_location),
+                "receiving_order_id": placement_entry.order_id,
+                "status": "created",
+            },
+        )
 
-    moves = []
-    for order_id, entry in latest_by_order.items():
-        payload = entry.payload or {}
-        status = (payload.get("status") or payload.get("submit_action") or "").strip().lower()
-        status_label = (payload.get("status_label") or "").strip() or status or "-"
-        pallet_code = (payload.get("pallet_code") or "").strip()
-        from_location = payload.get("from_location") or {}
-        to_location = payload.get("to_location") or {}
-        assigned_to_id = payload.get("assigned_to_id")
-        assigned_to_name = payload.get("assigned_to_name") or "-"
-        if assigned_to_id:
-            try:
-                assigned_to_id = int(assigned_to_id)
-            except (TypeError, ValueError):
-                assigned_to_id = None
-        move = {
-            "order_id": order_id,
-            "created_at": created_at_by_order.get(order_id) or entry.created_at,
-            "updated_at": entry.created_at,
-            "status": status or "-",
-            "status_label": status_label,
-            "pallet_code": pallet_code or "-",
-            "from_location": from_location,
-            "to_location": to_location,
-            "from_label": _location_label(from_location),
-            "to_label": _location_label(to_location),
-            "assigned_to_id": assigned_to_id,
-            "assigned_to_name": assigned_to_name,
-            "requested_by_name": payload.get("requested_by_name") or "-",
-            "receiving_order_id": payload.get("receiving_order_id") or "-",
-        }
-        if driver_view:
-            if status == "done":
-                moves.append(move)
-                continue
-            if assigned_to_id and employee_id and assigned_to_id != employee_id:
-                continue
-        moves.append(move)
 
-    moves.sort(key=lambda item: item["updated_at"], reverse=True)
-    active = [move for move in moves if move["status"] != "done"]
-    done = [move for move in moves if move["status"] == "done"][:10]
+def _create_moves(moves, **kwargs) -> list[str]:
+    """
+    Создает задания [(код паллеты, паллета из размещения, куда)] одной транзакцией и возвращает их номера.
+    Номера выдаются внутри транзакции; если их заняло параллельное создание, попытка повторяется,
+    а после MOVE_NUMBER_ATTEMPTS попыток — MoveNumberTaken. IntegrityError по занятой ячейке уходит наружу.
+    """
+    for _ in range(MOVE_NUMBER_ATTEMPTS):
+        numbers = []
+        try:
+            with immediate_atomic():
+                numbers = next_move_numbers(len(moves))
+                for number, (pallet_code, found, to_location) in zip(numbers, moves):
+                    _create_move_records(number, pallet_code, found, to_location, **kwargs)
+            return numbers
+        except IntegrityError:
+            if not StockMove.objects.filter(order_id__in=numbers).exists():
+                raise
+    raise MoveNumberTaken
+
+
+def _collect_moves(employee_id: int | None, driver_view: bool) -> tuple[list[dict], list[dict]]:
+    active = [_move_row(move) for move in active_moves(employee_id, driver_view)]
+    done = [_move_row(move) for move in recent_done_moves()]
     for move in active:
-        move["can_take"] = move["status"] == "created" and not move["assigned_to_id"]
+        move["can_take"] = move["status"] == StockMove.STATUS_CREATED and not move["assigned_to_id"]
         move["can_complete"] = (
-            move["status"] == "in_progress" and move["assigned_to_id"] and move["assigned_to_id"] == employee_id
+            move["status"] == StockMove.STATUS_IN_PROGRESS
+            and move["assigned_to_id"]
+            and move["assigned_to_id"] == employee_id
         )
     for move in done:
         move["can_take"] = False
@@ -277,6 +324,22 @@ def _collect_moves(employee_id: int | None, driver_view: bool) -> tuple[list[dic
     return active, done
 
 
+def _collect_route(employee_id: int) -> dict:
+    steps = []
+    for number, step in enumerate(driver_route(employee_id), start=1):
+        row = _move_row(step["move"])
+        row["step"] = number
+        row["empty_m"] = round(step["empty_m"])
+        row["loaded_m"] = round(step["loaded_m"])
+        row["can_take"] = row["status"] == StockMove.STATUS_CREATED
+        row["can_complete"] = row["status"] == StockMove.STATUS_IN_PROGRESS
+        steps.append(row)
+    return {
+        "steps": steps,
+        "total_m": sum(step["empty_m"] + step["loaded_m"] for step in steps),
+    }
+
+
 class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
     template_name = "reachtruck/dashboard.html"
     allowed_roles = ALLOWED_ROLES
@@ -288,27 +351,40 @@ class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
     def get_context_data(self, **kwargs):
         ctx = super().get_context_data(**kwargs)
         role = get_request_role(self.request)
-        employee = get_employee_for_user(self.request.user)
+        employee = get_request_employee(self.request)
         employee_id = employee.id if employee else None
         ctx["role"] = role
+        ctx["employee_id"] = employee_id
         ctx["is_driver"] = role == "reachtruck_driver"
         ctx["can_create"] = role in CREATE_ROLES
         ctx["cabinet_url"] = resolve_cabinet_url(role)
+        if ctx["can_create"]:
+            ctx["agencies"] = Agency.objects.only("id", "agn_name")
+            ctx["os_rows"] = list(_OS_ROW_SECTIONS)
         ctx["error"] = kwargs.get("error")
         if self.request.GET.get("ok") == "1":
             order_id = (self.request.GET.get("order") or "").strip()
-            ctx["ok_message"] = (
-                f"Задание №{order_id} создано." if order_id else "Задание создано."
-            )
+            bulk_count = _parse_int_value(self.request.GET.get("bulk"))
+            skipped = _parse_int_value(self.request.GET.get("skipped"))
+            if bulk_count:
+                ctx["ok_message"] = f"Создано заданий: {bulk_count}."
+                if skipped:
+                    ctx["ok_message"] += f" Пропущено паллет с активными заданиями: {skipped}."
+            else:
+                ctx["ok_message"] = (
+                    f"Задание №{order_id} создано." if order_id else "Задание создано."
+                )
         active_moves, done_moves = _collect_moves(employee_id, ctx["is_driver"])
         ctx["moves_active"] = active_moves
         ctx["moves_done"] = done_moves
+        if ctx["is_driver"] and employee_id:
+            ctx["route"] = _collect_route(employee_id)
         return ctx
 
     def post(self, request, *args, **kwargs):
         action = (request.POST.get("action") or "").strip()
         role = get_request_role(request)
-        employee = get_employee_for_user(request.user)
+        employee = get_request_employee(request)
         employee_id = employee.id if employee else None
         employee_name = employee.full_name if employee else request.user.get_full_name() or request.user.username
         if action == "create_move":
@@ -328,109 +404,118 @@ class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
                 return self._render_error("Для зоны MR укажите ряд.")
             if zone == "OS" and not (row and section and tier and cell):
                 return self._render_error("Для зоны OS укажите ряд, секцию, ярус и ячейку.")
+            snapshot = _placement_snapshot()
             if zone == "OS":
-                occupied = _occupied_os_cells(exclude_code=pallet_code)
+                occupied = _occupied_os_cells(exclude_code=pallet_code, snapshot=snapshot) | reserved_os_cells()
                 if (row, section, tier, cell) in occupied:
                     return self._render_error("Указанная ячейка уже занята.")
-            found = _find_pallet_by_code(pallet_code)
+            found = _find_pallet_by_code(pallet_code, snapshot)
             if not found:
                 return self._render_error("Паллета не найдена в размещении.")
-            placement_entry, _, pallet, from_parts = found
-            from_location = _build_location(
-                from_parts.get("zone"),
-                from_parts.get("row"),
-                from_parts.get("section"),
-                from_parts.get("tier"),
-                from_parts.get("cell"),
-            )
-            to_location = _build_location(zone, row, section, tier, cell)
-            move_id = _next_move_number()
-            payload = {
-                "status": "created",
-                "status_label": "Ожидает перевозки",
-                "pallet_code": pallet_code,
-                "from_location": from_location,
-                "to_location": to_location,
-                "from_label": _location_label(from_location),
-                "to_label": _location_label(to_location),
-                "receiving_order_id": placement_entry.order_id,
-                "requested_by_name": employee_name,
-                "requested_by_role": role,
-            }
-            log_order_action(
-                "create",
-                order_id=move_id,
-                order_type="stock_move",
-                user=request.user if request.user.is_authenticated else None,
-                agency=placement_entry.agency,
-                description=f"Задание на перемещение паллеты {pallet_code}",
-                payload=payload,
-            )
-            log_stock_move(
-                "create",
-                user=request.user if request.user.is_authenticated else None,
-                agency=placement_entry.agency,
-                description=f"Создано задание на перемещение паллеты {pallet_code}",
-                snapshot={
-                    "move_id": move_id,
-                    "pallet_code": pallet_code,
-                    "from_location": from_location,
-                    "to_location": to_location,
-                    "from_label": _location_label(from_location),
-                    "to_label": _location_label(to_location),
-                    "receiving_order_id": placement_entry.order_id,
-                    "status": "created",
-                },
-            )
+            try:
+                (move_id,) = _create_moves(
+                    [(pallet_code, found, _build_location(zone, row, section, tier, cell))],
+                    user=request.user if request.user.is_authenticated else None,
+                    employee_name=employee_name,
+                    role=role,
+                )
+            except MoveNumberTaken:
+                return self._render_error(MOVE_NUMBER_TAKEN_ERROR)
+            except IntegrityError:
+                return self._render_error("Указанная ячейка уже занята.")
             return redirect(f"/reachtruck/?ok=1&order={move_id}")
+        if action == "bulk_move":
+            if role not in CREATE_ROLES:
+                return HttpResponseForbidden("Доступ запрещен")
+            codes = _parse_pallet_codes(request.POST.get("pallet_codes"))
+            source_agency_id = _parse_int_value(request.POST.get("source_agency"))
+            source_row = _parse_int_value(request.POST.get("source_row"))
+            zone = _normalize_zone_code(request.POST.get("to_zone") or "")
+            row = _parse_int_value(request.POST.get("to_row"))
+            if not codes and not (source_agency_id and source_row):
+                return self._render_error("Укажите коды паллет или клиента и ряд.")
+            if zone not in ALLOWED_ZONES:
+                return self._render_error("Выберите зону хранения.")
+            if zone == "MR" and not row:
+                return self._render_error("Для зоны MR укажите ряд.")
+            if zone == "OS" and row not in _OS_ROW_SECTIONS:
+                return self._render_error("Для зоны OS укажите существующий ряд.")
+            snapshot = _placement_snapshot()
+            pallets = snapshot["pallets"]
+            if codes:
+                missing = [code for code in codes if code not in pallets]
+                if missing:
+                    return self._render_error(
+                        "Паллеты не найдены в размещении: " + ", ".join(missing[:10]) + ("…" if len(missing) > 10 else "")
+                    )
+            else:
+                codes = [
+                    code
+                    for code, (entry, _, _, parts) in pallets.items()
+                    if entry.agency_id == source_agency_id
+                    and parts["zone"] in {"OS", "MR"}
+                    and parts["row"] == source_row
+                ]
+                if not codes:
+                    return self._render_error(f"У клиента нет паллет в ряду {source_row}.")
+            codes = [
+                code
+                for code in codes
+                if not (pallets[code][3]["zone"] == zone and (zone in {"PR", "OTG"} or pallets[code][3]["row"] == row))
+            ]
+            busy = set(
+                StockMove.objects.filter(status__in=ACTIVE_STATUSES, pallet_code__in=codes).values_list(
+                    "pallet_code", flat=True
+                )
+            )
+            codes = [code for code in codes if code not in busy]
+            if not codes:
+                return self._render_error("Нет паллет для перемещения: все уже в целевой зоне или в работе.")
+            blocked = set(snapshot["occupied"]) | reserved_os_cells()
+            targets = _free_target_locations(zone, row, len(codes), blocked)
+            if len(targets) < len(codes):
+                return self._render_error(
+                    f"В ряду {row} свободно ячеек: {len(targets)}, а паллет к перемещению: {len(codes)}."
+                )
+            try:
+                _create_moves(
+                    [(code, pallets[code], to_location) for code, to_location in zip(codes, targets)],
+                    user=request.user if request.user.is_authenticated else None,
+                    employee_name=employee_name,
+                    role=role,
+                )
+            except MoveNumberTaken:
+                return self._render_error(MOVE_NUMBER_TAKEN_ERROR)
+            except IntegrityError:
+                return self._render_error("Ячейки только что заняты другим заданием, повторите перемещение.")
+            return redirect(f"/reachtruck/?ok=1&bulk={len(codes)}&skipped={len(busy)}")
         if action == "take_move":
             if role != "reachtruck_driver":
                 return HttpResponseForbidden("Доступ запрещен")
             if not employee_id:
                 return self._render_error("Профиль сотрудника не найден.")
             order_id = (request.POST.get("order_id") or "").strip()
-            entry = _latest_move_entry(order_id)
-            if not entry:
-                return self._render_error("Задание не найдено.")
-            payload = dict(entry.payload or {})
-            status = (payload.get("status") or "").strip().lower()
-            assigned_to_id = payload.get("assigned_to_id")
-            if assigned_to_id:
-                try:
-                    assigned_to_id = int(assigned_to_id)
-                except (TypeError, ValueError):
-                    assigned_to_id = None
-            if status == "done":
-                return self._render_error("Задание уже выполнено.")
-            if status == "in_progress" and assigned_to_id and assigned_to_id != employee_id:
-                return self._render_error("Задание уже взято другим водителем.")
-            payload["status"] = "in_progress"
-            payload["status_label"] = "В работе"
-            payload["assigned_to_id"] = employee_id
-            payload["assigned_to_name"] = employee_name
-            payload["taken_at"] = timezone.localtime().isoformat()
-            log_order_action(
-                "status",
-                order_id=order_id,
-                order_type="stock_move",
+            move, error = claim_move(
+                order_id,
+                employee,
+                employee_name,
                 user=request.user if request.user.is_authenticated else None,
-                agency=entry.agency,
-                description=f"Задание {order_id} взято в работу",
-                payload=payload,
             )
+            if error:
+                return self._render_error(error)
             log_stock_move(
                 "update",
                 user=request.user if request.user.is_authenticated else None,
-                agency=entry.agency,
+                agency=move.agency,
                 description=f"Задание {order_id} взято в работу",
                 snapshot={
                     "move_id": order_id,
-                    "pallet_code": payload.get("pallet_code"),
-                    "from_location": payload.get("from_location"),
-                    "to_location": payload.get("to_location"),
-                    "from_label": payload.get("from_label"),
-                    "to_label": payload.get("to_label"),
-                    "receiving_order_id": payload.get("receiving_order_id"),
+                    "pallet_code": move.pallet_code,
+                    "from_location": move.from_location,
+                    "to_location": move.to_location,
+                    "from_label": _location_label(move.from_location),
+                    "to_label": _location_label(move.to_location),
+                    "receiving_order_id": move.receiving_order_id,
                     "status": "in_progress",
                     "assigned_to": employee_name,
                 },
@@ -442,22 +527,14 @@ class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
             if not employee_id:
                 return self._render_error("Профиль сотрудника не найден.")
             order_id = (request.POST.get("order_id") or "").strip()
-            entry = _latest_move_entry(order_id)
-            if not entry:
+            move = StockMove.objects.select_related("agency").filter(order_id=order_id).first()
+            if not move:
                 return self._render_error("Задание не найдено.")
-            payload = dict(entry.payload or {})
-            status = (payload.get("status") or "").strip().lower()
-            assigned_to_id = payload.get("assigned_to_id")
-            if assigned_to_id:
-                try:
-                    assigned_to_id = int(assigned_to_id)
-                except (TypeError, ValueError):
-                    assigned_to_id = None
-            if status != "in_progress":
+            if move.status != StockMove.STATUS_IN_PROGRESS:
                 return self._render_error("Задание еще не взято в работу.")
-            if assigned_to_id and employee_id and assigned_to_id != employee_id:
+            if move.assigned_to_id and move.assigned_to_id != employee_id:
                 return self._render_error("Задание назначено другому водителю.")
-            pallet_code = (payload.get("pallet_code") or "").strip()
+            pallet_code = move.pallet_code
             if not pallet_code:
                 return self._render_error("Не найден код паллеты в задании.")
             found = _find_pallet_by_code(pallet_code)
@@ -466,7 +543,7 @@ class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
             placement_entry, _, _, _ = found
             placement_payload = copy.deepcopy(placement_entry.payload or {})
             pallets = placement_payload.get("act_pallets") or []
-            to_location = payload.get("to_location") or {}
+            to_location = move.to_location or {}
             updated = False
             for pallet in pallets:
                 if not isinstance(pallet, dict):
@@ -485,40 +562,46 @@ class ReachtruckDashboardView(RoleRequiredMixin, TemplateView):
                 return self._render_error("Не удалось обновить локацию паллеты.")
             placement_payload["act"] = "placement"
             placement_payload["act_state"] = "closed"
-            log_order_action(
-                "status",
-                order_id=placement_entry.order_id,
-                order_type="receiving",
-                user=request.user if request.user.is_authenticated else None,
-                agency=placement_entry.agency,
-                description=f"Перемещение паллеты {pallet_code}",
-                payload=placement_payload,
-            )
+            payload = latest_move_payload(order_id)
             payload["status"] = "done"
             payload["status_label"] = "Перемещено"
             payload["completed_at"] = timezone.localtime().isoformat()
             payload["completed_by_name"] = employee_name
-            log_order_action(
-                "status",
-                order_id=order_id,
-                order_type="stock_move",
-                user=request.user if request.user.is_authenticated else None,
-                agency=entry.agency,
-                description=f"Задание {order_id} выполнено",
-                payload=payload,
-            )
+            with transaction.atomic():
+                # Повторная отправка формы не должна второй раз переносить паллету.
+                if not StockMove.objects.select_for_update().filter(
+                    order_id=order_id, status=StockMove.STATUS_IN_PROGRESS
+                ).exists():
+                    return self._render_error("Задание уже выполнено.")
+                log_order_action(
+                    "status",
+                    order_id=placement_entry.order_id,
+                    order_type="receiving",
+                    user=request.user if request.user.is_authenticated else None,
+                    agency=placement_entry.agency,
+                    description=f"Перемещение паллеты {pallet_code}",
+                    payload=placement_payload,
+                )
+                log_move_action(
+                    "status",
+                    order_id=order_id,
+                    user=request.user if request.user.is_authenticated else None,
+                    agency=move.agency,
+                    description=f"Задание {order_id} выполнено",
+                    payload=payload,
+                )
             log_stock_move(
                 "update",
                 user=request.user if request.user.is_authenticated else None,
-                agency=entry.agency,
+                agency=move.agency,
                 description=f"Задание {order_id} выполнено",
                 snapshot={
                     "move_id": order_id,
                     "pallet_code": pallet_code,
-                    "from_location": payload.get("from_location"),
-                    "to_location": payload.get("to_location"),
-                    "from_label": payload.get("from_label"),
-                    "to_label": payload.get("to_label"),
+                    "from_location": move.from_location,
+                    "to_location": move.to_location,
+                    "from_label": _location_label(move.from_location),
+                    "to_label": _location_label(move.to_location),
                     "receiving_order_id": placement_entry.order_id,
                     "status": "done",
                     "completed_by": employee_name,
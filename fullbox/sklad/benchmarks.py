@@ -0,0 +1,195 @@
+import json
+import math
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+from django.db.models.signals import post_init
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from audit.models import OrderAuditEntry
+
+from .dataset import SYNTHETIC_PREFIX, synthetic_username
+
+
+DEFAULT_BASELINE_PATH = settings.BASE_DIR / "benchmarks" / "baseline.json"
+
+_BASELINE_KEYS = ("url", "status", "p50_ms", "p90_ms", "p95_ms", "max_ms", "queries", "response_bytes")
+
+# Горячие страницы: имя, роль пользователя и адрес ({agency_id} — самый «тяжелый» клиент набора).
+BENCHMARK_VIEWS = [
+    {"name": "orders_journal", "role": "manager", "url": "/orders/"},
+    {"name": "client_dashboard", "role": "manager", "url": "/client/dashboard/?client={agency_id}"},
+    {"name": "inventory_journal", "role": "manager", "url": "/sklad/journal/?client={agency_id}"},
+    {"name": "stockmap", "role": "head_manager", "url": "/stockmap/"},
+    {"name": "reachtruck", "role": "reachtruck_driver", "url": "/reachtruck/"},
+    {"name": "task_panel", "role": "manager", "url": "/team-manager/"},
+    {"name": "processing_stock_picker", "role": "manager", "url": "/orders/processing/stock/?client={agency_id}"},
+]
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """Перцентиль методом ближайшего ранга."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(math.ceil(pct / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def _benchmark_context() -> dict:
+    busiest = (
+        OrderAuditEntry.objects.filter(agency__pref=SYNTHETIC_PREFIX)
+        .values("agency_id")
+        .annotate(total=Count("id"))
+        .order_by("-total")
+        .first()
+    )
+    return {"agency_id": busiest["agency_id"] if busiest else ""}
+
+
+def _client_for_role(role: str, clients: dict) -> Client:
+    if role not in clients:
+        user = get_user_model().objects.filter(username=synthetic_username(role)).first()
+        if not user:
+            raise LookupError(f"Нет пользователя {synthetic_username(role)}: сначала выполните generate_dataset.")
+        client = Client(HTTP_HOST=(settings.ALLOWED_HOSTS or ["localhost"])[0])
+        client.force_login(user)
+        clients[role] = client
+    return clients[role]
+
+
+@contextmanager
+def count_loaded_rows():
+    """Считает экземпляры моделей, загруженные из БД внутри блока: {"rows": N}."""
+    counter = {"rows": 0}
+
+    def on_init(sender, **kwargs):
+        counter["rows"] += 1
+
+    post_init.connect(on_init, weak=False, dispatch_uid="sklad.benchmarks.rows")
+    try:
+        yield counter
+    finally:
+        post_init.disconnect(dispatch_uid="sklad.benchmarks.rows")
+
+
+def profile_view(client: Client, url: str) -> dict:
+    """Один запрос страницы: статус, список SQL и число загруженных строк моделей."""
+    with CaptureQueriesContext(connection) as captured, count_loaded_rows() as counter:
+        response = client.get(url)
+    return {
+        "url": url,
+        "status": response.status_code,
+        "queries": [query["sql"] for query in captured.captured_queries],
+        "rows": counter["rows"],
+    }
+
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+
+
+def query_report(profile: dict, limit: int = 40) -> str:
+    """Читаемый отчет по SQL страницы: повторяющиеся (с точностью до литералов) запросы идут первыми."""
+    shapes = Counter(_SQL_LITERALS.sub("?", sql) for sql in profile["queries"])
+    lines = [
+        f"{profile['url']}: {len(profile['queries'])} SQL, {profile['rows']} строк, статус {profile['status']}",
+    ]
+    for shape, count in shapes.most_common(limit):
+        lines.append(f"  {count:>4} × {shape[:300]}")
+    return "\n".join(lines)
+
+
+def run_benchmarks(repeat: int = 10, warmup: int = 1, names=None, cold: bool = False) -> list[dict]:
+    """
+    Прогоняет горячие страницы через тестовый клиент.
+    Возвращает по каждой странице статус, перцентили времени (мс), число SQL-запросов и размер ответа.
+    cold=True очищает кэш перед каждым запросом.
+    """
+    context = _benchmark_context()
+    clients = {}
+    results = []
+    for spec in BENCHMARK_VIEWS:
+        if names and spec["name"] not in names:
+            continue
+        client = _client_for_role(spec["role"], clients)
+        url = spec["url"].format(**context)
+        for _ in range(warmup):
+            client.get(url)
+        timings = []
+        queries = []
+        status = None
+        size = 0
+        for _ in range(repeat):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured.captured_queries))
+            status = response.status_code
+            size = len(response.content) if not getattr(response, "streaming", False) else 0
+        results.append(
+            {
+                "name": spec["name"],
+                "url": url,
+                "status": status,
+                "p50_ms": round(percentile(timings, 50), 1),
+                "p90_ms": round(percentile(timings, 90), 1),
+                "p95_ms": round(percentile(timings, 95), 1),
+                "max_ms": round(max(timings), 1) if timings else 0.0,
+                "queries": max(queries) if queries else 0,
+                "response_bytes": size,
+            }
+        )
+    return results
+
+
+def load_baseline(path: Path) -> dict:
+    try:
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return {}
+    return data.get("views") or {}
+
+
+def save_baseline(path: Path, results: list[dict], meta: dict | None = None) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {
+        "meta": meta or {},
+        "views": {row["name"]: {key: row[key] for key in _BASELINE_KEYS} for row in results},
+    }
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+
+
+def compare_with_baseline(results: list[dict], baseline: dict, tolerance: float = 0.2) -> list[dict]:
+    """
+    Добавляет к результатам сравнение с базовой линией.
+    Регрессия — p95 дольше базового более чем на tolerance или больше SQL-запросов.
+    """
+    for row in results:
+        base = baseline.get(row["name"])
+        row["baseline_p95_ms"] = base.get("p95_ms") if base else None
+        row["baseline_queries"] = base.get("queries") if base else None
+        row["p95_change"] = None
+        row["regression"] = False
+        if not base:
+            continue
+        base_p95 = base.get("p95_ms") or 0
+        if base_p95:
+            row["p95_change"] = round((row["p95_ms"] - base_p95) / base_p95 * 100, 1)
+            if row["p95_ms"] > base_p95 * (1 + tolerance):
+                row["regression"] = True
+        if row["queries"] > (base.get("queries") or 0):
+            row["regression"] = True
+    return results
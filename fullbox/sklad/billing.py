@@ -0,0 +1,307 @@
+"""
+Начисление за хранение по паллето-дням.
+
+Паллета занимает зону с дня записи акта размещения, в которой она появилась (или сменила
+зону после перемещения ричтраком), до дня записи, в которой ее не стало: паллету убрали
+из акта, акт открыт заново. День считается по состоянию на конец суток, как в снимках
+остатков. Состояние на начало периода берется из ближайшего снимка (sklad.snapshots), дальше
+проигрываются события размещения журнала и архива; без снимков — вся история. Паллето-дни
+по зонам считаются проходом по отсортированным границам интервалов. Закрытые периоды
+сохраняются в StorageStatement.
+"""
+
+import heapq
+from datetime import date as date_type, timedelta
+from decimal import Decimal
+from io import BytesIO
+
+from django.conf import settings
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.styles import Font
+
+from audit.archive import archived_entries_between
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
+from sku.models import Agency
+from stockmap.views import _location_parts
+
+from .models import InventorySnapshot, InventorySnapshotDay, StorageStatement
+from .services import _parse_qty_value
+from .snapshots import _day_end
+
+BILLING_ZONES = ("OS", "MR", "PR", "OTG")
+ZONE_LABELS = {
+    "OS": "Основной склад",
+    "MR": "Между рядами",
+    "PR": "Зона приемки",
+    "OTG": "Зона отгрузки",
+}
+
+
+def month_period(value: str) -> tuple[date_type, date_type]:
+    """Первый и последний день месяца ГГГГ-ММ; ValueError для другого формата."""
+    year, _, month = (value or "").strip().partition("-")
+    start = date_type(int(year), int(month), 1)
+    next_month = (start + timedelta(days=32)).replace(day=1)
+    return start, next_month - timedelta(days=1)
+
+
+def pallet_day_rates() -> dict[str, Decimal]:
+    return {zone: Decimal(str(settings.STORAGE_PALLET_DAY_RATES.get(zone) or 0)) for zone in BILLING_ZONES}
+
+
+def _billing_zone(zone: str) -> str:
+    return zone if zone in BILLING_ZONES else "PR"
+
+
+def _has_goods(items) -> bool:
+    for item in items or []:
+        if not isinstance(item, dict):
+            continue
+        if not any((item.get("sku") or item.get("sku_code"), item.get("name"), item.get("size"))):
+            continue
+        qty = _parse_qty_value(item.get("qty"))
+        if qty is None:
+            qty = _parse_qty_value(item.get("actual_qty"))
+        if qty:
+            return True
+    return False
+
+
+def _entry_pallets(entry: OrderAuditEntry) -> dict[str, str]:
+    """
+    Паллеты с товаром (на самой паллете или в ее коробах) по записи акта: {код: зона};
+    открытый акт — пусто. Те же паллеты, что попадают в снимок остатков (placement_rows).
+    """
+    if (entry.act_state or "closed") != "closed":
+        return {}
+    payload = entry.payload or {}
+    filled_boxes = {
+        box.get("code") for box in payload.get("act_boxes") or [] if isinstance(box, dict) and _has_goods(box.get("items"))
+    }
+    pallets = {}
+    for pallet in payload.get("act_pallets") or []:
+        if not isinstance(pallet, dict):
+            continue
+        code = (pallet.get("code") or "").strip()
+        if not code or code in pallets:
+            continue
+        if _has_goods(pallet.get("items")) or any(box in filled_boxes for box in pallet.get("boxes") or []):
+            pallets[code] = _billing_zone(_location_parts(pallet)[0] or "PR")
+    return pallets
+
+
+def pallet_intervals(start: date_type, end: date_type, agency_ids=None) -> dict[int, list[tuple]]:
+    """
+    Интервалы хранения паллет за дни start..end включительно:
+    {ид клиента: [(первый день, день после последнего, зона)]}.
+    """
+    base = InventorySnapshotDay.objects.filter(date__lt=start).order_by("-date").first()
+    stop = end + timedelta(days=1)
+    orders = {}
+    opened = {}
+    intervals = {}
+
+    def close(key, day):
+        agency_id, since, zone = opened.pop(key)
+        since = max(since, start)
+        if day > since:
+            intervals.setdefault(agency_id, []).append((since, day, zone))
+
+    if base:
+        current = InventorySnapshot.objects.filter(date=base.date).exclude(pallet_code="")
+        if agency_ids is not None:
+            current = current.filter(agency_id__in=agency_ids)
+        for agency_id, order_id, pallet_code, zone in (
+            current.values_list("agency_id", "order_id", "pallet_code", "zone").distinct().iterator()
+        ):
+            orders.setdefault(order_id, {})[pallet_code] = _billing_zone(zone)
+            opened[(order_id, pallet_code)] = (agency_id, start, _billing_zone(zone))
+
+    since = _day_end(base.date) if base else None
+    wanted = set(agency_ids) if agency_ids is not None else None
+    events = OrderAuditEntry.objects.filter(
+        order_type="receiving", act="placement", created_at__lt=_day_end(end), agency__isnull=False
+    )
+    if since:
+        events = events.filter(created_at__gte=since)
+    if agency_ids is not None:
+        events = events.filter(agency_id__in=agency_ids)
+    events = events.order_by("created_at", "pk").only("order_id", "agency_id", "act_state", "created_at", "payload")
+    archived = archived_entries_between("receiving", since, _day_end(end), act="placement", agency_ids=agency_ids)
+    for entry in heapq.merge(
+        events.iterator(chunk_size=JOURNAL_CHUNK_SIZE), archived, key=lambda entry: (entry.created_at, entry.pk)
+    ):
+        if not entry.agency_id or (wanted is not None and entry.agency_id not in wanted):
+            continue
+        day = timezone.localdate(entry.created_at)
+        previous = orders.get(entry.order_id, {})
+        pallets = _entry_pallets(entry)
+        for code, zone in previous.items():
+            if pallets.get(code) != zone:
+                close((entry.order_id, code), day)
+        for code, zone in pallets.items():
+            if previous.get(code) != zone:
+                opened[(entry.order_id, code)] = (entry.agency_id, day, zone)
+        orders[entry.order_id] = pallets
+    for key in list(opened):
+        close(key, stop)
+    return intervals
+
+
+def sweep_pallet_days(intervals: list[tuple]) -> tuple[dict[str, int], list[tuple]]:
+    """
+    Проход по границам интервалов: паллето-дни по зонам и ступенчатый ряд
+    [(день, {зона: паллет})] — число паллет меняется только в перечисленные дни.
+    """
+    boundaries = []
+    for since, until, zone in intervals:
+        boundaries.append((since, zone, 1))
+        boundaries.append((until, zone, -1))
+    boundaries.sort()
+    pallet_days = dict.fromkeys(BILLING_ZONES, 0)
+    counts = dict.fromkeys(BILLING_ZONES, 0)
+    steps = []
+    previous_day = None
+    for day, zone, delta in boundaries:
+        if previous_day is not None and day > previous_day:
+            span = (day - previous_day).days
+            for name, count in counts.items():
+                pallet_days[name] += count * span
+            steps.append((previous_day, dict(counts)))
+        counts[zone] += delta
+        previous_day = day
+    return pallet_days, steps
+
+
+def _statement(agency_id: int, start: date_type, end: date_type, intervals: list[tuple], rates: dict) -> dict:
+    pallet_days, steps = sweep_pallet_days(intervals)
+    zones = {}
+    amount = Decimal(0)
+    for zone in BILLING_ZONES:
+        zone_amount = rates[zone] * pallet_days[zone]
+        amount += zone_amount
+        zones[zone] = {"pallet_days": pallet_days[zone], "rate": str(rates[zone]), "amount": str(zone_amount)}
+    return {
+        "agency_id": agency_id,
+        "period_start": start,
+        "period_end": end,
+        "pallet_days": sum(pallet_days.values()),
+        "amount": amount,
+        "lines": {
+            "zones": zones,
+            "steps": [[day.isoformat(), counts] for day, counts in steps],
+        },
+    }
+
+
+def _from_model(statement: StorageStatement) -> dict:
+    return {
+        "agency_id": statement.agency_id,
+        "period_start": statement.period_start,
+        "period_end": statement.period_end,
+        "pallet_days": statement.pallet_days,
+        "amount": statement.amount,
+        "lines": statement.lines,
+    }
+
+
+def storage_statements(start: date_type, end: date_type, agency_ids=None, recompute: bool = False) -> dict:
+    """
+    Начисления за хранение по клиентам за дни start..end: {ид клиента: начисление}.
+    Период, закончившийся до сегодняшнего дня, считается один раз и дальше читается из StorageStatement.
+    """
+    if agency_ids is None:
+        agency_ids = list(Agency.objects.values_list("pk", flat=True))
+    agency_ids = list(agency_ids)
+    closed = end < timezone.localdate()
+    statements = {}
+    if closed and not recompute:
+        for statement in StorageStatement.objects.filter(
+            period_start=start, period_end=end, agency_id__in=agency_ids
+        ):
+            statements[statement.agency_id] = _from_model(statement)
+    missing = [agency_id for agency_id in agency_ids if agency_id not in statements]
+    if not missing:
+        return statements
+    intervals = pallet_intervals(start, end, missing)
+    rates = pallet_day_rates()
+    computed = {
+        agency_id: _statement(agency_id, start, end, intervals.get(agency_id, []), rates) for agency_id in missing
+    }
+    if closed:
+        # Upsert, а не удаление и вставка: параллельный запрос того же периода
+        # не упирается в uniq_storage_statement_period.
+        StorageStatement.objects.bulk_create(
+            [
+                StorageStatement(
+                    agency_id=agency_id,
+                    period_start=start,
+                    period_end=end,
+                    pallet_days=item["pallet_days"],
+                    amount=item["amount"],
+                    lines=item["lines"],
+                )
+                for agency_id, item in computed.items()
+            ],
+            update_conflicts=True,
+            unique_fields=["agency", "period_start", "period_end"],
+            update_fields=["pallet_days", "amount", "lines", "computed_at"],
+        )
+    statements.update(computed)
+    return statements
+
+
+def _daily_counts(statement: dict) -> list[tuple[date_type, dict]]:
+    """Разворачивает ступенчатый ряд начисления в число паллет по каждому дню периода."""
+    steps = [(date_type.fromisoformat(day), counts) for day, counts in statement["lines"].get("steps") or []]
+    empty = dict.fromkeys(BILLING_ZONES, 0)
+    days = []
+    day = statement["period_start"]
+    index = -1
+    while day <= statement["period_end"]:
+        while index + 1 < len(steps) and steps[index + 1][0] <= day:
+            index += 1
+        days.append((day, steps[index][1] if index >= 0 else empty))
+        day += timedelta(days=1)
+    return days
+
+
+def statement_xlsx(agency: Agency, statement: dict) -> bytes:
+    """Выписка клиента по хранению: итоги по зонам и число паллет по дням."""
+    workbook = Workbook()
+    summary = workbook.active
+    summary.title = "Хранение"
+    bold = Font(bold=True)
+    summary.append([f"Хранение: {agency.agn_name or agency.fio_agn or agency}"])
+    summary.append(
+        [f"Период: {statement['period_start']:%d.%m.%Y} – {statement['period_end']:%d.%m.%Y}"]
+    )
+    summary.append([])
+    summary.append(["Зона", "Паллето-дни", "Тариф, руб.", "Сумма, руб."])
+    for cell in summary[4]:
+        cell.font = bold
+    for zone in BILLING_ZONES:
+        line = statement["lines"]["zones"][zone]
+        summary.append(
+            [f"{zone} · {ZONE_LABELS[zone]}", line["pallet_days"], float(line["rate"]), float(line["amount"])]
+        )
+    summary.append(["Итого", statement["pallet_days"], None, float(statement["amount"])])
+    for cell in summary[summary.max_row]:
+        cell.font = bold
+    summary.column_dimensions["A"].width = 28
+    for column in "BCD":
+        summary.column_dimensions[column].width = 14
+
+    daily = workbook.create_sheet("По дням")
+    daily.append(["Дата", *BILLING_ZONES, "Всего"])
+    for cell in daily[1]:
+        cell.font = bold
+    for day, counts in _daily_counts(statement):
+        daily.append([day, *(counts.get(zone, 0) for zone in BILLING_ZONES), sum(counts.values())])
+        daily.cell(row=daily.max_row, column=1).number_format = "DD.MM.YYYY"
+    daily.column_dimensions["A"].width = 12
+
+    buffer = BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
@@ -0,0 +1,621 @@
+import random
+import secrets
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from audit.models import OrderAuditArchive, OrderAuditEntry, promoted_payload_fields
+from employees.access import touch_access
+from employees.directory import touch_employee_directory
+from employees.models import Employee
+from head_manager.analytics import reset_throughput
+from marking.models import MarkingCode
+from reachtruck.models import StockMove
+from reachtruck.services import rebuild_stock_moves
+from sku.barcodes import touch_barcode_index
+from sku.models import Agency, SKU, SKUBarcode, SKUPhoto
+from stockmap.views import _OS_CELLS_PER_TIER, _OS_ROW_SECTIONS, _OS_TIERS
+from todo.models import Task, touch_task_board
+
+from .models import InventoryState
+from .services import GOODS_TYPE_LABELS, invalidate_reserve_cache, invalidate_stock_cache
+
+
+SYNTHETIC_PREFIX = "SYN"
+SYNTHETIC_ORDER_PREFIX = "syn-"
+
+SYNTHETIC_ROLES = (
+    "manager",
+    "head_manager",
+    "storekeeper",
+    "processing_head",
+    "reachtruck_driver",
+    "director",
+)
+
+_SIZES = ("XS", "S", "M", "L", "XL", "XXL")
+_SUBJECTS = ("Футболка", "Худи", "Брюки", "Платье", "Куртка", "Рубашка", "Шорты", "Свитшот")
+_BRANDS = ("Nord", "Ателье", "Basic Line", "Сезон", "Urban")
+_BATCH = 1000
+
+
+def synthetic_username(role: str) -> str:
+    return f"syn_{role}"
+
+
+def _order_id(kind: str, number: int) -> str:
+    return f"{SYNTHETIC_ORDER_PREFIX}{kind}-{number:06d}"
+
+
+def _random_location(rng: random.Random) -> dict:
+    zone = rng.choices(("OS", "MR", "PR", "OTG"), weights=(80, 8, 8, 4))[0]
+    if zone == "OS":
+        row = rng.choice(list(_OS_ROW_SECTIONS))
+        return {
+            "zone": "OS",
+            "row": row,
+            "section": rng.randint(1, _OS_ROW_SECTIONS[row]),
+            "tier": rng.randint(1, _OS_TIERS),
+            "cell": rng.randint(1, _OS_CELLS_PER_TIER),
+        }
+    if zone == "MR":
+        return {"zone": "MR", "row": rng.randint(1, 4), "section": "", "tier": "", "cell": ""}
+    return {"zone": zone, "row": "", "section": "", "tier": "", "cell": ""}
+
+
+def reset_synthetic_dataset() -> dict:
+    """Удаляет все ранее сгенерированные синтетические данные."""
+    agencies = Agency.objects.filter(pref=SYNTHETIC_PREFIX)
+    counts = {
+        "journal": OrderAuditEntry.objects.filter(order_id__startswith=SYNTHETIC_ORDER_PREFIX).delete()[0],
+        "journal_archive": OrderAuditArchive.objects.filter(order_id__startswith=SYNTHETIC_ORDER_PREFIX).delete()[0],
+        "tasks": Task.objects.filter(route__contains=f"/{SYNTHETIC_ORDER_PREFIX}").delete()[0],
+        "marking_codes": MarkingCode.objects.filter(order_id__startswith=SYNTHETIC_ORDER_PREFIX).delete()[0],
+        "stock_moves": StockMove.objects.filter(order_id__startswith=SYNTHETIC_ORDER_PREFIX).delete()[0],
+        "reserves": InventoryState.objects.filter(agency__in=agencies).delete()[0],
+        "skus": SKU.objects.filter(agency__in=agencies).delete()[0],
+        "agencies": agencies.delete()[0],
+    }
+    # Итоги выработки накоплены и по удаленным записям журнала — пересчитываются с нуля.
+    reset_throughput()
+    _touch_caches()
+    return counts
+
+
+def _touch_caches(agency_ids=()):
+    touch_task_board()
+    touch_employee_directory()
+    touch_access()
+    for agency_id in agency_ids:
+        invalidate_stock_cache(agency_id)
+        invalidate_reserve_cache(agency_id)
+        touch_barcode_index(agency_id)
+
+
+def _set_synthetic_password(user, created: bool, password: str | None) -> None:
+    """Без явного пароля новые входы получают случайный: общий известный пароль не создается."""
+    if not created and not password:
+        return
+    user.set_password(password or secrets.token_urlsafe(24))
+    user.save(update_fields=["password"])
+
+
+def _ensure_staff(rng: random.Random, password: str | None) -> dict:
+    user_model = get_user_model()
+    staff = {}
+    for role in SYNTHETIC_ROLES:
+        user, created = user_model.objects.get_or_create(
+            username=synthetic_username(role),
+            defaults={"first_name": role},
+        )
+        _set_synthetic_password(user, created, password)
+        employee = Employee.objects.filter(user=user).first()
+        if not employee:
+            employee = Employee.objects.create(
+                full_name=f"Синтетический {rng.choice(_SUBJECTS)} {role}",
+                role=role,
+                user=user,
+            )
+        staff[role] = employee
+    return staff
+
+
+def _create_agencies(count: int, portal_users: bool, password: str | None) -> list[Agency]:
+    user_model = get_user_model()
+    agencies = []
+    for idx in range(count):
+        portal_user = None
+        if portal_users:
+            portal_user, created = user_model.objects.get_or_create(username=f"syn_client_{idx + 1}")
+            _set_synthetic_password(portal_user, created, password)
+        agencies.append(
+            Agency(
+                agn_name=f"ООО Синтетика {idx + 1}",
+                inn=f"99{idx + 1:08d}",
+                pref=SYNTHETIC_PREFIX,
+                fio_agn=f"Клиентов Клиент {idx + 1}",
+                email=f"client{idx + 1}@example.com",
+                portal_user=portal_user,
+            )
+        )
+    Agency.objects.bulk_create(agencies, batch_size=_BATCH)
+    return list(Agency.objects.filter(pref=SYNTHETIC_PREFIX).order_by("id"))
+
+
+def _create_skus(agencies: list[Agency], per_agency: int, rng: random.Random) -> dict:
+    skus = []
+    for agency in agencies:
+        for idx in range(per_agency):
+            subject = rng.choice(_SUBJECTS)
+            skus.append(
+                SKU(
+                    sku_code=f"{SYNTHETIC_PREFIX}{agency.id}-{idx + 1:04d}",
+                    name=f"{subject} {rng.choice(_BRANDS)} {idx + 1}",
+                    brand=rng.choice(_BRANDS),
+                    agency=agency,
+                    honest_sign=rng.random() < 0.3,
+                    source="manual",
+                )
+            )
+    SKU.objects.bulk_create(skus, batch_size=_BATCH)
+    created = list(SKU.objects.filter(agency__in=agencies).order_by("id"))
+    barcodes = []
+    photos = []
+    barcode_seq = 0
+    for sku in created:
+        for size in _SIZES[: rng.randint(2, len(_SIZES))]:
+            barcode_seq += 1
+            barcodes.append(
+                SKUBarcode(
+                    sku=sku,
+                    value=f"99{sku.agency_id:04d}{barcode_seq:07d}",
+                    size=size,
+                    is_primary=size == "M",
+                )
+            )
+        for order in range(rng.randint(1, 3)):
+            photos.append(
+                SKUPhoto(sku=sku, url=f"https://example.com/photos/{sku.sku_code}-{order}.jpg", sort_order=order)
+            )
+    SKUBarcode.objects.bulk_create(barcodes, batch_size=_BATCH)
+    SKUPhoto.objects.bulk_create(photos, batch_size=_BATCH)
+    by_agency = {}
+    sizes_by_sku = {}
+    for barcode in barcodes:
+        sizes_by_sku.setdefault(barcode.sku_id, []).append((barcode.size, barcode.value))
+    for sku in created:
+        by_agency.setdefault(sku.agency_id, []).append((sku, sizes_by_sku.get(sku.id, [])))
+    return by_agency
+
+
+class _Journal:
+    """Накопитель записей журнала и задач с пакетной записью."""
+
+    def __init__(self, now, days, rng):
+        self.now = now
+        self.days = days
+        self.rng = rng
+        self.entries = []
+        self.tasks = []
+        self.marking_codes = []
+        self.reserves = []
+        self.total_entries = 0
+
+    def started_at(self):
+        return self.now - timedelta(minutes=self.rng.randint(60, self.days * 24 * 60))
+
+    def add(self, action, order_id, order_type, agency, payload, created_at, user=None, description=""):
+        self.entries.append(
+            OrderAuditEntry(
+                order_id=order_id,
+                order_type=order_type,
+                action=action,
+                agency=agency,
+                user=user,
+                description=description,
+                payload=payload,
+                created_at=created_at,
+                **promoted_payload_fields(payload),
+            )
+        )
+        if len(self.entries) >= _BATCH:
+            self.flush_entries()
+
+    def flush_entries(self):
+        if self.entries:
+            OrderAuditEntry.objects.bulk_create(self.entries, batch_size=_BATCH)
+            self.total_entries += len(self.entries)
+            self.entries = []
+
+    def flush(self):
+        self.flush_entries()
+        Task.objects.bulk_create(self.tasks, batch_size=_BATCH)
+        MarkingCode.objects.bulk_create(self.marking_codes, batch_size=_BATCH, ignore_conflicts=True)
+        InventoryState.objects.bulk_create(self.reserves, batch_size=_BATCH, ignore_conflicts=True)
+
+
+def _receiving_order(journal, number, agency, catalog, staff, pallets_out):
+    rng = journal.rng
+    order_id = _order_id("rcv", number)
+    created_at = journal.started_at()
+    goods_type = rng.choice(list(GOODS_TYPE_LABELS))
+    lines = []
+    for sku, sizes in rng.sample(catalog, k=min(len(catalog), rng.randint(1, 6))):
+        for size, barcode in sizes[: rng.randint(1, max(len(sizes), 1))]:
+            lines.append((sku, size, barcode, rng.randint(5, 120)))
+    items = [
+        {"sku_code": sku.sku_code, "name": sku.name, "size": size, "qty": qty, "barcode": barcode}
+        for sku, size, barcode, qty in lines
+    ]
+    journal.add(
+        "create",
+        order_id,
+        "receiving",
+        agency,
+        {
+            "eta_at": (created_at + timedelta(days=1)).isoformat(),
+            "expected_boxes": str(max(1, len(items) // 2)),
+            "comment": "",
+            "submit_action": "send",
+            "status": "sent_unconfirmed",
+            "status_label": "Ждет подтверждения",
+            "goods_type": goods_type,
+            "items": items,
+            "documents": [],
+        },
+        created_at,
+        description="Заявка на приемку (заявка)",
+    )
+    stage = rng.random()
+    if stage < 0.15:
+        journal.tasks.append(
+            Task(
+                title=f"Подтвердите заявку на приемку товара №{order_id}",
+                description=f"Клиент: {agency.agn_name}",
+                route=f"/orders/receiving/{order_id}/",
+                assigned_to=staff["manager"],
+                due_date=created_at + timedelta(hours=6),
+            )
+        )
+        return
+    confirmed_at = created_at + timedelta(hours=2)
+    journal.add(
+        "status",
+        order_id,
+        "receiving",
+        agency,
+        {"status": "warehouse", "status_label": "На складе", "goods_type": goods_type},
+        confirmed_at,
+        user=staff["manager"].user,
+        description="Подтверждено и отправлено на склад",
+    )
+    if stage < 0.3:
+        journal.tasks.append(
+            Task(
+                title=f"Принять заявку на приемку товара №{order_id}",
+                description=f"Клиент: {agency.agn_name}",
+                route=f"/orders/receiving/{order_id}/",
+                assigned_to=staff["storekeeper"],
+                observer=staff["manager"],
+                due_date=confirmed_at + timedelta(days=1),
+            )
+        )
+        return
+    accepted_at = confirmed_at + timedelta(hours=rng.randint(3, 30))
+    act_items = [
+        {
+            "sku_code": item["sku_code"],
+            "name": item["name"],
+            "size": item["size"],
+            "planned_qty": item["qty"],
+            "actual_qty": item["qty"],
+            "comment": "",
+        }
+        for item in items
+    ]
+    act_payload = {
+        "status": "warehouse",
+        "status_label": "Товар принят",
+        "goods_type": goods_type,
+        "act": "receiving",
+        "act_label": "Акт приемки",
+        "act_mismatch": False,
+        "act_items": act_items,
+        "flow_closed": True,
+        "flow_closed_at": accepted_at.isoformat(),
+        "storekeeper_employee_id": staff["storekeeper"].id,
+        "act_storekeeper_signed": True,
+        "act_storekeeper_employee_id": staff["storekeeper"].id,
+        "act_manager_signed": True,
+        "act_manager_employee_id": staff["manager"].id,
+        "act_sent": True,
+        "act_sent_at": accepted_at.isoformat(),
+    }
+    boxes = []
+    pallets = []
+    box_codes = []
+    for idx, item in enumerate(items):
+        remaining = item["qty"]
+        part = 0
+        while remaining > 0:
+            part += 1
+            qty = min(remaining, rng.randint(10, 40))
+            remaining -= qty
+            code = f"{order_id.upper()}-B{idx + 1}-{part}"
+            box_codes.append(code)
+            boxes.append(
+                {
+                    "code": code,
+                    "items": [
+                        {
+                            "sku_code": item["sku_code"],
+                            "sku": item["sku_code"],
+                            "name": item["name"],
+                            "size": item["size"],
+                            "qty": qty,
+                        }
+                    ],
+                    "sealed": True,
+                }
+            )
+    for idx in range(0, len(box_codes), 8):
+        code = f"{order_id.upper()}-P{idx // 8 + 1}"
+        pallets.append(
+            {
+                "code": code,
+                "boxes": box_codes[idx:idx + 8],
+                "items": [],
+                "sealed": True,
+                "location": _random_location(rng),
+            }
+        )
+        pallets_out.append((agency, order_id, code, pallets[-1]["location"]))
+    act_payload["flow_state"] = {"boxes": boxes, "pallets": pallets, "active_box": "", "active_pallet": ""}
+    journal.add(
+        "status",
+        order_id,
+        "receiving",
+        agency,
+        act_payload,
+        accepted_at,
+        user=staff["storekeeper"].user,
+        description="Создан акт приемки",
+    )
+    placement_payload = {
+        key: value
+        for key, value in act_payload.items()
+        if key not in {"status", "status_label", "flow_state"}
+    }
+    placement_payload.update(
+        {
+            "act": "placement",
+            "act_label": "Акт размещения",
+            "act_state": "closed",
+            "act_items": [
+                {**item, "box_qty": item["actual_qty"], "pallet_qty": 0} for item in act_items
+            ],
+            "act_boxes": boxes,
+            "act_pallets": pallets,
+        }
+    )
+    journal.add(
+        "update",
+        order_id,
+        "receiving",
+        agency,
+        placement_payload,
+        accepted_at + timedelta(hours=1),
+        user=staff["storekeeper"].user,
+        description="Создан акт размещения",
+    )
+    journal.tasks.append(
+        Task(
+            title=f"Подписать акт приемки по заявке №{order_id}",
+            description=f"Клиент: {agency.agn_name}",
+            route=f"/orders/receiving/{order_id}/act/print/",
+            assigned_to=staff["manager"],
+            status="done",
+            due_date=accepted_at,
+        )
+    )
+
+
+def _processing_order(journal, number, agency, catalog, staff):
+    rng = journal.rng
+    order_id = _order_id("prc", number)
+    created_at = journal.started_at()
+    goods_type = rng.choice(list(GOODS_TYPE_LABELS.values()))
+    cards = []
+    stock_rows = []
+    for card_idx, (sku, sizes) in enumerate(rng.sample(catalog, k=min(len(catalog), rng.randint(1, 3)))):
+        rows = []
+        for size, barcode in sizes[: rng.randint(1, max(len(sizes), 1))]:
+            qty = rng.randint(1, 15)
+            rows.append({"article": sku.sku_code, "size": size, "barcode": barcode, "qty": qty})
+            stock_rows.append({**rows[-1], "goods_type": goods_type})
+        cards.append(
+            {
+                "id": f"card-{card_idx + 1}",
+                "article": sku.sku_code,
+                "product_name": sku.name,
+                "photo_url": f"https://example.com/photos/{sku.sku_code}-0.jpg",
+                "goods_type": goods_type,
+                "rows": rows,
+            }
+        )
+    status_value, status_label = rng.choice(
+        (
+            ("sent_unconfirmed", "Ждет подтверждения"),
+            ("processing_head", "Передана руководителю обработки"),
+            ("processing_in_work", "Взята в работу"),
+            ("done", "Выполнена"),
+            ("done", "Выполнена"),
+        )
+    )
+    base_payload = {
+        "email": agency.email or "",
+        "fio": agency.fio_agn or "",
+        "org": agency.agn_name or "",
+        "product_name": cards[0]["product_name"],
+        "article": cards[0]["article"],
+        "marketplace": rng.choice(("wb", "ozon", "ym")),
+        "cards": cards,
+        "stock_rows": stock_rows,
+        "size_rows": [
+            {"size_no": str(idx + 1), "size_value": row["size"], "barcode": row["barcode"], "processing_qty": row["qty"]}
+            for idx, row in enumerate(stock_rows)
+        ],
+        "submit_action": "send",
+        "status": "sent_unconfirmed",
+        "status_label": "Ждет подтверждения",
+    }
+    journal.add("create", order_id, "processing", agency, base_payload, created_at, description="Заявка на обработку")
+    if status_value != "sent_unconfirmed":
+        journal.add(
+            "status",
+            order_id,
+            "processing",
+            agency,
+            {**base_payload, "status": status_value, "status_label": status_label},
+            created_at + timedelta(hours=rng.randint(1, 48)),
+            user=staff["processing_head"].user,
+            description=status_label,
+        )
+    if status_value in {"processing_head", "processing_in_work"}:
+        for row in stock_rows:
+            journal.reserves.append(
+                InventoryState(
+                    agency=agency,
+                    order_id=order_id,
+                    sku=row["article"],
+                    size=row["size"],
+                    barcode=row["barcode"],
+                    goods_type=goods_type,
+                    qty=row["qty"],
+                )
+            )
+        journal.tasks.append(
+            Task(
+                title=f"Заявка на обработку №{order_id}",
+                description=f"Клиент: {agency.agn_name}",
+                route=f"/orders/processing/{order_id}/",
+                assigned_to=staff["processing_head"],
+                status="in_progress" if status_value == "processing_in_work" else "backlog",
+                due_date=created_at + timedelta(days=1),
+            )
+        )
+    if status_value != "sent_unconfirmed":
+        sku_by_code = {sku.sku_code: sku for sku, _ in catalog}
+        for row in stock_rows:
+            sku = sku_by_code.get(row["article"])
+            if not sku or not sku.honest_sign:
+                continue
+            for idx in range(row["qty"]):
+                journal.marking_codes.append(
+                    MarkingCode(
+                        order_type="processing",
+                        order_id=order_id,
+                        agency=agency,
+                        sku=sku,
+                        sku_code=row["article"],
+                        size=row["size"],
+                        barcode=row["barcode"],
+                        code=f"01{row['barcode']}21{order_id}{row['size']}{idx:04d}",
+                    )
+                )
+
+
+def _stock_move_order(journal, number, pallet, staff):
+    rng = journal.rng
+    agency, receiving_order_id, pallet_code, location = pallet
+    order_id = _order_id("mov", number)
+    created_at = journal.started_at()
+    from_location = _random_location(rng)
+    payload = {
+        "status": "created",
+        "status_label": "Ожидает перевозки",
+        "pallet_code": pallet_code,
+        "from_location": from_location,
+        "to_location": location,
+        "receiving_order_id": receiving_order_id,
+        "requested_by_name": staff["storekeeper"].full_name,
+        "requested_by_role": "storekeeper",
+    }
+    journal.add(
+        "create",
+        order_id,
+        "stock_move",
+        agency,
+        payload,
+        created_at,
+        user=staff["storekeeper"].user,
+        description=f"Задание на перемещение паллеты {pallet_code}",
+    )
+    if rng.random() < 0.8:
+        journal.add(
+            "status",
+            order_id,
+            "stock_move",
+            agency,
+            {**payload, "status": "done", "status_label": "Перемещено"},
+            created_at + timedelta(minutes=rng.randint(5, 240)),
+            user=staff["reachtruck_driver"].user,
+            description=f"Паллета {pallet_code} перемещена",
+        )
+
+
+def generate_dataset(
+    orders: int = 1000,
+    agencies: int = 10,
+    skus_per_agency: int = 40,
+    days: int = 90,
+    seed: int = 1,
+    portal_users: bool = True,
+    password: str | None = None,
+) -> dict:
+    """
+    Генерирует синтетический склад: клиентов, SKU со штрихкодами и фото, заявки на приемку,
+    обработку и перемещение с полными актами, задачи, резервы и коды маркировки.
+    Примерно 60% заявок — приемка, 25% — обработка, 15% — перемещения паллет.
+    Предыдущий синтетический набор удаляется. Входы syn_* получают password,
+    а без него — случайные пароли (для замеров достаточно force_login).
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    with transaction.atomic():
+        reset_synthetic_dataset()
+        staff = _ensure_staff(rng, password)
+        agency_rows = _create_agencies(agencies, portal_users, password)
+        catalog = _create_skus(agency_rows, skus_per_agency, rng)
+        journal = _Journal(now, days, rng)
+        receiving_count = int(orders * 0.6)
+        processing_count = int(orders * 0.25)
+        move_count = max(orders - receiving_count - processing_count, 0)
+        pallets = []
+        for number in range(1, receiving_count + 1):
+            agency = rng.choice(agency_rows)
+            _receiving_order(journal, number, agency, catalog[agency.id], staff, pallets)
+        for number in range(1, processing_count + 1):
+            agency = rng.choice(agency_rows)
+            _processing_order(journal, number, agency, catalog[agency.id], staff)
+        moved = 0
+        if pallets:
+            for number in range(1, move_count + 1):
+                _stock_move_order(journal, number, rng.choice(pallets), staff)
+                moved += 1
+        journal.flush()
+        rebuild_stock_moves(SYNTHETIC_ORDER_PREFIX)
+    _touch_caches([agency.id for agency in agency_rows])
+    return {
+        "agencies": len(agency_rows),
+        "skus": sum(len(items) for items in catalog.values()),
+        "receiving": receiving_count,
+        "processing": processing_count,
+        "stock_move": moved,
+        "journal_entries": journal.total_entries,
+        "tasks": len(journal.tasks),
+        "marking_codes": len(journal.marking_codes),
+        "reserves": len(journal.reserves),
+    }
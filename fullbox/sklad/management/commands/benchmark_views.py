@@ -0,0 +1,73 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from sklad.benchmarks import (
+    BENCHMARK_VIEWS,
+    DEFAULT_BASELINE_PATH,
+    compare_with_baseline,
+    load_baseline,
+    run_benchmarks,
+    save_baseline,
+)
+
+
+class Command(BaseCommand):
+    help = "Benchmark hot views on the synthetic dataset and compare latency percentiles and query counts with a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=10)
+        parser.add_argument("--warmup", type=int, default=1)
+        parser.add_argument("--view", action="append", dest="views", help="Run only the named view (repeatable).")
+        parser.add_argument("--cold", action="store_true", help="Clear the cache before every request.")
+        parser.add_argument("--baseline", default=str(DEFAULT_BASELINE_PATH))
+        parser.add_argument("--save-baseline", action="store_true", help="Write the results as the new baseline.")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed p95 growth (0.2 = 20%%).")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        known = {spec["name"] for spec in BENCHMARK_VIEWS}
+        unknown = set(options["views"] or []) - known
+        if unknown:
+            raise CommandError(f"Unknown views: {', '.join(sorted(unknown))}. Known: {', '.join(sorted(known))}")
+        try:
+            results = run_benchmarks(
+                repeat=max(options["repeat"], 1),
+                warmup=max(options["warmup"], 0),
+                names=set(options["views"] or []),
+                cold=options["cold"],
+            )
+        except LookupError as exc:
+            raise CommandError(str(exc))
+        baseline_path = Path(options["baseline"])
+        results = compare_with_baseline(results, load_baseline(baseline_path), options["tolerance"])
+
+        header = f"{'view':<26}{'status':>7}{'p50':>9}{'p90':>9}{'p95':>9}{'max':>9}{'sql':>6}{'base p95':>10}{'Δ%':>8}"
+        self.stdout.write(header)
+        self.stdout.write("-" * len(header))
+        for row in results:
+            base = "-" if row["baseline_p95_ms"] is None else f"{row['baseline_p95_ms']:.1f}"
+            change = "-" if row["p95_change"] is None else f"{row['p95_change']:+.1f}"
+            line = (
+                f"{row['name']:<26}{row['status']:>7}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+                f"{row['p95_ms']:>9.1f}{row['max_ms']:>9.1f}{row['queries']:>6}{base:>10}{change:>8}"
+            )
+            self.stdout.write(self.style.ERROR(line) if row["regression"] else line)
+
+        if options["save_baseline"]:
+            save_baseline(
+                baseline_path,
+                results,
+                meta={
+                    "created_at": timezone.now().isoformat(),
+                    "database": connection.vendor,
+                    "repeat": options["repeat"],
+                    "cold": options["cold"],
+                },
+            )
+            self.stdout.write(f"Baseline saved to {baseline_path}")
+        regressions = [row["name"] for row in results if row["regression"]]
+        if regressions and options["fail_on_regression"]:
+            raise CommandError(f"Regressions: {', '.join(regressions)}")
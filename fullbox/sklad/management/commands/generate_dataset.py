@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from sklad.dataset import generate_dataset, reset_synthetic_dataset
+
+
+SIZE_PRESETS = {
+    "small": {"orders": 1000, "agencies": 10, "skus_per_agency": 40},
+    "medium": {"orders": 10000, "agencies": 40, "skus_per_agency": 80},
+    "large": {"orders": 40000, "agencies": 120, "skus_per_agency": 150},
+}
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic warehouse dataset (agencies, SKUs, orders, tasks, marking codes) for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", choices=sorted(SIZE_PRESETS), default="small")
+        parser.add_argument("--orders", type=int, help="Override the number of orders.")
+        parser.add_argument("--agencies", type=int, help="Override the number of agencies.")
+        parser.add_argument("--skus-per-agency", type=int, help="Override the number of SKUs per agency.")
+        parser.add_argument("--days", type=int, default=90, help="Spread orders over this many days.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--reset", action="store_true", help="Only delete previously generated data.")
+        parser.add_argument(
+            "--password",
+            help="Password for the syn_* staff and client logins. Without it every login gets a random password.",
+        )
+        parser.add_argument(
+            "--allow-production",
+            action="store_true",
+            help="Run even though DEBUG is off.",
+        )
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options["allow_production"]:
+            raise CommandError(
+                "DEBUG is off: this looks like a production database. "
+                "Synthetic data adds logins for every role; pass --allow-production to run anyway."
+            )
+        if options["reset"]:
+            counts = reset_synthetic_dataset()
+            self.stdout.write("Deleted: " + ", ".join(f"{key}={value}" for key, value in counts.items()))
+            return
+        params = dict(SIZE_PRESETS[options["size"]])
+        for key in ("orders", "agencies", "skus_per_agency"):
+            if options.get(key) is not None:
+                params[key] = options[key]
+        if min(params.values()) <= 0:
+            raise CommandError("Orders, agencies and SKUs per agency must be positive.")
+        self.stdout.write(
+            f"Generating {params['orders']} orders for {params['agencies']} agencies "
+            f"({params['skus_per_agency']} SKUs each)..."
+        )
+        summary = generate_dataset(
+            days=options["days"], seed=options["seed"], password=options["password"], **params
+        )
+        self.stdout.write(", ".join(f"{key}={value}" for key, value in summary.items()))
+        passwords = "the --password value" if options["password"] else "random (pass --password to sign in by hand)"
+        self.stdout.write(
+            self.style.SUCCESS(f"Done. Staff logins: syn_<role>, clients: syn_client_<n>, passwords: {passwords}")
+        )
@@ -0,0 +1,32 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from sklad.snapshots import build_snapshots
+
+
+def _parse_date(value: str | None) -> date | None:
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError as exc:
+        raise CommandError(f"Invalid date: {value} (expected YYYY-MM-DD).") from exc
+
+
+class Command(BaseCommand):
+    help = "Write end-of-day inventory snapshots: by default every missing day up to yesterday."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since", help="First day to (re)build, YYYY-MM-DD (default: day after the last snapshot).")
+        parser.add_argument("--until", help="Last day to build, YYYY-MM-DD (default: yesterday).")
+
+    def handle(self, *args, **options):
+        since = _parse_date(options["since"])
+        until = _parse_date(options["until"])
+        if since and until and since > until:
+            raise CommandError("--since must not be later than --until.")
+        built = build_snapshots(since=since, until=until)
+        for day, rows in built.items():
+            self.stdout.write(f"{day.isoformat()}: {rows} rows")
+        self.stdout.write(self.style.SUCCESS(f"Done. Built {len(built)} snapshots."))
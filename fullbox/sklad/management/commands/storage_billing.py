@@ -0,0 +1,58 @@
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from sklad.billing import month_period, statement_xlsx, storage_statements
+from sku.models import Agency
+
+
+class Command(BaseCommand):
+    help = "Compute pallet-day storage charges per client for a period and optionally export XLSX statements."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--period", help="Billing month, YYYY-MM (default: previous month).")
+        parser.add_argument("--from", dest="start", help="First day, YYYY-MM-DD (instead of --period).")
+        parser.add_argument("--to", dest="end", help="Last day, YYYY-MM-DD (instead of --period).")
+        parser.add_argument("--agency", type=int, action="append", help="Agency id; repeat for several (default: all).")
+        parser.add_argument("--recompute", action="store_true", help="Ignore statements saved for a closed period.")
+        parser.add_argument("--xlsx", metavar="DIR", help="Write one statement per client with charges into DIR.")
+
+    def handle(self, *args, **options):
+        try:
+            if options["start"] or options["end"]:
+                if not (options["start"] and options["end"]):
+                    raise CommandError("Use --from and --to together.")
+                start, end = date.fromisoformat(options["start"]), date.fromisoformat(options["end"])
+            elif options["period"]:
+                start, end = month_period(options["period"])
+            else:
+                start, end = month_period(f"{timezone.localdate().replace(day=1) - timedelta(days=1):%Y-%m}")
+        except ValueError as exc:
+            raise CommandError(f"Invalid period: {exc}") from exc
+        if start > end:
+            raise CommandError("Period start must not be later than its end.")
+        started = time.perf_counter()
+        statements = storage_statements(start, end, agency_ids=options["agency"], recompute=options["recompute"])
+        elapsed = time.perf_counter() - started
+        agencies = Agency.objects.in_bulk(list(statements))
+        billed = [item for item in statements.values() if item["pallet_days"]]
+        billed.sort(key=lambda item: -item["amount"])
+        self.stdout.write(f"{'agency':<40}{'pallet-days':>12}{'amount':>14}")
+        for item in billed:
+            self.stdout.write(f"{str(agencies[item['agency_id']])[:39]:<40}{item['pallet_days']:>12}{item['amount']:>14.2f}")
+        if options["xlsx"]:
+            target = Path(options["xlsx"])
+            target.mkdir(parents=True, exist_ok=True)
+            for item in billed:
+                path = target / f"storage_{item['agency_id']}_{start:%Y%m%d}_{end:%Y%m%d}.xlsx"
+                path.write_bytes(statement_xlsx(agencies[item["agency_id"]], item))
+            self.stdout.write(f"Wrote {len(billed)} statements to {target}.")
+        total = sum(item["amount"] for item in billed)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Done. {start}..{end}: {len(billed)} clients billed, {total:.2f} total, computed in {elapsed:.2f}s."
+            )
+        )
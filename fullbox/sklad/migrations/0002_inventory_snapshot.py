@@ -0,0 +1,55 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sklad", "0001_inventory_state"),
+        ("sku", "0008_agency_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="InventorySnapshot",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField()),
+                ("order_id", models.CharField(max_length=64)),
+                ("pallet_code", models.CharField(blank=True, max_length=64)),
+                ("zone", models.CharField(blank=True, max_length=8)),
+                ("row", models.PositiveSmallIntegerField(default=0)),
+                ("section", models.PositiveSmallIntegerField(default=0)),
+                ("tier", models.PositiveSmallIntegerField(default=0)),
+                ("cell", models.PositiveSmallIntegerField(default=0)),
+                ("sku", models.CharField(blank=True, max_length=64)),
+                ("name", models.CharField(blank=True, max_length=255)),
+                ("size", models.CharField(blank=True, max_length=64)),
+                ("goods_type", models.CharField(blank=True, max_length=64)),
+                ("qty", models.IntegerField(default=0)),
+                (
+                    "agency",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="inventory_snapshots",
+                        to="sku.agency",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["agency", "date"], name="sklad_inven_agency__3bb043_idx"),
+                    models.Index(fields=["date", "order_id"], name="sklad_inven_date_d06372_idx"),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name="InventorySnapshotDay",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("date", models.DateField(unique=True)),
+                ("rows", models.PositiveIntegerField(default=0)),
+                ("built_at", models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
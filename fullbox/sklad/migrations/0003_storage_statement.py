@@ -0,0 +1,44 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("sklad", "0002_inventory_snapshot"),
+        ("sku", "0008_agency_user"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="StorageStatement",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("period_start", models.DateField()),
+                ("period_end", models.DateField()),
+                ("pallet_days", models.PositiveIntegerField(default=0)),
+                ("amount", models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ("lines", models.JSONField(blank=True, default=dict)),
+                ("computed_at", models.DateTimeField(auto_now=True)),
+                (
+                    "agency",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="storage_statements",
+                        to="sku.agency",
+                    ),
+                ),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["period_start", "period_end"], name="sklad_stora_period__5ecfbc_idx"),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=["agency", "period_start", "period_end"],
+                        name="uniq_storage_statement_period",
+                    )
+                ],
+            },
+        ),
+    ]
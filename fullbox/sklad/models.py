@@ -46,3 +46,68 @@ class InventoryState(models.Model):
 
     def __str__(self) -> str:
         return f"{self.sku} · {self.size or '-'} · {self.state}"
+
+
+class InventorySnapshot(models.Model):
+    """Остаток на конец дня: строка акта размещения (заявка, паллета, место, SKU)."""
+
+    date = models.DateField()
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name="inventory_snapshots")
+    order_id = models.CharField(max_length=64)
+    pallet_code = models.CharField(max_length=64, blank=True)
+    zone = models.CharField(max_length=8, blank=True)
+    row = models.PositiveSmallIntegerField(default=0)
+    section = models.PositiveSmallIntegerField(default=0)
+    tier = models.PositiveSmallIntegerField(default=0)
+    cell = models.PositiveSmallIntegerField(default=0)
+    sku = models.CharField(max_length=64, blank=True)
+    name = models.CharField(max_length=255, blank=True)
+    size = models.CharField(max_length=64, blank=True)
+    goods_type = models.CharField(max_length=64, blank=True)
+    qty = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["agency", "date"]),
+            models.Index(fields=["date", "order_id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.date} · {self.sku or '-'} · {self.qty}"
+
+
+class InventorySnapshotDay(models.Model):
+    """Отметка о готовом снимке остатков за день."""
+
+    date = models.DateField(unique=True)
+    rows = models.PositiveIntegerField(default=0)
+    built_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.date} ({self.rows})"
+
+
+class StorageStatement(models.Model):
+    """Начисление за хранение клиента за закрытый период (паллето-дни по зонам и по дням)."""
+
+    agency = models.ForeignKey(Agency, on_delete=models.CASCADE, related_name="storage_statements")
+    period_start = models.DateField()
+    period_end = models.DateField()
+    pallet_days = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    lines = models.JSONField(default=dict, blank=True)
+    computed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["agency", "period_start", "period_end"],
+                name="uniq_storage_statement_period",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["period_start", "period_end"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.agency_id} · {self.period_start}–{self.period_end} · {self.amount}"
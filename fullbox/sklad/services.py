@@ -0,0 +1,497 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
+from fullbox.db_concurrency import immediate_atomic, retry_on_lock
+from sku.models import Agency, SKU
+
+from .models import InventoryState
+
+
+GOODS_TYPE_LABELS = {
+    "op": "Оптовый",
+    "gv": "Готовый",
+    "br": "Брак",
+    "vz": "Возврат",
+    "rh": "Расходный",
+    "no": "Не обработанный",
+}
+
+
+def _parse_qty_value(raw: object | None) -> int | None:
+    if raw is None:
+        return None
+    text = str(raw).strip()
+    if not text:
+        return None
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_goods_type(value) -> str:
+    text = str(value or "").strip()
+    if not text or text == "-":
+        return ""
+    lowered = text.lower()
+    if lowered in GOODS_TYPE_LABELS:
+        return GOODS_TYPE_LABELS[lowered].lower()
+    return lowered
+
+
+def placed_stock_totals(agency: Agency | None) -> dict[tuple[str, str, str, str], dict]:
+    """
+    Остатки клиента по закрытым актам размещения.
+    Ключ: (sku, name, size, goods_type), значение: {"sku", "name", "size", "qty", "goods_type"}.
+    """
+    if not agency:
+        return {}
+    order_ids = list(
+        OrderAuditEntry.objects.filter(order_type="receiving", agency=agency)
+        .values_list("order_id", flat=True)
+        .distinct()
+    )
+    if not order_ids:
+        return {}
+    entries = (
+        OrderAuditEntry.objects.filter(order_type="receiving", order_id__in=order_ids)
+        .order_by("-created_at")
+    )
+    goods_type_by_order = {}
+    latest_by_order = {}
+    blocked_orders = set()
+    for entry in entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
+        payload = entry.payload or {}
+        if entry.order_id not in goods_type_by_order:
+            goods_type = (payload.get("goods_type") or "").strip().lower()
+            goods_label = (payload.get("goods_type_label") or "").strip()
+            if not goods_label and goods_type in GOODS_TYPE_LABELS:
+                goods_label = GOODS_TYPE_LABELS[goods_type]
+            if goods_label or goods_type:
+                goods_type_by_order[entry.order_id] = goods_label or goods_type
+        if entry.order_id in latest_by_order or entry.order_id in blocked_orders:
+            continue
+        if payload.get("act") != "placement":
+            continue
+        state = (payload.get("act_state") or "closed").lower()
+        if state != "closed":
+            blocked_orders.add(entry.order_id)
+            continue
+        latest_by_order[entry.order_id] = entry
+
+    totals = {}
+
+    def add_item(item, goods_label: str):
+        sku = (item.get("sku") or item.get("sku_code") or "").strip()
+        name = (item.get("name") or "").strip()
+        size = (item.get("size") or "").strip()
+        qty = _parse_qty_value(item.get("qty"))
+        if qty is None:
+            qty = _parse_qty_value(item.get("actual_qty")) or 0
+        if not any((sku, name, size)):
+            return
+        goods_label = goods_label or "-"
+        key = (sku, name, size, goods_label)
+        entry = totals.setdefault(
+            key,
+            {"sku": sku, "name": name, "size": size, "qty": 0, "goods_type": goods_label},
+        )
+        entry["qty"] += qty
+
+    for entry in latest_by_order.values():
+        payload = entry.payload or {}
+        goods_label = goods_type_by_order.get(entry.order_id, "-")
+        boxes = payload.get("act_boxes") or []
+        pallets = payload.get("act_pallets") or []
+        for box in boxes:
+            for item in (box or {}).get("items") or []:
+                add_item(item, goods_label)
+        for pallet in pallets:
+            for item in (pallet or {}).get("items") or []:
+                add_item(item, goods_label)
+        if not boxes and not pallets:
+            for item in payload.get("act_items") or []:
+                add_item(item, goods_label)
+    return totals
+
+
+def _barcode_value_for_sku(sku, size: str | None) -> str:
+    if not sku:
+        return "-"
+    barcodes = list(getattr(sku, "barcodes", []).all())
+    if not barcodes:
+        return "-"
+    size_value = (size or "").strip()
+    if size_value:
+        for barcode in barcodes:
+            if (barcode.size or "").strip() == size_value:
+                return barcode.value
+    primary = next((barcode for barcode in barcodes if barcode.is_primary), None)
+    return primary.value if primary else barcodes[0].value
+
+
+def _normalize_photo_url(url: str) -> str:
+    if not url:
+        return ""
+    if url.startswith(("http://", "https://", "/")):
+        return url
+    return f"/{url}"
+
+
+def _sku_photo_url(sku_obj: SKU | None) -> str:
+    if not sku_obj:
+        return ""
+    url = (sku_obj.img or "").strip()
+    if url:
+        return _normalize_photo_url(url)
+    photos = list(getattr(sku_obj, "photos", []).all())
+    if photos:
+        url = (photos[0].url or "").strip()
+        return _normalize_photo_url(url)
+    return ""
+
+
+def placed_stock_items(agency: Agency | None) -> list[dict]:
+    """Остатки клиента без учета резервов, дополненные штрихкодом и фото SKU."""
+    totals = placed_stock_totals(agency)
+    if not totals:
+        return []
+    sku_codes = {item["sku"] for item in totals.values() if item.get("sku")}
+    sku_map = {}
+    if sku_codes:
+        for sku in (
+            SKU.objects.filter(agency=agency, deleted=False, sku_code__in=sku_codes)
+            .prefetch_related("barcodes", "photos")
+        ):
+            sku_map[sku.sku_code] = sku
+    items = []
+    for item in totals.values():
+        sku_obj = sku_map.get(item.get("sku"))
+        barcode = _barcode_value_for_sku(sku_obj, item.get("size")) if sku_obj else "-"
+        items.append(
+            {
+                "sku": item.get("sku") or "",
+                "name": item.get("name") or "",
+                "size": item.get("size") or "",
+                "barcode": barcode or "-",
+                "qty": item.get("qty") or 0,
+                "goods_type": item.get("goods_type") or "-",
+                "photo": _sku_photo_url(sku_obj),
+            }
+        )
+    items.sort(
+        key=lambda row: (
+            row.get("name") or "",
+            row.get("goods_type") or "",
+            row.get("size") or "",
+            row.get("sku") or "",
+        )
+    )
+    return items
+
+
+def _stock_cache_key(agency_id) -> str:
+    return f"sklad:stock:{agency_id}"
+
+
+def _reserve_cache_key(agency_id) -> str:
+    return f"sklad:reserves:{agency_id}"
+
+
+def invalidate_stock_cache(agency_id) -> None:
+    """Сбрасывает снимок остатков клиента (размещение, перемещение, завершение обработки)."""
+    if agency_id:
+        cache.delete_many([_stock_cache_key(agency_id), _reserve_cache_key(agency_id)])
+
+
+def invalidate_reserve_cache(agency_id) -> None:
+    if agency_id:
+        cache.delete(_reserve_cache_key(agency_id))
+
+
+def cached_placed_stock_items(agency: Agency | None) -> list[dict]:
+    if not agency:
+        return []
+    key = _stock_cache_key(agency.pk)
+    items = cache.get(key)
+    if items is None:
+        items = placed_stock_items(agency)
+        cache.set(key, items, settings.STOCK_CACHE_SECONDS)
+    return items
+
+
+def cached_reserve_maps(
+    agency: Agency | None,
+    exclude_order_id: str | None = None,
+) -> tuple[dict[tuple[str, str, str], int], dict[tuple[str, str], int]]:
+    """Резервы клиента из кэша; резервы exclude_order_id вычитаются отдельным запросом."""
+    if not agency:
+        return {}, {}
+    key = _reserve_cache_key(agency.pk)
+    maps = cache.get(key)
+    if maps is None:
+        maps = processing_reserve_maps(agency)
+        cache.set(key, maps, settings.STOCK_CACHE_SECONDS)
+    reserve_map, reserve_any = maps
+    if not exclude_order_id:
+        return reserve_map, reserve_any
+    own_rows = InventoryState.objects.filter(
+        agency=agency,
+        order_type="processing",
+        order_id=str(exclude_order_id),
+        state=InventoryState.STATE_PROCESSING,
+    ).values_list("sku", "size", "goods_type", "qty")
+    reserve_map = dict(reserve_map)
+    reserve_any = dict(reserve_any)
+    for sku, size, goods_type, qty in own_rows:
+        sku_key = (sku or "").strip().lower()
+        if not sku_key:
+            continue
+        size_key = (size or "").strip().lower()
+        key = (sku_key, size_key, normalize_goods_type(goods_type))
+        reserve_map[key] = reserve_map.get(key, 0) - (qty or 0)
+        reserve_any[(sku_key, size_key)] = reserve_any.get((sku_key, size_key), 0) - (qty or 0)
+    return reserve_map, reserve_any
+
+
+def available_stock_items(agency: Agency | None, exclude_order_id: str | None = None) -> list[dict]:
+    """Свободные остатки клиента для подбора в заявку на обработку."""
+    items = cached_placed_stock_items(agency)
+    if not items:
+        return []
+    reserve_map, reserve_any = cached_reserve_maps(agency, exclude_order_id=exclude_order_id)
+    available = []
+    for item in items:
+        reserved = reserved_qty(
+            reserve_map,
+            reserve_any,
+            item.get("sku") or "",
+            item.get("size") or "",
+            item.get("goods_type") or "",
+        )
+        available_qty = max((item.get("qty") or 0) - reserved, 0)
+        if available_qty <= 0:
+            continue
+        available.append({**item, "qty": available_qty})
+    return available
+
+
+def processing_reserve_maps(
+    agency: Agency | None,
+    exclude_order_id: str | None = None,
+) -> tuple[dict[tuple[str, str, str], int], dict[tuple[str, str], int]]:
+    if not agency:
+        return {}, {}
+    reserves = InventoryState.objects.filter(agency=agency, state=InventoryState.STATE_PROCESSING)
+    if exclude_order_id:
+        reserves = reserves.exclude(order_type="processing", order_id=str(exclude_order_id))
+    totals = (
+        reserves.exclude(sku="")
+        .values("sku", "size", "goods_type")
+        .annotate(total=Sum("qty"))
+        .order_by()
+    )
+    reserve_map: dict[tuple[str, str, str], int] = {}
+    reserve_any: dict[tuple[str, str], int] = {}
+    for row in totals:
+        sku = (row["sku"] or "").strip()
+        if not sku:
+            continue
+        size = (row["size"] or "").strip()
+        qty = row["total"] or 0
+        goods_key = normalize_goods_type(row["goods_type"])
+        key = (sku.lower(), size.lower(), goods_key)
+        reserve_map[key] = reserve_map.get(key, 0) + qty
+        any_key = (sku.lower(), size.lower())
+        reserve_any[any_key] = reserve_any.get(any_key, 0) + qty
+    return reserve_map, reserve_any
+
+
+def reserved_qty(
+    reserve_map: dict[tuple[str, str, str], int],
+    reserve_any: dict[tuple[str, str], int],
+    sku: str,
+    size: str,
+    goods_type: str | None = None,
+) -> int:
+    sku_key = (sku or "").strip().lower()
+    if not sku_key:
+        return 0
+    size_key = (size or "").strip().lower()
+    goods_key = normalize_goods_type(goods_type)
+    if not goods_key:
+        return reserve_any.get((sku_key, size_key), 0)
+    return reserve_map.get((sku_key, size_key, goods_key), 0) + reserve_map.get(
+        (sku_key, size_key, ""),
+        0,
+    )
+
+
+def processing_reserve_rows(stock_rows: list[dict]) -> dict[tuple[str, str, str, str], int]:
+    reserves: dict[tuple[str, str, str, str], int] = {}
+    for row in stock_rows or []:
+        if not isinstance(row, dict):
+            continue
+        sku = (row.get("article") or row.get("sku") or "").strip()
+        if not sku:
+            continue
+        qty_value = _parse_qty_value(row.get("qty"))
+        if qty_value is None or qty_value <= 0:
+            continue
+        size = (row.get("size") or "").strip()
+        barcode = (row.get("barcode") or "").strip()
+        goods_type = (row.get("goods_type") or "").strip()
+        key = (sku, size, barcode, goods_type)
+        reserves[key] = reserves.get(key, 0) + qty_value
+    return reserves
+
+
+def _on_hand_maps(
+    items: list[dict],
+) -> tuple[dict[tuple[str, str, str], int], dict[tuple[str, str], int]]:
+    on_hand_map: dict[tuple[str, str, str], int] = {}
+    on_hand_any: dict[tuple[str, str], int] = {}
+    for item in items:
+        sku_key = (item.get("sku") or "").strip().lower()
+        if not sku_key:
+            continue
+        size_key = (item.get("size") or "").strip().lower()
+        goods_key = normalize_goods_type(item.get("goods_type"))
+        qty = item.get("qty") or 0
+        on_hand_map[(sku_key, size_key, goods_key)] = on_hand_map.get((sku_key, size_key, goods_key), 0) + qty
+        on_hand_any[(sku_key, size_key)] = on_hand_any.get((sku_key, size_key), 0) + qty
+    return on_hand_map, on_hand_any
+
+
+def _reserve_shortfall(
+    agency: Agency,
+    order_id: str,
+    requested: dict[tuple[str, str, str, str], int],
+    current: dict[tuple[str, str, str, str], int],
+) -> list[dict]:
+    grouped: dict[tuple[str, str, str], dict] = {}
+    for (sku, size, _barcode, goods_type), qty in requested.items():
+        key = (sku.lower(), size.lower(), normalize_goods_type(goods_type))
+        row = grouped.setdefault(
+            key,
+            {"sku": sku, "size": size, "goods_type": goods_type, "requested": 0, "current": 0},
+        )
+        row["requested"] += qty
+    for (sku, size, _barcode, goods_type), qty in current.items():
+        key = (sku.lower(), size.lower(), normalize_goods_type(goods_type))
+        if key in grouped:
+            grouped[key]["current"] += qty
+    growing = [row for row in grouped.values() if row["requested"] > row["current"]]
+    if not growing:
+        return []
+    # Остатки читаются из журнала под блокировкой, а не из кэша: они и убывают (завершение
+    # обработки, повторно открытый акт размещения), а кэш процесса может не знать о сбросе
+    # в другом воркере.
+    on_hand_map, on_hand_any = _on_hand_maps(placed_stock_items(agency))
+    reserve_map, reserve_any = processing_reserve_maps(agency, exclude_order_id=order_id)
+    shortfall = []
+    for row in growing:
+        sku_key = row["sku"].lower()
+        size_key = row["size"].lower()
+        goods_key = normalize_goods_type(row["goods_type"])
+        if goods_key:
+            on_hand = on_hand_map.get((sku_key, size_key, goods_key), 0) + on_hand_map.get(
+                (sku_key, size_key, ""),
+                0,
+            )
+        else:
+            on_hand = on_hand_any.get((sku_key, size_key), 0)
+        reserved = reserved_qty(reserve_map, reserve_any, row["sku"], row["size"], row["goods_type"])
+        available = max(on_hand - reserved, 0)
+        if row["requested"] > available:
+            shortfall.append(
+                {
+                    "sku": row["sku"],
+                    "size": row["size"],
+                    "goods_type": row["goods_type"],
+                    "requested": row["requested"],
+                    "available": available,
+                    "missing": row["requested"] - available,
+                }
+            )
+    return shortfall
+
+
+@retry_on_lock
+def reserve_processing_stock(order_id: str, agency: Agency, stock_rows: list[dict]) -> list[dict]:
+    """
+    Атомарно приводит резервы заявки на обработку к stock_rows.
+
+    Резервы клиента сериализуются блокировкой строки Agency: чтение остатков,
+    проверка «остаток минус чужие резервы» и запись выполняются под ней, поэтому две
+    параллельные заявки не могут забрать один и тот же товар. Если резерва
+    не хватает, ничего не пишется и возвращается список нехватки
+    (sku, size, goods_type, requested, available, missing); пустой список — успех.
+    Меняются только отличающиеся строки резерва.
+    """
+    if not order_id or not agency:
+        return []
+    order_id = str(order_id)
+    requested = processing_reserve_rows(stock_rows)
+    with immediate_atomic():
+        Agency.objects.select_for_update().filter(pk=agency.pk).first()
+        existing = {
+            (entry.sku, entry.size, entry.barcode, entry.goods_type): entry
+            for entry in InventoryState.objects.select_for_update().filter(
+                agency=agency,
+                order_type="processing",
+                order_id=order_id,
+                state=InventoryState.STATE_PROCESSING,
+            )
+        }
+        current = {key: entry.qty for key, entry in existing.items()}
+        shortfall = _reserve_shortfall(agency, order_id, requested, current)
+        if shortfall:
+            return shortfall
+        stale_ids = [entry.pk for key, entry in existing.items() if key not in requested]
+        if stale_ids:
+            InventoryState.objects.filter(pk__in=stale_ids).delete()
+        changed = []
+        created = []
+        for key, qty in requested.items():
+            entry = existing.get(key)
+            if entry is None:
+                sku, size, barcode, goods_type = key
+                created.append(
+                    InventoryState(
+                        agency=agency,
+                        order_type="processing",
+                        order_id=order_id,
+                        sku=sku,
+                        size=size,
+                        barcode=barcode,
+                        goods_type=goods_type,
+                        qty=qty,
+                        state=InventoryState.STATE_PROCESSING,
+                    )
+                )
+            elif entry.qty != qty:
+                entry.qty = qty
+                entry.updated_at = timezone.now()
+                changed.append(entry)
+        if changed:
+            InventoryState.objects.bulk_update(changed, ["qty", "updated_at"])
+        if created:
+            InventoryState.objects.bulk_create(created)
+        if stale_ids or changed or created:
+            transaction.on_commit(lambda: invalidate_reserve_cache(agency.pk))
+    return []
+
+
+def format_shortfall(shortfall: list[dict]) -> str:
+    if not shortfall:
+        return ""
+    row = shortfall[0]
+    return (
+        f"Количество для {row.get('sku') or '-'} ({row.get('size') or '-'}) "
+        f"превышает остаток: {row.get('available', 0)}."
+    )
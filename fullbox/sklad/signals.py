@@ -0,0 +1,35 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from audit.models import OrderAuditEntry
+
+from .models import InventoryState
+from .services import invalidate_reserve_cache, invalidate_stock_cache
+
+
+_DONE_STATUSES = {"done", "completed", "closed", "finished"}
+
+
+def _changes_stock(entry: OrderAuditEntry) -> bool:
+    payload = entry.payload or {}
+    if entry.order_type == "receiving":
+        return payload.get("act") == "placement"
+    if entry.order_type == "stock_move":
+        return True
+    if entry.order_type == "processing":
+        status_value = (payload.get("status") or "").strip().lower()
+        return status_value in _DONE_STATUSES
+    return False
+
+
+@receiver(post_save, sender=OrderAuditEntry)
+@receiver(post_delete, sender=OrderAuditEntry)
+def drop_stock_cache_on_journal_change(sender, instance, **kwargs):
+    if instance.agency_id and _changes_stock(instance):
+        invalidate_stock_cache(instance.agency_id)
+
+
+@receiver(post_save, sender=InventoryState)
+@receiver(post_delete, sender=InventoryState)
+def drop_reserve_cache_on_reserve_change(sender, instance, **kwargs):
+    invalidate_reserve_cache(instance.agency_id)
@@ -0,0 +1,248 @@
+"""
+Ежедневные снимки остатков.
+
+Снимок дня D — строки закрытых актов размещения на конец D (клиент, заявка, паллета,
+место, SKU, количество). Он строится из снимка D-1 и событий размещения за день D:
+строки заявок без событий копируются, заявки с событиями пересчитываются по последней
+записи дня. Остаток на любую дату — чтение ближайшего снимка не позже даты
+плюс события после него (при ежедневном запуске — не больше дня). archive_orders
+переносит вытесненные записи актов в архив, поэтому события читаются из журнала
+и из архива (audit.archive.archived_entries_between).
+"""
+
+import heapq
+from datetime import date as date_type, datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from audit.archive import archived_entries_between
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
+from stockmap.views import _location_parts
+
+from .models import InventorySnapshot, InventorySnapshotDay
+from .services import GOODS_TYPE_LABELS, _parse_qty_value
+
+SNAPSHOT_BATCH_SIZE = 2000
+_ROW_FIELDS = (
+    "agency_id",
+    "order_id",
+    "pallet_code",
+    "zone",
+    "row",
+    "section",
+    "tier",
+    "cell",
+    "sku",
+    "name",
+    "size",
+    "goods_type",
+)
+
+
+def _day_end(day: date_type) -> datetime:
+    """Начало следующего дня в часовом поясе проекта (граница снимка, не включается)."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def _goods_type_label(payload: dict) -> str:
+    goods_type = (payload.get("goods_type") or "").strip().lower()
+    goods_label = (payload.get("goods_type_label") or "").strip()
+    if not goods_label and goods_type in GOODS_TYPE_LABELS:
+        goods_label = GOODS_TYPE_LABELS[goods_type]
+    return goods_label or goods_type
+
+
+def _goods_types(order_ids, end: datetime) -> dict:
+    """Тип товара заявок приемки по последней записи с типом до end."""
+    if not order_ids:
+        return {}
+    entries = (
+        OrderAuditEntry.objects.filter(order_type="receiving", order_id__in=order_ids, created_at__lt=end)
+        .order_by("-created_at")
+        .only("order_id", "payload")
+    )
+    labels = {}
+    for entry in entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
+        if entry.order_id not in labels:
+            label = _goods_type_label(entry.payload or {})
+            if label:
+                labels[entry.order_id] = label
+    return labels
+
+
+def placement_rows(entry: OrderAuditEntry, goods_type: str = "") -> list[dict]:
+    """Строки остатка по записи акта размещения: товар паллет и их коробов на месте паллеты."""
+    if not entry.agency_id:
+        return []
+    payload = entry.payload or {}
+    boxes = payload.get("act_boxes") or []
+    pallets = payload.get("act_pallets") or []
+    goods_type = goods_type or "-"
+    rows = {}
+    locations = {}
+
+    def add_items(items, pallet=None):
+        if not items:
+            return
+        pallet = pallet or {}
+        if id(pallet) not in locations:
+            locations[id(pallet)] = _location_parts(pallet) if pallet else ("", 0, 0, 0, 0)
+        zone, row, section, tier, cell = locations[id(pallet)]
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            sku = (item.get("sku") or item.get("sku_code") or "").strip()
+            name = (item.get("name") or "").strip()
+            size = (item.get("size") or "").strip()
+            if not any((sku, name, size)):
+                continue
+            qty = _parse_qty_value(item.get("qty"))
+            if qty is None:
+                qty = _parse_qty_value(item.get("actual_qty")) or 0
+            key = (
+                entry.agency_id,
+                entry.order_id,
+                (pallet.get("code") or "").strip(),
+                zone or "PR",
+                row,
+                section,
+                tier,
+                cell,
+                sku,
+                name,
+                size,
+                goods_type,
+            )
+            rows[key] = rows.get(key, 0) + qty
+
+    pallet_by_box = {}
+    for pallet in pallets:
+        if not isinstance(pallet, dict):
+            continue
+        for box_code in pallet.get("boxes") or []:
+            pallet_by_box.setdefault(box_code, pallet)
+        add_items(pallet.get("items"), pallet)
+    for box in boxes:
+        if isinstance(box, dict):
+            add_items(box.get("items"), pallet_by_box.get(box.get("code")))
+    if not boxes and not pallets:
+        add_items(payload.get("act_items"))
+    return [{**dict(zip(_ROW_FIELDS, key)), "qty": qty} for key, qty in rows.items() if qty]
+
+
+def _latest_placements(start: datetime | None, end: datetime, agency_id=None) -> dict:
+    """
+    Последняя запись размещения по заявке среди событий [start, end) журнала и архива;
+    None, если акт в этот момент открыт.
+    """
+    entries = OrderAuditEntry.objects.filter(order_type="receiving", act="placement", created_at__lt=end)
+    if start is not None:
+        entries = entries.filter(created_at__gte=start)
+    if agency_id is not None:
+        entries = entries.filter(agency_id=agency_id)
+    archived = archived_entries_between(
+        "receiving", start, end, act="placement", agency_ids=[agency_id] if agency_id is not None else None
+    )
+    latest = {}
+    for entry in heapq.merge(
+        entries.order_by("-created_at", "-pk").iterator(chunk_size=JOURNAL_CHUNK_SIZE),
+        reversed(archived),
+        key=lambda entry: (entry.created_at, entry.pk),
+        reverse=True,
+    ):
+        if agency_id is not None and entry.agency_id != agency_id:
+            continue
+        if entry.order_id in latest:
+            continue
+        latest[entry.order_id] = entry if (entry.act_state or "closed") == "closed" else None
+    return latest
+
+
+def _replayed_rows(latest: dict, end: datetime) -> list[dict]:
+    goods_types = _goods_types([order_id for order_id, entry in latest.items() if entry], end)
+    rows = []
+    for order_id, entry in latest.items():
+        if entry:
+            rows.extend(placement_rows(entry, goods_types.get(order_id, "")))
+    return rows
+
+
+def build_snapshot(day: date_type) -> int:
+    """
+    Пишет снимок на конец дня day: из снимка предыдущего дня и событий day,
+    а без него — полным проходом по журналу. Возвращает число строк.
+    """
+    end = _day_end(day)
+    previous = day - timedelta(days=1)
+    incremental = InventorySnapshotDay.objects.filter(date=previous).exists()
+    latest = _latest_placements(_day_end(previous) if incremental else None, end)
+    new_rows = _replayed_rows(latest, end)
+    with transaction.atomic():
+        InventorySnapshot.objects.filter(date=day).delete()
+        count = 0
+        if incremental:
+            kept = (
+                InventorySnapshot.objects.filter(date=previous)
+                .exclude(order_id__in=list(latest))
+                .values(*_ROW_FIELDS, "qty")
+            )
+            batch = []
+            for row in kept.iterator(chunk_size=SNAPSHOT_BATCH_SIZE):
+                batch.append(InventorySnapshot(date=day, **row))
+                if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                    count += len(InventorySnapshot.objects.bulk_create(batch))
+                    batch = []
+            count += len(InventorySnapshot.objects.bulk_create(batch))
+        count += len(
+            InventorySnapshot.objects.bulk_create(
+                [InventorySnapshot(date=day, **row) for row in new_rows], batch_size=SNAPSHOT_BATCH_SIZE
+            )
+        )
+        InventorySnapshotDay.objects.update_or_create(date=day, defaults={"rows": count})
+    return count
+
+
+def build_snapshots(since: date_type | None = None, until: date_type | None = None) -> dict:
+    """
+    Снимки за дни с since по until (по умолчанию — вчера). Без since продолжает
+    с дня после последнего снимка; если снимков нет — начинает с until.
+    Возвращает {дата: число строк}.
+    """
+    until = until or timezone.localdate() - timedelta(days=1)
+    if since is None:
+        last = InventorySnapshotDay.objects.filter(date__lte=until).order_by("-date").first()
+        since = last.date + timedelta(days=1) if last else until
+    built = {}
+    day = since
+    while day <= until:
+        built[day] = build_snapshot(day)
+        day += timedelta(days=1)
+    return built
+
+
+def stock_as_of(agency, day: date_type) -> dict:
+    """
+    Остатки клиента на конец дня day: строки ближайшего снимка не позже day
+    и пересчет заявок, по которым после снимка были события размещения.
+    """
+    snapshot = InventorySnapshotDay.objects.filter(date__lte=day).order_by("-date").first()
+    end = _day_end(day)
+    rows = []
+    if snapshot:
+        rows = list(
+            InventorySnapshot.objects.filter(agency=agency, date=snapshot.date).values(*_ROW_FIELDS, "qty")
+        )
+    if not snapshot or snapshot.date < day:
+        start = _day_end(snapshot.date) if snapshot else None
+        latest = _latest_placements(start, end, agency_id=agency.pk)
+        if latest:
+            rows = [row for row in rows if row["order_id"] not in latest]
+            rows.extend(_replayed_rows(latest, end))
+    rows.sort(key=lambda row: (row["sku"], row["size"], row["zone"], row["row"], row["section"], row["tier"], row["cell"]))
+    return {
+        "date": day,
+        "snapshot_date": snapshot.date if snapshot else None,
+        "rows": rows,
+        "total_qty": sum(row["qty"] for row in rows),
+    }
@@ -1,3 +1,423 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from audit.archive import archive_order
+from audit.models import OrderAuditEntry, log_order_action
+from reachtruck.models import StockMove
+from reachtruck.services import ACTIVE_STATUSES, DONE_HISTORY_LIMIT
+from sku.models import Agency
+from todo.models import Task
+
+from .billing import storage_statements
+from .benchmarks import (
+    BENCHMARK_VIEWS,
+    _benchmark_context,
+    _client_for_role,
+    percentile,
+    profile_view,
+    query_report,
+)
+from .dataset import SYNTHETIC_PREFIX, generate_dataset, reset_synthetic_dataset
+from .models import InventorySnapshot, InventorySnapshotDay, InventoryState, StorageStatement
+from .services import available_stock_items, cached_placed_stock_items, reserve_processing_stock
+from .snapshots import build_snapshot, build_snapshots, stock_as_of
+
+
+def _place_stock(agency, order_id="1", items=None, goods_type="gv"):
+    log_order_action(
+        "update",
+        order_id=order_id,
+        order_type="receiving",
+        agency=agency,
+        payload={
+            "act": "placement",
+            "act_state": "closed",
+            "goods_type": goods_type,
+            "act_pallets": [{"items": items or [{"sku": "A-1", "size": "M", "qty": 10}]}],
+        },
+    )
+
+
+def _stock_row(qty, sku="A-1", size="M", goods_type="Готовый"):
+    return {"article": sku, "size": size, "barcode": "", "qty": qty, "goods_type": goods_type}
+
+
+def _reserved_total(agency):
+    return sum(InventoryState.objects.filter(agency=agency).values_list("qty", flat=True))
+
+
+class ReserveProcessingStockTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        _place_stock(self.agency)
+
+    def test_reserves_within_on_hand(self):
+        self.assertEqual(reserve_processing_stock("100", self.agency, [_stock_row(6)]), [])
+        self.assertEqual(_reserved_total(self.agency), 6)
+
+    def test_shortfall_is_reported_and_nothing_is_written(self):
+        reserve_processing_stock("100", self.agency, [_stock_row(6)])
+        shortfall = reserve_processing_stock("101", self.agency, [_stock_row(5)])
+        self.assertEqual(len(shortfall), 1)
+        self.assertEqual(shortfall[0]["available"], 4)
+        self.assertEqual(shortfall[0]["missing"], 1)
+        self.assertFalse(InventoryState.objects.filter(order_id="101").exists())
+
+    def test_update_rewrites_only_changed_rows(self):
+        _place_stock(self.agency, order_id="2", items=[{"sku": "A-1", "size": "L", "qty": 5}])
+        reserve_processing_stock("100", self.agency, [_stock_row(2), _stock_row(1, size="L")])
+        kept = InventoryState.objects.get(order_id="100", size="M")
+        reserve_processing_stock("100", self.agency, [_stock_row(3)])
+        rows = list(InventoryState.objects.filter(order_id="100"))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0].pk, kept.pk)
+        self.assertEqual(rows[0].qty, 3)
+
+    def test_shrinking_an_oversubscribed_order_is_allowed(self):
+        InventoryState.objects.create(
+            agency=self.agency, order_id="100", sku="A-1", size="M", goods_type="Готовый", qty=12
+        )
+        self.assertEqual(reserve_processing_stock("100", self.agency, [_stock_row(11)]), [])
+
+    def test_stale_stock_cache_does_not_approve_reservation(self):
+        stale = cached_placed_stock_items(self.agency)
+        # Акт размещения открыт повторно, а сброс кэша до этого процесса не дошел.
+        log_order_action(
+            "update",
+            order_id="1",
+            order_type="receiving",
+            agency=self.agency,
+            payload={"act": "placement", "act_state": "open", "goods_type": "gv", "act_pallets": []},
+        )
+        cache.set(f"sklad:stock:{self.agency.pk}", stale, None)
+        self.assertEqual(len(reserve_processing_stock("100", self.agency, [_stock_row(6)])), 1)
+        self.assertFalse(InventoryState.objects.filter(order_id="100").exists())
+
+
+class AvailableStockCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        _place_stock(self.agency)
+
+    def _available(self, exclude_order_id=None):
+        return {
+            (item["sku"], item["size"]): item["qty"]
+            for item in available_stock_items(self.agency, exclude_order_id=exclude_order_id)
+        }
+
+    def test_snapshot_is_served_from_cache(self):
+        self._available()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._available(), {("A-1", "M"): 10})
+
+    def test_placement_close_invalidates_snapshot(self):
+        self._available()
+        _place_stock(self.agency, order_id="2", items=[{"sku": "A-1", "size": "M", "qty": 5}])
+        self.assertEqual(self._available(), {("A-1", "M"): 15})
+
+    def test_reserve_change_invalidates_snapshot(self):
+        self._available()
+        with self.captureOnCommitCallbacks(execute=True):
+            reserve_processing_stock("100", self.agency, [_stock_row(4)])
+        self.assertEqual(self._available(), {("A-1", "M"): 6})
+        self.assertEqual(self._available(exclude_order_id="100"), {("A-1", "M"): 10})
+
+
+@override_settings(DB_WRITE_RETRIES=20, DB_WRITE_RETRY_DELAY_MS=5)
+class ConcurrentReservationTests(TransactionTestCase):
+    workers = 8
+    qty_per_order = 3
+
+    def test_parallel_reservations_never_oversubscribe(self):
+        agency = Agency.objects.create(agn_name="Клиент")
+        _place_stock(agency)
+        barrier = threading.Barrier(self.workers)
+        results = []
+        lock = threading.Lock()
+
+        def worker(index):
+            try:
+                barrier.wait()
+                shortfall = reserve_processing_stock(str(200 + index), agency, [_stock_row(self.qty_per_order)])
+                outcome = "short" if shortfall else "ok"
+                with lock:
+                    results.append(outcome)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(idx,)) for idx in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Писатели SQLite выстраиваются в очередь (BEGIN IMMEDIATE и повтор при блокировке):
+        # каждый поток получает ответ, трое резервируют 9 из 10, остальным не хватает.
+        self.assertEqual(sorted(results), ["ok"] * 3 + ["short"] * 5)
+        self.assertEqual(_reserved_total(agency), 9)
+
+
+DAY_1 = date(2026, 3, 2)
+
+
+def _at(day, hour=12):
+    return timezone.make_aware(datetime.combine(day, time(hour)))
+
+
+def _place_on(day, agency, order_id, pallets, act_state="closed"):
+    entry = log_order_action(
+        "update",
+        order_id=order_id,
+        agency=agency,
+        payload={"act": "placement", "act_state": act_state, "goods_type": "gv", "act_pallets": pallets},
+    )
+    OrderAuditEntry.objects.filter(pk=entry.pk).update(created_at=_at(day))
+
+
+def _pallet(code, qty, row=1, sku="A-1", zone="OS"):
+    location = {"zone": "OS", "row": row, "section": 1, "tier": 1, "cell": 1} if zone == "OS" else {"zone": zone, "row": row}
+    return {"code": code, "location": location, "items": [{"sku": sku, "size": "M", "qty": qty}]}
+
+
+def _balances(stock):
+    return sorted((row["order_id"], row["pallet_code"], row["row"], row["qty"]) for row in stock["rows"])
+
+
+class InventorySnapshotTests(TestCase):
+    def setUp(self):
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        self.other = Agency.objects.create(agn_name="Другой клиент")
+        _place_on(DAY_1, self.agency, "1", [_pallet("P-1", 10)])
+        _place_on(DAY_1, self.other, "9", [_pallet("P-9", 4)])
+        _place_on(DAY_1 + timedelta(days=1), self.agency, "2", [_pallet("P-2", 5, row=2)])
+        _place_on(DAY_1 + timedelta(days=1), self.agency, "1", [_pallet("P-1", 7, row=3)])
+        _place_on(DAY_1 + timedelta(days=2), self.agency, "2", [_pallet("P-2", 5, row=2)], act_state="open")
+
+    def test_incremental_snapshot_matches_full_replay(self):
+        build_snapshots(since=DAY_1, until=DAY_1 + timedelta(days=2))
+        incremental = _balances(stock_as_of(self.agency, DAY_1 + timedelta(days=1)))
+        self.assertEqual(incremental, [("1", "P-1", 3, 7), ("2", "P-2", 2, 5)])
+        InventorySnapshotDay.objects.filter(date=DAY_1).delete()
+        build_snapshot(DAY_1 + timedelta(days=1))
+        self.assertEqual(_balances(stock_as_of(self.agency, DAY_1 + timedelta(days=1))), incremental)
+        self.assertEqual(_balances(stock_as_of(self.agency, DAY_1 + timedelta(days=2))), [("1", "P-1", 3, 7)])
+        row = InventorySnapshot.objects.get(date=DAY_1, agency=self.agency)
+        self.assertEqual((row.sku, row.zone, row.goods_type, row.qty), ("A-1", "OS", "Готовый", 10))
+
+    def test_as_of_reads_snapshot_and_replays_later_events(self):
+        build_snapshot(DAY_1)
+        with self.assertNumQueries(2):
+            stock = stock_as_of(self.agency, DAY_1)
+        self.assertEqual((stock["snapshot_date"], stock["total_qty"]), (DAY_1, 10))
+        with self.assertNumQueries(5):
+            # Снимок, его строки, архив и журнал размещений после снимка, типы товара.
+            stock = stock_as_of(self.agency, DAY_1 + timedelta(days=1))
+        self.assertEqual(_balances(stock), [("1", "P-1", 3, 7), ("2", "P-2", 2, 5)])
+        self.assertIsNone(stock_as_of(self.agency, DAY_1 - timedelta(days=1))["snapshot_date"])
+        self.assertEqual(stock_as_of(self.agency, DAY_1 - timedelta(days=1))["rows"], [])
+
+    def test_rebuild_replays_archived_placements(self):
+        created = log_order_action("create", order_id="5", agency=self.agency, payload={"items": []})
+        OrderAuditEntry.objects.filter(pk=created.pk).update(created_at=_at(DAY_1, 9))
+        _place_on(DAY_1, self.agency, "5", [_pallet("P-5", 2, row=5)])
+        _place_on(DAY_1 + timedelta(days=1), self.agency, "5", [_pallet("P-5", 2, row=6)])
+        done = log_order_action("status", order_id="5", agency=self.agency, payload={"status": "done"})
+        OrderAuditEntry.objects.filter(pk=done.pk).update(created_at=_at(DAY_1 + timedelta(days=1), 18))
+        before = _balances(stock_as_of(self.agency, DAY_1))
+        self.assertEqual(archive_order("receiving", "5"), 1)
+        self.assertEqual(_balances(stock_as_of(self.agency, DAY_1)), before)
+        build_snapshot(DAY_1)
+        self.assertIn(("5", "P-5", 5, 2), _balances(stock_as_of(self.agency, DAY_1)))
+
+    def test_view_limits_clients_to_their_own_stock(self):
+        build_snapshot(DAY_1)
+        user = get_user_model().objects.create_user("snapshot_client")
+        self.agency.portal_user = user
+        self.agency.save(update_fields=["portal_user"])
+        self.client.force_login(user)
+        response = self.client.get("/sklad/stock/as-of/", {"date": DAY_1.isoformat(), "agency": self.other.pk})
+        self.assertEqual(response.json()["agency"], self.agency.pk)
+        self.assertEqual(response.json()["total_qty"], 10)
+        self.assertEqual(self.client.get("/sklad/stock/as-of/", {"date": "02.03.2026"}).status_code, 400)
+
+
+def _day(number):
+    return DAY_1 + timedelta(days=number - 1)
+
+
+@override_settings(STORAGE_PALLET_DAY_RATES={"OS": "40", "MR": "30", "PR": "50.5", "OTG": "50"})
+class StorageBillingTests(TestCase):
+    def setUp(self):
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        _place_on(_day(1), self.agency, "1", [_pallet("P-1", 10), _pallet("P-2", 5, zone="PR")])
+        _place_on(_day(3), self.agency, "1", [_pallet("P-1", 10), _pallet("P-2", 5, zone="MR")])
+        _place_on(_day(5), self.agency, "1", [_pallet("P-2", 5, zone="MR")])
+        _place_on(_day(2), self.agency, "2", [_pallet("P-3", 3, row=4)])
+        _place_on(_day(4), self.agency, "2", [_pallet("P-3", 3, row=4)], act_state="open")
+
+    def _zones(self, start, end):
+        statement = storage_statements(_day(start), _day(end), agency_ids=[self.agency.pk], recompute=True)[self.agency.pk]
+        return {zone: line["pallet_days"] for zone, line in statement["lines"]["zones"].items()}, statement
+
+    def test_pallet_days_follow_moves_removals_and_reopened_acts(self):
+        zones, statement = self._zones(1, 6)
+        self.assertEqual(zones, {"OS": 6, "MR": 4, "PR": 2, "OTG": 0})
+        self.assertEqual(statement["amount"], Decimal("461.00"))
+
+    def test_period_starting_from_snapshot_matches_full_replay(self):
+        full, _ = self._zones(3, 6)
+        build_snapshot(_day(2))
+        self.assertEqual(self._zones(3, 6)[0], full)
+        self.assertEqual(full, {"OS": 3, "MR": 4, "PR": 0, "OTG": 0})
+
+    def test_closed_period_is_read_from_saved_statement(self):
+        storage_statements(_day(1), _day(6), agency_ids=[self.agency.pk])
+        _place_on(_day(6), self.agency, "3", [_pallet("P-4", 1)])
+        with self.assertNumQueries(1):
+            cached = storage_statements(_day(1), _day(6), agency_ids=[self.agency.pk])[self.agency.pk]
+        self.assertEqual(cached["pallet_days"], 12)
+
+    def test_recompute_updates_saved_statement_in_place(self):
+        storage_statements(_day(1), _day(6), agency_ids=[self.agency.pk])
+        saved = StorageStatement.objects.get()
+        _place_on(_day(6), self.agency, "3", [_pallet("P-4", 1)])
+        storage_statements(_day(1), _day(6), agency_ids=[self.agency.pk], recompute=True)
+        updated = StorageStatement.objects.get()
+        self.assertEqual(updated.pk, saved.pk)
+        self.assertEqual(updated.pallet_days, 13)
+
+    def test_archived_moves_are_still_billed(self):
+        full, _ = self._zones(1, 6)
+        done = log_order_action("status", order_id="1", agency=self.agency, payload={"status": "done"})
+        OrderAuditEntry.objects.filter(pk=done.pk).update(created_at=_at(_day(5), 18))
+        self.assertEqual(archive_order("receiving", "1"), 1)
+        self.assertEqual(self._zones(1, 6)[0], full)
+
+    def test_client_downloads_statement(self):
+        user = get_user_model().objects.create_user("billing_client")
+        self.agency.portal_user = user
+        self.agency.save(update_fields=["portal_user"])
+        self.client.force_login(user)
+        response = self.client.get("/sklad/billing/storage/", {"period": f"{DAY_1:%Y-%m}"})
+        self.assertEqual(response.status_code, 200)
+        workbook = load_workbook(BytesIO(response.content))
+        rows = list(workbook["Хранение"].iter_rows(values_only=True))
+        self.assertEqual(rows[-1][:2], ("Итого", 36))
+        self.assertEqual(workbook["По дням"].max_row, 32)
+        self.assertEqual(self.client.get("/sklad/billing/storage/", {"period": "март"}).status_code, 400)
+
+
+class SyntheticDatasetTests(TestCase):
+    def test_generated_orders_produce_stock_and_reset_cleans_up(self):
+        summary = generate_dataset(orders=40, agencies=2, skus_per_agency=5, seed=3)
+        self.assertEqual(summary["receiving"] + summary["processing"] + summary["stock_move"], 40)
+        agencies = list(Agency.objects.filter(pref=SYNTHETIC_PREFIX))
+        self.assertEqual(len(agencies), 2)
+        self.assertTrue(any(available_stock_items(agency) for agency in agencies))
+        reset_synthetic_dataset()
+        self.assertFalse(Agency.objects.filter(pref=SYNTHETIC_PREFIX).exists())
+        self.assertFalse(OrderAuditEntry.objects.filter(order_id__startswith="syn-").exists())
+
+    def test_command_refuses_production_and_keeps_password_private(self):
+        sizes = ["--orders", "10", "--agencies", "1", "--skus-per-agency", "2"]
+        with self.assertRaises(CommandError):
+            call_command("generate_dataset", *sizes, stdout=StringIO())
+        out = StringIO()
+        call_command("generate_dataset", *sizes, "--allow-production", "--password", "s3cret-pass", stdout=out)
+        self.assertNotIn("s3cret-pass", out.getvalue())
+        self.assertTrue(get_user_model().objects.get(username="syn_director").check_password("s3cret-pass"))
+        call_command("generate_dataset", *sizes, "--allow-production", stdout=StringIO())
+        # Повторный запуск без --password не меняет уже выданные пароли.
+        self.assertTrue(get_user_model().objects.get(username="syn_client_1").check_password("s3cret-pass"))
+        generate_dataset(orders=10, agencies=2, skus_per_agency=2)
+        new_login = get_user_model().objects.get(username="syn_client_2")
+        self.assertTrue(new_login.has_usable_password())
+        self.assertFalse(new_login.check_password("s3cret-pass"))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = [float(value) for value in range(1, 11)]
+        self.assertEqual(percentile(values, 50), 5.0)
+        self.assertEqual(percentile(values, 95), 10.0)
+        self.assertEqual(percentile([], 95), 0.0)
+
+
+# Потолки для холодного запроса (кэш очищен): SQL и загруженные строки моделей на двух объемах данных.
+# Число SQL не должно зависеть от объема. Лимит строк = постоянная часть + доля на элемент того, что
+# страница показывает: журнал клиента, весь журнал заказов, акты размещения, активные перемещения,
+# открытые задачи. Данные вне этой области (другие клиенты, чужие таблицы) лимит не увеличивают.
+QUERY_BUDGET_SIZES = {
+    "small": {"orders": 60, "agencies": 3, "skus_per_agency": 8},
+    "large": {"orders": 240, "agencies": 6, "skus_per_agency": 8},
+}
+ROW_SCOPES = {
+    "client_journal": lambda context: OrderAuditEntry.objects.filter(agency_id=context["agency_id"]).count(),
+    "journal": lambda context: OrderAuditEntry.objects.count(),
+    "placement_acts": lambda context: OrderAuditEntry.objects.filter(
+        order_type="receiving", act="placement"
+    ).count(),
+    "active_moves": lambda context: StockMove.objects.filter(status__in=ACTIVE_STATUSES).count(),
+    "open_tasks": lambda context: Task.objects.exclude(status="done").count(),
+}
+# rows: (постоянная часть, строк на элемент, область из ROW_SCOPES).
+QUERY_BUDGETS = {
+    "orders_journal": {"queries": 10, "rows": (20, 2.75, "journal")},
+    "client_dashboard": {"queries": 10, "rows": (15, 1.25, "client_journal")},
+    "inventory_journal": {"queries": 14, "rows": (10, 3.4, "client_journal")},
+    "stockmap": {"queries": 8, "rows": (10, 1, "placement_acts")},
+    "reachtruck": {"queries": 12, "rows": (10 + DONE_HISTORY_LIMIT, 2, "active_moves")},
+    "task_panel": {"queries": 16, "rows": (160, 2, "open_tasks")},
+    "processing_stock_picker": {"queries": 14, "rows": (70, 1, "client_journal")},
+}
+
+
+class QueryBudgetTests(TestCase):
+    def _profile_all(self, size):
+        generate_dataset(seed=5, **QUERY_BUDGET_SIZES[size])
+        context = _benchmark_context()
+        clients = {}
+        profiles = {}
+        for spec in BENCHMARK_VIEWS:
+            client = _client_for_role(spec["role"], clients)
+            cache.clear()
+            profile = profile_view(client, spec["url"].format(**context))
+            fixed, per_item, scope = QUERY_BUDGETS[spec["name"]]["rows"]
+            profile["row_limit"] = int(fixed + per_item * ROW_SCOPES[scope](context))
+            profiles[spec["name"]] = profile
+        return profiles
+
+    def test_critical_views_stay_within_query_budget(self):
+        self.assertEqual(set(QUERY_BUDGETS), {spec["name"] for spec in BENCHMARK_VIEWS})
+        measured = {size: self._profile_all(size) for size in QUERY_BUDGET_SIZES}
+        for name, budget in QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                small = measured["small"][name]
+                large = measured["large"][name]
+                self.assertEqual(large["status"], 200, query_report(large))
+                self.assertEqual(
+                    len(large["queries"]),
+                    len(small["queries"]),
+                    "Число SQL растет с объемом данных (N+1?):\n" + query_report(large),
+                )
+                for size, profile in (("small", small), ("large", large)):
+                    self.assertLessEqual(
+                        len(profile["queries"]),
+                        budget["queries"],
+                        f"Превышен лимит SQL ({size}):\n" + query_report(profile),
+                    )
+                    self.assertLessEqual(
+                        profile["rows"],
+                        profile["row_limit"],
+                        f"Превышен лимит строк ({size}):\n" + query_report(profile),
+                    )
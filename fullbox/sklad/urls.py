@@ -1,10 +1,12 @@
 from django.urls import path
 
-from .views import dashboard, inventory_journal
+from .views import dashboard, inventory_journal, stock_as_of_view, storage_statement_view
 
 app_name = "sklad"
 
 urlpatterns = [
     path("", dashboard, name="dashboard"),
     path("journal/", inventory_journal, name="inventory_journal"),
+    path("stock/as-of/", stock_as_of_view, name="stock_as_of"),
+    path("billing/storage/", storage_statement_view, name="storage_statement"),
 ]
@@ -1,13 +1,21 @@
 import re
+from datetime import date
 
+from django.contrib.auth.decorators import login_required
 from django.db.models import Q
-from django.http import HttpResponseForbidden
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.utils import timezone
+from django.views.decorators.http import require_GET
 
-from audit.models import OrderAuditEntry
-from employees.access import get_request_role, is_staff_role, role_required
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
+from employees.access import get_request_client_agency, get_request_role, is_staff_role, role_required
+from fullbox.db_routing import replica_reads
 from sku.models import Agency
 
+from .billing import month_period, statement_xlsx, storage_statements
+from .snapshots import stock_as_of
+
 
 _IP_PREFIX_RE = re.compile(r"\bиндивидуальный предприниматель\b", re.IGNORECASE)
 
@@ -22,7 +30,7 @@ def _shorten_ip_name(name: str) -> str:
 def _client_agency_for_request(request):
     if not request.user.is_authenticated:
         return None
-    return Agency.objects.filter(portal_user=request.user).first()
+    return get_request_client_agency(request)
 
 def _parse_qty_value(raw: object | None) -> int | None:
     if raw is None:
@@ -48,6 +56,68 @@ def dashboard(request):
     return render(request, "sklad/dashboard.html")
 
 
+def _report_agency(request):
+    """Клиент отчета: для сотрудников — из ?agency=, для клиента — его собственный."""
+    role = get_request_role(request)
+    if request.user.is_staff or is_staff_role(role):
+        agency = Agency.objects.filter(pk=_parse_int_value(request.GET.get("agency"))).first()
+        if not agency:
+            return None, JsonResponse({"ok": False, "error": "Клиент не найден"}, status=400)
+        return agency, None
+    agency = _client_agency_for_request(request)
+    if not agency:
+        return None, HttpResponseForbidden("Доступ запрещен")
+    return agency, None
+
+
+@login_required
+@require_GET
+@replica_reads
+def stock_as_of_view(request):
+    """Остатки клиента на конец дня ?date=ГГГГ-ММ-ДД (по умолчанию — сегодня)."""
+    agency, error = _report_agency(request)
+    if error:
+        return error
+    raw_date = (request.GET.get("date") or "").strip()
+    try:
+        day = date.fromisoformat(raw_date) if raw_date else timezone.localdate()
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Дата в формате ГГГГ-ММ-ДД"}, status=400)
+    stock = stock_as_of(agency, day)
+    rows = [{key: value for key, value in row.items() if key != "agency_id"} for row in stock["rows"]]
+    return JsonResponse(
+        {
+            "ok": True,
+            "agency": agency.pk,
+            "date": day.isoformat(),
+            "snapshot_date": stock["snapshot_date"].isoformat() if stock["snapshot_date"] else None,
+            "total_qty": stock["total_qty"],
+            "rows": rows,
+        }
+    )
+
+
+@login_required
+@require_GET
+def storage_statement_view(request):
+    """Выписка клиента по хранению за месяц ?period=ГГГГ-ММ (по умолчанию — текущий) в XLSX."""
+    agency, error = _report_agency(request)
+    if error:
+        return error
+    try:
+        start, end = month_period(request.GET.get("period") or f"{timezone.localdate():%Y-%m}")
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Период в формате ГГГГ-ММ"}, status=400)
+    statement = storage_statements(start, end, agency_ids=[agency.pk])[agency.pk]
+    response = HttpResponse(
+        statement_xlsx(agency, statement),
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+    response["Content-Disposition"] = f'attachment; filename="storage_{agency.pk}_{start:%Y_%m}.xlsx"'
+    return response
+
+
+@replica_reads
 def inventory_journal(request):
     if not request.user.is_authenticated:
         return HttpResponseForbidden("Доступ запрещен")
@@ -72,13 +142,11 @@ def inventory_journal(request):
         if agency.portal_user:
             query |= Q(user=agency.portal_user)
         if agency.agn_name:
-            query |= Q(payload__org__iexact=agency.agn_name)
-            query |= Q(payload__org__icontains=agency.agn_name)
+            query |= Q(org__icontains=agency.agn_name)
         if agency.fio_agn:
-            query |= Q(payload__fio__iexact=agency.fio_agn)
-            query |= Q(payload__fio__icontains=agency.fio_agn)
+            query |= Q(fio__icontains=agency.fio_agn)
         if agency.email:
-            query |= Q(payload__email__iexact=agency.email)
+            query |= Q(email=agency.email.strip().lower())
         if not query:
             return []
         return list(
@@ -123,7 +191,7 @@ def inventory_journal(request):
         "no": "Не обработанный",
     }
     goods_type_by_order = {}
-    for entry in entries:
+    for entry in entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
         if entry.order_id in goods_type_by_order:
             continue
         payload = entry.payload or {}
@@ -135,7 +203,7 @@ def inventory_journal(request):
             goods_type_by_order[entry.order_id] = goods_label or goods_type
     placement_entries = OrderAuditEntry.objects.filter(
         order_type="receiving",
-        payload__act="placement",
+        act="placement",
     )
     if client_agency:
         if order_ids:
@@ -145,12 +213,10 @@ def inventory_journal(request):
     placement_entries = placement_entries.select_related("agency").order_by("-created_at")
     latest_by_order = {}
     blocked_orders = set()
-    for entry in placement_entries:
+    for entry in placement_entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
         if entry.order_id in latest_by_order or entry.order_id in blocked_orders:
             continue
-        payload = entry.payload or {}
-        state = (payload.get("act_state") or "closed").lower()
-        if state != "closed":
+        if (entry.act_state or "closed") != "closed":
             blocked_orders.add(entry.order_id)
             continue
         latest_by_order[entry.order_id] = entry
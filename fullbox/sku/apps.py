@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class SkuConfig(AppConfig):
     name = 'sku'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,165 @@
+"""
+Индекс штрихкодов клиента в памяти процесса.
+
+Для клиента двумя запросами строится словарь штрихкод → SKU и размер и список SKU
+для подсказок по артикулу, наименованию и штрихкоду. Индекс строится при первом
+обращении и перечитывается, когда меняется версия клиента в кэше (ее увеличивают
+сигналы SKU и SKUBarcode, sku.signals) или индекс старше BARCODE_INDEX_SECONDS.
+Версию видят все процессы только при общем кэше (REDIS_URL); без него срок жизни
+ограничивает, как долго другой воркер отвечает по старому справочнику. В памяти
+держится не больше BARCODE_INDEX_MAX_AGENCIES клиентов, давно не спрошенные вытесняются.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import SKU, SKUBarcode
+
+CATALOG_SEARCH_LIMIT = 20
+BARCODE_BATCH_LIMIT = 500
+BARCODE_INDEX_MAX_AGENCIES = 50
+
+_indexes_lock = threading.Lock()
+_indexes = OrderedDict()
+
+
+def _version_key(agency_id) -> str:
+    return f"sku:barcodes:{agency_id}:version"
+
+
+def barcode_index_version(agency_id) -> int:
+    key = _version_key(agency_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        cache.add(key, version, None)
+        version = cache.get(key, version)
+    return version
+
+
+def touch_barcode_index(agency_id) -> None:
+    """Помечает индекс штрихкодов клиента устаревшим (в других процессах — через общий кэш)."""
+    if not agency_id:
+        return
+    try:
+        cache.incr(_version_key(agency_id))
+    except ValueError:
+        cache.set(_version_key(agency_id), time.time_ns(), None)
+    with _indexes_lock:
+        _indexes.pop(agency_id, None)
+
+
+def _build_index(agency_id) -> dict:
+    skus = {}
+    for sku_id, sku_code, name, size, code in (
+        SKU.objects.filter(agency_id=agency_id, deleted=False)
+        .order_by("sku_code", "id")
+        .values_list("id", "sku_code", "name", "size", "code")
+    ):
+        skus[sku_id] = {
+            "id": sku_id,
+            "sku_code": sku_code,
+            "name": name,
+            "size": (size or "").strip(),
+            "barcodes": [],
+            "sizes": {},
+            "_code": (code or "").strip(),
+        }
+    barcodes = {}
+    for sku_id, value, size in (
+        SKUBarcode.objects.filter(sku__agency_id=agency_id, sku__deleted=False)
+        .order_by("-is_primary", "value")
+        .values_list("sku_id", "value", "size")
+    ):
+        value = (value or "").strip()
+        sku = skus.get(sku_id)
+        if not value or sku is None:
+            continue
+        size = (size or "").strip()
+        sku["barcodes"].append(value)
+        if size:
+            sku["sizes"].setdefault(size, []).append(value)
+        barcodes.setdefault(
+            value, {"sku_id": sku_id, "sku_code": sku["sku_code"], "name": sku["name"], "size": size or sku["size"]}
+        )
+    by_code = {}
+    for sku in skus.values():
+        # Код товара сканируется как штрихкод, если такого штрихкода в справочнике нет.
+        code = sku.pop("_code")
+        if code:
+            barcodes.setdefault(
+                code, {"sku_id": sku["id"], "sku_code": sku["sku_code"], "name": sku["name"], "size": sku["size"]}
+            )
+        sku["_search"] = " ".join([sku["sku_code"], sku["name"], *sku["barcodes"]]).lower()
+        by_code.setdefault(sku["sku_code"], sku)
+    return {"barcodes": barcodes, "skus": list(skus.values()), "by_code": by_code}
+
+
+def barcode_index(agency_id) -> dict:
+    """
+    Индекс клиента: {"barcodes": {штрихкод: {sku_id, sku_code, name, size}},
+    "skus": [SKU по артикулу], "by_code": {артикул: SKU}}.
+    """
+    version = barcode_index_version(agency_id)
+    now = time.monotonic()
+    with _indexes_lock:
+        cached = _indexes.get(agency_id)
+        if cached and cached["version"] == version and now - cached["loaded_at"] < settings.BARCODE_INDEX_SECONDS:
+            _indexes.move_to_end(agency_id)
+            return cached
+    index = {"version": version, "loaded_at": now, **_build_index(agency_id)}
+    with _indexes_lock:
+        _indexes[agency_id] = index
+        _indexes.move_to_end(agency_id)
+        while len(_indexes) > BARCODE_INDEX_MAX_AGENCIES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def lookup_barcodes(agency_id, values) -> dict:
+    """Разбор пачки сканов: {"found": {штрихкод: SKU и размер}, "missing": [нераспознанные]}."""
+    barcodes = barcode_index(agency_id)["barcodes"]
+    found = {}
+    missing = []
+    for value in values:
+        value = str(value or "").strip()
+        if not value or value in found or value in missing:
+            continue
+        if value in barcodes:
+            found[value] = barcodes[value]
+        else:
+            missing.append(value)
+    return {"found": found, "missing": missing}
+
+
+def _public(sku: dict) -> dict:
+    return {key: value for key, value in sku.items() if not key.startswith("_")}
+
+
+def catalog_skus(agency_id, sku_codes) -> list[dict]:
+    """SKU клиента по точным артикулам (позиции уже заполненной заявки)."""
+    by_code = barcode_index(agency_id)["by_code"]
+    return [_public(by_code[code]) for code in dict.fromkeys(sku_codes) if code in by_code]
+
+
+def search_catalog(agency_id, query: str, limit: int = CATALOG_SEARCH_LIMIT) -> list[dict]:
+    """Подсказки SKU по части артикула, наименования или штрихкода; совпадения с начала артикула — первыми."""
+    needle = (query or "").strip().lower()
+    if not needle:
+        return []
+    leading = []
+    other = []
+    for sku in barcode_index(agency_id)["skus"]:
+        if needle not in sku["_search"]:
+            continue
+        if sku["sku_code"].lower().startswith(needle):
+            leading.append(sku)
+            if len(leading) >= limit:
+                break
+        elif len(other) < limit:
+            other.append(sku)
+    return [_public(sku) for sku in (leading + other)[:limit]]
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .barcodes import touch_barcode_index
+from .models import SKU, SKUBarcode
+
+
+@receiver(post_save, sender=SKU)
+@receiver(post_delete, sender=SKU)
+def drop_barcode_index_on_sku_change(sender, instance, **kwargs):
+    touch_barcode_index(instance.agency_id)
+
+
+@receiver(post_save, sender=SKUBarcode)
+@receiver(post_delete, sender=SKUBarcode)
+def drop_barcode_index_on_barcode_change(sender, instance, **kwargs):
+    agency_id = SKU.objects.filter(pk=instance.sku_id).values_list("agency_id", flat=True).first()
+    touch_barcode_index(agency_id)
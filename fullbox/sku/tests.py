@@ -1,3 +1,95 @@
-from django.test import TestCase
+import json
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from employees.models import Employee
+
+from .barcodes import _indexes, barcode_index, lookup_barcodes, search_catalog
+from .models import SKU, Agency, SKUBarcode
+
+
+class BarcodeIndexTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        self.other = Agency.objects.create(agn_name="Другой клиент")
+        self.shirt = SKU.objects.create(sku_code="SH-1", name="Рубашка", agency=self.agency, code="2000000000017")
+        SKUBarcode.objects.create(sku=self.shirt, value="4600000000011", size="M", is_primary=True)
+        SKUBarcode.objects.create(sku=self.shirt, value="4600000000028", size="L")
+        SKUBarcode.objects.create(
+            sku=SKU.objects.create(sku_code="SH-2", name="Чужая рубашка", agency=self.other),
+            value="4600000000035",
+        )
+
+    def test_lookup_resolves_barcodes_and_sku_code(self):
+        result = lookup_barcodes(self.agency.pk, ["4600000000028", "2000000000017", "4600000000035", ""])
+        self.assertEqual(result["found"]["4600000000028"]["size"], "L")
+        self.assertEqual(result["found"]["2000000000017"]["sku_code"], "SH-1")
+        self.assertEqual(result["missing"], ["4600000000035"])
+
+    def test_index_is_built_once_and_rebuilt_after_barcode_change(self):
+        barcode_index(self.agency.pk)
+        with self.assertNumQueries(0):
+            barcode_index(self.agency.pk)
+        SKUBarcode.objects.create(sku=self.shirt, value="4600000000042", size="XL")
+        self.assertIn("4600000000042", lookup_barcodes(self.agency.pk, ["4600000000042"])["found"])
+        SKUBarcode.objects.filter(value="4600000000011").get().delete()
+        self.assertEqual(lookup_barcodes(self.agency.pk, ["4600000000011"])["missing"], ["4600000000011"])
+        self.shirt.deleted = True
+        self.shirt.save(update_fields=["deleted"])
+        self.assertEqual(barcode_index(self.agency.pk)["skus"], [])
+
+    def test_index_expires_and_keeps_only_recent_agencies(self):
+        barcode_index(self.agency.pk)
+        SKU.objects.filter(pk=self.shirt.pk).update(name="Сорочка")
+        self.assertEqual(barcode_index(self.agency.pk)["by_code"]["SH-1"]["name"], "Рубашка")
+        with override_settings(BARCODE_INDEX_SECONDS=0):
+            self.assertEqual(barcode_index(self.agency.pk)["by_code"]["SH-1"]["name"], "Сорочка")
+        with patch("sku.barcodes.BARCODE_INDEX_MAX_AGENCIES", 1):
+            barcode_index(self.other.pk)
+            self.assertEqual(list(_indexes), [self.other.pk])
+
+    def test_search_matches_code_name_and_barcode(self):
+        self.assertEqual([sku["sku_code"] for sku in search_catalog(self.agency.pk, "sh")], ["SH-1"])
+        self.assertEqual(len(search_catalog(self.agency.pk, "рубаш")), 1)
+        found = search_catalog(self.agency.pk, "00028")
+        self.assertEqual(found[0]["sizes"], {"M": ["4600000000011"], "L": ["4600000000028"]})
+        self.assertNotIn("_search", found[0])
+
+
+class BarcodeLookupViewTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        self.other = Agency.objects.create(agn_name="Другой клиент")
+        sku = SKU.objects.create(sku_code="SH-1", name="Рубашка", agency=self.agency)
+        SKUBarcode.objects.create(sku=sku, value="4600000000011", size="M")
+
+    def test_storekeeper_resolves_batch_of_scans(self):
+        user = get_user_model().objects.create_user("lookup_storekeeper")
+        Employee.objects.create(full_name="Иванов Иван", role="storekeeper", user=user)
+        self.client.force_login(user)
+        response = self.client.post(
+            "/sku/barcodes/lookup/",
+            data=json.dumps({"agency": self.agency.pk, "codes": ["4600000000011", "000"]}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data["found"]["4600000000011"]["sku_code"], "SH-1")
+        self.assertEqual(data["missing"], ["000"])
+        response = self.client.get(f"/sku/catalog/?agency={self.agency.pk}&sku=SH-1&sku=NOPE")
+        self.assertEqual([item["sku_code"] for item in response.json()["items"]], ["SH-1"])
+
+    def test_client_sees_only_own_catalog(self):
+        user = get_user_model().objects.create_user("lookup_client")
+        self.agency.portal_user = user
+        self.agency.save(update_fields=["portal_user"])
+        self.client.force_login(user)
+        response = self.client.get("/sku/barcodes/lookup/?code=4600000000011")
+        self.assertEqual(list(response.json()["found"]), ["4600000000011"])
+        response = self.client.get(f"/sku/catalog/?agency={self.other.pk}&q=sh")
+        self.assertEqual(response.status_code, 403)
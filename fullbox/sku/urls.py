@@ -6,6 +6,8 @@ from .views import (
     SKUUpdateView,
     SKUDuplicateView,
     suggest_sku,
+    barcode_lookup,
+    catalog_search,
     clone_sku,
     mark_deleted,
 )
@@ -17,5 +19,7 @@ urlpatterns = [
     path('<int:pk>/duplicate/', SKUDuplicateView.as_view(), name='sku-duplicate'),
     path('<int:pk>/delete/', mark_deleted, name='sku-delete'),
     path('suggest/', suggest_sku, name='sku-suggest'),
+    path('barcodes/lookup/', barcode_lookup, name='sku-barcode-lookup'),
+    path('catalog/', catalog_search, name='sku-catalog-search'),
     path('clone/<int:pk>/', clone_sku, name='sku-clone'),
 ]
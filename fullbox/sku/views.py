@@ -1,12 +1,18 @@
+import json
+
+from django.contrib.auth.decorators import login_required
 from django.db import models
-from django.http import JsonResponse, HttpResponseRedirect
+from django.http import JsonResponse, HttpResponseForbidden, HttpResponseRedirect
 from django.urls import reverse
+from django.views.decorators.http import require_GET, require_http_methods
 from django.views.generic import ListView, CreateView, UpdateView
 from django.shortcuts import get_object_or_404, redirect
 
+from .barcodes import BARCODE_BATCH_LIMIT, catalog_skus, lookup_barcodes, search_catalog
 from .models import SKU
 from .forms import SKUForm
 from audit.models import log_sku_change
+from employees.access import get_request_access
 from labels.utils import load_label_settings
 
 
@@ -174,6 +180,69 @@ def suggest_sku(request):
     return JsonResponse({"items": items})
 
 
+def _catalog_agency_id(request, raw_agency):
+    """Клиент каталога: сотрудник выбирает любого, клиентский кабинет видит только свой."""
+    access = get_request_access(request)
+    try:
+        agency_id = int(str(raw_agency).strip())
+    except (TypeError, ValueError):
+        agency_id = None
+    if request.user.is_staff or access.employee_role:
+        if not agency_id:
+            return None, JsonResponse({"ok": False, "error": "Клиент не найден"}, status=400)
+        return agency_id, None
+    own_id = access.snapshot.get("agency_id")
+    if not own_id or (agency_id and agency_id != own_id):
+        return None, HttpResponseForbidden("Доступ запрещен")
+    return own_id, None
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def barcode_lookup(request):
+    """
+    SKU и размер по штрихкодам клиента: ?agency=&code= (можно несколько code)
+    или POST JSON {"agency": ..., "codes": [...]} для пачки сканов.
+    """
+    if request.method == "POST":
+        try:
+            data = json.loads(request.body or b"{}")
+        except (TypeError, ValueError):
+            return JsonResponse({"ok": False, "error": "Некорректный JSON"}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({"ok": False, "error": "Некорректный JSON"}, status=400)
+        raw_agency = data.get("agency")
+        codes = data.get("codes") or []
+        if not isinstance(codes, list):
+            return JsonResponse({"ok": False, "error": "codes — список штрихкодов"}, status=400)
+    else:
+        raw_agency = request.GET.get("agency")
+        codes = request.GET.getlist("code")
+    if len(codes) > BARCODE_BATCH_LIMIT:
+        return JsonResponse(
+            {"ok": False, "error": f"Не больше {BARCODE_BATCH_LIMIT} штрихкодов за запрос"}, status=400
+        )
+    agency_id, error = _catalog_agency_id(request, raw_agency)
+    if error:
+        return error
+    return JsonResponse({"ok": True, **lookup_barcodes(agency_id, codes)})
+
+
+@login_required
+@require_GET
+def catalog_search(request):
+    """Подсказки номенклатуры клиента: ?agency=&q= (часть артикула, наименования, ШК) или ?sku= (точные артикулы)."""
+    agency_id, error = _catalog_agency_id(request, request.GET.get("agency"))
+    if error:
+        return error
+    sku_codes = [code.strip() for code in request.GET.getlist("sku") if code.strip()]
+    if sku_codes:
+        items = catalog_skus(agency_id, sku_codes[:BARCODE_BATCH_LIMIT])
+    else:
+        items = search_catalog(agency_id, request.GET.get("q") or "")
+    return JsonResponse({"ok": True, "items": items})
+
+
 def clone_sku(request, pk: int):
     """Создает копию SKU и отправляет в админку для редактирования."""
     orig = get_object_or_404(SKU, pk=pk)
@@ -0,0 +1,240 @@
+"""
+Подбор ячеек OS под паллеты акта размещения.
+
+Стоимость ячейки для паллеты считается в метрах по модели склада reachtruck.routing:
+подвоз от PR, близость к OTG для ходовых товаров (пропорционально оборачиваемости),
+близость к паллетам того же SKU и того же клиента, штраф за «не свой» ярус
+(тяжелые паллеты — вниз, легкие — наверх). Все ячейки сетки считаются одним массивом
+numpy, паллеты раскладываются по очереди: тяжелые первыми, каждая размещенная паллета
+сразу становится ориентиром для следующих.
+"""
+
+from datetime import timedelta
+from decimal import Decimal
+from functools import lru_cache
+
+import numpy as np
+from django.db.models import Sum
+from django.utils import timezone
+
+from reachtruck.routing import location_point
+from sklad.models import InventoryState
+from sku.models import SKU
+
+from .views import _OS_CELLS_PER_TIER, _OS_ROW_SECTIONS, _OS_TIERS, _latest_closed_placement_entries, _location_parts
+
+PUTAWAY_TRAVEL_WEIGHT = 0.2
+FAST_MOVER_WEIGHT = 1.0
+SKU_GROUP_WEIGHT = 1.0
+CLIENT_GROUP_WEIGHT = 0.4
+TIER_PENALTY_M = 8.0
+HEAVY_PALLET_KG = 400.0
+BULKY_PALLET_M3 = 1.2
+FAST_MOVER_DAYS = 30
+
+
+@lru_cache(maxsize=1)
+def _grid() -> dict:
+    cells = [
+        (row, section, tier, cell)
+        for row, sections in _OS_ROW_SECTIONS.items()
+        for section in range(1, sections + 1)
+        for tier in range(1, _OS_TIERS + 1)
+        for cell in range(1, _OS_CELLS_PER_TIER + 1)
+    ]
+    points = [
+        location_point({"zone": "OS", "row": row, "section": section, "tier": tier, "cell": cell})
+        for row, section, tier, cell in cells
+    ]
+    grid = {
+        "cells": cells,
+        "index": {cell: idx for idx, cell in enumerate(cells)},
+        "row": np.array([cell[0] for cell in cells]),
+        "tier": np.array([cell[2] for cell in cells], dtype=float),
+        "x": np.array([point[0] for point in points]),
+        "y": np.array([point[1] for point in points]),
+    }
+    grid["from_pr"] = _distance_to_point(grid, location_point({"zone": "PR"}))
+    grid["to_otg"] = _distance_to_point(grid, location_point({"zone": "OTG"}))
+    return grid
+
+
+def _distance_to_point(grid: dict, point) -> np.ndarray:
+    x, y, aisle = point
+    return np.where(grid["row"] == aisle, np.abs(grid["y"] - y), grid["y"] + np.abs(grid["x"] - x) + abs(y))
+
+
+def _distance_to_cells(grid: dict, indexes) -> np.ndarray:
+    """Расстояние от каждой ячейки сетки до ближайшей из indexes (нули, если ориентиров нет)."""
+    indexes = np.asarray(sorted(indexes), dtype=int)
+    if not indexes.size:
+        return np.zeros(len(grid["cells"]))
+    same_aisle = grid["row"][:, None] == grid["row"][indexes][None, :]
+    along = np.abs(grid["y"][:, None] - grid["y"][indexes][None, :])
+    across = grid["y"][:, None] + np.abs(grid["x"][:, None] - grid["x"][indexes][None, :]) + grid["y"][indexes][None, :]
+    return np.where(same_aisle, along, across).min(axis=1)
+
+
+def suggest_cells(pallets: list[dict], occupied: dict, agency_id=None) -> dict:
+    """
+    pallets: [{"code", "skus": {sku: qty}, "weight_kg", "volume", "velocity" (0..1)}].
+    occupied: {(ряд, секция, ярус, ячейка): {"agency_id", "skus": set}} — занятые и зарезервированные ячейки.
+    Возвращает {код паллеты: место}; паллеты без свободной ячейки в ответ не попадают.
+    """
+    grid = _grid()
+    size = len(grid["cells"])
+    free = np.ones(size, dtype=bool)
+    client_anchors = set()
+    sku_anchors = {}
+    wanted_skus = {sku for pallet in pallets for sku in pallet["skus"]}
+    for cell, info in occupied.items():
+        idx = grid["index"].get(cell)
+        if idx is None:
+            continue
+        free[idx] = False
+        if agency_id is None or info.get("agency_id") != agency_id:
+            continue
+        client_anchors.add(idx)
+        for sku in info.get("skus") or ():
+            if sku in wanted_skus:
+                sku_anchors.setdefault(sku, set()).add(idx)
+    client_distance = _distance_to_cells(grid, client_anchors)
+    sku_distance = {sku: _distance_to_cells(grid, sku_anchors.get(sku, ())) for sku in wanted_skus}
+    has_sku_anchor = {sku: bool(sku_anchors.get(sku)) for sku in wanted_skus}
+
+    def heaviness(pallet) -> float:
+        return min(
+            1.0,
+            max(float(pallet.get("weight_kg") or 0) / HEAVY_PALLET_KG, float(pallet.get("volume") or 0) / BULKY_PALLET_M3),
+        )
+
+    suggestions = {}
+    for pallet in sorted(pallets, key=lambda item: (-heaviness(item), -(item.get("velocity") or 0), item["code"])):
+        if not free.any():
+            break
+        target_tier = 1 + (1 - heaviness(pallet)) * (_OS_TIERS - 1)
+        cost = (
+            PUTAWAY_TRAVEL_WEIGHT * grid["from_pr"]
+            + FAST_MOVER_WEIGHT * float(pallet.get("velocity") or 0) * grid["to_otg"]
+            + CLIENT_GROUP_WEIGHT * client_distance
+            + TIER_PENALTY_M * np.abs(grid["tier"] - target_tier)
+        )
+        anchored = [sku_distance[sku] for sku in pallet["skus"] if has_sku_anchor[sku]]
+        if anchored:
+            cost = cost + SKU_GROUP_WEIGHT * np.minimum.reduce(anchored)
+        cost = np.where(free, cost, np.inf)
+        idx = int(np.argmin(cost))
+        free[idx] = False
+        placed = _distance_to_cells(grid, [idx])
+        client_distance = np.minimum(client_distance, placed) if client_anchors else placed
+        client_anchors.add(idx)
+        for sku in pallet["skus"]:
+            sku_distance[sku] = np.minimum(sku_distance[sku], placed) if has_sku_anchor[sku] else placed
+            has_sku_anchor[sku] = True
+        row, section, tier, cell = grid["cells"][idx]
+        suggestions[pallet["code"]] = {"zone": "OS", "row": row, "section": section, "tier": tier, "cell": cell}
+    return suggestions
+
+
+def _pallet_skus(pallet: dict, boxes_by_code: dict) -> dict:
+    quantities = {}
+    items = list(pallet.get("items") or [])
+    for box_code in pallet.get("boxes") or []:
+        items.extend((boxes_by_code.get(box_code) or {}).get("items") or [])
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        sku = str(item.get("sku") or item.get("sku_code") or "").strip()
+        try:
+            qty = int(item.get("qty") or 0)
+        except (TypeError, ValueError):
+            qty = 0
+        if sku and qty > 0:
+            quantities[sku] = quantities.get(sku, 0) + qty
+    return quantities
+
+
+def placement_occupancy(exclude_order_id: str | None = None) -> dict:
+    """Занятые ячейки OS по закрытым актам размещения с клиентом и SKU паллеты."""
+    occupied = {}
+    for entry in _latest_closed_placement_entries():
+        if entry.order_id == exclude_order_id:
+            continue
+        payload = entry.payload or {}
+        boxes_by_code = {box.get("code"): box for box in payload.get("act_boxes") or [] if isinstance(box, dict)}
+        for pallet in payload.get("act_pallets") or []:
+            if not isinstance(pallet, dict):
+                continue
+            zone, row, section, tier, cell = _location_parts(pallet)
+            if zone == "OS" and row and section and tier and cell:
+                occupied[(row, section, tier, cell)] = {
+                    "agency_id": entry.agency_id,
+                    "skus": set(_pallet_skus(pallet, boxes_by_code)),
+                }
+    return occupied
+
+
+def _sku_velocity(agency_id) -> dict:
+    """Доля отгрузочного спроса SKU клиента за FAST_MOVER_DAYS (1 — самый ходовой)."""
+    since = timezone.now() - timedelta(days=FAST_MOVER_DAYS)
+    demand = dict(
+        InventoryState.objects.filter(agency_id=agency_id, created_at__gte=since)
+        .values("sku")
+        .annotate(total=Sum("qty"))
+        .values_list("sku", "total")
+    )
+    top = max(demand.values(), default=0)
+    return {sku: total / top for sku, total in demand.items()} if top else {}
+
+
+def placement_suggestions(
+    agency, pallets_data: list, boxes_data: list, targets, exclude_order_id: str | None = None, reserved=()
+) -> dict:
+    """
+    Предложения ячеек для паллет акта с кодами из targets. Ячейки, уже выбранные
+    для остальных паллет акта, и зарезервированные заданиями ричтрака считаются занятыми.
+    """
+    targets = set(targets)
+    boxes_by_code = {box.get("code"): box for box in boxes_data or [] if isinstance(box, dict)}
+    occupied = placement_occupancy(exclude_order_id)
+    for cell in reserved:
+        occupied.setdefault(tuple(cell), {"agency_id": None, "skus": set()})
+    pallets = []
+    for pallet in pallets_data or []:
+        if not isinstance(pallet, dict):
+            continue
+        code = str(pallet.get("code") or "").strip()
+        if code in targets:
+            pallets.append({"code": code, "skus": _pallet_skus(pallet, boxes_by_code)})
+            continue
+        zone, row, section, tier, cell = _location_parts(pallet)
+        if zone == "OS" and row and section and tier and cell:
+            occupied[(row, section, tier, cell)] = {
+                "agency_id": agency.id if agency else None,
+                "skus": set(_pallet_skus(pallet, boxes_by_code)),
+            }
+    if not pallets:
+        return {}
+    agency_id = agency.id if agency else None
+    sku_codes = {sku for pallet in pallets for sku in pallet["skus"]}
+    specs = {
+        sku.sku_code: sku
+        for sku in SKU.objects.filter(agency_id=agency_id, sku_code__in=sku_codes, deleted=False).only(
+            "sku_code", "weight_kg", "volume"
+        )
+    }
+    velocity = _sku_velocity(agency_id) if agency_id else {}
+    for pallet in pallets:
+        units = sum(pallet["skus"].values())
+        weight = volume = Decimal(0)
+        demand = 0.0
+        for sku, qty in pallet["skus"].items():
+            spec = specs.get(sku)
+            if spec:
+                weight += (spec.weight_kg or 0) * qty
+                volume += (spec.volume or 0) * qty
+            demand += velocity.get(sku, 0.0) * qty
+        pallet["weight_kg"] = weight
+        pallet["volume"] = volume
+        pallet["velocity"] = demand / units if units else 0.0
+    return suggest_cells(pallets, occupied, agency_id)
@@ -0,0 +1,100 @@
+import json
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.utils import timezone
+
+from audit.models import log_order_action
+from employees.models import Employee
+from sklad.models import InventoryState
+from sku.models import Agency, SKU
+
+from .slotting import placement_suggestions, suggest_cells
+from .views import _OS_ROW_SECTIONS, _OS_TIERS
+
+
+def _pallet(code, skus=None, weight_kg=0, volume=0, velocity=0.0):
+    return {"code": code, "skus": skus or {}, "weight_kg": weight_kg, "volume": volume, "velocity": velocity}
+
+
+class SlottingTests(TestCase):
+    def test_heavy_pallets_go_low_and_light_pallets_go_high(self):
+        suggestions = suggest_cells([_pallet("light"), _pallet("heavy", weight_kg=800)], {})
+        self.assertEqual(suggestions["heavy"]["tier"], 1)
+        self.assertEqual(suggestions["light"]["tier"], _OS_TIERS)
+
+    def test_pallets_are_grouped_with_same_sku(self):
+        occupied = {(7, 4, 1, 1): {"agency_id": 1, "skus": {"A"}}}
+        suggestion = suggest_cells([_pallet("p", {"A": 10}, weight_kg=800)], occupied, agency_id=1)["p"]
+        self.assertEqual((suggestion["row"], suggestion["tier"]), (7, 1))
+        self.assertLessEqual(abs(suggestion["section"] - 4), 1)
+
+    def test_fast_movers_are_closer_to_shipping(self):
+        fast = suggest_cells([_pallet("fast", velocity=1.0)], {})["fast"]
+        slow = suggest_cells([_pallet("slow")], {})["slow"]
+        self.assertGreater(fast["row"], slow["row"])
+
+    def test_fifty_pallets_get_distinct_free_cells_quickly(self):
+        occupied = {
+            (row, 1, tier, cell): {"agency_id": 2, "skus": set()}
+            for row in _OS_ROW_SECTIONS
+            for tier in (1, 2)
+            for cell in (1, 2, 3)
+        }
+        pallets = [_pallet(f"P{idx}", {f"S{idx % 5}": 5}, weight_kg=idx * 15) for idx in range(50)]
+        started = time.perf_counter()
+        suggestions = suggest_cells(pallets, occupied, agency_id=1)
+        elapsed = time.perf_counter() - started
+        cells = {(loc["row"], loc["section"], loc["tier"], loc["cell"]) for loc in suggestions.values()}
+        self.assertEqual(len(cells), 50)
+        self.assertFalse(cells & set(occupied))
+        self.assertLess(elapsed, 0.5)
+
+
+class PlacementSuggestionViewTests(TestCase):
+    def setUp(self):
+        user = get_user_model().objects.create_user("slotting_storekeeper")
+        Employee.objects.create(full_name="Кладовщик", role="storekeeper", user=user)
+        self.client.force_login(user)
+        self.agency = Agency.objects.create(agn_name="Клиент")
+        SKU.objects.create(agency=self.agency, sku_code="HEAVY", name="Гири", weight_kg=20)
+        log_order_action("create", order_id="10", agency=self.agency, payload={"status": "warehouse"})
+
+    def _suggest(self, pallets, targets):
+        return self.client.post(
+            "/orders/receiving/10/placement/",
+            {"action": "suggest", "pallets_json": json.dumps(pallets), "boxes_json": "[]", "targets": targets},
+        )
+
+    def test_suggestions_skip_cells_chosen_in_the_act(self):
+        pallets = [
+            {"code": "A", "items": [{"sku": "HEAVY", "qty": 40}], "location": {"zone": "PR"}},
+            {
+                "code": "B",
+                "items": [{"sku": "HEAVY", "qty": 1}],
+                "location": {"zone": "OS", "row": 1, "section": 1, "tier": 1, "cell": 1},
+            },
+        ]
+        response = self._suggest(pallets, ["A"])
+        self.assertEqual(response.status_code, 200)
+        suggestion = response.json()["suggestions"]["A"]
+        self.assertEqual(suggestion["tier"], 1)
+        self.assertNotEqual((suggestion["row"], suggestion["section"], suggestion["cell"]), (1, 1, 1))
+
+    def test_demand_marks_fast_movers(self):
+        SKU.objects.create(agency=self.agency, sku_code="FAST", name="Ходовой")
+        SKU.objects.create(agency=self.agency, sku_code="SLOW", name="Редкий")
+        InventoryState.objects.create(agency=self.agency, order_id="p1", sku="FAST", qty=100)
+        old = InventoryState.objects.create(agency=self.agency, order_id="p2", sku="SLOW", qty=100)
+        InventoryState.objects.filter(pk=old.pk).update(created_at=timezone.now() - timedelta(days=90))
+        fast = placement_suggestions(self.agency, [{"code": "F", "items": [{"sku": "FAST", "qty": 5}]}], [], ["F"])
+        slow = placement_suggestions(self.agency, [{"code": "S", "items": [{"sku": "SLOW", "qty": 5}]}], [], ["S"])
+        self.assertGreater(fast["F"]["row"], slow["S"]["row"])
+
+    def test_only_storekeeper_gets_suggestions(self):
+        user = get_user_model().objects.create_user("slotting_manager")
+        Employee.objects.create(full_name="Менеджер", role="manager", user=user)
+        self.client.force_login(user)
+        self.assertEqual(self._suggest([], []).status_code, 403)
@@ -1,10 +1,12 @@
 import re
 
 from django.http import Http404
+from django.utils.decorators import method_decorator
 from django.views.generic import TemplateView
 
-from audit.models import OrderAuditEntry
+from audit.models import JOURNAL_CHUNK_SIZE, OrderAuditEntry
 from employees.access import RoleRequiredMixin, get_request_role, resolve_cabinet_url
+from fullbox.db_routing import replica_reads
 
 _OS_ROW_SECTIONS = {
     1: 10,
@@ -21,6 +23,7 @@ _OS_TIERS = 4
 _OS_CELLS_PER_TIER = 3
 
 
+@method_decorator(replica_reads, name="dispatch")
 class StockMapView(RoleRequiredMixin, TemplateView):
     template_name = "stockmap/stockmap.html"
     allowed_roles = ("storekeeper", "head_manager", "director", "admin")
@@ -94,6 +97,7 @@ class StockMapView(RoleRequiredMixin, TemplateView):
         return context
 
 
+@method_decorator(replica_reads, name="dispatch")
 class StockMapRowView(RoleRequiredMixin, TemplateView):
     template_name = "stockmap/stockmap_row.html"
     allowed_roles = ("storekeeper", "head_manager", "director", "admin")
@@ -213,17 +217,13 @@ def _location_parts(pallet):
 
 
 def _latest_closed_placement_entries():
-    entries = OrderAuditEntry.objects.filter(order_type="receiving").order_by("-created_at")
+    entries = OrderAuditEntry.objects.filter(order_type="receiving", act="placement").order_by("-created_at")
     latest_by_order = {}
     blocked_orders = set()
-    for entry in entries:
+    for entry in entries.iterator(chunk_size=JOURNAL_CHUNK_SIZE):
         if entry.order_id in latest_by_order or entry.order_id in blocked_orders:
             continue
-        payload = entry.payload or {}
-        if payload.get("act") != "placement":
-            continue
-        state = (payload.get("act_state") or "closed").lower()
-        if state != "closed":
+        if (entry.act_state or "closed") != "closed":
             blocked_orders.add(entry.order_id)
             continue
         latest_by_order[entry.order_id] = entry
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TodoConfig(AppConfig):
     name = 'todo'
+
+    def ready(self):
+        from . import signals  # noqa: F401
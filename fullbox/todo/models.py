@@ -1,18 +1,22 @@
 import os
 import re
+import time
 from datetime import timedelta
 
 from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 from django.utils import timezone
 
 from audit.models import OrderAuditEntry
 from employees.models import Employee
+from fullbox.events import publish_event
 
 
 _RECEIVING_ROUTE_RE = re.compile(r"/orders/receiving/([^/]+)/")
 _PROCESSING_ROUTE_RE = re.compile(r"/orders/processing/([^/]+)/")
 _STATUS_ONLY_KEYS = {"comment", "message", "status", "status_label", "submit_action"}
+_TASK_BOARD_VERSION_KEY = "todo:board:version"
 
 
 def _extract_receiving_order_id(route: str | None) -> str | None:
@@ -69,10 +73,94 @@ def _payload_for_receiving_order(order_id: str) -> dict:
     return _latest_payload_from_entries(entries)
 
 
+def prefetch_display_titles(tasks) -> list:
+    """Заполняет display_title для списка задач одним запросом к журналу заявок."""
+    tasks = list(tasks)
+    order_ids = set()
+    for task in tasks:
+        order_id = _extract_receiving_order_id(task.route)
+        if order_id and not getattr(task, "_display_title_cache", None):
+            order_ids.add(order_id)
+    entries_by_order = {order_id: [] for order_id in order_ids}
+    if order_ids:
+        entries = (
+            OrderAuditEntry.objects.filter(order_type="receiving", order_id__in=list(order_ids))
+            .only("order_id", "payload", "created_at")
+            .order_by("order_id", "created_at")
+        )
+        for entry in entries:
+            entries_by_order[entry.order_id].append(entry)
+    for task in tasks:
+        order_id = _extract_receiving_order_id(task.route)
+        if order_id in entries_by_order:
+            payload = _latest_payload_from_entries(entries_by_order[order_id])
+            task._display_title_cache = f"{_receiving_title_from_payload(payload)} №{order_id}"
+        task.display_title()
+    return tasks
+
+
 def default_due_date():
     return timezone.now() + timedelta(days=1)
 
 
+def task_board_version() -> int:
+    """Версия доски задач: входит в ключ кэша панели и меняется при любом изменении задач."""
+    version = cache.get(_TASK_BOARD_VERSION_KEY)
+    if version is None:
+        version = time.time_ns()
+        cache.add(_TASK_BOARD_VERSION_KEY, version, None)
+        version = cache.get(_TASK_BOARD_VERSION_KEY, version)
+    return version
+
+
+def touch_task_board() -> None:
+    try:
+        cache.incr(_TASK_BOARD_VERSION_KEY)
+    except ValueError:
+        cache.set(_TASK_BOARD_VERSION_KEY, time.time_ns(), None)
+
+
+class TaskQuerySet(models.QuerySet):
+    """Массовые update/delete не шлют сигналов, поэтому версию доски сдвигаем здесь."""
+
+    _prefetch_display_titles = False
+
+    def with_display_titles(self):
+        """Названия задач по заявкам приемки считаются пачкой при загрузке queryset."""
+        clone = self._chain()
+        clone._prefetch_display_titles = True
+        return clone
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._prefetch_display_titles = self._prefetch_display_titles
+        return clone
+
+    def _fetch_all(self):
+        needs_titles = self._result_cache is None and self._prefetch_display_titles
+        super()._fetch_all()
+        if needs_titles and self._result_cache and isinstance(self._result_cache[0], Task):
+            prefetch_display_titles(self._result_cache)
+
+    def update(self, **kwargs):
+        rows = super().update(**kwargs)
+        if rows:
+            touch_task_board()
+            publish_event("tasks", "tasks.changed", {"rows": rows})
+        return rows
+
+    update.alters_data = True
+
+    def delete(self):
+        result = super().delete()
+        if result[0]:
+            touch_task_board()
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Task(models.Model):
     STATUS_CHOICES = [
         ("backlog", "Просрочены"),
@@ -121,6 +209,8 @@ class Task(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = TaskQuerySet.as_manager()
+
     class Meta:
         ordering = ["status", "priority", "due_date", "-created_at"]
         verbose_name = "Задача"
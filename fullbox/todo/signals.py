@@ -0,0 +1,64 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from audit.models import OrderAuditEntry
+from fullbox.events import publish_event
+
+from .models import Task, touch_task_board
+from .templatetags.todo_panel import (
+    _is_status_entry as _is_board_status_entry,
+    _processing_status_label_from_entry,
+    _status_label_from_entry,
+)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_delete, sender=Task)
+def drop_task_board_on_task_change(sender, instance, **kwargs):
+    touch_task_board()
+
+
+@receiver(post_save, sender=Task)
+def publish_task_saved(sender, instance, created, **kwargs):
+    publish_event(
+        "tasks",
+        "task.created" if created else "task.updated",
+        {
+            "id": instance.pk,
+            "status": instance.status,
+            "route": instance.route,
+            "assigned_to_id": instance.assigned_to_id,
+        },
+    )
+
+
+@receiver(post_delete, sender=Task)
+def publish_task_deleted(sender, instance, **kwargs):
+    publish_event("tasks", "task.deleted", {"id": instance.pk, "route": instance.route})
+
+
+def _is_status_entry(entry) -> bool:
+    return entry.order_type in {"receiving", "processing"} and _is_board_status_entry(entry)
+
+
+@receiver(post_save, sender=OrderAuditEntry)
+def drop_task_board_on_order_status(sender, instance, **kwargs):
+    # На доске выводятся статусы заявок и заголовок приемки по ее позициям; сканы,
+    # комментарии и прочие записи потока доску не меняют.
+    if _is_status_entry(instance) or (instance.order_type == "receiving" and "items" in (instance.payload or {})):
+        touch_task_board()
+
+
+@receiver(post_save, sender=OrderAuditEntry)
+def publish_order_status(sender, instance, created, **kwargs):
+    if not created or not _is_status_entry(instance):
+        return
+    if instance.order_type == "receiving":
+        label = _status_label_from_entry(instance)
+    else:
+        label = _processing_status_label_from_entry(instance)
+    publish_event(
+        "tasks",
+        "order.status",
+        {"order_type": instance.order_type, "order_id": instance.order_id, "status_label": label},
+    )
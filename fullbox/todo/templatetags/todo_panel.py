@@ -1,16 +1,18 @@
 from django import template
 import re
-from datetime import datetime
+from datetime import datetime, time, timedelta
 
-from django.db.models import Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, CharField, F, OuterRef, Q, Subquery, Value, When
 from django.utils import timezone
 
 from employees.models import Employee
-from employees.access import get_employee_for_user
+from employees.access import get_request_employee
 
 from audit.models import OrderAuditEntry
 
-from ..models import Task
+from ..models import Task, prefetch_display_titles, task_board_version
 
 register = template.Library()
 
@@ -21,6 +23,21 @@ STATUS_LABELS = dict(Task.STATUS_CHOICES)
 _RECEIVING_ROUTE_RE = re.compile(r"/orders/receiving/([^/]+)/")
 _PROCESSING_ROUTE_RE = re.compile(r"/orders/processing/([^/]+)/")
 _IP_PREFIX_RE = re.compile(r"\bиндивидуальный предприниматель\b", re.IGNORECASE)
+# Ключи payload статусной записи; все продублированы в колонки журнала (audit.models.promoted_payload_fields).
+_STATUS_ENTRY_FIELDS = ("status", "status_label", "submit_action", "act")
+
+
+def _is_status_entry(entry) -> bool:
+    payload = entry.payload or {}
+    return entry.action == "status" or any(payload.get(key) for key in _STATUS_ENTRY_FIELDS)
+
+
+def _status_entry_q() -> Q:
+    """То же условие, что _is_status_entry, по колонкам журнала: пустое значение статусом не считается."""
+    status_q = Q(action="status")
+    for name in _STATUS_ENTRY_FIELDS:
+        status_q |= ~Q(**{name: ""})
+    return status_q
 
 
 def _shorten_ip_name(name: str) -> str:
@@ -59,7 +76,7 @@ def _resolve_attention_employee(context):
     request = context.get("request")
     if not request:
         return None
-    employee = get_employee_for_user(request.user)
+    employee = get_request_employee(request)
     if employee:
         return employee
     name = request.session.get("employee_name") if hasattr(request, "session") else None
@@ -97,13 +114,6 @@ def _is_receiving_sign_task(route: str | None) -> bool:
     return bool(route and "/orders/receiving/" in route and "/act/print" in route)
 
 
-def _is_status_entry(entry) -> bool:
-    if entry.action == "status":
-        return True
-    payload = entry.payload or {}
-    return bool(payload.get("status") or payload.get("status_label") or payload.get("submit_action") or payload.get("act"))
-
-
 def _status_label_from_entry(entry) -> str:
     payload = entry.payload or {}
     client_response = (payload.get("act_client_response") or "").lower()
@@ -138,9 +148,86 @@ def _processing_status_label_from_entry(entry) -> str:
     return status_value or "-"
 
 
-@register.inclusion_tag("todo/_task_panel.html", takes_context=True)
-def task_panel(context, role=None, limit=6, show_meta=True, include_created_by=True):
-    role_key = _resolve_role(context, role)
+def _latest_status_entries(order_type: str, order_ids) -> dict:
+    """
+    Последняя статусная запись каждой заявки одним запросом.
+    Подзапрос идет по индексу (order_type, order_id, created_at) и не тянет всю историю заявки.
+    """
+    order_ids = [order_id for order_id in order_ids if order_id]
+    if not order_ids:
+        return {}
+    latest_pk = (
+        OrderAuditEntry.objects.filter(order_type=order_type, order_id=OuterRef("order_id"))
+        .filter(_status_entry_q())
+        .order_by("-created_at")
+        .values("pk")[:1]
+    )
+    entries = (
+        OrderAuditEntry.objects.filter(order_type=order_type, order_id__in=order_ids)
+        .annotate(latest_status_pk=Subquery(latest_pk))
+        .filter(pk=F("latest_status_pk"))
+        .select_related("agency")
+    )
+    return {entry.order_id: entry for entry in entries}
+
+
+def _client_label(entry) -> str:
+    if not entry or not entry.agency:
+        return "-"
+    name = entry.agency.agn_name or entry.agency.fio_agn or str(entry.agency)
+    return _shorten_ip_name(name)
+
+
+def _processing_in_work_order_ids() -> set[str]:
+    latest_pk = (
+        OrderAuditEntry.objects.filter(order_type="processing", order_id=OuterRef("order_id"))
+        .filter(_status_entry_q())
+        .order_by("-created_at")
+        .values("pk")[:1]
+    )
+    return set(
+        OrderAuditEntry.objects.filter(order_type="processing", status="processing_in_work")
+        .annotate(latest_status_pk=Subquery(latest_pk))
+        .filter(pk=F("latest_status_pk"))
+        .values_list("order_id", flat=True)
+    )
+
+
+def _due_bucket_expression(today):
+    tz = timezone.get_current_timezone()
+    day_start = timezone.make_aware(datetime.combine(today, time.min), tz)
+    next_day = day_start + timedelta(days=1)
+    return Case(
+        When(due_date__lt=day_start, then=Value("backlog")),
+        When(due_date__lt=next_day, then=Value("in_progress")),
+        default=Value("blocked"),
+        output_field=CharField(),
+    )
+
+
+def _task_group_key(task):
+    order_id = _extract_receiving_order_id(task.route)
+    if order_id and not _is_receiving_sign_task(task.route):
+        return ("receiving", order_id)
+    processing_id = _extract_processing_order_id(task.route)
+    if processing_id:
+        return ("processing", processing_id)
+    return ("task", task.pk)
+
+
+def _prefer_open(existing_task, candidate_task):
+    if not existing_task:
+        return candidate_task
+    if existing_task.status == "done" and candidate_task.status != "done":
+        return candidate_task
+    if existing_task.status != "done" and candidate_task.status == "done":
+        return existing_task
+    if candidate_task.updated_at > existing_task.updated_at:
+        return candidate_task
+    return existing_task
+
+
+def _build_task_board(role_key, limit_value, include_created_by, today) -> dict:
     tasks_qs = Task.objects.select_related(
         "assigned_to",
         "created_by",
@@ -153,89 +240,63 @@ def task_panel(context, role=None, limit=6, show_meta=True, include_created_by=T
             role_filter |= Q(created_by__username=role_key)
     if role_filter is not None:
         tasks_qs = tasks_qs.filter(role_filter)
-    limit_value = _normalize_limit(limit)
-    today = timezone.localdate()
-
-    tasks = list(tasks_qs)
-    receiving_by_order = {}
-    processing_by_order = {}
-    other_tasks = []
-    def _prefer_open(existing_task, candidate_task):
-        if not existing_task:
-            return candidate_task
-        if existing_task.status == "done" and candidate_task.status != "done":
-            return candidate_task
-        if existing_task.status != "done" and candidate_task.status == "done":
-            return existing_task
-        if candidate_task.updated_at > existing_task.updated_at:
-            return candidate_task
-        return existing_task
+    done_qs = tasks_qs.filter(status="done")
 
-    for task in tasks:
-        order_id = _extract_receiving_order_id(task.route)
-        if order_id and not _is_receiving_sign_task(task.route):
-            receiving_by_order[order_id] = _prefer_open(
-                receiving_by_order.get(order_id),
-                task,
-            )
-            continue
-        processing_id = _extract_processing_order_id(task.route)
-        if processing_id:
-            processing_by_order[processing_id] = _prefer_open(
-                processing_by_order.get(processing_id),
-                task,
-            )
-            continue
-        other_tasks.append(task)
-    combined_tasks = (
-        other_tasks + list(receiving_by_order.values()) + list(processing_by_order.values())
+    # Открытые задачи грузим целиком (их немного), из истории готовых — только верх колонки.
+    open_loaded = list(
+        tasks_qs.exclude(status="done")
+        .annotate(due_bucket=_due_bucket_expression(today))
+        .order_by(F("due_date").asc(nulls_last=True), "-created_at")
     )
+    done_loaded = list(done_qs.order_by("-updated_at", "-created_at")[: limit_value * 3])
+    in_work_ids = _processing_in_work_order_ids()
+    if in_work_ids:
+        loaded_ids = {task.pk for task in done_loaded}
+        done_loaded.extend(
+            task
+            for task in done_qs.filter(
+                route__in=[f"/orders/processing/{order_id}/" for order_id in in_work_ids]
+            )
+            if task.pk not in loaded_ids
+        )
 
-    processing_order_ids = {}
+    grouped = {}
+    for task in open_loaded + done_loaded:
+        key = _task_group_key(task)
+        grouped[key] = _prefer_open(grouped.get(key), task)
+    combined_tasks = list(grouped.values())
+
+    processing_ids = {key[1] for key in grouped if key[0] == "processing"}
+    processing_entries = _latest_status_entries("processing", processing_ids)
     for task in combined_tasks:
         order_id = _extract_processing_order_id(task.route)
-        if order_id:
-            processing_order_ids[order_id] = True
-    if processing_order_ids:
-        entries = (
-            OrderAuditEntry.objects.filter(
-                order_type="processing",
-                order_id__in=list(processing_order_ids),
-            )
-            .order_by("order_id", "-created_at")
-        )
-        status_by_order = {}
-        for entry in entries:
-            if entry.order_id in status_by_order:
-                continue
-            if not _is_status_entry(entry):
-                continue
-            status_by_order[entry.order_id] = _processing_status_label_from_entry(entry)
-        for task in combined_tasks:
-            order_id = _extract_processing_order_id(task.route)
-            if not order_id:
-                continue
-            status_label = (status_by_order.get(order_id) or "").lower()
-            if "взята в работу" in status_label and task.status == "done":
+        if not order_id:
+            continue
+        entry = processing_entries.get(order_id)
+        status_label = (_processing_status_label_from_entry(entry) if entry else "").lower()
+        if "взята в работу" in status_label:
+            if task.status == "done":
                 task.status = "in_progress"
-            if "взята в работу" in status_label:
-                task.route = f"/orders/processing/{order_id}/work/"
+                task.due_bucket = "in_progress"
+            task.route = f"/orders/processing/{order_id}/work/"
 
-    done_tasks = [task for task in combined_tasks if task.status == "done"]
     open_tasks = [task for task in combined_tasks if task.status != "done"]
     open_routes = {task.route for task in open_tasks if task.route}
-    done_tasks = [task for task in done_tasks if not task.route or task.route not in open_routes]
-
-    def due_date_only(task):
-        return task.due_date.date() if task.due_date else None
-
-    status_map = {
-        "backlog": [task for task in open_tasks if due_date_only(task) and due_date_only(task) < today],
-        "in_progress": [task for task in open_tasks if due_date_only(task) == today],
-        "blocked": [task for task in open_tasks if due_date_only(task) and due_date_only(task) > today],
-        "done": done_tasks,
-    }
+    done_tasks = [
+        task
+        for task in combined_tasks
+        if task.status == "done" and (not task.route or task.route not in open_routes)
+    ]
+
+    status_map = {"backlog": [], "in_progress": [], "blocked": [], "done": done_tasks}
+    for task in open_tasks:
+        if task.due_date:
+            status_map[getattr(task, "due_bucket", "in_progress")].append(task)
     totals = {status: len(status_map[status]) for status in status_map}
+    totals["done"] = (
+        done_qs.exclude(route__in=open_routes).exclude(route="").values("route").distinct().count()
+        + done_qs.filter(route="").count()
+    )
     columns = []
     for status in STATUS_ORDER:
         if status == "done":
@@ -262,78 +323,55 @@ def task_panel(context, role=None, limit=6, show_meta=True, include_created_by=T
             }
         )
     tasks = [task for column in columns for task in column["tasks"]]
-    receiving_order_ids = {}
-    processing_order_ids = {}
+    receiving_ids = {_extract_receiving_order_id(task.route) for task in tasks}
+    receiving_entries = _latest_status_entries("receiving", receiving_ids)
     for task in tasks:
         order_id = _extract_receiving_order_id(task.route)
         if order_id:
-            receiving_order_ids[order_id] = True
-        order_id = _extract_processing_order_id(task.route)
-        if order_id:
-            processing_order_ids[order_id] = True
-    receiving_status_by_order = {}
-    receiving_client_by_order = {}
-    if receiving_order_ids:
-        entries = (
-            OrderAuditEntry.objects.filter(
-                order_type="receiving",
-                order_id__in=list(receiving_order_ids),
-            )
-            .select_related("agency")
-            .order_by("order_id", "-created_at")
-        )
-        for entry in entries:
-            if entry.order_id not in receiving_client_by_order:
-                if entry.agency:
-                    name = entry.agency.agn_name or entry.agency.fio_agn or str(entry.agency)
-                    receiving_client_by_order[entry.order_id] = _shorten_ip_name(name)
-                else:
-                    receiving_client_by_order[entry.order_id] = "-"
-            if entry.order_id in receiving_status_by_order:
-                continue
-            if not _is_status_entry(entry):
-                continue
-            receiving_status_by_order[entry.order_id] = _status_label_from_entry(entry)
-    for order_id in receiving_order_ids:
-        label = receiving_status_by_order.get(order_id)
-        if not label or label == "-":
-            receiving_status_by_order[order_id] = "В ожидании поставки товара"
-    processing_status_by_order = {}
-    processing_client_by_order = {}
-    if processing_order_ids:
-        entries = (
-            OrderAuditEntry.objects.filter(
-                order_type="processing",
-                order_id__in=list(processing_order_ids),
-            )
-            .select_related("agency")
-            .order_by("order_id", "-created_at")
-        )
-        for entry in entries:
-            if entry.order_id not in processing_client_by_order:
-                if entry.agency:
-                    name = entry.agency.agn_name or entry.agency.fio_agn or str(entry.agency)
-                    processing_client_by_order[entry.order_id] = _shorten_ip_name(name)
-                else:
-                    processing_client_by_order[entry.order_id] = "-"
-            if entry.order_id in processing_status_by_order:
-                continue
-            if not _is_status_entry(entry):
-                continue
-            processing_status_by_order[entry.order_id] = _processing_status_label_from_entry(entry)
-    for task in tasks:
-        order_id = _extract_receiving_order_id(task.route)
-        if order_id:
-            task.order_status_label = receiving_status_by_order.get(order_id)
-            task.order_client_label = receiving_client_by_order.get(order_id)
-            continue
-        order_id = _extract_processing_order_id(task.route)
-        if order_id:
-            task.order_status_label = processing_status_by_order.get(order_id)
-            task.order_client_label = processing_client_by_order.get(order_id)
-            continue
-        task.order_status_label = None
-        task.order_client_label = None
+            entry = receiving_entries.get(order_id)
+            label = _status_label_from_entry(entry) if entry else None
+            if not label or label == "-":
+                label = "В ожидании поставки товара"
+            task.order_status_label = label
+            task.order_client_label = _client_label(entry)
+        else:
+            order_id = _extract_processing_order_id(task.route)
+            if order_id:
+                entry = processing_entries.get(order_id)
+                task.order_status_label = _processing_status_label_from_entry(entry) if entry else None
+                task.order_client_label = _client_label(entry)
+            else:
+                task.order_status_label = None
+                task.order_client_label = None
+    prefetch_display_titles(tasks)
+    return {
+        "columns": columns,
+        "totals": totals,
+    }
+
+
+def _task_board(role_key, limit_value, include_created_by) -> dict:
+    today = timezone.localdate()
+    cache_key = "todo:board:{version}:{role}:{limit}:{created_by}:{today}".format(
+        version=task_board_version(),
+        role=role_key or "-",
+        limit=limit_value,
+        created_by=int(bool(include_created_by)),
+        today=today.isoformat(),
+    )
+    board = cache.get(cache_key)
+    if board is None:
+        board = _build_task_board(role_key, limit_value, include_created_by, today)
+        cache.set(cache_key, board, settings.TASK_BOARD_CACHE_SECONDS)
+    return board
+
+
+@register.inclusion_tag("todo/_task_panel.html", takes_context=True)
+def task_panel(context, role=None, limit=6, show_meta=True, include_created_by=True):
+    role_key = _resolve_role(context, role)
+    board = _task_board(role_key, _normalize_limit(limit), include_created_by)
+    columns = board["columns"]
+    totals = board["totals"]
     role_label = None
     if role_key == ALL_ROLES_KEY:
         role_label = "Все роли"
@@ -1,3 +1,236 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from audit.models import log_order_action
+from employees.models import Employee
+from fullbox.events import CacheBroker, MemoryBroker, event_stream, get_broker, reset_broker
+
+from .models import Task
+from .templatetags.todo_panel import _task_board
+
+
+def _render_panel(role="manager", limit=6):
+    template = Template('{% load todo_panel %}{% task_panel role limit False %}')
+    return template.render(Context({"role": role, "limit": limit}))
+
+
+class TaskPanelTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = Employee.objects.create(full_name="Иванов Иван", role="manager")
+        now = timezone.now()
+        self.overdue = Task.objects.create(
+            title="Просроченная", assigned_to=self.manager, due_date=now - timedelta(days=2)
+        )
+        self.upcoming = Task.objects.create(
+            title="Будущая", assigned_to=self.manager, due_date=now + timedelta(days=3)
+        )
+        for idx in range(8):
+            Task.objects.create(
+                title=f"Готовая {idx}",
+                assigned_to=self.manager,
+                status="done",
+                due_date=now - timedelta(days=5),
+            )
+
+    def test_columns_are_bucketed_by_due_date(self):
+        html = _render_panel()
+        self.assertIn("Просроченная", html)
+        self.assertIn("Будущая", html)
+
+    def test_done_history_is_limited_but_counted(self):
+        board = _task_board("manager", 3, False)
+        done_column = next(column for column in board["columns"] if column["status"] == "done")
+        self.assertEqual(len(done_column["tasks"]), 3)
+        self.assertEqual(done_column["count"], 8)
+        backlog = next(column for column in board["columns"] if column["status"] == "backlog")
+        self.assertEqual([task.pk for task in backlog["tasks"]], [self.overdue.pk])
+
+    def test_board_is_cached_until_tasks_change(self):
+        _render_panel()
+        with self.assertNumQueries(0):
+            _render_panel()
+        Task.objects.filter(pk=self.upcoming.pk).update(status="done")
+        board = _task_board("manager", 6, False)
+        counts = {column["status"]: column["count"] for column in board["columns"]}
+        self.assertEqual(counts["blocked"], 0)
+        self.assertEqual(counts["done"], 9)
+
+    def test_order_status_label_comes_from_latest_status_entry(self):
+        log_order_action(
+            "create",
+            order_id="77",
+            order_type="receiving",
+            payload={"status": "sent_unconfirmed", "items": [{"sku_code": "A"}]},
+        )
+        log_order_action("comment", order_id="77", order_type="receiving", payload={"comment": "ok"})
+        # Пустые статусные ключи статусной записью не считаются.
+        log_order_action("update", order_id="77", order_type="receiving", payload={"status": "", "submit_action": ""})
+        Task.objects.create(
+            title="Заявка",
+            route="/orders/receiving/77/",
+            assigned_to=self.manager,
+            due_date=timezone.now() - timedelta(days=1),
+        )
+        self.assertIn("Ждет подтверждения", _render_panel())
+
+    def test_only_status_entries_drop_the_board(self):
+        log_order_action("status", order_id="77", order_type="receiving", payload={"status": "warehouse"})
+        _render_panel()
+        log_order_action("update", order_id="77", order_type="receiving", payload={"scan": "4600000000011"})
+        with self.assertNumQueries(0):
+            _render_panel()
+        log_order_action("update", order_id="77", order_type="receiving", payload={"status": "done"})
+        with CaptureQueriesContext(connection) as queries:
+            _render_panel()
+        self.assertTrue(queries.captured_queries)
+
+
+class DisplayTitlePrefetchTests(TestCase):
+    def setUp(self):
+        log_order_action("create", order_id="1", order_type="receiving", payload={"items": [{"sku_code": "A"}]})
+        log_order_action("create", order_id="2", order_type="receiving", payload={"items": []})
+        log_order_action("status", order_id="2", order_type="receiving", payload={"status": "warehouse"})
+        for order_id in ("1", "2"):
+            Task.objects.create(title="Приемка", route=f"/orders/receiving/{order_id}/")
+        Task.objects.create(title="Обработка", route="/orders/processing/5/")
+
+    def test_titles_resolved_with_one_journal_query(self):
+        with self.assertNumQueries(2):
+            tasks = list(Task.objects.with_display_titles().order_by("pk"))
+            titles = [task.display_title() for task in tasks]
+        self.assertEqual(
+            titles,
+            [
+                "Заявка на приемку №1",
+                "Заявка на приемку без указания товара №2",
+                "Заявка на обработку №5",
+            ],
+        )
+
+    def test_chained_querysets_keep_prefetch(self):
+        tasks = Task.objects.with_display_titles().filter(route__contains="receiving")
+        with self.assertNumQueries(2):
+            self.assertEqual(len([task.display_title() for task in tasks]), 2)
+
+
+def _stream_events(broker, channels, count, publish=None, last_id=0):
+    """Читает count событий из потока SSE; publish() вызывается из другого потока после подписки."""
+
+    async def read():
+        stream = event_stream(channels, last_id=last_id, broker=broker, keepalive=5)
+        received = []
+        async for chunk in stream:
+            if chunk.startswith("retry:"):
+                if publish:
+                    threading.Timer(0.05, publish).start()
+                continue
+            received.append(json.loads(chunk.split("data: ", 1)[1]))
+            if len(received) == count:
+                break
+        await stream.aclose()
+        return received
+
+    return asyncio.run(asyncio.wait_for(read(), 5))
+
+
+@override_settings(EVENT_BROKER="memory")
+class LiveEventsTests(TestCase):
+    def setUp(self):
+        reset_broker()
+        self.addCleanup(reset_broker)
+
+    def test_task_and_order_changes_are_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            task = Task.objects.create(title="Приемка", route="/orders/receiving/7/")
+            self.assertEqual(asyncio.run(get_broker().since(0)), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            log_order_action("status", order_id="7", payload={"status": "warehouse"})
+            log_order_action("comment", order_id="7", payload={"comment": "ok"})
+            Task.objects.filter(pk=task.pk).update(status="done")
+        events = asyncio.run(get_broker().since(0))
+        self.assertEqual([event["type"] for event in events], ["task.created", "order.status", "tasks.changed"])
+        self.assertEqual(events[0]["data"]["id"], task.pk)
+        self.assertEqual(events[1]["data"]["status_label"], "В ожидании поставки товара")
+
+    def test_stream_delivers_only_requested_channels(self):
+        broker = MemoryBroker()
+
+        def publish():
+            broker.publish({"channel": "print", "type": "print_job", "data": {"id": 1}})
+            broker.publish({"channel": "moves", "type": "move.created", "data": {"order_id": "5"}})
+
+        received = _stream_events(broker, {"moves"}, 1, publish=publish)
+        self.assertEqual(received, [{"type": "move.created", "channel": "moves", "order_id": "5"}])
+
+    def test_stale_last_event_id_is_reset(self):
+        broker = MemoryBroker()
+
+        def publish():
+            broker.publish({"channel": "tasks", "type": "task.created", "data": {"id": 3}})
+
+        received = _stream_events(broker, {"tasks"}, 1, publish=publish, last_id=1000)
+        self.assertEqual(received[0]["id"], 3)
+
+    def test_cache_broker_shares_events_through_cache(self):
+        cache.clear()
+        writer, reader = CacheBroker(), CacheBroker(poll_seconds=0.01)
+        for order_id in ("1", "2"):
+            writer.publish({"channel": "moves", "type": "move.updated", "data": {"order_id": order_id}})
+        events = asyncio.run(reader.since(0))
+        self.assertEqual([event["data"]["order_id"] for event in events], ["1", "2"])
+        self.assertEqual(asyncio.run(reader.since(events[-1]["id"])), [])
+        self.assertFalse(asyncio.run(reader.wait(events[-1]["id"], 0.05)))
+
+    def test_expired_cache_events_do_not_spin_the_stream(self):
+        cache.clear()
+        broker = CacheBroker(poll_seconds=0.01)
+        for order_id in range(1, 6):
+            broker.publish({"channel": "moves", "type": "move.updated", "data": {"order_id": str(order_id)}})
+        cache.delete_many([f"events:{event_id}" for event_id in range(1, 6)])
+        calls = []
+        since = broker.since
+
+        async def counting_since(last_id):
+            calls.append(last_id)
+            return await since(last_id)
+
+        broker.since = counting_since
+
+        async def read():
+            stream = event_stream({"moves"}, last_id=2, broker=broker, keepalive=0.2)
+            chunks = [await stream.__anext__(), await stream.__anext__()]
+            await stream.aclose()
+            return chunks
+
+        chunks = asyncio.run(asyncio.wait_for(read(), 5))
+        self.assertEqual(chunks[1], ": keepalive\n\n")
+        self.assertEqual(calls, [2])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": "/tmp"}}
+    )
+    def test_cache_broker_requires_atomic_counter(self):
+        with self.assertRaises(ImproperlyConfigured):
+            CacheBroker()
+
+    def test_anonymous_users_cannot_subscribe(self):
+        response = self.client.get("/events/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_wsgi_requests_are_told_to_stop_reconnecting(self):
+        user = get_user_model().objects.create_user("live_manager")
+        Employee.objects.create(full_name="Петров Петр", role="manager", user=user)
+        self.client.force_login(user)
+        self.assertEqual(self.client.get("/events/").status_code, 204)
@@ -8,10 +8,12 @@ from django.urls import reverse
 from django.utils import timezone
 from django.db.models import Q
 
+from audit.archive import order_entries
 from audit.models import OrderAuditEntry, log_order_action
-from employees.models import Employee
-from employees.access import get_request_role
+from employees.directory import first_active_entry
+from employees.access import get_request_employee, get_request_role
 from orders import views as order_views
+from orders.aggregate import current_status_entry, find_act_entry, latest_payload_from_entries, order_aggregate
 from .forms import TaskAttachmentForm, TaskCommentForm, TaskForm
 from .models import Task, TaskAttachment
 
@@ -64,21 +66,15 @@ def _send_receiving_to_warehouse(task, request) -> bool:
         route=f"/orders/receiving/{order_id}/",
         assigned_to__role="manager",
     ).exclude(status="done").update(status="done")
-    storekeeper = (
-        Employee.objects.filter(role="storekeeper", is_active=True)
-        .order_by("full_name")
-        .first()
-    )
+    storekeeper = first_active_entry("storekeeper")
     if storekeeper:
-        observer = Employee.objects.filter(
-            user=request.user, is_active=True
-        ).first()
+        observer = get_request_employee(request)
         description = f"Клиент: {latest.agency.agn_name or latest.agency.inn or latest.agency.id}"
         Task.objects.create(
             title=f"Принять заявку на приемку товара №{order_id}",
             description=description,
             route=f"/orders/receiving/{order_id}/",
-            assigned_to=storekeeper,
+            assigned_to_id=storekeeper["id"],
             observer=observer,
             created_by=request.user if request.user.is_authenticated else None,
             due_date=timezone.localtime() + timedelta(days=1),
@@ -137,7 +133,7 @@ def task_list(request):
     role = get_request_role(request)
     if not role and not request.user.is_staff:
         return redirect("/")
-    tasks = Task.objects.all()
+    tasks = Task.objects.with_display_titles()
     if role and not request.user.is_staff:
         tasks = tasks.filter(
             Q(assigned_to__role=role)
@@ -260,16 +256,9 @@ def task_detail(request, pk):
             return redirect("todo:detail", pk=task.pk)
         if action == "send_act_to_client":
             order_id = _extract_receiving_order_id(task.route)
-            if order_id:
-                entries = list(
-                    OrderAuditEntry.objects.filter(order_id=order_id, order_type="receiving")
-                    .select_related("agency")
-                    .order_by("created_at")
-                )
-            else:
-                entries = []
-            if entries and role in {"manager", "head_manager", "director", "admin"}:
-                if order_views._send_act_to_client(order_id, entries, request.user):
+            order = order_aggregate(request, "receiving", order_id) if order_id else None
+            if order and order.entries and role in {"manager", "head_manager", "director", "admin"}:
+                if order_views._send_act_to_client(order, request.user):
                     messages.success(request, "Акт отправлен клиенту")
                 else:
                     messages.error(request, "Не удалось отправить акт клиенту")
@@ -334,15 +323,11 @@ def task_detail(request, pk):
     can_send_act_to_client = False
     order_id = _extract_receiving_order_id(task.route)
     if order_id:
-        entries = list(
-            OrderAuditEntry.objects.filter(order_id=order_id, order_type="receiving")
-            .select_related("user", "agency")
-            .order_by("created_at")
-        )
+        entries = order_entries(order_id, "receiving")
         if entries:
             latest = entries[-1]
-            status_entry = order_views._current_status_entry(entries)
-            payload = order_views._latest_payload_from_entries(entries)
+            status_entry = current_status_entry(entries)
+            payload = latest_payload_from_entries(entries)
             client_label = "-"
             if latest and latest.agency:
                 name = latest.agency.agn_name or latest.agency.fio_agn or str(latest.agency)
@@ -355,18 +340,8 @@ def task_detail(request, pk):
                     continue
                 seen.add(label)
                 participants.append(label)
-            def find_act_entry(act_type, label_hint):
-                entry = order_views._act_entry_from_entries(entries, act_type)
-                if entry:
-                    return entry
-                for candidate in reversed(entries):
-                    label = ((candidate.payload or {}).get("act_label") or "").lower()
-                    if label_hint in label:
-                        return candidate
-                return None
-
-            receiving_entry = find_act_entry("receiving", "акт приемки")
-            placement_entry = find_act_entry("placement", "акт размещения")
+            receiving_entry = find_act_entry(entries, "receiving", "акт приемки")
+            placement_entry = find_act_entry(entries, "placement", "акт размещения")
             receiving_act_exists = bool(receiving_entry)
             placement_act_exists = bool(placement_entry)
             receiving_act_label = (